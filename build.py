@@ -134,6 +134,15 @@ def copy_frontend(is_dry_run):
         sys.exit(1)
 
 
+def precompress_frontend(is_dry_run):
+    """Write .br and .gz siblings of the frontend files, so pyrobird serves them without compressing on request"""
+    print(f"Precompressing '{static_path}'")
+    if is_dry_run:
+        return
+
+    _run([sys.executable, "-m", "pyrobird.server.static_assets", static_path], cwd=pyrobird_path, prefix="precompress")
+
+
 def copy_docs(is_dry_run):
 
     # Copy all files and directories from script_path/firebird-ng/dist/firebird to script_path/pyrobird/server/static
@@ -193,6 +202,7 @@ def main():
 
     if mode in ["all", "cp_ng"]:
         copy_frontend(is_dry_run=args.dry_run)
+        precompress_frontend(is_dry_run=args.dry_run)
 
     if mode in ["all", "py", "py_build", "py-build"]:
         build_py(is_dry_run=args.dry_run)
@@ -1,17 +1,71 @@
 # Created by: Dmitry Romanov, 2024
 # This file is part of Firebird Event Display and is licensed under the LGPLv3.
 # See the LICENSE file in the project root for full license information.
+import importlib
 import logging
 
 import click
 
 from pyrobird.__version__ import __version__
-from pyrobird.cli.geo import geo as geo_group
-from pyrobird.cli.serve import serve as serve_group
-from pyrobird.cli.convert import convert as convert_cmd
-from pyrobird.cli.screenshot import screenshot as screenshot_cmd
-from pyrobird.cli.merge import merge as merge_cmd
-from pyrobird.cli.smooth import smooth as smooth_cmd
+
+# Subcommand name => (module, command object name, short help)
+# Modules are imported only when the command runs, so `pyrobird merge` doesn't import flask or uproot.
+# Short help is kept here to show `pyrobird --help` without importing anything
+LAZY_SUBCOMMANDS = {
+    "convert": ("pyrobird.cli.convert", "convert", "Converts an input EDM4eic ROOT file to a Firebird-compatible JSON file."),
+    "geo": ("pyrobird.cli.geo", "geo", "Operations with geometry"),
+    "merge": ("pyrobird.cli.merge", "merge", "Merge multiple Firebird DEX JSON files."),
+    "screenshot": ("pyrobird.cli.screenshot", "screenshot", "Start the Flask server, take a screenshot of the specified URL using Playwright."),
+    "serve": ("pyrobird.cli.serve", "serve", "Start the server that serves Firebird frontend and can communicate with it."),
+    "smooth": ("pyrobird.cli.smooth", "smooth", "Smooth trajectories in a Firebird DEX JSON file."),
+}
+
+# Root logger prints INFO messages of the commands (geo used to set it when all commands were imported)
+logging.basicConfig(level=logging.INFO)
+
+
+class LazyGroup(click.Group):
+    """
+    Click group that imports subcommand modules on first use.
+
+    Parameters
+    ----------
+    lazy_subcommands : dict
+        Command name => (module, command object name, short help)
+    """
+
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_subcommands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in self.lazy_subcommands and cmd_name not in self.commands:
+            module_name, attr_name, _ = self.lazy_subcommands[cmd_name]
+            command = getattr(importlib.import_module(module_name), attr_name)
+            if not isinstance(command, click.Command):
+                raise ValueError(f"{module_name}.{attr_name} is not a click command")
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        """Lists commands with short help of not imported commands taken from lazy_subcommands"""
+        rows = []
+        limit = formatter.width - 6 - max(len(name) for name in self.list_commands(ctx))
+        for name in self.list_commands(ctx):
+            command = self.commands.get(name)
+            if command is not None:
+                if command.hidden:
+                    continue
+                rows.append((name, command.get_short_help_str(limit)))
+            else:
+                placeholder = click.Command(name, help=self.lazy_subcommands[name][2])
+                rows.append((name, placeholder.get_short_help_str(limit)))
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
 
 
 def setup_logging(is_verbose):
@@ -38,7 +92,8 @@ def setup_logging(is_verbose):
     logger.debug("DEBUG log level")
 
 
-@click.group(context_settings={"help_option_names": ["-h", "--help"]}, invoke_without_command=True)
+@click.group(cls=LazyGroup, lazy_subcommands=LAZY_SUBCOMMANDS,
+             context_settings={"help_option_names": ["-h", "--help"]}, invoke_without_command=True)
 @click.option('--verbose', is_flag=True, help="Enable verbose mode (INFO level logging).")
 @click.version_option(version=__version__, prog_name="pyrobird")
 @click.pass_context
@@ -52,11 +107,3 @@ def cli_app(ctx, verbose):
     if ctx.invoked_subcommand is None:
         click.echo("No command was specified")
 
-
-# noinspection PyTypeChecker
-cli_app.add_command(geo_group)
-cli_app.add_command(serve_group)
-cli_app.add_command(convert_cmd)
-cli_app.add_command(screenshot_cmd)
-cli_app.add_command(merge_cmd)
-cli_app.add_command(smooth_cmd)
@@ -1,8 +1,14 @@
 import logging
 import click
-from pyrobird.edm4eic import edm4eic_to_dex_dict, parse_entry_numbers
+from pyrobird.edm4eic import (edm4eic_to_dex_dict, parse_entry_numbers, OPTION_CALO_MIN_ENERGY, OPTION_CALO_MAX_HITS,
+                              OPTION_LOD, OPTION_LOD_VOXEL_SIZE, OPTION_LOD_MAX_HITS)
+from pyrobird.dex_lod import LOD_METHODS
+from pyrobird.dex_arrays import dex_to_json
+from pyrobird.dex_columnar import DEX_FORMATS, FORMAT_ROWS
+from pyrobird.dex_binary import write_dex_binary
 import os
-import json
+
+logger = logging.getLogger(__name__)
 
 
 def guess_output_name(input_entry, output_extension='.firebird.json'):
@@ -45,11 +51,70 @@ def guess_output_name(input_entry, output_extension='.firebird.json'):
 @click.option(
     "-c", "--collections", "collections_str", default="",
     help="Comma-separated list of collection types to convert. "
-         "For example: 'tracker_hits,tracks'."
+         "For example: 'tracker_hits,tracks,calorimeter_hits,clusters,mc_particles'."
+)
+@click.option(
+    "--calo-min-energy", "calo_min_energy", type=float, default=0.0, show_default=True,
+    help="Calorimeter hits with lower energy are dropped."
+)
+@click.option(
+    "--calo-max-hits", "calo_max_hits", type=click.IntRange(min=0), default=0, show_default=True,
+    help="Keep only this number of calorimeter hits with the highest energy per collection. 0 keeps all."
+)
+@click.option(
+    "--lod", "lod", type=click.Choice(LOD_METHODS), default=None,
+    help="Decimate hit groups: 'voxel' aggregates hits on a grid of --lod-voxel-size, "
+         "'sample' keeps up to --lod-max-hits hits per event sampled from each detector."
+)
+@click.option(
+    "--lod-voxel-size", "lod_voxel_size", type=click.FloatRange(min=0, min_open=True), default=10.0,
+    show_default=True, help="Voxel size [mm] of --lod=voxel."
+)
+@click.option(
+    "--lod-max-hits", "lod_max_hits", type=click.IntRange(min=0), default=20000, show_default=True,
+    help="Hit budget of an event of --lod=sample."
+)
+@click.option(
+    "--format", "dex_format", type=click.Choice(DEX_FORMATS), default=FORMAT_ROWS, show_default=True,
+    help="Encoding of hits and trajectories. 'rows' is DEX 0.04, 'columnar' and 'columnar-base64' are DEX 0.05 "
+         "with one array per column (the latter as base64 float32 buffers)."
+)
+@click.option(
+    "--remote-cache-dir", "remote_cache_dir", envvar="PYROBIRD_REMOTE_CACHE_DIR", default="",
+    help="Directory to cache blocks of remote (root://, http://) files in. "
+         "Converting the same remote file again reads it from the local disk."
+)
+@click.option(
+    "--remote-cache-size-mb", "remote_cache_size_mb", envvar="PYROBIRD_REMOTE_CACHE_SIZE_MB", type=float,
+    default=10240, show_default=True,
+    help="Size limit of the remote files cache. The least recently used blocks are removed."
+)
+@click.option(
+    "--remote-parallel-requests", "remote_parallel_requests", envvar="PYROBIRD_REMOTE_PARALLEL_REQUESTS", type=int,
+    default=32, show_default=True,
+    help="Maximum range requests in flight when reading baskets of a remote file."
+)
+@click.option(
+    "--remote-connections-per-host", "remote_connections_per_host", envvar="PYROBIRD_REMOTE_CONNECTIONS_PER_HOST",
+    type=int, default=16, show_default=True,
+    help="Maximum HTTP connections per host. 0 means unlimited."
+)
+@click.option(
+    "--remote-coalesce/--no-remote-coalesce", "remote_coalesce", envvar="PYROBIRD_REMOTE_COALESCE", default=True,
+    show_default=True,
+    help="Merge nearby basket ranges and send them as vector requests."
+)
+@click.option(
+    "--remote-timeout", "remote_timeout", envvar="PYROBIRD_REMOTE_TIMEOUT", type=float, default=60,
+    show_default=True,
+    help="Seconds to wait for a remote read request. 0 waits forever."
 )
 # TODO @click.option("-t", "--type", "input_type", default=None, help="Input file type. Currently only edm4eic supported")
 @click.argument("filename", required=True)
-def convert(filename, output_file, entries_str, collections_str):
+def convert(filename, output_file, entries_str, collections_str, calo_min_energy, calo_max_hits, lod, lod_voxel_size,
+            lod_max_hits, dex_format,
+            remote_cache_dir, remote_cache_size_mb, remote_parallel_requests, remote_connections_per_host,
+            remote_coalesce, remote_timeout):
     """
     Converts an input EDM4eic ROOT file to a Firebird-compatible JSON file.
 
@@ -64,9 +129,18 @@ def convert(filename, output_file, entries_str, collections_str):
     Use `-o -` or `--output -` to output the JSON data to stdout instead of a file.
     This allows the command to be used in pipelines.
 
+    If the output file name ends with `.bin` (e.g. `file.firebird.bin`), binary DEX container
+    is written instead of JSON: a small JSON header with typed array payloads (see pyrobird.dex_binary).
+
     Use `-c` or `--collections` to specify specific collections to convert:
-      - tracker_hits  - edm4eic::TrackerHitData
-      - tracks        - edm4eic::TrackSegmentData with associated tracks
+      - tracker_hits      - edm4eic::TrackerHitData
+      - tracks            - edm4eic::TrackSegmentData with associated tracks
+      - calorimeter_hits  - edm4eic::CalorimeterHitData, edm4hep::SimCalorimeterHitData
+      - clusters          - edm4eic::ClusterData
+      - mc_particles      - edm4hep::MCParticleData as lines from vertex to endpoint
+
+    Hits and clusters are linked to MC particles if mc_particles are converted,
+    clusters are linked to their hits if calorimeter_hits are converted.
 
     Currently, only EDM4eic format is supported.
 
@@ -78,8 +152,12 @@ def convert(filename, output_file, entries_str, collections_str):
         convert mydata.root --output output.firebird.json
         convert mydata.root --output - | less
         convert mydata.root --collections=tracks
+        convert mydata.root --format columnar
+        convert mydata.root --output mydata.firebird.bin
+        convert root://dtn-eic.jlab.org//work/eic2/file.root --remote-cache-dir ~/.cache/pyrobird
     """
-    import uproot
+    from pyrobird.remote_cache import RemoteBlockCache
+    from pyrobird.remote_source import RemoteSourcePool
 
     may_be_url = "://" in filename
 
@@ -87,7 +165,14 @@ def convert(filename, output_file, entries_str, collections_str):
         msg = f"File not found: '{filename}'"
         raise FileNotFoundError(msg)
 
-    file = uproot.open(filename)
+    block_cache = None
+    if remote_cache_dir:
+        block_cache = RemoteBlockCache(remote_cache_dir, max_bytes=int(remote_cache_size_mb * 1024 * 1024))
+
+    source_pool = RemoteSourcePool(connections_per_host=remote_connections_per_host,
+                                   parallel_requests=remote_parallel_requests, coalesce=remote_coalesce,
+                                   timeout=remote_timeout, block_cache=block_cache)
+    file = source_pool.open(filename)
     tree = file['events']
 
     num_entries = tree.num_entries
@@ -113,10 +198,25 @@ def convert(filename, output_file, entries_str, collections_str):
         "entries_count": num_entries
     }
 
-    fdex_dict = edm4eic_to_dex_dict(tree, entries, origin_info, collections=collections)
+    # Hits are kept as NumPy arrays and written to JSON directly
+    is_binary = output_file is not None and output_file.endswith('.bin')
+    options = {OPTION_CALO_MIN_ENERGY: calo_min_energy, OPTION_CALO_MAX_HITS: calo_max_hits}
+    if lod:
+        options.update({OPTION_LOD: lod, OPTION_LOD_VOXEL_SIZE: lod_voxel_size, OPTION_LOD_MAX_HITS: lod_max_hits})
+    fdex_dict = edm4eic_to_dex_dict(tree, entries, origin_info, collections=collections, as_arrays=True,
+                                    dex_format=FORMAT_ROWS if is_binary else dex_format, options=options)
+
+    if block_cache is not None:
+        logger.info(f"Remote files cache: {block_cache.stats()}")
+
+    if is_binary:
+        # Binary container keeps arrays as they are, --format doesn't apply
+        with open(output_file, 'wb') as f:
+            f.write(write_dex_binary(fdex_dict))
+        return
 
     # Convert the event data to JSON format
-    json_data = json.dumps(fdex_dict)
+    json_data = dex_to_json(fdex_dict)
 
     if output_file == '-':
         # Output to stdout
@@ -6,6 +6,7 @@ import sys
 from typing import Dict, List, Any, Set, Union
 
 from pyrobird.dex_utils import load_dex_file
+from pyrobird.dex_format import DEX_FORMATS, FORMAT_ROWS
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,8 +16,10 @@ logger = logging.getLogger(__name__)
 @click.option('--ignore', is_flag=True, help='Ignore duplicate group names from right files')
 @click.option('--overwrite', is_flag=True, help='Overwrite duplicate group names from left files')
 @click.option('-o', '--output', 'output_file', help='Output file name for the merged result')
+@click.option('--format', 'dex_format', type=click.Choice(DEX_FORMATS), default=FORMAT_ROWS, show_default=True,
+              help='Encoding of BoxHit and PointTrajectory groups in the output')
 @click.argument('input_files', nargs=-1, required=True)
-def merge(reset_id, ignore, overwrite, output_file, input_files):
+def merge(reset_id, ignore, overwrite, output_file, input_files, dex_format):
     """
     Merge multiple Firebird DEX JSON files.
 
@@ -40,6 +43,11 @@ def merge(reset_id, ignore, overwrite, output_file, input_files):
 
       - Save merged result to a specific file:
           pyrobird merge -o merged.firebird.json file1.firebird.json file2.firebird.json
+
+      - Save merged result with columnar groups (DEX 0.05):
+          pyrobird merge --format columnar -o merged.firebird.json file1.firebird.json file2.firebird.json
+
+    Input files may have row (DEX 0.04) or columnar (DEX 0.05) groups.
     """
     # Check that we have at least two files
     if len(input_files) < 2:
@@ -57,6 +65,10 @@ def merge(reset_id, ignore, overwrite, output_file, input_files):
 
     # Merge the DEX files
     merged_data = merge_dex_files(dex_data_list, reset_id, ignore, overwrite)
+    if dex_format != FORMAT_ROWS:
+        # NumPy encoders are imported only when needed
+        from pyrobird.dex_columnar import encode_dex
+        merged_data = encode_dex(merged_data, dex_format)
 
     # Save the merged result
     if output_file:
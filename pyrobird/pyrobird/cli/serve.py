@@ -1,8 +1,13 @@
 import logging
 import click
 import pyrobird.server
+import pyrobird.server.production
+from pyrobird.server.production import ENGINES, ENGINE_FLASK
 from pyrobird.server import CFG_DOWNLOAD_IS_UNRESTRICTED, CFG_DOWNLOAD_IS_DISABLED, CFG_DOWNLOAD_PATH, \
-    CFG_CORS_IS_ALLOWED, CFG_API_BASE_URL, CFG_FIREBIRD_CONFIG_PATH
+    CFG_CORS_IS_ALLOWED, CFG_API_BASE_URL, CFG_FIREBIRD_CONFIG_PATH, CFG_RESULT_CACHE_DIR, CFG_CONVERT_WORKERS, \
+    CFG_REMOTE_CACHE_DIR, CFG_METRICS, CFG_CALO_MIN_ENERGY, CFG_CALO_MAX_HITS, CFG_LOD, CFG_LOD_VOXEL_SIZE, \
+    CFG_LOD_MAX_HITS
+from pyrobird.dex_lod import LOD_METHODS
 from pyrobird.utils import is_running_in_container
 
 # Configure logging
@@ -44,9 +49,21 @@ def get_default_host():
 @click.option("--port", "port", default="", help="Set the port for development server to listen to")
 @click.option("--api-url", "api_url", envvar=CFG_API_BASE_URL, default="", help="Force to use this address as backend API base URL. E.g. https://my-server:1234/")
 @click.option("--config", "config_path", envvar=CFG_FIREBIRD_CONFIG_PATH, default="", help="Path to firebird config.jsonc if used a custom")
+@click.option("--cache-dir", "cache_dir", envvar=CFG_RESULT_CACHE_DIR, default="", help="Directory to store converted events in. By default converted events are cached only in memory")
+@click.option("--convert-workers", "convert_workers", envvar=CFG_CONVERT_WORKERS, type=int, default=0, show_default=True, help="Number of processes converting events. 0 converts events on the request threads")
+@click.option("--remote-cache-dir", "remote_cache_dir", envvar=CFG_REMOTE_CACHE_DIR, default="", help="Directory to cache blocks of remote (root://, http://) files in. Repeated reads of a remote file then come from the local disk")
+@click.option("--metrics", "metrics", envvar=CFG_METRICS, is_flag=True, show_default=True, default=False, help="Expose Prometheus metrics at /api/v1/metrics")
+@click.option("--calo-min-energy", "calo_min_energy", envvar=CFG_CALO_MIN_ENERGY, type=float, default=0.0, show_default=True, help="Default energy threshold of calorimeter hits. Requests may override it with calo_min_energy argument")
+@click.option("--calo-max-hits", "calo_max_hits", envvar=CFG_CALO_MAX_HITS, type=click.IntRange(min=0), default=0, show_default=True, help="Default number of calorimeter hits with the highest energy kept per collection, 0 keeps all. Requests may override it with calo_max_hits argument")
+@click.option("--lod", "lod", envvar=CFG_LOD, type=click.Choice(LOD_METHODS), default=None, help="Default LOD decimation of hit groups: voxel or sample. Requests may override it with lod argument, lod=none disables it")
+@click.option("--lod-voxel-size", "lod_voxel_size", envvar=CFG_LOD_VOXEL_SIZE, type=click.FloatRange(min=0, min_open=True), default=10.0, show_default=True, help="Default voxel size [mm] of lod=voxel. Requests may override it with lod_voxel_size argument")
+@click.option("--lod-max-hits", "lod_max_hits", envvar=CFG_LOD_MAX_HITS, type=click.IntRange(min=0), default=20000, show_default=True, help="Default hit budget of an event of lod=sample. Requests may override it with lod_max_hits argument")
+@click.option("--workers", "workers", type=int, default=1, show_default=True, help="Number of server processes. More than 1 requires --engine gunicorn or uvicorn")
+@click.option("--engine", "engine", type=click.Choice(ENGINES), default=ENGINE_FLASK, show_default=True, help="Server to run: flask development server, gunicorn (preloaded forked workers) or uvicorn")
+@click.option("--threads", "threads", type=int, default=8, show_default=True, help="Request threads of each gunicorn worker")
 @click.option("--debug", "is_debug", is_flag=True, help="Run flask in debugging mode")
 @click.pass_context
-def serve(ctx, unsecure_files, allow_cors, disable_download, work_path, host, port, api_url, config_path, is_debug):
+def serve(ctx, unsecure_files, allow_cors, disable_download, work_path, host, port, api_url, config_path, cache_dir, convert_workers, remote_cache_dir, metrics, calo_min_energy, calo_max_hits, lod, lod_voxel_size, lod_max_hits, workers, engine, threads, is_debug):
     """
     Start the server that serves Firebird frontend and can communicate with it.
 
@@ -65,6 +82,8 @@ def serve(ctx, unsecure_files, allow_cors, disable_download, work_path, host, po
           fbd serve --work-path=/home/username/datafiles
         Now if you set file local://filename.root in Firebird UI,
         the file /home/username/datafiles/filename.root will be opened
+      - Serve a group of users with 8 preloaded gunicorn workers:
+          fbd serve --workers 8 --engine gunicorn --cache-dir /scratch/firebird-events
     """
 
     # Log the state of each flag
@@ -79,13 +98,25 @@ def serve(ctx, unsecure_files, allow_cors, disable_download, work_path, host, po
     if not port:
         port = 5454
 
-    pyrobird.server.run(debug=is_debug, host=host, port=port, config={
+    if workers > 1 and engine == ENGINE_FLASK:
+        raise click.UsageError("flask development server runs one worker. Use --engine gunicorn or uvicorn")
+
+    pyrobird.server.production.run(debug=is_debug, host=host, port=port, workers=workers, engine=engine, threads=threads, config={
         CFG_DOWNLOAD_IS_UNRESTRICTED: unsecure_files,
         CFG_DOWNLOAD_IS_DISABLED: disable_download,
         CFG_DOWNLOAD_PATH: work_path,
         CFG_CORS_IS_ALLOWED: allow_cors,
         CFG_API_BASE_URL: api_url,
-        CFG_FIREBIRD_CONFIG_PATH: config_path})
+        CFG_FIREBIRD_CONFIG_PATH: config_path,
+        CFG_RESULT_CACHE_DIR: cache_dir,
+        CFG_CONVERT_WORKERS: convert_workers,
+        CFG_REMOTE_CACHE_DIR: remote_cache_dir,
+        CFG_METRICS: metrics,
+        CFG_CALO_MIN_ENERGY: calo_min_energy,
+        CFG_CALO_MAX_HITS: calo_max_hits,
+        CFG_LOD: lod or '',
+        CFG_LOD_VOXEL_SIZE: lod_voxel_size,
+        CFG_LOD_MAX_HITS: lod_max_hits})
 
 
 if __name__ == '__main__':
@@ -9,6 +9,7 @@ import math
 from typing import Dict, Any, List
 
 from pyrobird.dex_utils import load_dex_file
+from pyrobird.dex_columnar import DEX_FORMATS, FORMAT_ROWS, encode_dex
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,8 +24,10 @@ cut_volumes = [
 @click.command()
 @click.option('-o', '--output', 'output_file', required=True, help='Output file name for the smoothed result')
 @click.option('--step-time', 'step_time', type=float, default=0.2, help='Time step in nanoseconds for interpolation (default: 0.2)')
+@click.option('--format', 'dex_format', type=click.Choice(DEX_FORMATS), default=FORMAT_ROWS, show_default=True,
+              help='Encoding of BoxHit and PointTrajectory groups in the output')
 @click.argument('input_file', required=True)
-def smooth(output_file, input_file, step_time):
+def smooth(output_file, input_file, step_time, dex_format):
     """
     Smooth trajectories in a Firebird DEX JSON file.
 
@@ -39,6 +42,9 @@ def smooth(output_file, input_file, step_time):
 
       - Smooth with custom time step:
           pyrobird smooth input.firebird.json -o smoothed.firebird.json --step-time 0.1
+
+      - Write smoothed trajectories with columnar groups (DEX 0.05):
+          pyrobird smooth input.firebird.json -o smoothed.firebird.json --format columnar
     """
     # Load the input DEX file
     dex_data = load_dex_file(input_file)
@@ -46,6 +52,7 @@ def smooth(output_file, input_file, step_time):
     # Apply smoothing algorithms
     logger.info("Applying trajectory smoothing...")
     smoothed_data = apply_smoothing(dex_data, step_time)
+    smoothed_data = encode_dex(smoothed_data, dex_format)
 
     # Process trajectories and print statistics
     #process_trajectories(smoothed_data)
@@ -0,0 +1,172 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Columnar in-memory representation of DEX groups.
+
+Converters may keep hits of a group as NumPy arrays instead of one python dict per hit.
+It takes roughly the memory of the raw arrays, and the JSON is written straight from them.
+Use dex_to_json to serialize DEX documents, events or groups holding such arrays.
+"""
+
+import json
+import re
+import uuid
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Column names of BoxHit group in the order they go to a hit:
+# {"pos": [x, y, z], "dim": [dx, dy, dz], "t": [t, dt], "ed": [ed, ded]}
+BOX_HIT_COLUMNS = ("x", "y", "z", "dx", "dy", "dz", "t", "dt", "ed", "ded")
+
+
+def _box_hit_template(separators):
+    """Template of one hit JSON, e.g. '{"pos":[%s,%s,%s],"dim":[%s,%s,%s],"t":[%s,%s],"ed":[%s,%s]}'"""
+    item, key = separators
+
+    def values(count):
+        return "[" + item.join(["%s"] * count) + "]"
+
+    return "{" + item.join([f'"pos"{key}{values(3)}', f'"dim"{key}{values(3)}',
+                             f'"t"{key}{values(2)}', f'"ed"{key}{values(2)}']) + "}"
+
+
+class BoxHitArrays:
+    """
+    Hits of a BoxHit group stored as NumPy arrays, one array per column.
+
+    Parameters
+    ----------
+    columns : dict
+        Column name => 1D array. Must have all BOX_HIT_COLUMNS of the same length
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        missing = [name for name in BOX_HIT_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"BoxHitArrays: missing columns {missing}")
+        self.columns = {name: np.asarray(columns[name]) for name in BOX_HIT_COLUMNS}
+        lengths = {len(array) for array in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"BoxHitArrays: columns have different lengths {sorted(lengths)}")
+
+    @classmethod
+    def from_list(cls, hits: List[Dict[str, Any]]) -> "BoxHitArrays":
+        """Creates arrays from the list of hit dictionaries (DEX row form)"""
+        if not hits:
+            return cls({name: np.zeros(0, dtype=np.float64) for name in BOX_HIT_COLUMNS})
+        rows = np.array([hit["pos"] + hit["dim"] + hit["t"] + hit["ed"] for hit in hits], dtype=np.float64)
+        return cls({name: rows[:, i] for i, name in enumerate(BOX_HIT_COLUMNS)})
+
+    def __len__(self):
+        return len(self.columns["x"])
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory taken by the arrays"""
+        return sum(array.nbytes for array in self.columns.values())
+
+    def take(self, indices) -> "BoxHitArrays":
+        """Returns hits selected by integer indices or boolean mask"""
+        return BoxHitArrays({name: array[indices] for name, array in self.columns.items()})
+
+    def _rows(self) -> np.ndarray:
+        """2D array with hit per row and BOX_HIT_COLUMNS as columns"""
+        return np.column_stack([self.columns[name] for name in BOX_HIT_COLUMNS])
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Returns hits as list of dictionaries (DEX row form)"""
+        if not len(self):
+            return []
+        return [{"pos": row[0:3], "dim": row[3:6], "t": row[6:8], "ed": row[8:10]}
+                for row in self._rows().tolist()]
+
+    def to_json(self, separators=(",", ":")) -> str:
+        """Returns JSON text of the hits list. The same as json.dumps(self.to_list(), separators=separators)"""
+        if not len(self):
+            return "[]"
+
+        # json formats all numbers in C, then numbers are placed to the hit template
+        values = json.dumps(self._rows().ravel().tolist(), separators=(",", ":"))[1:-1].split(",")
+        hits_template = separators[0].join([_box_hit_template(separators)] * len(self))
+        return "[" + hits_template % tuple(values) + "]"
+
+    def __eq__(self, other):
+        if not isinstance(other, BoxHitArrays):
+            return NotImplemented
+        return all(np.array_equal(self.columns[name], other.columns[name], equal_nan=True)
+                   for name in BOX_HIT_COLUMNS)
+
+    def __repr__(self):
+        return f"BoxHitArrays(len={len(self)})"
+
+
+# Group keys that may hold array objects
+_ARRAY_KEYS = ("hits",)
+
+
+def materialize_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns group where array objects are replaced by lists (DEX row form). Group is updated in place"""
+    for key in _ARRAY_KEYS:
+        value = group.get(key)
+        if isinstance(value, BoxHitArrays):
+            group[key] = value.to_list()
+    return group
+
+
+def dex_to_json(obj, separators=(", ", ": ")) -> str:
+    """
+    Serializes DEX document, event, list of events or group that may hold BoxHitArrays.
+
+    Array objects are written directly from NumPy arrays without creating python objects per hit.
+    The result is the same as json.dumps of the object with all arrays converted by to_list().
+
+    Parameters
+    ----------
+    obj : dict or list
+        DEX document (has "events"), event (has "groups"), group or list of events
+    separators : tuple
+        Separators as for json.dumps. Default is the same as json.dumps default. Use (",", ":") for compact JSON
+    """
+    placeholder_prefix = f"@@dex-arrays-{uuid.uuid4().hex}-"
+    replacements = []
+
+    def replace_group(group):
+        if not any(isinstance(group.get(key), BoxHitArrays) for key in _ARRAY_KEYS):
+            return group
+        group = dict(group)
+        for key in _ARRAY_KEYS:
+            value = group.get(key)
+            if isinstance(value, BoxHitArrays):
+                group[key] = f"{placeholder_prefix}{len(replacements)}"
+                replacements.append(value)
+        return group
+
+    def replace_event(event):
+        if not isinstance(event, dict) or "groups" not in event:
+            return event
+        event = dict(event)
+        event["groups"] = [replace_group(group) for group in event["groups"]]
+        return event
+
+    if isinstance(obj, list):
+        prepared = [replace_event(event) for event in obj]
+    elif "events" in obj:
+        prepared = dict(obj)
+        prepared["events"] = [replace_event(event) for event in obj["events"]]
+    elif "groups" in obj:
+        prepared = replace_event(obj)
+    else:
+        prepared = replace_group(obj)
+
+    text = json.dumps(prepared, separators=separators)
+    if not replacements:
+        return text
+
+    # Substitute all placeholders in one pass
+    pattern = re.compile('"' + re.escape(placeholder_prefix) + r'(\d+)"')
+    return pattern.sub(lambda match: replacements[int(match.group(1))].to_json(separators), text)
@@ -0,0 +1,227 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Binary DEX container.
+
+The container is a small JSON header followed by raw typed array payloads:
+
+    offset  size  content
+    0       8     magic b"FBDEXBIN"
+    8       4     uint32 little-endian, container version (1)
+    12      4     uint32 little-endian, N - header length in bytes (multiple of 8)
+    16      N     UTF-8 JSON header, padded with spaces
+    16+N    ...   data section: array payloads, each starts at 8 bytes aligned offset
+
+The header is a DEX 0.05 document (or event) with columnar groups (see pyrobird.dex_columnar).
+Columns are references to the data section, offset is counted from the data section start:
+
+    {"dtype": "float32", "offset": 1024, "count": 100}
+
+Payloads are little-endian and have the dtype of the original arrays (float32 hits stay float32,
+python floats are float64), so decoding gives exactly the same values as the dict form.
+In a browser a column is `new Float32Array(buffer, 16 + N + offset, count)`.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+
+from pyrobird.dex_columnar import (FORMAT_COLUMNAR, DEX_COLUMNAR_VERSION, encode_group, decode_dex,
+                                   is_columnar_group)
+from pyrobird.dex_format import DEX_BINARY_MAGIC, is_dex_binary  # noqa: F401
+
+DEX_BINARY_CONTAINER_VERSION = 1
+DEX_BINARY_MIME_TYPE = "application/vnd.firebird.dex+binary"
+
+# Conventional extension of binary DEX files
+DEX_BINARY_EXTENSION = ".firebird.bin"
+
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 8
+
+_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+    "int32": np.dtype("<i4"),
+    "int64": np.dtype("<i8"),
+}
+
+
+def _padding(size):
+    return (-size) % _ALIGNMENT
+
+
+class _DataSectionWriter:
+    """Collects array payloads and gives column references to them"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, values, dtype=None):
+        """Adds values to the data section. dtype hint is ignored: values keep their own type"""
+        array = np.asarray(values)
+        if array.dtype.kind in "iub":
+            dtype_name = "int32" if array.size == 0 or np.abs(array).max() < 2 ** 31 else "int64"
+        elif array.dtype == np.float32:
+            dtype_name = "float32"
+        else:
+            dtype_name = "float64"
+        payload = np.ascontiguousarray(array, dtype=_DTYPES[dtype_name]).tobytes()
+
+        reference = {"dtype": dtype_name, "offset": self.size, "count": int(array.size)}
+        self.chunks.append(payload)
+        self.size += len(payload)
+        padding = _padding(len(payload))
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.size += padding
+        return reference
+
+
+def _pack(header: Dict[str, Any], data_chunks: List[bytes]) -> bytes:
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * _padding(len(header_bytes))
+    preamble = _PREAMBLE.pack(DEX_BINARY_MAGIC, DEX_BINARY_CONTAINER_VERSION, len(header_bytes))
+    return b"".join([preamble, header_bytes] + data_chunks)
+
+
+def _encode_event(event: Dict[str, Any], writer: _DataSectionWriter) -> Dict[str, Any]:
+    groups = [encode_group(group, FORMAT_COLUMNAR, column_writer=writer.add) for group in event.get("groups", [])]
+    return dict(event, groups=groups)
+
+
+def write_dex_binary(obj: Dict[str, Any]) -> bytes:
+    """
+    Serializes DEX document or a single event to the binary container.
+
+    Parameters
+    ----------
+    obj : dict
+        DEX document (has "events") or event (has "groups") in the row form. Hits may be BoxHitArrays
+
+    Returns
+    -------
+    bytes
+        Binary container
+    """
+    writer = _DataSectionWriter()
+    if "events" in obj:
+        header = dict(obj)
+        header["version"] = DEX_COLUMNAR_VERSION
+        header["events"] = [_encode_event(event, writer) for event in obj["events"]]
+    else:
+        header = _encode_event(obj, writer)
+    return _pack(header, writer.chunks)
+
+
+def _split(data):
+    """Returns (header, data section memoryview) of the binary container"""
+    data = memoryview(data)
+    if len(data) < _PREAMBLE.size or not is_dex_binary(data):
+        raise ValueError("Not a binary DEX container")
+    _, version, header_size = _PREAMBLE.unpack(data[:_PREAMBLE.size])
+    if version != DEX_BINARY_CONTAINER_VERSION:
+        raise ValueError(f"Unsupported binary DEX container version {version}")
+    header_end = _PREAMBLE.size + header_size
+    if header_end > len(data):
+        raise ValueError("Binary DEX container is truncated")
+    header = json.loads(bytes(data[_PREAMBLE.size:header_end]).decode("utf-8"))
+    return header, data[header_end:]
+
+
+def _is_reference(column):
+    return isinstance(column, dict) and "offset" in column and "count" in column and "dtype" in column
+
+
+def _group_references(group):
+    """Yields (container, key) of all column references of the columnar group"""
+    for key in ("columns", "points", "params"):
+        columns = group.get(key)
+        if isinstance(columns, dict):
+            for name, column in columns.items():
+                if _is_reference(column):
+                    yield columns, name
+    for key in ("offsets", "hasParams"):
+        if _is_reference(group.get(key)):
+            yield group, key
+
+
+def _header_events(header):
+    return header["events"] if "events" in header else [header]
+
+
+def _columnar_groups(header):
+    for event in _header_events(header):
+        for group in event.get("groups", []):
+            if is_columnar_group(group):
+                yield group
+
+
+def read_dex_binary(data, as_rows=True) -> Dict[str, Any]:
+    """
+    Reads binary DEX container.
+
+    Parameters
+    ----------
+    data : bytes-like
+        Binary container
+    as_rows : bool
+        If True (default), groups are decoded to the row form, the same as DEX 0.04 JSON.
+        If False, groups stay columnar with NumPy arrays as columns (arrays are views of data)
+
+    Returns
+    -------
+    dict
+        DEX document or event, as it was given to write_dex_binary
+    """
+    header, data_section = _split(data)
+    for group in _columnar_groups(header):
+        for container, key in list(_group_references(group)):
+            reference = container[key]
+            dtype = _DTYPES.get(reference["dtype"])
+            if dtype is None:
+                raise ValueError(f"Unsupported binary DEX dtype: {reference['dtype']!r}")
+            start = reference["offset"]
+            stop = start + reference["count"] * dtype.itemsize
+            if stop > len(data_section):
+                raise ValueError("Binary DEX container is truncated")
+            container[key] = np.frombuffer(data_section[start:stop], dtype=dtype)
+
+    if not as_rows:
+        return header
+    if "events" in header:
+        return decode_dex(header)
+    return decode_dex({"events": [header]})["events"][0]
+
+
+def assemble_dex_binary(document_header: Dict[str, Any], event_containers: List[bytes]) -> bytes:
+    """
+    Assembles DEX document container from the header and containers of single events
+    (made by write_dex_binary(event)). Payloads are copied as is, only references are moved.
+
+    Parameters
+    ----------
+    document_header : dict
+        Document fields like "type", "version" and "origin"
+    event_containers : list of bytes
+        Binary containers of events
+    """
+    events = []
+    chunks = []
+    data_size = 0
+    for container in event_containers:
+        event, data_section = _split(container)
+        for group in _columnar_groups(event):
+            for columns, key in _group_references(group):
+                columns[key] = dict(columns[key], offset=columns[key]["offset"] + data_size)
+        events.append(event)
+        chunks.append(data_section)
+        data_size += len(data_section)
+
+    header = dict(document_header)
+    header["events"] = events
+    return _pack(header, chunks)
@@ -0,0 +1,296 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Columnar DEX group encoding (DEX version 0.05).
+
+DEX 0.04 has a dict per BoxHit hit and a nested list per trajectory point.
+The columnar encoding stores one array per column instead. Groups get "encoding": "columnar":
+
+    {
+      "name": "TOFEndcapRecHits", "type": "BoxHit", "origin": {...},
+      "encoding": "columnar",
+      "count": 2,
+      "columns": {"x": [...], "y": [...], "z": [...], "dx": [...], "dy": [...], "dz": [...],
+                  "t": [...], "dt": [...], "ed": [...], "ded": [...]}
+    }
+
+    {
+      "name": "CentralTrackSegments", "type": "PointTrajectory", "origin": [...],
+      "paramColumns": ["theta", ...], "pointColumns": ["x", "y", "z", "t", ...],
+      "encoding": "columnar",
+      "count": 2,                           # number of trajectories
+      "offsets": [0, 5, 12],                # points of trajectory i are offsets[i]..offsets[i+1]
+      "points": {"x": [...], ...},          # one column per pointColumns, points of all trajectories
+      "params": {"theta": [...], ...},      # one column per paramColumns, one value per trajectory with params
+      "hasParams": [1, 0]                   # only if some trajectories have no params
+    }
+
+A column is either a JSON list of numbers or a packed little-endian buffer:
+
+    {"dtype": "float32", "base64": "AACAPw..."}
+
+Packed hits and points are written as float32, trajectory params as float64
+(they have integer like values, e.g. PDG codes, that don't fit float32), offsets as int32.
+
+Groups of other types, or groups that can't be encoded (e.g. points of different length),
+are left in the row form. Decoders process only groups that have "encoding": "columnar".
+"""
+
+import base64
+from typing import Any, Dict, List
+
+import numpy as np
+
+from pyrobird.dex_arrays import BoxHitArrays, BOX_HIT_COLUMNS
+from pyrobird.dex_format import (DEX_COLUMNAR_VERSION, DEX_ROWS_VERSION, FORMAT_ROWS, FORMAT_COLUMNAR,  # noqa: F401
+                                 FORMAT_COLUMNAR_BASE64, DEX_FORMATS, COLUMNAR_ENCODING, is_columnar_group,
+                                 is_columnar_dex)
+
+# Packed dtypes names => little-endian NumPy dtypes
+_PACKED_DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float64": np.dtype("<f8"),
+    "int32": np.dtype("<i4"),
+}
+
+
+def pack_column(values, dtype="float32"):
+    """Packs column values to {"dtype": ..., "base64": ...} little-endian buffer"""
+    array = np.ascontiguousarray(values, dtype=_PACKED_DTYPES[dtype])
+    return {"dtype": dtype, "base64": base64.b64encode(array.tobytes()).decode("ascii")}
+
+
+def unpack_column(column) -> np.ndarray:
+    """Returns column values as NumPy array. Column is a list of numbers, a packed buffer or an array"""
+    if isinstance(column, np.ndarray):
+        return column
+    if isinstance(column, dict):
+        dtype = _PACKED_DTYPES.get(column.get("dtype"))
+        if dtype is None:
+            raise ValueError(f"Unsupported packed column dtype: {column.get('dtype')!r}")
+        return np.frombuffer(base64.b64decode(column["base64"]), dtype=dtype)
+    return np.asarray(column, dtype=np.float64)
+
+
+def _list_column(values, dtype):
+    return np.asarray(values).tolist()
+
+
+def _column_writer(packed, column_writer):
+    """
+    Returns function(values, dtype) => column object.
+    dtype is the type of the packed buffer, writers that keep values as lists ignore it
+    """
+    if column_writer is not None:
+        return column_writer
+    return pack_column if packed else _list_column
+
+
+def encode_box_hit_group(group: Dict[str, Any], packed=False, column_writer=None) -> Dict[str, Any]:
+    """
+    Returns BoxHit group in the columnar encoding. The original group is not changed.
+
+    Parameters
+    ----------
+    group : dict
+        BoxHit group. Hits may be a list of hit dictionaries or BoxHitArrays
+    packed : bool
+        If True, columns are written as base64 float32 buffers
+    column_writer : callable, optional
+        Custom function(values, dtype) => column object. Overrides packed
+    """
+    write_column = _column_writer(packed, column_writer)
+    hits = group.get("hits", [])
+    if not isinstance(hits, BoxHitArrays):
+        hits = BoxHitArrays.from_list(hits)
+
+    result = {key: value for key, value in group.items() if key != "hits"}
+    result["encoding"] = COLUMNAR_ENCODING
+    result["count"] = len(hits)
+    result["columns"] = {name: write_column(hits[name], "float32") for name in BOX_HIT_COLUMNS}
+    return result
+
+
+def decode_box_hit_group(group: Dict[str, Any], as_arrays=False) -> Dict[str, Any]:
+    """
+    Returns columnar BoxHit group in the row form.
+
+    Parameters
+    ----------
+    group : dict
+        BoxHit group in the columnar encoding
+    as_arrays : bool
+        If True, hits are returned as BoxHitArrays instead of list of dictionaries
+    """
+    columns = group["columns"]
+    hits = BoxHitArrays({name: unpack_column(columns[name]) for name in BOX_HIT_COLUMNS})
+    if len(hits) != group.get("count", len(hits)):
+        raise ValueError(f"BoxHit group '{group.get('name')}': count={group['count']} but columns have {len(hits)} values")
+
+    result = {key: value for key, value in group.items() if key not in ("encoding", "count", "columns")}
+    result["hits"] = hits if as_arrays else hits.to_list()
+    return result
+
+
+def encode_trajectory_group(group: Dict[str, Any], packed=False, column_writer=None) -> Dict[str, Any]:
+    """
+    Returns PointTrajectory group in the columnar encoding. The original group is not changed.
+
+    The group is returned as is if its points or params don't match pointColumns and paramColumns.
+
+    Parameters
+    ----------
+    group : dict
+        PointTrajectory group
+    packed : bool
+        If True, points are written as base64 float32 buffers, params as float64 buffers
+    column_writer : callable, optional
+        Custom function(values, dtype) => column object. Overrides packed
+    """
+    write_column = _column_writer(packed, column_writer)
+    point_columns = group.get("pointColumns", [])
+    param_columns = group.get("paramColumns", [])
+    trajectories = group.get("trajectories", [])
+
+    offsets = [0]
+    points = []
+    params = []
+    has_params = []
+    for trajectory in trajectories:
+        trajectory_points = trajectory.get("points", [])
+        trajectory_params = trajectory.get("params", [])
+        if any(len(point) != len(point_columns) for point in trajectory_points):
+            return group
+        if trajectory_params and len(trajectory_params) != len(param_columns):
+            return group
+        points.extend(trajectory_points)
+        offsets.append(len(points))
+        if trajectory_params:
+            params.append(trajectory_params)
+        has_params.append(1 if trajectory_params else 0)
+
+    points = np.array(points, dtype=np.float64).reshape(len(points), len(point_columns))
+    params = np.array(params, dtype=np.float64).reshape(len(params), len(param_columns))
+
+    result = {key: value for key, value in group.items() if key != "trajectories"}
+    result["encoding"] = COLUMNAR_ENCODING
+    result["count"] = len(trajectories)
+    result["offsets"] = write_column(np.array(offsets, dtype=np.int32), "int32")
+    result["points"] = {name: write_column(points[:, i], "float32") for i, name in enumerate(point_columns)}
+    result["params"] = {name: write_column(params[:, i], "float64") for i, name in enumerate(param_columns)}
+    if not all(has_params):
+        result["hasParams"] = has_params
+    return result
+
+
+def decode_trajectory_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns columnar PointTrajectory group in the row form"""
+    point_columns = group.get("pointColumns", [])
+    param_columns = group.get("paramColumns", [])
+    count = group["count"]
+
+    offsets = unpack_column(group["offsets"]).astype(np.int64)
+    if len(offsets) != count + 1:
+        raise ValueError(f"PointTrajectory group '{group.get('name')}': count={count} but {len(offsets)} offsets")
+
+    points_columns = group.get("points", {})
+    num_points = int(offsets[-1]) if count else 0
+    points = np.zeros((num_points, len(point_columns)))
+    for i, name in enumerate(point_columns):
+        points[:, i] = unpack_column(points_columns[name])
+    points = points.tolist()
+
+    params_columns = group.get("params", {})
+    has_params = group.get("hasParams", [1] * count)
+    num_params = int(sum(has_params))
+    params = np.zeros((num_params, len(param_columns)))
+    for i, name in enumerate(param_columns):
+        params[:, i] = unpack_column(params_columns[name])
+    params = params.tolist()
+
+    trajectories = []
+    param_index = 0
+    for i in range(count):
+        trajectory_params = []
+        if has_params[i]:
+            trajectory_params = params[param_index]
+            param_index += 1
+        trajectories.append({
+            "points": points[offsets[i]:offsets[i + 1]],
+            "params": trajectory_params,
+        })
+
+    excluded = ("encoding", "count", "offsets", "points", "params", "hasParams")
+    result = {key: value for key, value in group.items() if key not in excluded}
+    result["trajectories"] = trajectories
+    return result
+
+
+# Group type => (encoder, decoder)
+_GROUP_CODECS = {
+    "BoxHit": (encode_box_hit_group, decode_box_hit_group),
+    "PointTrajectory": (encode_trajectory_group, decode_trajectory_group),
+}
+
+
+def encode_group(group: Dict[str, Any], dex_format=FORMAT_COLUMNAR, column_writer=None) -> Dict[str, Any]:
+    """
+    Returns group in the given format. Groups of types without columnar encoding are returned as is.
+    column_writer is a custom function(values, dtype) => column object (see encode_box_hit_group)
+    """
+    codec = _GROUP_CODECS.get(group.get("type"))
+    if dex_format == FORMAT_ROWS or codec is None or is_columnar_group(group):
+        return group
+    return codec[0](group, packed=(dex_format == FORMAT_COLUMNAR_BASE64), column_writer=column_writer)
+
+
+def decode_group(group: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns group in the row form"""
+    codec = _GROUP_CODECS.get(group.get("type"))
+    if codec is None or not is_columnar_group(group):
+        return group
+    return codec[1](group)
+
+
+def encode_events(events: List[Dict[str, Any]], dex_format=FORMAT_COLUMNAR) -> List[Dict[str, Any]]:
+    """Returns events with groups in the given format"""
+    return [dict(event, groups=[encode_group(group, dex_format) for group in event.get("groups", [])])
+            for event in events]
+
+
+def decode_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Returns events with all groups in the row form"""
+    return [dict(event, groups=[decode_group(group) for group in event.get("groups", [])])
+            for event in events]
+
+
+def encode_dex(dex: Dict[str, Any], dex_format=FORMAT_COLUMNAR) -> Dict[str, Any]:
+    """
+    Returns DEX document with groups in the given format and the matching version.
+
+    Parameters
+    ----------
+    dex : dict
+        DEX document in the row form
+    dex_format : str
+        One of DEX_FORMATS
+    """
+    if dex_format not in DEX_FORMATS:
+        raise ValueError(f"Unknown DEX format '{dex_format}'. Supported formats: {', '.join(DEX_FORMATS)}")
+    if dex_format == FORMAT_ROWS:
+        return dex
+    result = dict(dex)
+    result["version"] = DEX_COLUMNAR_VERSION
+    result["events"] = encode_events(dex.get("events", []), dex_format)
+    return result
+
+
+def decode_dex(dex: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns DEX document with all groups in the row form. Columnar documents get version 0.04"""
+    if not is_columnar_dex(dex):
+        return dex
+    result = dict(dex)
+    result["version"] = DEX_ROWS_VERSION
+    result["events"] = decode_events(dex["events"])
+    return result
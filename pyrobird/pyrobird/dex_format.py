@@ -0,0 +1,48 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+DEX format names and checks that don't need NumPy.
+
+Light CLI commands (e.g. merge of row form files) use them without importing the encoders
+(pyrobird.dex_columnar, pyrobird.dex_binary), which are imported only when a file needs them.
+"""
+
+from typing import Any, Dict
+
+# DEX version of documents with columnar groups
+DEX_COLUMNAR_VERSION = "0.05"
+
+# DEX version of documents in the row form
+DEX_ROWS_VERSION = "0.04"
+
+FORMAT_ROWS = "rows"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_COLUMNAR_BASE64 = "columnar-base64"
+
+# Supported group encodings. "rows" is the DEX 0.04 form
+DEX_FORMATS = (FORMAT_ROWS, FORMAT_COLUMNAR, FORMAT_COLUMNAR_BASE64)
+
+COLUMNAR_ENCODING = "columnar"
+
+DEX_BINARY_MAGIC = b"FBDEXBIN"
+
+
+def is_columnar_group(group: Dict[str, Any]) -> bool:
+    """True if group is in the columnar encoding"""
+    return group.get("encoding") == COLUMNAR_ENCODING
+
+
+def is_columnar_dex(dex: Dict[str, Any]) -> bool:
+    """True if DEX document has columnar groups or the columnar DEX version"""
+    events = dex.get("events")
+    if not isinstance(events, list):
+        return False
+    has_columnar = any(is_columnar_group(group) for event in events if isinstance(event, dict)
+                       for group in event.get("groups", []) if isinstance(group, dict))
+    return has_columnar or dex.get("version") == DEX_COLUMNAR_VERSION
+
+
+def is_dex_binary(data) -> bool:
+    """True if data starts with the binary DEX magic"""
+    return bytes(data[:len(DEX_BINARY_MAGIC)]) == DEX_BINARY_MAGIC
@@ -0,0 +1,202 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Level of detail (LOD) decimation of BoxHit groups.
+
+Events with background merged may have far more hits than a browser can render interactively.
+LOD reduces BoxHit groups of an event on the NumPy arrays (see pyrobird.dex_arrays), before serialization:
+
+- "voxel": hits are aggregated on a spatial grid. Each voxel with hits becomes one hit at the energy
+  weighted centroid with the voxel size as dimensions, summed energy, the earliest time and
+  the time spread of its hits as time error.
+- "sample": stratified sampling. Groups (detectors) share the event hit budget: groups smaller
+  than their share keep all hits, the rest is split between the larger groups equally.
+  Hits are sampled uniformly and reproducibly (the same hits for the same group).
+
+Decimated groups get origin "lod" with the parameters, e.g.
+    {"method": "voxel", "voxelSize": 10.0, "totalHits": 2000, "keptHits": 340}
+Hits of decimated groups no longer match podio objects, so their links and links to them are removed.
+"""
+
+import zlib
+
+import numpy as np
+
+from pyrobird.dex_arrays import BoxHitArrays
+
+LOD_VOXEL = "voxel"
+LOD_SAMPLE = "sample"
+
+# Supported LOD methods
+LOD_METHODS = (LOD_VOXEL, LOD_SAMPLE)
+
+# Voxel indexes are packed to one int64 with this number of bits per axis
+_VOXEL_BITS = 21
+_VOXEL_OFFSET = 1 << (_VOXEL_BITS - 1)
+
+
+def voxel_aggregate(hits: BoxHitArrays, voxel_size: float) -> BoxHitArrays:
+    """
+    Returns one hit per voxel of the grid with voxel_size [mm] step.
+
+    Hit position is the energy weighted centroid of the voxel hits (the mean position if they have no energy),
+    dimensions are voxel_size, energy and its error are the sum and the quadratic sum,
+    time is the earliest time and time error is the time spread of the hits.
+    Voxels are in the order of their first hit.
+    """
+    if voxel_size <= 0:
+        raise ValueError(f"Voxel size must be positive, got {voxel_size}")
+    if not len(hits):
+        return hits
+
+    # Voxel index along each axis, packed to one key
+    keys = np.zeros(len(hits), dtype=np.int64)
+    for axis in ("x", "y", "z"):
+        index = np.floor(np.asarray(hits[axis], dtype=np.float64) / voxel_size).astype(np.int64)
+        index = np.clip(index + _VOXEL_OFFSET, 0, (1 << _VOXEL_BITS) - 1)
+        keys = (keys << _VOXEL_BITS) | index
+
+    # Hits of each voxel go together, voxels are ordered by their first hit
+    _, first_hits, voxel_of_hit = np.unique(keys, return_index=True, return_inverse=True)
+    voxel_order = np.argsort(first_hits, kind="stable")
+    voxel_rank = np.empty_like(voxel_order)
+    voxel_rank[voxel_order] = np.arange(len(voxel_order))
+    voxel_of_hit = voxel_rank[voxel_of_hit.reshape(-1)]
+    order = np.argsort(voxel_of_hit, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(voxel_of_hit[order]) != 0])
+    counts = np.diff(np.r_[starts, len(order)])
+
+    def column(name):
+        return np.asarray(hits[name], dtype=np.float64)[order]
+
+    energy = column("ed")
+    energy_sum = np.add.reduceat(energy, starts)
+    weights = np.where(np.repeat(energy_sum > 0, counts), energy, 1.0)
+    weight_sum = np.add.reduceat(weights, starts)
+
+    time = column("t")
+    earliest = np.minimum.reduceat(time, starts)
+    latest = np.maximum.reduceat(time, starts)
+    size = np.full(len(starts), float(voxel_size))
+
+    return BoxHitArrays({
+        "x":   np.add.reduceat(column("x") * weights, starts) / weight_sum,
+        "y":   np.add.reduceat(column("y") * weights, starts) / weight_sum,
+        "z":   np.add.reduceat(column("z") * weights, starts) / weight_sum,
+        "dx":  size,
+        "dy":  size,
+        "dz":  size,
+        "t":   earliest,
+        "dt":  latest - earliest,
+        "ed":  energy_sum,
+        "ded": np.sqrt(np.add.reduceat(column("ded") ** 2, starts)),
+    })
+
+
+def stratified_budgets(sizes, max_hits):
+    """
+    Splits max_hits between groups of the given sizes.
+
+    Groups smaller than the equal share keep all hits, the rest of the budget is split
+    between the larger groups equally.
+
+    Examples
+    --------
+    >>> stratified_budgets([10, 500, 1000], 310)
+    [10, 150, 150]
+    """
+    budgets = list(sizes)
+    remaining = max_hits
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for position, group_index in enumerate(order):
+        share = remaining // (len(order) - position)
+        budgets[group_index] = min(sizes[group_index], share)
+        remaining -= budgets[group_index]
+    return budgets
+
+
+def sample_hits(hits: BoxHitArrays, count: int, seed: int = 0) -> np.ndarray:
+    """Returns sorted indexes of count hits sampled uniformly without replacement"""
+    if count >= len(hits):
+        return np.arange(len(hits))
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(len(hits), size=count, replace=False))
+
+
+def _group_seed(group):
+    """The same group is always sampled the same way, so cached and fresh conversions match"""
+    return zlib.crc32(str(group.get("name", "")).encode("utf-8"))
+
+
+def _as_arrays(hits):
+    return hits if isinstance(hits, BoxHitArrays) else BoxHitArrays.from_list(hits)
+
+
+def _link_targets(link):
+    if "collections" in link:
+        return link["collections"]
+    return [link.get("collection")]
+
+
+def apply_lod(groups, method, voxel_size=None, max_hits=None):
+    """
+    Decimates BoxHit groups of an event. Groups are changed in place, their hits become BoxHitArrays.
+
+    Parameters
+    ----------
+    groups : list of dict
+        Groups of one event. BoxHit hits may be lists of hit dictionaries or BoxHitArrays
+    method : str
+        One of LOD_METHODS
+    voxel_size : float, optional
+        Voxel size [mm] for LOD_VOXEL
+    max_hits : int, optional
+        Hit budget of the event for LOD_SAMPLE
+
+    Returns
+    -------
+    list of dict
+        The groups
+    """
+    if method not in LOD_METHODS:
+        raise ValueError(f"Unknown LOD method '{method}'. Supported methods: {', '.join(LOD_METHODS)}")
+    if method == LOD_VOXEL and (voxel_size is None or voxel_size <= 0):
+        raise ValueError("LOD voxel method needs positive voxel size")
+    if method == LOD_SAMPLE and (max_hits is None or max_hits < 0):
+        raise ValueError("LOD sample method needs not negative hit budget")
+
+    box_groups = [group for group in groups if group.get("type") == "BoxHit" and "hits" in group]
+    hits = [_as_arrays(group["hits"]) for group in box_groups]
+
+    if method == LOD_VOXEL:
+        decimated = [voxel_aggregate(group_hits, voxel_size) for group_hits in hits]
+        parameters = {"method": LOD_VOXEL, "voxelSize": float(voxel_size)}
+    else:
+        budgets = stratified_budgets([len(group_hits) for group_hits in hits], max_hits)
+        decimated = [group_hits.take(sample_hits(group_hits, budget, _group_seed(group)))
+                     for group, group_hits, budget in zip(box_groups, hits, budgets)]
+        parameters = {"method": LOD_SAMPLE, "maxHits": int(max_hits)}
+
+    decimated_names = set()
+    for group, original, result in zip(box_groups, hits, decimated):
+        group["hits"] = result
+        if len(result) == len(original) and method == LOD_SAMPLE:
+            continue
+        origin = group.get("origin")
+        if isinstance(origin, dict):
+            group["origin"] = dict(origin, lod=dict(parameters, totalHits=len(original), keptHits=len(result)))
+        group.pop("links", None)
+        decimated_names.add(group.get("name"))
+        if isinstance(origin, dict) and origin.get("name"):
+            decimated_names.add(origin["name"])
+
+    # Links to decimated groups point to hits that are no longer there
+    for group in groups:
+        links = group.get("links")
+        if links:
+            for name in [name for name, link in links.items() if set(_link_targets(link)) & decimated_names]:
+                del links[name]
+            if not links:
+                del group["links"]
+    return groups
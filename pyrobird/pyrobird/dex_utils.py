@@ -8,10 +8,12 @@ import json
 from typing import Dict, Any
 import click
 
+from pyrobird.dex_format import is_columnar_dex, is_dex_binary
+
 
 def load_dex_file(file_path: str) -> Dict[str, Any]:
     """
-    Load and validate a Firebird DEX JSON file.
+    Load and validate a Firebird DEX JSON or binary DEX file.
 
     Parameters
     ----------
@@ -21,7 +23,7 @@ def load_dex_file(file_path: str) -> Dict[str, Any]:
     Returns
     -------
     dict
-        The loaded DEX data
+        The loaded DEX data. Columnar groups (DEX 0.05) and binary files are decoded to the row form
 
     Raises
     ------
@@ -29,8 +31,13 @@ def load_dex_file(file_path: str) -> Dict[str, Any]:
         If file cannot be loaded or is invalid
     """
     try:
-        with open(file_path, 'r') as f:
-            dex_data = json.load(f)
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        if is_dex_binary(data):
+            from pyrobird.dex_binary import read_dex_binary
+            dex_data = read_dex_binary(data)
+        else:
+            dex_data = json.loads(data)
     except FileNotFoundError:
         raise click.FileError(file_path, "File not found")
     except json.JSONDecodeError:
@@ -42,6 +49,14 @@ def load_dex_file(file_path: str) -> Dict[str, Any]:
     if not is_valid_dex_file(dex_data):
         raise click.FileError(file_path, "Not a valid Firebird DEX file")
 
+    # Columnar groups are decoded with NumPy, it is imported only for such files
+    if is_columnar_dex(dex_data):
+        from pyrobird.dex_columnar import decode_dex
+        try:
+            dex_data = decode_dex(dex_data)
+        except (KeyError, ValueError, TypeError) as e:
+            raise click.FileError(file_path, f"Invalid columnar group: {e}")
+
     return dex_data
 
 
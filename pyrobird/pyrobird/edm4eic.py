@@ -1,10 +1,20 @@
-import uproot
-from rich.pretty import pprint
 import awkward as ak
 import numpy as np
 import json
+import logging
 import math
 
+from pyrobird.__version__ import __version__
+from pyrobird.podio import get_events_schema
+from pyrobird.podio_relations import (NO_LINK, ObjectRefs, RelationResolver, association_branches, key_indexes,
+                                      multi_relation_branches, relation_branches)
+from pyrobird.dex_arrays import BoxHitArrays, materialize_group
+from pyrobird.dex_lod import apply_lod
+from pyrobird.dex_columnar import FORMAT_ROWS, DEX_COLUMNAR_VERSION, encode_group
+from pyrobird.timing import timed, timed_collection
+
+logger = logging.getLogger(__name__)
+
 """
 We have types: 
     vector<edm4hep::SimTrackerHitData> - dd4hep simulation data     
@@ -62,6 +72,21 @@ We have types:
 """
 
 
+# Version of DEX format produced by the converters
+DEX_VERSION = "0.04"
+
+# Revision of the converters output. Increase it with every change of the converted events,
+# so result caches (in memory, on disk, shared by workers) don't serve events of older converters:
+#   1 - vectorized track segments
+#   2 - calorimeter hits and clusters, origin.selection of calorimeter cuts
+#   3 - MC particles, links resolved from podio relations
+#   4 - LOD decimation, origin.lod
+CONVERTER_REVISION = 4
+
+# Identifies the converters output. Cached conversion results depend on it
+CONVERTER_VERSION = f"{__version__}/dex-{DEX_VERSION}/r{CONVERTER_REVISION}"
+
+
 def parse_entry_numbers(value):
     """
     Parses an input string representing entry numbers and returns a list of integers.
@@ -116,67 +141,357 @@ def parse_entry_numbers(value):
         raise ValueError(f"Invalid entry format: '{value}'. Expected integers or ranges like '1-5'.")
 
 
-def tracker_hits_to_box_hits(tree, branch_name, entry_start, entry_stop=None):
-    """Converts vector<edm4eic::TrackerHitData> to BoxHit format dictionary"""
+# Fields of vector<edm4eic::TrackerHitData> that are used to build BoxHit-s
+TRACKER_HIT_FIELDS = [
+    "position.x",
+    "position.y",
+    "position.z",
+    "positionError.xx",
+    "positionError.yy",
+    "positionError.zz",
+    "time",
+    "timeError",
+    "edep",
+    "edepError",
+]
+
+
+class EntryRangeArrays:
+    """
+    Data of several branches read for the entry range [entry_start, entry_stop) in a single pass.
+
+    All branches are read with one ``tree.arrays(...)`` call, so baskets are decompressed
+    once per range instead of once per branch and per entry. The jagged arrays are kept
+    as flat NumPy arrays plus per-entry offsets, so slicing out an entry is just a view.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branches : list of str
+        Full branch paths like 'TOFEndcapRecHits/TOFEndcapRecHits.position.x'
+    entry_start : int
+        First entry to read
+    entry_stop : int
+        Entry after the last one to read
+    """
+
+    def __init__(self, tree, branches, entry_start, entry_stop):
+        self.entry_start = entry_start
+        self.entry_stop = entry_stop
+        self._flat = {}
+        self._offsets = {}
+        self.read(tree, branches)
+
+    def read(self, tree, branches):
+        """Reads more branches for the same entry range in a single pass. Already read branches are skipped"""
+        # Keep the order but remove duplicates
+        branches = [branch for branch in dict.fromkeys(branches) if branch not in self._flat]
+        if not branches:
+            return
+
+        arrays = tree.arrays(branches, entry_start=self.entry_start, entry_stop=self.entry_stop, how=dict)
+        for branch, array in arrays.items():
+            counts = ak.num(array, axis=1).to_numpy()
+            offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+            self._offsets[branch] = offsets
+            self._flat[branch] = ak.flatten(array, axis=1).to_numpy()
+
+    def __contains__(self, branch):
+        return branch in self._flat
+
+    def get(self, branch, entry_start, entry_stop=None):
+        """Returns flat NumPy array of branch values for entries [entry_start, entry_stop)"""
+        if entry_stop is None:
+            entry_stop = entry_start + 1
+        if entry_start < self.entry_start or entry_stop > self.entry_stop:
+            raise IndexError(f"Entries [{entry_start}, {entry_stop}) are outside of the read range "
+                             f"[{self.entry_start}, {self.entry_stop})")
+        offsets = self._offsets[branch]
+        begin = offsets[entry_start - self.entry_start]
+        end = offsets[entry_stop - self.entry_start]
+        return self._flat[branch][begin:end]
+
+    def offsets(self, branch, entry_start, entry_stop=None):
+        """
+        Returns offsets of entries [entry_start, entry_stop) in the array returned by get():
+        values of entry_start + i are values[offsets[i]:offsets[i + 1]]
+        """
+        if entry_stop is None:
+            entry_stop = entry_start + 1
+        if entry_start < self.entry_start or entry_stop > self.entry_stop:
+            raise IndexError(f"Entries [{entry_start}, {entry_stop}) are outside of the read range "
+                             f"[{self.entry_start}, {self.entry_stop})")
+        offsets = self._offsets[branch][entry_start - self.entry_start:entry_stop - self.entry_start + 1]
+        return offsets - offsets[0]
+
+
+def split_entry_ranges(entry_ids):
+    """
+    Splits entry indexes into ranges of consecutive entries.
+
+    Parameters
+    ----------
+    entry_ids : iterable of int
+        Entry indexes, in any order and possibly with duplicates
+
+    Returns
+    -------
+    list of tuple
+        Sorted list of (entry_start, entry_stop) ranges that cover all unique entries
+
+    Examples
+    --------
+    >>> split_entry_ranges([5, 0, 1, 2, 1])
+    [(0, 3), (5, 6)]
+    """
+    ranges = []
+    for entry_id in sorted(set(entry_ids)):
+        if ranges and ranges[-1][1] == entry_id:
+            ranges[-1] = (ranges[-1][0], entry_id + 1)
+        else:
+            ranges.append((entry_id, entry_id + 1))
+    return ranges
+
+
+def tracker_hits_branches(branch_name):
+    """Returns the list of branches needed to convert vector<edm4eic::TrackerHitData> collection"""
+    return [f'{branch_name}/{branch_name}.{field}' for field in TRACKER_HIT_FIELDS]
+
+
+def tracker_hits_to_box_hits(tree, branch_name, entry_start, entry_stop=None, arrays=None, as_arrays=False,
+                             resolver=None, with_particles=False):
+    """
+    Converts vector<edm4eic::TrackerHitData> to BoxHit format dictionary
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branch_name : str
+        Name of the TrackerHitData collection
+    entry_start : int
+        First entry to convert
+    entry_stop : int, optional
+        Entry after the last one to convert. Only entry_start is converted if not given
+    arrays : EntryRangeArrays, optional
+        Already read data covering the entries. If not given, the branches are read from the tree
+    as_arrays : bool
+        If True, group "hits" is BoxHitArrays that keeps NumPy arrays. Otherwise, it is list of hit dictionaries
+    resolver : pyrobird.podio_relations.RelationResolver, optional
+        Relations of the entry range. Takes precedence over arrays
+    with_particles : bool
+        Group gets "links": {"particles": ...} with MCParticle of each hit (see tracker_hit_particles)
+    """
 
     # Read only 1 event if entry_stop is not given
     if entry_stop is None:
         entry_stop = entry_start + 1
 
-    def get_field_array(field_branch):
-        """Gets array of values of a field branch"""
-        return ak.flatten(tree[field_branch].array(entry_start=entry_start, entry_stop=entry_stop)).tolist()
-
-    # fields is a dict where:
-    #  - keys are exact branch names of data field in root files
-    #  - values are python types
-
-    cell_id  = get_field_array(f'{branch_name}/{branch_name}.cellID')              # 'uint64_t[]',
-    pos_x    = get_field_array(f'{branch_name}/{branch_name}.position.x')          # 'float[]',
-    pos_y    = get_field_array(f'{branch_name}/{branch_name}.position.y')          # 'float[]',
-    pos_z    = get_field_array(f'{branch_name}/{branch_name}.position.z')          # 'float[]',
-    err_x    = get_field_array(f'{branch_name}/{branch_name}.positionError.xx')    # 'float[]',
-    err_y    = get_field_array(f'{branch_name}/{branch_name}.positionError.yy')    # 'float[]',
-    err_z    = get_field_array(f'{branch_name}/{branch_name}.positionError.zz')    # 'float[]',
-    time     = get_field_array(f'{branch_name}/{branch_name}.time')                # 'float[]',
-    err_time = get_field_array(f'{branch_name}/{branch_name}.timeError')           # 'float[]',
-    edep     = get_field_array(f'{branch_name}/{branch_name}.edep')                # 'float[]',
-    err_edep = get_field_array(f'{branch_name}/{branch_name}.edepError')           # 'float[]',
-
-    hits = []
-    for i in range(len(cell_id)):
-        hit = {
-            "pos": [pos_x[i], pos_y[i], pos_z[i]],
-            "dim": [2 * err_x[i], 2 * err_y[i], 2 * err_z[i]],
-            "t": [time[i], err_time[i]],
-            "ed": [edep[i], err_edep[i]]
-        }
-
-        hits.append(hit)
-        #hits.append([pos_x[i], pos_y[i], pos_z[i], 2 * err_x[i], 2 * err_y[i], 2 * err_z[i], time[i], err_time[i], edep[i], err_edep[i]])
+    if resolver is not None:
+        arrays = resolver.arrays
+        arrays.read(tree, tracker_hits_branches(branch_name))
+    elif arrays is None:
+        arrays = EntryRangeArrays(tree, tracker_hits_branches(branch_name), entry_start, entry_stop)
+
+    def get_field_array(field):
+        """Gets values of a field branch as NumPy array"""
+        return arrays.get(f'{branch_name}/{branch_name}.{field}', entry_start, entry_stop)
+
+    # Errors are sigmas, while box dimensions are full widths: x2.0
+    hits = BoxHitArrays({
+        "x":   get_field_array('position.x'),                 # 'float[]',
+        "y":   get_field_array('position.y'),                 # 'float[]',
+        "z":   get_field_array('position.z'),                 # 'float[]',
+        "dx":  2 * get_field_array('positionError.xx'),       # 'float[]',
+        "dy":  2 * get_field_array('positionError.yy'),       # 'float[]',
+        "dz":  2 * get_field_array('positionError.zz'),       # 'float[]',
+        "t":   get_field_array('time'),                       # 'float[]',
+        "dt":  get_field_array('timeError'),                  # 'float[]',
+        "ed":  get_field_array('edep'),                       # 'float[]',
+        "ded": get_field_array('edepError'),                  # 'float[]',
+    })
 
     group = {
         "name": branch_name,
         "type": "BoxHit",
         "origin": {"type": "edm4eic::TrackerHitData", "name": branch_name},
-        "hits": hits,
+        "hits": hits if as_arrays else hits.to_list(),
     }
+    if with_particles and "rawHit" in get_events_schema(tree)[branch_name].relations:
+        if resolver is None:
+            resolver = RelationResolver(tree, arrays)
+        particles = tracker_hit_particles(resolver, branch_name)
+        group["links"] = {"particles": link_dict(particles, entry_start, entry_stop)}
     return group
 
-def track_segments_to_line_trajectories(tree, branch_name, entry_start, entry_stop=None):
+# Fields of calorimeter hit types that are used to build BoxHit-s.
+# edm4hep::SimCalorimeterHitData has no cell dimensions and time (time is in its contributions)
+CALORIMETER_HIT_FIELDS = {
+    "edm4eic::CalorimeterHitData": ["position.x", "position.y", "position.z",
+                                    "dimension.x", "dimension.y", "dimension.z",
+                                    "time", "timeError", "energy", "energyError"],
+    "edm4hep::SimCalorimeterHitData": ["position.x", "position.y", "position.z", "energy"],
+}
+
+# Conversion options (see edm4eic_entries_to_dicts)
+OPTION_CALO_MIN_ENERGY = "calo_min_energy"
+OPTION_CALO_MAX_HITS = "calo_max_hits"
+OPTION_LOD = "lod"
+OPTION_LOD_VOXEL_SIZE = "lod_voxel_size"
+OPTION_LOD_MAX_HITS = "lod_max_hits"
+
+
+def calorimeter_hits_branches(branch_name, type_name):
+    """Returns the list of branches needed to convert calorimeter hits collection of type_name"""
+    return [f'{branch_name}/{branch_name}.{field}' for field in CALORIMETER_HIT_FIELDS[type_name]]
+
+
+def select_by_energy(energy, min_energy=0.0, max_hits=None):
     """
-    Converts vector<edm4eic::TrackSegmentData> + the associated TrackPoints
-    into a Firebird 'TrackerLinePointTrajectory' component.
+    Returns indexes of hits to keep, in the original order.
 
-    Each segment => one 'line' with an array of points from points_begin..points_end.
+    Parameters
+    ----------
+    energy : numpy.ndarray
+        Energy of the hits
+    min_energy : float
+        Hits with lower energy are dropped
+    max_hits : int, optional
+        Only this number of hits with the highest energy are kept. All hits if None or 0
 
-    The code also optionally attempts to link to the main 'CentralCKFTracks' to find
-    momentum, charge, etc. This logic can be adapted or extended as needed.
+    Returns
+    -------
+    numpy.ndarray or None
+        Indexes of hits or None if all hits are kept
+    """
+    selected = None
+    if min_energy:
+        selected = np.flatnonzero(energy >= min_energy)
+    if max_hits:
+        count = len(energy) if selected is None else len(selected)
+        if count > max_hits:
+            candidates = np.arange(len(energy)) if selected is None else selected
+            # argpartition finds top N without sorting all hits
+            top = np.argpartition(energy[candidates], count - max_hits)[count - max_hits:]
+            selected = np.sort(candidates[top])
+    if selected is not None and len(selected) == len(energy):
+        return None
+    return selected
+
+
+def calorimeter_hits_to_box_hits(tree, branch_name, entry_start, entry_stop=None, arrays=None, as_arrays=False,
+                                 min_energy=0.0, max_hits=None):
+    """
+    Converts vector<edm4eic::CalorimeterHitData> or vector<edm4hep::SimCalorimeterHitData> to BoxHit format dictionary
+
+    Hits are selected by energy on the arrays, before hit dictionaries are made.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branch_name : str
+        Name of the calorimeter hits collection
+    entry_start : int
+        First entry to convert
+    entry_stop : int, optional
+        Entry after the last one to convert. Only entry_start is converted if not given
+    arrays : EntryRangeArrays, optional
+        Already read data covering the entries. If not given, the branches are read from the tree
+    as_arrays : bool
+        If True, group "hits" is BoxHitArrays that keeps NumPy arrays. Otherwise, it is list of hit dictionaries
+    min_energy : float
+        Hits with lower energy are dropped
+    max_hits : int, optional
+        Only this number of hits with the highest energy are kept
     """
     if entry_stop is None:
         entry_stop = entry_start + 1
 
-    result = {
+    type_name = get_events_schema(tree)[branch_name].type_name
+    if arrays is None:
+        arrays = EntryRangeArrays(tree, calorimeter_hits_branches(branch_name, type_name), entry_start, entry_stop)
+
+    def get_field_array(field):
+        """Gets values of a field branch as NumPy array"""
+        return arrays.get(f'{branch_name}/{branch_name}.{field}', entry_start, entry_stop)
+
+    energy = get_field_array('energy')
+    zeros = np.zeros(len(energy), dtype=np.float32)
+    has_cells = "dimension.x" in CALORIMETER_HIT_FIELDS[type_name]
+
+    # Dimensions are full cell sizes
+    hits = BoxHitArrays({
+        "x":   get_field_array('position.x'),
+        "y":   get_field_array('position.y'),
+        "z":   get_field_array('position.z'),
+        "dx":  get_field_array('dimension.x') if has_cells else zeros,
+        "dy":  get_field_array('dimension.y') if has_cells else zeros,
+        "dz":  get_field_array('dimension.z') if has_cells else zeros,
+        "t":   get_field_array('time') if has_cells else zeros,
+        "dt":  get_field_array('timeError') if has_cells else zeros,
+        "ed":  energy,
+        "ded": get_field_array('energyError') if has_cells else zeros,
+    })
+
+    origin = {"type": type_name, "name": branch_name}
+    if min_energy or max_hits:
+        origin["selection"] = {"minEnergy": min_energy, "maxHits": max_hits or 0, "totalHits": len(hits)}
+        selected = select_by_energy(energy, min_energy, max_hits)
+        if selected is not None:
+            hits = hits.take(selected)
+
+    group = {
+        "name": branch_name,
+        "type": "BoxHit",
+        "origin": origin,
+        "hits": hits if as_arrays else hits.to_list(),
+    }
+    return group
+
+
+# Fields of vector<edm4eic::TrackPoint> that are used to build trajectory points
+TRACK_POINT_FIELDS = [
+    "position.x",
+    "position.y",
+    "position.z",
+    "time",
+    "positionError.xx",
+    "positionError.yy",
+    "positionError.zz",
+    "timeError",
+]
+
+# TODO selecting Tracks by the track relation will not work because of https://github.com/eic/EICrecon/issues/1730
+# Parameters are taken from this collection by the segment index
+TRACK_PARAMETERS_BRANCH = "CentralCKFTrackParameters"
+
+# Fields of TRACK_PARAMETERS_BRANCH and the corresponding paramColumns
+TRACK_PARAMETERS_FIELDS = ["theta", "phi", "qOverP", "loc.a", "loc.b", "time"]
+TRACK_PARAM_COLUMNS = ["theta", "phi", "q_over_p", "loc_a", "loc_b", "time"]
+
+
+def track_segments_branches(tree, branch_name):
+    """
+    Returns the list of branches needed to convert vector<edm4eic::TrackSegmentData> collection.
+    Empty list if the collection has no points
+    """
+    schema = get_events_schema(tree)
+    if branch_name not in schema or "points" not in schema[branch_name].vector_members:
+        return []
+    points = schema[branch_name].vector_members["points"][0]     # e.g. _CentralTrackSegments_points
+    branches = [f'{branch_name}/{branch_name}.points_begin', f'{branch_name}/{branch_name}.points_end']
+    branches.extend(f'{points}/{points}.{field}' for field in TRACK_POINT_FIELDS)
+    if TRACK_PARAMETERS_BRANCH in schema:
+        branches.extend(f'{TRACK_PARAMETERS_BRANCH}/{TRACK_PARAMETERS_BRANCH}.{field}'
+                        for field in TRACK_PARAMETERS_FIELDS)
+    return branches
+
+
+def _empty_trajectory_group(branch_name):
+    return {
         "name": branch_name,
         "type": "PointTrajectory",
         "origin": ["edm4eic::TrackPoint", "edm4eic::TrackSegmentData"],
@@ -184,167 +499,733 @@ def track_segments_to_line_trajectories(tree, branch_name, entry_start, entry_st
         "pointColumns": ["x", "y", "z", "t", "dx", "dy", "dz", "dt"],
         "trajectories": []
     }
-    # -- Grab the arrays for the main TrackSegmentData
-    seg_points_begin_index   = ak.flatten(tree[f'{branch_name}/{branch_name}.points_begin'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-    seg_points_end_index     = ak.flatten(tree[f'{branch_name}/{branch_name}.points_end'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-
-    # TODO selecting Tracks by track_objid_index  will not work because of https://github.com/eic/EICrecon/issues/1730
-    # If the file also has a one-to-one relation to Track => read the objectIDs
-    # (Many times stored in _CentralTrackSegments_track/*):
-    track_objid_index = None
-    track_objid_coll  = None
-    # These are not guaranteed to exist; so we do a safe check
-    objid_branch_base = f'_{"_".join(branch_name.split())}_track'  # e.g. _CentralTrackSegments_track
-    if objid_branch_base in tree.keys():
-        # inside that we typically have .index and .collectionID
-        track_objid_index = ak.flatten(tree[f'{objid_branch_base}/{objid_branch_base}.index'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        track_objid_coll = ak.flatten(tree[f'{objid_branch_base}/{objid_branch_base}.collectionID'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-
-    # -- Now get the TrackPoints for "CentralTrackSegments.points"
-    # Podio names the sub-collection something like "_CentralTrackSegments_points/..."
-    # For safety, we search among keys that start with _<branch_name>_points'
-    points_collection_name = f'_{branch_name}_points'
-    if points_collection_name not in tree.keys():
-        # Possibly the file organizes them differently, or there are no points
-        # We return an empty dictionary if not found
+
+
+class TrackSegmentTrajectories:
+    """
+    Trajectories of vector<edm4eic::TrackSegmentData> collection for an entry range.
+
+    Point columns of all entries are computed at once over the flat TrackPoint arrays.
+    group() then slices out PointTrajectory group of one or several entries.
+
+    Parameters
+    ----------
+    arrays : EntryRangeArrays
+        Read data with track_segments_branches()
+    branch_name : str
+        Name of the TrackSegmentData collection, e.g. 'CentralTrackSegments'
+    points_branch : str
+        Name of the points vector member branch, e.g. '_CentralTrackSegments_points'
+    with_params : bool
+        TRACK_PARAMETERS_BRANCH is read and parameters are added to trajectories
+    entry_start, entry_stop
+        Entries to compute. All entries of arrays if not given
+    """
+
+    def __init__(self, arrays, branch_name, points_branch, with_params, entry_start=None, entry_stop=None):
+        self.branch_name = branch_name
+        self.entry_start = arrays.entry_start if entry_start is None else entry_start
+        self.entry_stop = arrays.entry_stop if entry_stop is None else entry_stop
+
+        def segment_field(field):
+            return f'{branch_name}/{branch_name}.{field}'
+
+        def point_field(field):
+            return f'{points_branch}/{points_branch}.{field}'
+
+        def values(branch):
+            """float32 values are converted to float64 exactly, as to_list() does"""
+            return arrays.get(branch, self.entry_start, self.entry_stop).astype(np.float64)
+
+        # points_begin..points_end index points of the same entry
+        self._begins = arrays.get(segment_field("points_begin"), self.entry_start, self.entry_stop).tolist()
+        self._ends = arrays.get(segment_field("points_end"), self.entry_start, self.entry_stop).tolist()
+        self._segment_offsets = arrays.offsets(segment_field("points_begin"), self.entry_start, self.entry_stop)
+        self._point_offsets = arrays.offsets(point_field("position.x"), self.entry_start, self.entry_stop)
+
+        # p_exx is assumed to be the 𝜎^2 in the x-coordinate of point’s position (same for y, z).
+        # x2.0 represents “plus-or-minus one sigma” as the entire width in that direction.
+        def full_width(variance):
+            return np.where(variance > 0, 2.0 * np.sqrt(np.maximum(variance, 0.0)), 0.0)
+
+        # pointColumns => [x, y, z, t, dx, dy, dz, dt]
+        self.points = np.column_stack([
+            values(point_field("position.x")),
+            values(point_field("position.y")),
+            values(point_field("position.z")),
+            values(point_field("time")),
+            full_width(values(point_field("positionError.xx"))),
+            full_width(values(point_field("positionError.yy"))),
+            full_width(values(point_field("positionError.zz"))),
+            values(point_field("timeError")),
+        ])
+
+        # Rows of TRACK_PARAM_COLUMNS
+        self.params = None
+        self._params_offsets = None
+        if with_params:
+            params_fields = [f'{TRACK_PARAMETERS_BRANCH}/{TRACK_PARAMETERS_BRANCH}.{field}'
+                             for field in TRACK_PARAMETERS_FIELDS]
+            self.params = np.column_stack([values(branch) for branch in params_fields])
+            self._params_offsets = arrays.offsets(params_fields[0], self.entry_start, self.entry_stop)
+
+    def group(self, entry_start, entry_stop=None):
+        """Returns PointTrajectory group with trajectories of entries [entry_start, entry_stop)"""
+        if entry_stop is None:
+            entry_stop = entry_start + 1
+        if entry_start < self.entry_start or entry_stop > self.entry_stop:
+            raise IndexError(f"Entries [{entry_start}, {entry_stop}) are outside of the computed range "
+                             f"[{self.entry_start}, {self.entry_stop})")
+
+        result = _empty_trajectory_group(self.branch_name)
+        if self.params is not None:
+            result["paramColumns"] = list(TRACK_PARAM_COLUMNS)
+
+        trajectories = []
+        for entry in range(entry_start - self.entry_start, entry_stop - self.entry_start):
+            point_rows = self.points[self._point_offsets[entry]:self._point_offsets[entry + 1]].tolist()
+            segment_start, segment_stop = self._segment_offsets[entry], self._segment_offsets[entry + 1]
+
+            params_rows = []
+            if self.params is not None:
+                params_rows = self.params[self._params_offsets[entry]:self._params_offsets[entry + 1]].tolist()
+                if segment_stop - segment_start != len(params_rows):
+                    logger.warning(f"len(CentralCKFParameters) != len({self.branch_name}). "
+                                   f"Might be a sign of format change or broken tree")
+
+            # Segments without parameters get empty params
+            for seg_index in range(segment_stop - segment_start):
+                begin = self._begins[segment_start + seg_index]
+                end = self._ends[segment_start + seg_index]
+                trajectories.append({
+                    "points": point_rows[begin:end],
+                    "params": params_rows[seg_index] if seg_index < len(params_rows) else []
+                })
+
+        result["trajectories"] = trajectories
         return result
 
-    def get_points_field_array(field_suffix):
-        """Helper to flatten points arrays from the sub-collection."""
-        full_branch = f'{points_collection_name}/{points_collection_name}.{field_suffix}'
-        return ak.flatten(tree[full_branch].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-
-    # Grab the trackpoint fields
-    p_x         = get_points_field_array("position.x")
-    p_y         = get_points_field_array("position.y")
-    p_z         = get_points_field_array("position.z")
-    p_t         = get_points_field_array("time")
-    p_terr      = get_points_field_array("timeError")
-    p_exx       = get_points_field_array("positionError.xx")
-    p_eyy       = get_points_field_array("positionError.yy")
-    p_ezz       = get_points_field_array("positionError.zz")
-    # If you want pathlength info, add it:
-    # p_path      = get_points_field_array("pathlength")
-    # p_patherr   = get_points_field_array("pathlengthError")
-
-    # # TODO selecting Tracks by track_objid_index  will not work because of https://github.com/eic/EICrecon/issues/1730
-    # -- Optionally load track collection to get momentum, charge, etc.
-    #    We'll do a quick attempt for "CentralCKFTracks", but if that doesn't exist,
-    #    we'll skip.
-    params_branch = "CentralCKFTrackParameters"
-    params_exists = (params_branch in tree.keys())
-
-    # If present, read the relevant arrays for indexing
-    if params_exists:
-        trk_theta  = ak.flatten(tree[f'{params_branch}/{params_branch}.theta'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        trk_phi    = ak.flatten(tree[f'{params_branch}/{params_branch}.phi'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        trk_qoverp = ak.flatten(tree[f'{params_branch}/{params_branch}.qOverP'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        trk_loc_a  = ak.flatten(tree[f'{params_branch}/{params_branch}.loc.a'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        trk_loc_b  = ak.flatten(tree[f'{params_branch}/{params_branch}.loc.b'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        trk_time   = ak.flatten(tree[f'{params_branch}/{params_branch}.time'].array(entry_start=entry_start, entry_stop=entry_stop)).to_list()
-        result["paramColumns"] = [
-            "theta",
-            "phi",
-            "q_over_p",
-            "loc_a",
-            "loc_b",
-            "time"
+
+def _track_segment_trajectories(tree, branch_name, arrays, entry_start=None, entry_stop=None):
+    """Returns TrackSegmentTrajectories for the read arrays. The collection must have points"""
+    schema = get_events_schema(tree)
+    points_branch = schema[branch_name].vector_members["points"][0]
+    return TrackSegmentTrajectories(arrays, branch_name, points_branch, TRACK_PARAMETERS_BRANCH in schema,
+                                    entry_start, entry_stop)
+
+
+def track_segments_to_line_trajectories(tree, branch_name, entry_start, entry_stop=None, arrays=None):
+    """
+    Converts vector<edm4eic::TrackSegmentData> + the associated TrackPoints
+    into a Firebird 'TrackerLinePointTrajectory' component.
+
+    Each segment => one 'line' with an array of points from points_begin..points_end.
+    Parameters are taken from CentralCKFTrackParameters by the segment index.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branch_name : str
+        Name of the TrackSegmentData collection
+    entry_start : int
+        First entry to convert
+    entry_stop : int, optional
+        Entry after the last one to convert. Only entry_start is converted if not given.
+        Trajectories of all entries are put to one group
+    arrays : EntryRangeArrays, optional
+        Already read data covering the entries. Missing branches are read to it.
+        If not given, the branches are read from the tree
+    """
+    if entry_stop is None:
+        entry_stop = entry_start + 1
+
+    branches = track_segments_branches(tree, branch_name)
+    if not branches:
+        # Possibly the file organizes them differently, or there are no points
+        return _empty_trajectory_group(branch_name)
+
+    if arrays is None:
+        arrays = EntryRangeArrays(tree, branches, entry_start, entry_stop)
+    else:
+        arrays.read(tree, branches)
+    return _track_segment_trajectories(tree, branch_name, arrays, entry_start, entry_stop).group(entry_start, entry_stop)
+
+
+# Fields of vector<edm4hep::MCParticleData> that are used to build trajectories
+MC_PARTICLE_FIELDS = [
+    "vertex.x", "vertex.y", "vertex.z",
+    "endpoint.x", "endpoint.y", "endpoint.z",
+    "time",
+    "momentum.x", "momentum.y", "momentum.z",
+    "mass",
+    "PDG",
+    "charge",
+    "generatorStatus",
+    "simulatorStatus",
+]
+
+# paramColumns of MCParticle trajectories. "parent" is the index of the first parent particle or -1
+MC_PARTICLE_PARAM_COLUMNS = ["pdg", "charge", "px", "py", "pz", "mass", "generator_status", "simulator_status",
+                             "parent"]
+
+# [mm/ns]
+SPEED_OF_LIGHT = 299.792458
+
+# Fields of vector<edm4eic::ClusterData> that are used to build BoxHit-s
+CLUSTER_FIELDS = [
+    "position.x", "position.y", "position.z",
+    "positionError.xx", "positionError.yy", "positionError.zz",
+    "time", "timeError",
+    "energy", "energyError",
+]
+
+# Associations that link reconstructed objects to MC
+TRACKER_HIT_ASSOCIATION_TYPE = "edm4eic::MCRecoTrackerHitAssociationData"
+CLUSTER_ASSOCIATION_TYPE = "edm4eic::MCRecoClusterParticleAssociationData"
+
+
+def mc_particles_branches(tree, branch_name):
+    """Returns the list of branches needed to convert vector<edm4hep::MCParticleData> collection"""
+    collection = get_events_schema(tree)[branch_name]
+    branches = [collection.field_branch(field) for field in MC_PARTICLE_FIELDS]
+    if "parents" in collection.relations:
+        branches.extend(multi_relation_branches(collection, "parents"))
+    return branches
+
+
+def _empty_particle_group(branch_name):
+    return {
+        "name": branch_name,
+        "type": "PointTrajectory",
+        "origin": {"type": "edm4hep::MCParticleData", "name": branch_name},
+        "paramColumns": list(MC_PARTICLE_PARAM_COLUMNS),
+        "pointColumns": ["x", "y", "z", "t", "dx", "dy", "dz", "dt"],
+        "trajectories": []
+    }
+
+
+class MCParticleTrajectories:
+    """
+    Trajectories of vector<edm4hep::MCParticleData> collection for an entry range.
+
+    Each particle is a straight line from the vertex to the endpoint. The time at the endpoint
+    is computed from the particle velocity. Columns of all entries are computed at once,
+    group() slices out PointTrajectory group of one or several entries.
+
+    Parameters
+    ----------
+    resolver : pyrobird.podio_relations.RelationResolver
+        Relations of the entry range. Its arrays have mc_particles_branches()
+    branch_name : str
+        Name of the MCParticleData collection, e.g. 'MCParticles'
+    """
+
+    def __init__(self, resolver, branch_name):
+        self.branch_name = branch_name
+        self.entry_start = resolver.entry_start
+        self.entry_stop = resolver.entry_stop
+        arrays = resolver.arrays
+
+        def values(field):
+            branch = f'{branch_name}/{branch_name}.{field}'
+            return arrays.get(branch, self.entry_start, self.entry_stop).astype(np.float64)
+
+        self._offsets = arrays.offsets(f'{branch_name}/{branch_name}.PDG', self.entry_start, self.entry_stop)
+        vertex = np.column_stack([values("vertex.x"), values("vertex.y"), values("vertex.z")])
+        endpoint = np.column_stack([values("endpoint.x"), values("endpoint.y"), values("endpoint.z")])
+        momentum = np.column_stack([values("momentum.x"), values("momentum.y"), values("momentum.z")])
+        mass = values("mass")
+        time = values("time")
+
+        # t_end = t + length / (beta * c), beta = p / E
+        p = np.linalg.norm(momentum, axis=1)
+        energy = np.sqrt(p * p + mass * mass)
+        length = np.linalg.norm(endpoint - vertex, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            end_time = np.where(p > 0, time + length * energy / (p * SPEED_OF_LIGHT), time)
+
+        zeros = np.zeros((len(time), 4))
+        self.starts = np.column_stack([vertex, time, zeros])
+        self.ends = np.column_stack([endpoint, end_time, zeros])
+
+        # First parent of each particle
+        parents = np.full(len(time), NO_LINK, dtype=np.int64)
+        if "parents" in resolver.schema[branch_name].relations:
+            object_offsets, parent_refs = resolver.multi_refs(branch_name, "parents")
+            has_parent = np.diff(object_offsets) > 0
+            first = parent_refs.keys_to(branch_name)[object_offsets[:-1][has_parent]]
+            parents[has_parent] = key_indexes(first)
+
+        self.params = np.column_stack([
+            values("PDG"),
+            values("charge"),
+            momentum,
+            mass,
+            values("generatorStatus"),
+            values("simulatorStatus"),
+            parents,
+        ])
+
+    def group(self, entry_start, entry_stop=None):
+        """Returns PointTrajectory group with particles of entries [entry_start, entry_stop)"""
+        if entry_stop is None:
+            entry_stop = entry_start + 1
+        begin = self._offsets[entry_start - self.entry_start]
+        end = self._offsets[entry_stop - self.entry_start]
+
+        result = _empty_particle_group(self.branch_name)
+        result["trajectories"] = [
+            {"points": [start, stop], "params": params}
+            for start, stop, params in zip(self.starts[begin:end].tolist(), self.ends[begin:end].tolist(),
+                                           self.params[begin:end].tolist())
         ]
+        return result
+
+
+def mc_particles_to_trajectories(tree, branch_name, entry_start, entry_stop=None, arrays=None, resolver=None):
+    """
+    Converts vector<edm4hep::MCParticleData> to PointTrajectory group.
+
+    Each particle is a line from the vertex to the endpoint with MC_PARTICLE_PARAM_COLUMNS params.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branch_name : str
+        Name of the MCParticleData collection
+    entry_start : int
+        First entry to convert
+    entry_stop : int, optional
+        Entry after the last one to convert. Only entry_start is converted if not given
+    arrays : EntryRangeArrays, optional
+        Already read data covering the entries. Missing branches are read to it
+    resolver : pyrobird.podio_relations.RelationResolver, optional
+        Relations of the entry range. Takes precedence over arrays
+    """
+    if entry_stop is None:
+        entry_stop = entry_start + 1
+    if resolver is None:
+        if arrays is None:
+            arrays = EntryRangeArrays(tree, [], entry_start, entry_stop)
+        resolver = RelationResolver(tree, arrays)
+    return _mc_particle_trajectories(tree, branch_name, resolver).group(entry_start, entry_stop)
+
+
+def _mc_particle_trajectories(tree, branch_name, resolver):
+    """Returns MCParticleTrajectories of the resolver entry range, computed once per range"""
+    def compute():
+        resolver.arrays.read(tree, mc_particles_branches(tree, branch_name))
+        return MCParticleTrajectories(resolver, branch_name)
+    return resolver.cached(("mc_particle_trajectories", branch_name), compute)
+
+
+def tracker_hit_particle_branches(tree):
+    """
+    Returns the list of branches needed to link TrackerHitData hits to MCParticles:
+    TrackerHit -rawHit-> RawTrackerHit <-MCRecoTrackerHitAssociation-> SimTrackerHit -MCParticle-> MCParticle
+    """
+    schema = get_events_schema(tree)
+    branches = []
+    for collection in schema.collections_of_type("edm4eic::TrackerHitData"):
+        if "rawHit" in collection.relations:
+            branches.extend(relation_branches(collection, "rawHit"))
+    branches.extend(association_branches(schema, TRACKER_HIT_ASSOCIATION_TYPE, ["rawHit", "simHit"]))
+    for collection in schema.collections_of_type("edm4hep::SimTrackerHitData"):
+        if "MCParticle" in collection.relations:
+            branches.extend(relation_branches(collection, "MCParticle"))
+    return branches
+
+
+def tracker_hit_particles(resolver, branch_name):
+    """Returns ObjectRefs of MCParticles of TrackerHitData hits of the range, one per hit"""
+    def compute():
+        raw_hits = resolver.refs(branch_name, "rawHit")
+        sim_hits = resolver.associated(raw_hits, TRACKER_HIT_ASSOCIATION_TYPE, "rawHit", "simHit")
+        return resolver.follow(sim_hits, "MCParticle")
+    return resolver.cached(("tracker_hit_particles", branch_name), compute)
+
+
+def cluster_particles(resolver, branch_name):
+    """Returns ObjectRefs of MCParticles of ClusterData clusters of the range, one per cluster"""
+    def compute():
+        clusters = resolver.objects(branch_name, "energy")
+        return resolver.associated(clusters, CLUSTER_ASSOCIATION_TYPE, "rec", "sim")
+    return resolver.cached(("cluster_particles", branch_name), compute)
+
+
+def link_dict(refs, entry_start, entry_stop=None, object_offsets=None):
+    """
+    Returns DEX links of objects of entries [entry_start, entry_stop) to the referenced objects.
+
+    Parameters
+    ----------
+    refs : pyrobird.podio_relations.ObjectRefs
+        References of the entry range
+    entry_start, entry_stop : int
+        Entries of the links
+    object_offsets : numpy.ndarray, optional
+        For multi relations, references of object i of the entries are [object_offsets[i], object_offsets[i + 1]).
+        Links then get "offsets"
+    """
+    begin, end = refs.rows(entry_start, entry_stop)
+    if len(refs.collections) <= 1:
+        link = {"collection": refs.collections[0] if refs.collections else None}
     else:
-        trk_theta  = []
-        trk_phi    = []
-        trk_qoverp = []
-        trk_loc_a  = []
-        trk_loc_b  = []
-        trk_time   = []
-
-    trajectories = []
-    n_segments = len(seg_points_begin_index)
-
-    if params_exists and n_segments != len(trk_theta):
-        print(f"WARNING: len(CentralCKFParameters) != len({branch_name}). Might be a sign of format change or broken tree")
-
-    # Check, we should have the same number of segments and parameters
-    for seg_index in range(n_segments):
-        segment_points = []
-        for point_index in range(seg_points_begin_index[seg_index], seg_points_end_index[seg_index]):
-            # In that snippet, p_exx[point_index] is assumed to be the 𝜎^2 in the x,y,z-coordinate of point’s position.
-            # x2.0 represents “plus-or-minus one sigma” as the entire width in that direction.
-            dx = 2.0 * np.sqrt(p_exx[point_index]) if p_exx[point_index] > 0 else 0.0
-            dy = 2.0 * np.sqrt(p_eyy[point_index]) if p_eyy[point_index] > 0 else 0.0
-            dz = 2.0 * np.sqrt(p_ezz[point_index]) if p_ezz[point_index] > 0 else 0.0
-            dt = p_terr[point_index]
-            # pointColumns => [x, y, z, t, dx, dy, dz, dt]
-            point_val = [p_x[point_index], p_y[point_index], p_z[point_index], p_t[point_index], dx, dy, dz, dt]
-            segment_points.append(point_val)
-
-        # Attempt to get track params from the track reference
-        params_list = []
-        if params_exists and seg_index < len(trk_theta):
-            params_list.append(trk_theta[seg_index])
-            params_list.append(trk_phi[seg_index])
-            params_list.append(trk_qoverp[seg_index])
-            params_list.append(trk_loc_a[seg_index])
-            params_list.append(trk_loc_b[seg_index])
-            params_list.append(trk_time [seg_index])
-
-        trajectory = {
-            "points": segment_points,
-            "params": params_list
-        }
-        trajectories.append(trajectory)
-
-    result["trajectories"] = trajectories
-    return result
+        link = {"collections": list(refs.collections), "codes": refs.codes[begin:end].tolist()}
+    if object_offsets is not None:
+        link["offsets"] = np.asarray(object_offsets).tolist()
+    link["indexes"] = key_indexes(refs.keys[begin:end]).tolist()
+    return link
 
 
-def edm4eic_entry_to_dict(tree, entry_index, custom_name=None, collections=None):
-    # the result of this function
-    components = []
+def clusters_branches(tree, branch_name, with_hits=False, with_particles=False):
+    """Returns the list of branches needed to convert vector<edm4eic::ClusterData> collection"""
+    schema = get_events_schema(tree)
+    collection = schema[branch_name]
+    branches = [collection.field_branch(field) for field in CLUSTER_FIELDS]
+    if with_hits and "hits" in collection.relations:
+        branches.extend(multi_relation_branches(collection, "hits"))
+    if with_particles:
+        branches.extend(association_branches(schema, CLUSTER_ASSOCIATION_TYPE, ["rec", "sim"]))
+    return branches
+
+
+def clusters_to_box_hits(tree, branch_name, entry_start, entry_stop=None, arrays=None, resolver=None,
+                         as_arrays=False, with_hits=False, with_particles=False, min_energy=0.0, max_hits=None):
+    """
+    Converts vector<edm4eic::ClusterData> to BoxHit format dictionary
+
+    Each cluster is a box at the cluster position with position errors as dimensions.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    branch_name : str
+        Name of the ClusterData collection
+    entry_start : int
+        First entry to convert
+    entry_stop : int, optional
+        Entry after the last one to convert. Only entry_start is converted if not given
+    arrays : EntryRangeArrays, optional
+        Already read data covering the entries. Missing branches are read to it
+    resolver : pyrobird.podio_relations.RelationResolver, optional
+        Relations of the entry range. Takes precedence over arrays
+    as_arrays : bool
+        If True, group "hits" is BoxHitArrays that keeps NumPy arrays. Otherwise, it is list of hit dictionaries
+    with_hits : bool
+        Group gets "links": {"hits": ...} with the calorimeter hits of each cluster
+    with_particles : bool
+        Group gets "links": {"particles": ...} with MCParticle of each cluster, from the cluster associations
+    min_energy, max_hits
+        Selection of the linked calorimeter hits (see calorimeter_hits_to_box_hits).
+        Hit links are the indexes of the selected hits, dropped hits are -1
+    """
+    if entry_stop is None:
+        entry_stop = entry_start + 1
+    if resolver is None:
+        if arrays is None:
+            arrays = EntryRangeArrays(tree, [], entry_start, entry_stop)
+        resolver = RelationResolver(tree, arrays)
+    arrays = resolver.arrays
+    arrays.read(tree, clusters_branches(tree, branch_name, with_hits, with_particles))
+
+    def get_field_array(field):
+        """Gets values of a field branch as NumPy array"""
+        return arrays.get(f'{branch_name}/{branch_name}.{field}', entry_start, entry_stop)
+
+    # Errors are variances, while box dimensions are full widths: 2 sigma
+    hits = BoxHitArrays({
+        "x":   get_field_array('position.x'),
+        "y":   get_field_array('position.y'),
+        "z":   get_field_array('position.z'),
+        "dx":  2 * np.sqrt(np.maximum(get_field_array('positionError.xx'), 0)),
+        "dy":  2 * np.sqrt(np.maximum(get_field_array('positionError.yy'), 0)),
+        "dz":  2 * np.sqrt(np.maximum(get_field_array('positionError.zz'), 0)),
+        "t":   get_field_array('time'),
+        "dt":  get_field_array('timeError'),
+        "ed":  get_field_array('energy'),
+        "ded": get_field_array('energyError'),
+    })
 
+    group = {
+        "name": branch_name,
+        "type": "BoxHit",
+        "origin": {"type": "edm4eic::ClusterData", "name": branch_name},
+        "hits": hits if as_arrays else hits.to_list(),
+    }
+
+    links = {}
+    if with_hits and "hits" in resolver.schema[branch_name].relations:
+        object_offsets, hit_refs = resolver.multi_refs(branch_name, "hits")
+        if min_energy or max_hits:
+            hit_refs = resolver.cached(("selected_cluster_hits", branch_name, min_energy, max_hits),
+                                       lambda: _select_linked_hits(arrays, hit_refs, min_energy, max_hits))
+
+        # Clusters of the entries and their hits
+        clusters = arrays.offsets(f'{branch_name}/{branch_name}.energy', resolver.entry_start, resolver.entry_stop)
+        first = clusters[entry_start - resolver.entry_start]
+        last = clusters[entry_stop - resolver.entry_start]
+        links["hits"] = link_dict(hit_refs, entry_start, entry_stop,
+                                  object_offsets[first:last + 1] - object_offsets[first])
+    if with_particles:
+        links["particles"] = link_dict(cluster_particles(resolver, branch_name), entry_start, entry_stop)
+    if links:
+        group["links"] = links
+    return group
+
+
+def _select_linked_hits(arrays, refs, min_energy, max_hits):
+    """
+    Returns references to calorimeter hits with keys of the hits after select_by_energy.
+    Dropped hits are missing links. Collections without energy in arrays are kept as is
+    """
+    keys = refs.keys.copy()
+    for code, collection in enumerate(refs.collections):
+        energy_branch = f'{collection}/{collection}.energy'
+        if energy_branch not in arrays:
+            continue
+        for entry in range(refs.entry_start, refs.entry_start + len(refs.offsets) - 1):
+            selected = select_by_energy(arrays.get(energy_branch, entry), min_energy, max_hits)
+            if selected is None:
+                continue
+            # Index of each hit after the selection
+            new_indexes = np.full(len(arrays.get(energy_branch, entry)), NO_LINK, dtype=np.int64)
+            new_indexes[selected] = np.arange(len(selected))
+
+            begin, end = refs.rows(entry)
+            entry_keys = keys[begin:end]
+            linked = np.flatnonzero((refs.codes[begin:end] == code) & (entry_keys >= 0))
+            indexes = key_indexes(entry_keys[linked])
+            in_range = indexes < len(new_indexes)
+            indexes[in_range] = new_indexes[indexes[in_range]]
+            indexes[~in_range] = NO_LINK
+            entry_keys[linked] = np.where(indexes >= 0, (entry_keys[linked] >> 32 << 32) | indexes, NO_LINK)
+    return ObjectRefs(refs.collections, np.where(keys >= 0, refs.codes, NO_LINK), keys, refs.offsets,
+                      refs.entry_start)
+
+
+def _default_collections(collections):
     if not collections:
         collections = [
             "tracker_hits",
             "tracks"
         ]
+    return collections
+
+
+def _tracker_hit_collections(tree):
+    """Names of all vector<edm4eic::TrackerHitData> collections in the tree"""
+    return [collection.name for collection in get_events_schema(tree).collections_of_type("edm4eic::TrackerHitData")]
 
-    # Hits:
-    if "tracker_hits" in collections:
-        tracker_branches = tree.typenames(recursive=False, full_paths=True, filter_typename="vector<edm4eic::TrackerHitData>")
-        # >oO debug: pprint(type())
 
-        for branch_name in tracker_branches.keys():
-            components.append(tracker_hits_to_box_hits(tree, branch_name, entry_index))
+def _collections_of_type(tree, type_name):
+    """Names of all collections of the podio type in the tree"""
+    return [collection.name for collection in get_events_schema(tree).collections_of_type(type_name)]
 
-    # Tracks
-    if "tracks" in collections:
-        # TODO selecting all TrackSegmentData will not work because of https://github.com/eic/EICrecon/issues/1730
-        # track_branches = tree.typenames(recursive=False, full_paths=True, filter_typename="vector<edm4eic::TrackSegmentData>")
+
+def _calorimeter_hit_collections(tree):
+    """(name, type) of all calorimeter hits collections in the tree"""
+    schema = get_events_schema(tree)
+    return [(collection.name, type_name) for type_name in CALORIMETER_HIT_FIELDS
+            for collection in schema.collections_of_type(type_name)]
+
+
+def edm4eic_entries_to_dicts(tree, entry_ids, collections=None, as_arrays=False, dex_format=FORMAT_ROWS,
+                             timings=None, options=None):
+    """
+    Converts multiple entries to the list of DEX event dictionaries.
+
+    Consecutive entries are read together: all needed branches of an entry range (hits, tracks and relations)
+    are read in one pass and then split into events by the entry offsets. Relations are resolved
+    once per entry range (see pyrobird.podio_relations).
+
+    Groups get "links" to the objects of other converted kinds: "tracker_hits" and "clusters" to MCParticles
+    if "mc_particles" are converted, "clusters" to their hits if "calorimeter_hits" are converted.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    entry_ids : list of int
+        Entries to convert. The order is preserved in the result
+    collections : list of str, optional
+        Collection kinds to convert: "tracker_hits", "tracks", "calorimeter_hits", "clusters", "mc_particles".
+        "tracker_hits" and "tracks" are converted if not given
+    as_arrays : bool
+        If True, hits are kept as NumPy arrays (see pyrobird.dex_arrays). Use dex_to_json to serialize them
+    dex_format : str
+        Group encoding, one of pyrobird.dex_columnar.DEX_FORMATS. Default is the row form
+    timings : pyrobird.timing.StageTimings, optional
+        Gets durations of "schema", "read", "assemble" and "encode" stages.
+        If its per_collection is set, each collection is read separately to measure it
+    options : dict, optional
+        Conversion options:
+        OPTION_CALO_MIN_ENERGY - calorimeter hits with lower energy are dropped;
+        OPTION_CALO_MAX_HITS - only this number of calorimeter hits with the highest energy are kept per collection;
+        OPTION_LOD - LOD method of BoxHit groups (see pyrobird.dex_lod), with OPTION_LOD_VOXEL_SIZE [mm]
+        for "voxel" and OPTION_LOD_MAX_HITS hit budget of an event for "sample"
+
+    Returns
+    -------
+    list of dict
+        DEX event dictionaries, one per entry in entry_ids
+    """
+    collections = _default_collections(collections)
+    per_collection = timings is not None and timings.per_collection
+
+    # Branches that are read in a single pass
+    with timed(timings, "schema"):
+        tracker_collections = _tracker_hit_collections(tree) if "tracker_hits" in collections else []
         seg_collection = "CentralTrackSegments"
-        if seg_collection in tree.keys():
-            line_comp = track_segments_to_line_trajectories(tree, seg_collection, entry_index, entry_stop=entry_index+1)
-            components.append(line_comp)
+        has_segments = "tracks" in collections and seg_collection in get_events_schema(tree)
+        seg_branches = track_segments_branches(tree, seg_collection) if has_segments else []
+        calo_collections = _calorimeter_hit_collections(tree) if "calorimeter_hits" in collections else []
+        cluster_collections = _collections_of_type(tree, "edm4eic::ClusterData") if "clusters" in collections else []
+        mc_collections = _collections_of_type(tree, "edm4hep::MCParticleData") if "mc_particles" in collections else []
 
-    entry = {
-        "id": custom_name if custom_name else entry_index,
-        "groups": components
-    }
+        # Links to the objects of other converted kinds
+        with_particles = bool(mc_collections)
+        with_cluster_hits = "calorimeter_hits" in collections
+        link_branches = tracker_hit_particle_branches(tree) if tracker_collections and with_particles else []
+        cluster_branches = {branch_name: clusters_branches(tree, branch_name, with_cluster_hits, with_particles)
+                            for branch_name in cluster_collections}
+        mc_branches = {branch_name: mc_particles_branches(tree, branch_name) for branch_name in mc_collections}
+    branches = []
+    for branch_name in tracker_collections:
+        branches.extend(tracker_hits_branches(branch_name))
+    for branch_name, type_name in calo_collections:
+        branches.extend(calorimeter_hits_branches(branch_name, type_name))
+    branches.extend(seg_branches)
+    for collection_branches in list(cluster_branches.values()) + list(mc_branches.values()):
+        branches.extend(collection_branches)
+    branches.extend(link_branches)
 
-    return entry
+    options = options or {}
+    calo_min_energy = float(options.get(OPTION_CALO_MIN_ENERGY) or 0.0)
+    calo_max_hits = int(options.get(OPTION_CALO_MAX_HITS) or 0)
+    lod = options.get(OPTION_LOD)
+
+    # LOD works on arrays, hits are made lists after it
+    convert_as_arrays = as_arrays or bool(lod)
+
+    # entry_id => data of entry range that includes it
+    arrays_by_entry = {}
+    with timed(timings, "read"):
+        for entry_start, entry_stop in split_entry_ranges(entry_ids):
+            if per_collection:
+                arrays = EntryRangeArrays(tree, [], entry_start, entry_stop)
+                for branch_name in tracker_collections:
+                    with timed_collection(timings, branch_name):
+                        arrays.read(tree, tracker_hits_branches(branch_name))
+                for branch_name, type_name in calo_collections:
+                    with timed_collection(timings, branch_name):
+                        arrays.read(tree, calorimeter_hits_branches(branch_name, type_name))
+                with timed_collection(timings, seg_collection):
+                    arrays.read(tree, seg_branches)
+                for branch_name, collection_branches in list(cluster_branches.items()) + list(mc_branches.items()):
+                    with timed_collection(timings, branch_name):
+                        arrays.read(tree, collection_branches)
+                arrays.read(tree, link_branches)
+            else:
+                arrays = EntryRangeArrays(tree, branches, entry_start, entry_stop)
+            for entry_id in range(entry_start, entry_stop):
+                arrays_by_entry[entry_id] = arrays
 
+    # entry_start of a range => TrackSegmentTrajectories of the range
+    trajectories_by_range = {}
+
+    # entry_start of a range => RelationResolver of the range
+    resolvers_by_range = {}
+
+    events = []
+    for entry_id in entry_ids:
+        arrays = arrays_by_entry[entry_id]
+        resolver = resolvers_by_range.get(arrays.entry_start)
+        if resolver is None:
+            resolver = resolvers_by_range[arrays.entry_start] = RelationResolver(tree, arrays)
+        components = []
+
+        with timed(timings, "assemble"):
+            # Hits:
+            for branch_name in tracker_collections:
+                with timed_collection(timings, branch_name):
+                    components.append(tracker_hits_to_box_hits(tree, branch_name, entry_id, resolver=resolver,
+                                                               as_arrays=convert_as_arrays,
+                                                               with_particles=with_particles))
+            for branch_name, _ in calo_collections:
+                with timed_collection(timings, branch_name):
+                    components.append(calorimeter_hits_to_box_hits(tree, branch_name, entry_id, arrays=arrays,
+                                                                   as_arrays=convert_as_arrays,
+                                                                   min_energy=calo_min_energy,
+                                                                   max_hits=calo_max_hits))
+            for branch_name in cluster_collections:
+                with timed_collection(timings, branch_name):
+                    components.append(clusters_to_box_hits(tree, branch_name, entry_id, resolver=resolver,
+                                                           as_arrays=convert_as_arrays, with_hits=with_cluster_hits,
+                                                           with_particles=with_particles,
+                                                           min_energy=calo_min_energy, max_hits=calo_max_hits))
+
+            # Tracks
+            # TODO selecting all TrackSegmentData will not work because of https://github.com/eic/EICrecon/issues/1730
+            # track_branches = tree.typenames(recursive=False, full_paths=True, filter_typename="vector<edm4eic::TrackSegmentData>")
+            if has_segments:
+                with timed_collection(timings, seg_collection):
+                    if seg_branches:
+                        # Trajectories of the whole entry range are computed once
+                        trajectories = trajectories_by_range.get(arrays.entry_start)
+                        if trajectories is None:
+                            trajectories = _track_segment_trajectories(tree, seg_collection, arrays)
+                            trajectories_by_range[arrays.entry_start] = trajectories
+                        line_comp = trajectories.group(entry_id)
+                    else:
+                        line_comp = _empty_trajectory_group(seg_collection)
+                components.append(line_comp)
+
+            # MC particles
+            for branch_name in mc_collections:
+                with timed_collection(timings, branch_name):
+                    components.append(mc_particles_to_trajectories(tree, branch_name, entry_id, resolver=resolver))
+
+        if lod:
+            with timed(timings, "lod"):
+                apply_lod(components, lod, voxel_size=options.get(OPTION_LOD_VOXEL_SIZE),
+                          max_hits=options.get(OPTION_LOD_MAX_HITS))
+                if not as_arrays:
+                    components = [materialize_group(component) for component in components]
+
+        if dex_format != FORMAT_ROWS:
+            with timed(timings, "encode"):
+                components = [encode_group(component, dex_format) for component in components]
+
+        events.append({
+            "id": entry_id,
+            "groups": components
+        })
+
+    return events
+
+
+def edm4eic_entry_to_dict(tree, entry_index, custom_name=None, collections=None):
+    entry = edm4eic_entries_to_dicts(tree, [entry_index], collections=collections)[0]
+    if custom_name:
+        entry["id"] = custom_name
+    return entry
 
-def edm4eic_to_dex_dict(tree, event_ids, origin_info=None, collections=None):
-    event_data = []
 
+def edm4eic_to_dex_dict(tree, event_ids, origin_info=None, collections=None, as_arrays=False, dex_format=FORMAT_ROWS,
+                        options=None):
     if isinstance(event_ids, int):
         event_ids = [event_ids]
 
-    for entry_id in event_ids:
-        event_data.append(edm4eic_entry_to_dict(tree, entry_id, custom_name=None, collections=collections))
+    event_data = edm4eic_entries_to_dicts(tree, event_ids, collections=collections, as_arrays=as_arrays,
+                                          dex_format=dex_format, options=options)
 
     result = {
         "type": "firebird-dex-json",
-        "version": "0.04",
+        "version": DEX_VERSION if dex_format == FORMAT_ROWS else DEX_COLUMNAR_VERSION,
         "origin": origin_info,
         "events": event_data
     }
@@ -0,0 +1,448 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Introspection of podio 'events' trees.
+
+Podio writes each collection as a top level branch with split data members:
+    'TOFEndcapRecHits': 'vector<edm4eic::TrackerHitData>',
+    'TOFEndcapRecHits/TOFEndcapRecHits.position.x': 'float[]',
+Relations and vector members are written as separate branches named '_<collection>_<member>':
+    '_TOFEndcapRecHits_rawHit': 'vector<podio::ObjectID>',
+    '_TOFEndcapRecHits_rawHit/_TOFEndcapRecHits_rawHit.index': 'int32_t[]',
+    '_CentralTrackSegments_points': 'vector<edm4eic::TrackPoint>',
+Subset collections only have object IDs of the original objects:
+    'CentralTrackingRecHits_objIdx': 'vector<podio::ObjectID>',
+
+Files have thousands of branches, and walking them for every converted entry is expensive.
+The tree is scanned once per file, and the resulting EventsSchema is shared by all converters.
+
+ObjectID branches reference collections by collectionID. podio writes the collectionID => name table
+to the metadata tree, and the IDs are 32 bit MurmurHash3 of collection names (see CollectionIdTable).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Types of the branches with podio object IDs
+OBJECT_ID_TYPES = ("podio::ObjectID", "edm4hep::ObjectID")
+
+# Suffix of subset collection branches
+SUBSET_SUFFIX = "_objIdx"
+
+
+def _vector_value_type(class_name):
+    """Returns T for 'vector<T>' or 'std::vector<T>' class names and None for others"""
+    if class_name.startswith("std::"):
+        class_name = class_name[len("std::"):]
+    if class_name.startswith("vector<") and class_name.endswith(">"):
+        return class_name[len("vector<"):-1].strip()
+    return None
+
+
+def _branch_class_name(branch):
+    """Returns class name of a branch. Reading fClassName is much faster than computing branch.typename"""
+    if branch.has_member("fClassName"):
+        return str(branch.member("fClassName"))
+    return branch.typename
+
+
+class PodioCollection:
+    """
+    Branches of a podio collection.
+
+    Attributes
+    ----------
+    name : str
+        Collection name, e.g. 'TOFEndcapRecHits'
+    type_name : str or None
+        podio data type, e.g. 'edm4eic::TrackerHitData'. None for subset collections
+    fields : dict
+        Data member name => full branch path, e.g. 'position.x' => 'TOFEndcapRecHits/TOFEndcapRecHits.position.x'
+    relations : dict
+        Relation name => name of the branch with object IDs, e.g. 'rawHit' => '_TOFEndcapRecHits_rawHit'.
+        Object ID branch has '.index' and '.collectionID' fields (see object_id_branches)
+    vector_members : dict
+        Vector member name => (branch name, value type), e.g. 'points' => ('_CentralTrackSegments_points', 'edm4eic::TrackPoint')
+    vector_member_fields : dict
+        Vector member name => dict of its data member name => full branch path
+    subset_branch : str or None
+        Name of object IDs branch for subset collections, e.g. 'CentralTrackingRecHits_objIdx'
+    """
+
+    def __init__(self, name, type_name=None):
+        self.name = name
+        self.type_name = type_name
+        self.fields = OrderedDict()
+        self.relations = OrderedDict()
+        self.vector_members = OrderedDict()
+        self.vector_member_fields = OrderedDict()
+        self.subset_branch = None
+
+    @property
+    def is_subset(self):
+        return self.subset_branch is not None
+
+    def field_branch(self, field):
+        """Returns full branch path of a data member. Raises KeyError if there is no such member"""
+        return self.fields[field]
+
+    def object_id_branches(self, relation):
+        """Returns (index branch, collectionID branch) full paths for a relation"""
+        branch = self.relations[relation]
+        return f"{branch}/{branch}.index", f"{branch}/{branch}.collectionID"
+
+    def vector_member_branch(self, member, field):
+        """Returns full branch path of a data member of a vector member, e.g. ('points', 'position.x')"""
+        return self.vector_member_fields[member][field]
+
+    def to_dict(self):
+        """Returns JSON serializable description of the collection"""
+        return {
+            "type": self.type_name,
+            "fields": list(self.fields.keys()),
+            "relations": list(self.relations.keys()),
+            "vectorMembers": {name: value_type for name, (_, value_type) in self.vector_members.items()},
+            "isSubset": self.is_subset,
+        }
+
+    def __repr__(self):
+        return f"PodioCollection(name={self.name!r}, type_name={self.type_name!r})"
+
+
+class EventsSchema:
+    """
+    Map of podio collections in an events tree
+
+    Attributes
+    ----------
+    collections : OrderedDict
+        Collection name => PodioCollection, in order of the tree branches
+    fingerprint : str
+        Hash of all branch names and types. Files with the same fingerprint have the same schema
+    """
+
+    def __init__(self, collections, fingerprint):
+        self.collections = collections
+        self.fingerprint = fingerprint
+        self._by_type = {}
+        for collection in collections.values():
+            self._by_type.setdefault(collection.type_name, []).append(collection)
+
+    def collections_of_type(self, type_name):
+        """
+        Returns list of collections of the podio type.
+
+        Parameters
+        ----------
+        type_name : str
+            podio data type like 'edm4eic::TrackerHitData' or 'vector<edm4eic::TrackerHitData>'
+        """
+        value_type = _vector_value_type(type_name)
+        if value_type is not None:
+            type_name = value_type
+        return list(self._by_type.get(type_name, []))
+
+    def __contains__(self, name):
+        return name in self.collections
+
+    def __getitem__(self, name):
+        return self.collections[name]
+
+    def __iter__(self):
+        return iter(self.collections.values())
+
+    def __len__(self):
+        return len(self.collections)
+
+    def to_dict(self):
+        """Returns JSON serializable description of all collections"""
+        return {
+            "fingerprint": self.fingerprint,
+            "collections": {name: collection.to_dict() for name, collection in self.collections.items()},
+        }
+
+
+def _find_owner(member_branch_name, collections):
+    """
+    For branch named '_<collection>_<member>' finds the collection and the member name.
+    Collection names may have underscores, so the longest known collection name is taken
+    """
+    rest = member_branch_name[1:]
+    best = None
+    for pos in range(len(rest)):
+        if rest[pos] == '_' and rest[:pos] in collections:
+            best = (rest[:pos], rest[pos + 1:])
+    return best
+
+
+def _branch_infos(tree):
+    """Returns (name, class name, sub branch names) of all top level branches"""
+    return [(branch.name, _branch_class_name(branch), [sub_branch.name for sub_branch in branch.branches])
+            for branch in tree.branches]
+
+
+def scan_events_tree(tree):
+    """
+    Scans the tree branches and builds the map of podio collections.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        podio 'events' tree
+
+    Returns
+    -------
+    EventsSchema
+        Map of podio collections
+    """
+    branch_infos = _branch_infos(tree)
+
+    fingerprint_hash = hashlib.sha256()
+    for name, class_name, sub_names in branch_infos:
+        fingerprint_hash.update(f"{name}:{class_name}:{','.join(sub_names)};".encode("utf-8"))
+
+    def member_fields(branch_name, sub_names):
+        prefix = branch_name + "."
+        return OrderedDict((sub_name[len(prefix):] if sub_name.startswith(prefix) else sub_name,
+                            f"{branch_name}/{sub_name}") for sub_name in sub_names)
+
+    # First pass: collections
+    collections = OrderedDict()
+    for name, class_name, sub_names in branch_infos:
+        value_type = _vector_value_type(class_name)
+        if value_type is None or name.startswith('_'):
+            continue
+        if value_type in OBJECT_ID_TYPES:
+            if name.endswith(SUBSET_SUFFIX):
+                collection_name = name[:-len(SUBSET_SUFFIX)]
+                collection = PodioCollection(collection_name)
+                collection.subset_branch = name
+                collections[collection_name] = collection
+            continue
+        collection = PodioCollection(name, value_type)
+        collection.fields = member_fields(name, sub_names)
+        collections[name] = collection
+
+    # Second pass: relations and vector members
+    for name, class_name, sub_names in branch_infos:
+        if not name.startswith('_'):
+            continue
+        value_type = _vector_value_type(class_name)
+        owner = _find_owner(name, collections)
+        if value_type is None or owner is None:
+            continue
+        collection_name, member = owner
+        collection = collections[collection_name]
+        if value_type in OBJECT_ID_TYPES:
+            collection.relations[member] = name
+        else:
+            collection.vector_members[member] = (name, value_type)
+            collection.vector_member_fields[member] = member_fields(name, sub_names)
+
+    return EventsSchema(collections, fingerprint_hash.hexdigest())
+
+
+# Schemas by file and by fingerprint
+_MAX_CACHED_SCHEMAS = 64
+_schemas_by_file = OrderedDict()
+_schemas_by_fingerprint = OrderedDict()
+_schemas_lock = threading.Lock()
+
+
+def _tree_cache_key(tree):
+    file = tree.file
+    return file.file_path, str(file.uuid), tree.object_path
+
+
+def get_events_schema(tree):
+    """
+    Returns map of podio collections of the tree. The tree is scanned only once per file.
+    Files with the same branches share the same EventsSchema object.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        podio 'events' tree
+
+    Returns
+    -------
+    EventsSchema
+        Map of podio collections
+    """
+    key = _tree_cache_key(tree)
+    with _schemas_lock:
+        schema = _schemas_by_file.get(key)
+        if schema is not None:
+            _schemas_by_file.move_to_end(key)
+            return schema
+
+    schema = scan_events_tree(tree)
+
+    with _schemas_lock:
+        # Share the schema between files with the same layout
+        schema = _schemas_by_fingerprint.setdefault(schema.fingerprint, schema)
+        _schemas_by_fingerprint.move_to_end(schema.fingerprint)
+        _schemas_by_file[key] = schema
+        for cache in (_schemas_by_file, _schemas_by_fingerprint):
+            while len(cache) > _MAX_CACHED_SCHEMAS:
+                cache.popitem(last=False)
+    return schema
+
+
+def collection_id_hash(name):
+    """
+    Returns podio collection ID of the collection name.
+
+    podio derives collection IDs from the names with 32 bit MurmurHash3 (seed 0), see podio::detail::hash32.
+    """
+    data = name.encode("utf-8")
+    c1, c2 = 0xcc9e2d51, 0x1b873593
+    mask = 0xffffffff
+    result = 0
+    body_size = len(data) - len(data) % 4
+    for pos in range(0, body_size, 4):
+        k = int.from_bytes(data[pos:pos + 4], "little")
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        k = (k * c2) & mask
+        result ^= k
+        result = ((result << 13) | (result >> 19)) & mask
+        result = (result * 5 + 0xe6546b64) & mask
+
+    tail = data[body_size:]
+    if tail:
+        k = int.from_bytes(tail, "little")
+        k = (k * c1) & mask
+        k = ((k << 15) | (k >> 17)) & mask
+        k = (k * c2) & mask
+        result ^= k
+
+    result ^= len(data)
+    result ^= result >> 16
+    result = (result * 0x85ebca6b) & mask
+    result ^= result >> 13
+    result = (result * 0xc2b2ae35) & mask
+    result ^= result >> 16
+    return result
+
+
+class CollectionIdTable:
+    """
+    Map of podio collection IDs to collection names
+
+    Attributes
+    ----------
+    names : dict
+        Collection ID => collection name
+    """
+
+    def __init__(self, names=None):
+        self.names = dict(names or {})
+        self._ids = {name: collection_id for collection_id, name in self.names.items()}
+
+    def name(self, collection_id):
+        """Returns collection name or None for unknown collection IDs"""
+        return self.names.get(int(collection_id))
+
+    def collection_id(self, name):
+        """Returns collection ID or None for unknown collection names"""
+        return self._ids.get(name)
+
+    def __contains__(self, collection_id):
+        return int(collection_id) in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+
+# (tree, branch) with collection ID tables of a category in podio metadata. {category} is e.g. 'events'.
+# 'podio_metadata' is written by podio >= 0.17, 'metadata' by the older versions
+_METADATA_ID_TABLES = [("podio_metadata", "{category}___idTable"), ("metadata", "CollectionIDs")]
+
+
+def _read_metadata_id_table(tree):
+    """Returns collection ID => name from podio metadata of the file. Empty dict if the file has no metadata"""
+    directory = tree.file.root_directory
+    for tree_name, branch_name in _METADATA_ID_TABLES:
+        branch_name = branch_name.format(category=tree.name)
+        if tree_name not in directory:
+            continue
+        metadata = directory[tree_name]
+        if branch_name not in metadata:
+            continue
+        sub_branches = {sub_branch.name.rpartition(".")[2]: sub_branch for sub_branch in metadata[branch_name].branches}
+        if "m_collectionIDs" not in sub_branches or "m_names" not in sub_branches:
+            continue
+        try:
+            ids = sub_branches["m_collectionIDs"].array(entry_stop=1, library="ak").to_list()[0]
+            names = sub_branches["m_names"].array(entry_stop=1, library="ak").to_list()[0]
+        except Exception:
+            # Table of unexpected layout. Collection IDs are then computed from names
+            continue
+        return {int(collection_id): str(name) for collection_id, name in zip(ids, names)}
+    return {}
+
+
+def read_collection_id_table(tree):
+    """
+    Builds collection ID => name table of the tree.
+
+    IDs of all collections of the tree are computed with collection_id_hash,
+    then the table from podio metadata (if the file has it) takes precedence.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        podio 'events' tree
+
+    Returns
+    -------
+    CollectionIdTable
+        Collection ID => name table
+    """
+    names = {collection_id_hash(name): name for name in get_events_schema(tree).collections}
+    names.update(_read_metadata_id_table(tree))
+    return CollectionIdTable(names)
+
+
+_id_tables_by_file = OrderedDict()
+
+
+def get_collection_id_table(tree):
+    """
+    Returns collection ID => name table of the tree. The table is built only once per file.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        podio 'events' tree
+
+    Returns
+    -------
+    CollectionIdTable
+        Collection ID => name table
+    """
+    key = _tree_cache_key(tree)
+    with _schemas_lock:
+        table = _id_tables_by_file.get(key)
+        if table is not None:
+            _id_tables_by_file.move_to_end(key)
+            return table
+
+    table = read_collection_id_table(tree)
+
+    with _schemas_lock:
+        _id_tables_by_file[key] = table
+        while len(_id_tables_by_file) > _MAX_CACHED_SCHEMAS:
+            _id_tables_by_file.popitem(last=False)
+    return table
+
+
+def clear_schema_cache():
+    """Forgets all scanned schemas and collection ID tables"""
+    with _schemas_lock:
+        _schemas_by_file.clear()
+        _schemas_by_fingerprint.clear()
+        _id_tables_by_file.clear()
@@ -0,0 +1,316 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Resolution of podio relations to index arrays.
+
+podio writes a relation as an ObjectID branch with the index of the related object in its collection
+and the ID of that collection (see pyrobird.podio.CollectionIdTable):
+    '_TOFEndcapRecHits_rawHit/_TOFEndcapRecHits_rawHit.index': 'int32_t[]',
+    '_TOFEndcapRecHits_rawHit/_TOFEndcapRecHits_rawHit.collectionID': 'uint32_t[]',
+A single relation has one ObjectID per object. A multi relation has a range of ObjectIDs per object,
+given by '<relation>_begin' and '<relation>_end' data members:
+    'EcalEndcapPClusters/EcalEndcapPClusters.hits_begin': 'uint32_t[]',
+Associations (MCRecoTrackerHitAssociation, MCRecoClusterParticleAssociation, ...) are collections
+with two single relations, e.g. 'rawHit' and 'simHit'.
+
+Relations are resolved for all entries of a range read with pyrobird.edm4eic.EntryRangeArrays.
+collectionIDs are mapped to names once per branch, and an object is referenced by a key
+of its entry (relative to the range start) and its index in the entry. Following relations is then
+a gather over the flat arrays and following associations is a sorted lookup, without Python loops
+over objects. Missing links are NO_LINK (-1).
+
+    resolver = RelationResolver(tree, arrays)
+    raw_hits = resolver.refs("TOFEndcapRecHits", "rawHit")
+    sim_hits = resolver.associated(raw_hits, "edm4eic::MCRecoTrackerHitAssociationData", "rawHit", "simHit")
+    particles = resolver.follow(sim_hits, "MCParticle")
+    particles.entry_indexes("MCParticles")     # MCParticles index of each TOFEndcapRecHits hit or -1
+"""
+
+import numpy as np
+
+from pyrobird.podio import get_collection_id_table, get_events_schema
+
+# Marks missing links in keys, codes and indexes
+NO_LINK = -1
+
+_INDEX_MASK = (1 << 32) - 1
+
+
+def object_keys(entries, indexes):
+    """Returns int64 keys of objects with (entry << 32) | index. Entries are relative to the range start"""
+    return (np.asarray(entries, dtype=np.int64) << 32) | np.asarray(indexes, dtype=np.int64)
+
+
+def key_indexes(keys):
+    """Returns index of the object in its entry for each key, NO_LINK for missing links"""
+    return np.where(keys >= 0, keys & _INDEX_MASK, NO_LINK)
+
+
+def entry_numbers(offsets):
+    """Returns entry (relative to the range start) of each flat value for per-entry offsets"""
+    return np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+
+
+def lookup(keys, queries):
+    """
+    For each query returns the first row of keys with the same value.
+
+    NO_LINK if the query is negative or not in keys.
+    """
+    result = np.full(len(queries), NO_LINK, dtype=np.int64)
+    if not len(keys) or not len(queries):
+        return result
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    # leftmost position is the first row in the stable order
+    positions = np.minimum(np.searchsorted(sorted_keys, queries), len(keys) - 1)
+    found = (queries >= 0) & (sorted_keys[positions] == queries)
+    result[found] = order[positions[found]]
+    return result
+
+
+def relation_branches(collection, relation):
+    """Returns index and collectionID branches of a relation of PodioCollection"""
+    return list(collection.object_id_branches(relation))
+
+
+def multi_relation_branches(collection, relation):
+    """Returns '<relation>_begin', '<relation>_end' and ObjectID branches of a multi relation of PodioCollection"""
+    return ([collection.field_branch(f"{relation}_begin"), collection.field_branch(f"{relation}_end")]
+            + relation_branches(collection, relation))
+
+
+def association_branches(schema, type_name, relations):
+    """Returns ObjectID branches of the relations of all association collections of the type"""
+    branches = []
+    for collection in schema.collections_of_type(type_name):
+        if all(relation in collection.relations for relation in relations):
+            for relation in relations:
+                branches.extend(relation_branches(collection, relation))
+    return branches
+
+
+class ObjectRefs:
+    """
+    References to podio objects of an entry range.
+
+    Parameters
+    ----------
+    collections : list of str
+        Names of referenced collections
+    codes : numpy.ndarray
+        Position in collections of each reference, NO_LINK for missing links
+    keys : numpy.ndarray
+        object_keys of the referenced objects, NO_LINK for missing links
+    offsets : numpy.ndarray
+        References of entry i are [offsets[i], offsets[i + 1])
+    entry_start : int
+        First entry of the range
+    """
+
+    def __init__(self, collections, codes, keys, offsets, entry_start):
+        self.collections = collections
+        self.codes = codes
+        self.keys = keys
+        self.offsets = offsets
+        self.entry_start = entry_start
+
+    @classmethod
+    def from_object_ids(cls, indexes, collection_ids, offsets, id_table, entry_start):
+        """Resolves ObjectID '.index' and '.collectionID' values. Unknown collection IDs are missing links"""
+        unique_ids, inverse = np.unique(collection_ids, return_inverse=True)
+        names = [id_table.name(collection_id) for collection_id in unique_ids.tolist()]
+        collections = list(dict.fromkeys(name for name in names if name is not None))
+        unique_codes = np.array([collections.index(name) if name is not None else NO_LINK for name in names],
+                                dtype=np.int64)
+        codes = unique_codes[inverse.reshape(-1)] if len(unique_codes) else np.zeros(0, dtype=np.int64)
+        codes[np.asarray(indexes) < 0] = NO_LINK
+        keys = np.where(codes >= 0, object_keys(entry_numbers(offsets), indexes), NO_LINK)
+        return cls(collections, codes, keys, offsets, entry_start)
+
+    @classmethod
+    def of_collection(cls, name, offsets, entry_start):
+        """References to all objects of a collection with per-entry offsets"""
+        entries = entry_numbers(offsets)
+        keys = object_keys(entries, np.arange(len(entries), dtype=np.int64) - offsets[entries])
+        return cls([name], np.zeros(len(keys), dtype=np.int64), keys, offsets, entry_start)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def take(self, rows, offsets=None):
+        """Returns references at rows. NO_LINK rows are missing links"""
+        valid = rows >= 0
+        codes = np.full(len(rows), NO_LINK, dtype=np.int64)
+        keys = np.full(len(rows), NO_LINK, dtype=np.int64)
+        codes[valid] = self.codes[rows[valid]]
+        keys[valid] = self.keys[rows[valid]]
+        return ObjectRefs(self.collections, codes, keys, self.offsets if offsets is None else offsets,
+                          self.entry_start)
+
+    def keys_to(self, collection):
+        """Returns keys of references to the collection, NO_LINK for others"""
+        if collection not in self.collections:
+            return np.full(len(self.keys), NO_LINK, dtype=np.int64)
+        return np.where(self.codes == self.collections.index(collection), self.keys, NO_LINK)
+
+    def entry_indexes(self, collection, entry_start=None, entry_stop=None):
+        """
+        Returns index of the referenced object in its entry for references to the collection.
+        Other references are NO_LINK. Only references of [entry_start, entry_stop) if given
+        """
+        keys = self.keys_to(collection)
+        if entry_start is not None:
+            begin, end = self.rows(entry_start, entry_stop)
+            keys = keys[begin:end]
+        return key_indexes(keys)
+
+    def rows(self, entry_start, entry_stop=None):
+        """Returns (begin, end) of references of entries [entry_start, entry_stop)"""
+        if entry_stop is None:
+            entry_stop = entry_start + 1
+        return (int(self.offsets[entry_start - self.entry_start]),
+                int(self.offsets[entry_stop - self.entry_start]))
+
+    def merge(self, other):
+        """Returns references with missing links taken from other. Both must have the same rows"""
+        collections = list(dict.fromkeys(self.collections + other.collections))
+        remap = np.array([collections.index(name) for name in other.collections] + [NO_LINK], dtype=np.int64)
+        other_codes = remap[other.codes]   # NO_LINK (-1) takes the last element
+        missing = self.codes < 0
+        return ObjectRefs(collections,
+                          np.where(missing, other_codes, self.codes),
+                          np.where(missing, other.keys, self.keys),
+                          self.offsets, self.entry_start)
+
+
+class RelationResolver:
+    """
+    Resolves podio relations of an entry range.
+
+    ObjectID branches are resolved once and cached. Branches that are not in arrays yet
+    are read in an extra pass, list them before reading arrays to keep one pass per range.
+
+    Parameters
+    ----------
+    tree : uproot.TTree
+        The 'events' tree
+    arrays : EntryRangeArrays
+        Data of the entry range
+    """
+
+    def __init__(self, tree, arrays):
+        self.tree = tree
+        self.arrays = arrays
+        self.schema = get_events_schema(tree)
+        self.id_table = get_collection_id_table(tree)
+        self.entry_start = arrays.entry_start
+        self.entry_stop = arrays.entry_stop
+        self._refs = {}
+        self._cache = {}
+
+    def cached(self, key, compute):
+        """Returns compute() result. It is computed once per key for the entry range"""
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def _get(self, branch):
+        self.arrays.read(self.tree, [branch])
+        return self.arrays.get(branch, self.entry_start, self.entry_stop)
+
+    def _offsets(self, branch):
+        self.arrays.read(self.tree, [branch])
+        return self.arrays.offsets(branch, self.entry_start, self.entry_stop)
+
+    def refs(self, collection_name, relation):
+        """Returns ObjectRefs of a relation of the collection, one per ObjectID of the relation branch"""
+        refs = self._refs.get((collection_name, relation))
+        if refs is None:
+            index_branch, id_branch = relation_branches(self.schema[collection_name], relation)
+            self.arrays.read(self.tree, [index_branch, id_branch])
+            refs = ObjectRefs.from_object_ids(self._get(index_branch), self._get(id_branch),
+                                              self._offsets(index_branch), self.id_table, self.entry_start)
+            self._refs[(collection_name, relation)] = refs
+        return refs
+
+    def objects(self, collection_name, field):
+        """Returns ObjectRefs to all objects of the collection. field is any data member to count objects"""
+        branch = self.schema[collection_name].field_branch(field)
+        return ObjectRefs.of_collection(collection_name, self._offsets(branch), self.entry_start)
+
+    def multi_refs(self, collection_name, relation):
+        """
+        Returns (object_offsets, refs) of a multi relation:
+        ObjectRefs of object i are refs[object_offsets[i]:object_offsets[i + 1]]
+        """
+        return self.cached(("multi_refs", collection_name, relation),
+                           lambda: self._multi_refs(collection_name, relation))
+
+    def _multi_refs(self, collection_name, relation):
+        collection = self.schema[collection_name]
+        begin_branch, end_branch = multi_relation_branches(collection, relation)[:2]
+        self.arrays.read(self.tree, multi_relation_branches(collection, relation))
+        refs = self.refs(collection_name, relation)
+        begins = self._get(begin_branch).astype(np.int64)
+        counts = np.maximum(self._get(end_branch).astype(np.int64) - begins, 0)
+
+        # begins are rows of the entry, shift them to the rows of the range
+        entries = entry_numbers(self._offsets(begin_branch))
+        begins += refs.offsets[entries]
+        object_offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=object_offsets[1:])
+        rows = np.arange(object_offsets[-1], dtype=np.int64) - np.repeat(object_offsets[:-1] - begins, counts)
+
+        # Rows out of the refs of the object entry (broken or negative begin, end) are missing links
+        row_entries = np.repeat(entries, counts)
+        rows[(rows < refs.offsets[row_entries]) | (rows >= refs.offsets[row_entries + 1])] = NO_LINK
+        return object_offsets, refs.take(rows, offsets=object_offsets[self._offsets(begin_branch)])
+
+    def follow(self, refs, relation):
+        """Returns ObjectRefs of a single relation of the referenced objects, one per reference"""
+        result = None
+        for code, collection_name in enumerate(refs.collections):
+            collection = self.schema.collections.get(collection_name)
+            if collection is None or relation not in collection.relations:
+                continue
+            target = self.refs(collection_name, relation)
+
+            # key => row of the relation branch, one ObjectID per object
+            keys = np.where(refs.codes == code, refs.keys, NO_LINK)
+            valid = keys >= 0
+            entries = keys[valid] >> 32
+            indexes = keys[valid] & _INDEX_MASK
+            counts = np.diff(target.offsets)
+            rows = np.full(len(keys), NO_LINK, dtype=np.int64)
+            rows[valid] = np.where(indexes < counts[entries], target.offsets[entries] + indexes, NO_LINK)
+
+            followed = target.take(rows, offsets=refs.offsets)
+            result = followed if result is None else result.merge(followed)
+        return result if result is not None else self._no_links(refs)
+
+    def associated(self, refs, association_type, from_relation, to_relation):
+        """
+        Returns ObjectRefs of objects associated with the referenced objects, one per reference.
+
+        Associations of all collections of association_type are used. If an object has several
+        associations, the first one is taken.
+        """
+        result = None
+        for association in self.schema.collections_of_type(association_type):
+            if from_relation not in association.relations or to_relation not in association.relations:
+                continue
+            sources = self.refs(association.name, from_relation)
+            for collection_name in refs.collections:
+                if collection_name not in sources.collections:
+                    continue
+                rows = lookup(sources.keys_to(collection_name), refs.keys_to(collection_name))
+                found = self.refs(association.name, to_relation).take(rows, offsets=refs.offsets)
+                result = found if result is None else result.merge(found)
+        return result if result is not None else self._no_links(refs)
+
+    @staticmethod
+    def _no_links(refs):
+        missing = np.full(len(refs), NO_LINK, dtype=np.int64)
+        return ObjectRefs([], missing, missing.copy(), refs.offsets, refs.entry_start)
@@ -0,0 +1,348 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Local disk cache of remote ROOT files blocks.
+
+Files opened by root:// or http(s):// URLs are read over the network on each request.
+CachingSource is an uproot source that keeps fetched bytes in a local directory,
+so the next read of the same byte ranges (by this or another process) comes from the disk.
+
+A file is split to fixed size blocks. A read request is served from stored blocks,
+missing blocks are fetched from the remote file in one vector request and stored.
+Blocks are keyed by URL and validator (file size with ETag or modification time when available),
+so a changed remote file doesn't get stale data. The total size is capped,
+the least recently used blocks are removed.
+
+    cache = RemoteBlockCache("/tmp/pyrobird-blocks", max_bytes=10 * 1024**3)
+    file = open_root_file("root://dtn-eic.jlab.org//work/eic2/file.root", block_cache=cache)
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+
+import fsspec.core
+import uproot
+import uproot.source.chunk
+import uproot.source.fsspec
+
+logger = logging.getLogger(__name__)
+
+REMOTE_PREFIXES = ('http://', 'https://', 'root://')
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+_BLOCK_SUFFIX = ".blk"
+
+# fsspec info fields that change when the remote file changes
+_VALIDATOR_FIELDS = ("ETag", "etag", "LastModified", "last_modified", "mtime", "modified")
+
+# Options of CachingSource that are not fsspec filesystem options
+_SOURCE_OPTIONS = ("coalesce_config",)
+
+
+def is_remote_path(path):
+    """Returns True if path is URL that is read through the network"""
+    return any(path.startswith(prefix) for prefix in REMOTE_PREFIXES)
+
+
+def file_validator(info):
+    """
+    Returns validator string of a file by its fsspec info dictionary or None if size is unknown.
+    Validator is the file size and ETag or modification time fields that the protocol provides
+    """
+    size = info.get("size")
+    if size is None:
+        return None
+    parts = [f"size={size}"]
+    parts.extend(f"{name}={info[name]}" for name in _VALIDATOR_FIELDS if info.get(name) is not None)
+    return ";".join(parts)
+
+
+class RemoteBlockCache:
+    """
+    Directory of remote files blocks with LRU eviction.
+
+    The directory can be shared by several processes: blocks are written atomically.
+    Each process tracks the size it has written and cleans the directory up when it is over max_bytes.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store blocks in. Created if it doesn't exist
+    max_bytes : int
+        Maximum total size of stored blocks. 0 means unlimited
+    block_size : int
+        Size of a block in bytes. Changing it doesn't reuse blocks stored with the other size
+    """
+
+    def __init__(self, path, max_bytes=0, block_size=DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError(f"RemoteBlockCache block_size must be positive, got {block_size}")
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, size, _ in self._scan_blocks())
+        self.hits = 0
+        self.misses = 0
+        self.bytes_from_cache = 0
+        self.bytes_fetched = 0
+
+    def file_key(self, url, validator):
+        """Returns key of the file blocks"""
+        text = f"{url}\n{validator}\n{self.block_size}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _block_path(self, file_key, index):
+        return os.path.join(self.path, file_key[:2], file_key, f"{index}{_BLOCK_SUFFIX}")
+
+    def _scan_blocks(self):
+        """Returns list of (mtime, size, path) of stored blocks"""
+        result = []
+        for dir_path, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                if not file_name.endswith(_BLOCK_SUFFIX):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, file_path))
+        return result
+
+    def get_block(self, file_key, index, size):
+        """Returns stored block data or None. size is the expected block size, blocks of other size are ignored"""
+        block_path = self._block_path(file_key, index)
+        try:
+            with open(block_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+
+        if data is None or len(data) != size:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(block_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            self.bytes_from_cache += len(data)
+        return data
+
+    def put_block(self, file_key, index, data):
+        """Stores fetched block atomically, so concurrent readers never see partial blocks"""
+        block_path = self._block_path(file_key, index)
+        with self._lock:
+            self.bytes_fetched += len(data)
+        try:
+            os.makedirs(os.path.dirname(block_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(block_path), suffix=".tmp")
+        except OSError as ex:
+            logger.warning(f"Can't store remote file block in {self.path}: {ex}")
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, block_path)
+        except OSError as ex:
+            logger.warning(f"Can't store remote file block in {self.path}: {ex}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._total_bytes += len(data)
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._cleanup()
+
+    def _cleanup(self):
+        """Removes the least recently used blocks until the cache is at 90% of max_bytes. Lock must be held"""
+        blocks = sorted(self._scan_blocks())
+        total_bytes = sum(size for _, size, _ in blocks)
+        target_bytes = int(self.max_bytes * 0.9)
+        for _, size, block_path in blocks:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(block_path)
+                total_bytes -= size
+            except OSError:
+                pass
+        self._total_bytes = total_bytes
+
+    def stats(self):
+        """Returns dictionary with cache counters"""
+        with self._lock:
+            return {
+                "path": self.path,
+                "block_size": self.block_size,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_from_cache": self.bytes_from_cache,
+                "bytes_fetched": self.bytes_fetched,
+            }
+
+
+class CachingSource(uproot.source.chunk.Source):
+    """
+    uproot source that reads remote file through RemoteBlockCache.
+
+    Use it as uproot.open(url, handler=CachingSource, block_cache=cache).
+    Missing blocks are read by uproot FSSpecSource, other options are passed to it.
+    Without block_cache, or if the file size is unknown, all reads go to FSSpecSource directly.
+
+    Parameters
+    ----------
+    file_path : str
+        URL of the file
+    block_cache : RemoteBlockCache, optional
+        Cache to use
+    """
+
+    def __init__(self, file_path, block_cache=None, **options):
+        super().__init__()
+        self._file_path = file_path
+        self._inner = uproot.source.fsspec.FSSpecSource(file_path, **options)
+        self._block_cache = block_cache
+        self._file_key = None
+        if block_cache is None:
+            return
+
+        # The file info is read with own filesystem, uproot source attributes are private
+        fsspec_options = {key: value for key, value in options.items()
+                          if key not in uproot.reading.open.defaults and key not in _SOURCE_OPTIONS}
+        try:
+            self._fs, self._fs_path = fsspec.core.url_to_fs(file_path, **fsspec_options)
+            info = self._fs.info(self._fs_path)
+        except Exception as ex:
+            logger.debug(f"Can't get info of {file_path}, reading it without block cache: {ex}")
+            return
+        validator = file_validator(info)
+        if validator is not None:
+            self._num_bytes = int(info["size"])
+            self._file_key = block_cache.file_key(file_path, validator)
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self._file_path!r} at 0x{id(self):012x}>"
+
+    @property
+    def num_bytes(self):
+        if self._num_bytes is None:
+            self._num_bytes = self._inner.num_bytes
+        return self._num_bytes
+
+    @property
+    def closed(self):
+        return self._inner.closed
+
+    def __enter__(self):
+        self._inner.__enter__()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self._inner.__exit__(exception_type, exception_value, traceback)
+
+    def _read_ranges(self, ranges):
+        """Returns bytes of each (start, stop) range. Missing blocks are fetched in one request"""
+        cache = self._block_cache
+        block_size = cache.block_size
+        num_bytes = self.num_bytes
+        ranges = [(max(0, start), min(stop, num_bytes)) for start, stop in ranges]
+
+        def block_stop(index):
+            return min((index + 1) * block_size, num_bytes)
+
+        indexes = sorted({index for start, stop in ranges if stop > start
+                          for index in range(start // block_size, (stop - 1) // block_size + 1)})
+        blocks = {}
+        missing = []
+        for index in indexes:
+            data = cache.get_block(self._file_key, index, block_stop(index) - index * block_size)
+            if data is None:
+                missing.append(index)
+            else:
+                blocks[index] = data
+
+        if missing:
+            # Adjacent blocks are merged to one range request by FSSpecSource
+            block_ranges = [(index * block_size, block_stop(index)) for index in missing]
+            fetched = self._inner.chunks(block_ranges, queue.Queue())
+            for index, chunk in zip(missing, fetched):
+                data = bytes(chunk.raw_data)
+                cache.put_block(self._file_key, index, data)
+                blocks[index] = data
+
+        result = []
+        for start, stop in ranges:
+            parts = []
+            position = start
+            while position < stop:
+                index = position // block_size
+                offset = position - index * block_size
+                length = min(stop - position, block_size - offset)
+                parts.append(blocks[index][offset:offset + length])
+                position += length
+            result.append(b"".join(parts))
+        return result
+
+    def chunk(self, start, stop):
+        if self._file_key is None:
+            return self._inner.chunk(start, stop)
+        if self.closed:
+            raise OSError(f"file {self._file_path!r} is closed")
+
+        self._num_requests += 1
+        self._num_requested_chunks += 1
+        self._num_requested_bytes += stop - start
+        data, = self._read_ranges([(start, stop)])
+        return uproot.source.chunk.Chunk.wrap(self, data, start)
+
+    def chunks(self, ranges, notifications):
+        if self._file_key is None:
+            return self._inner.chunks(ranges, notifications)
+        if self.closed:
+            raise OSError(f"file {self._file_path!r} is closed")
+
+        self._num_requests += 1
+        self._num_requested_chunks += len(ranges)
+        self._num_requested_bytes += sum(stop - start for start, stop in ranges)
+        chunks = []
+        for (start, _), data in zip(ranges, self._read_ranges(ranges)):
+            chunk = uproot.source.chunk.Chunk.wrap(self, data, start)
+            chunks.append(chunk)
+            notifications.put(chunk)
+        return chunks
+
+
+def open_root_file(path, block_cache=None, **options):
+    """
+    Opens ROOT file with uproot. Remote files are read through the block cache if it is given.
+
+    Parameters
+    ----------
+    path : str
+        Local file path or URL
+    block_cache : RemoteBlockCache, optional
+        Cache of remote files blocks
+    **options
+        Options of uproot.open
+    """
+    if block_cache is not None and is_remote_path(path):
+        return uproot.open(path, handler=CachingSource, block_cache=block_cache, **options)
+    return uproot.open(path, **options)
@@ -0,0 +1,142 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Shared settings of remote ROOT file sources.
+
+uproot reads root:// and http(s):// files with FSSpecSource: baskets requested together go to
+fsspec cat_ranges, HTTP ranges are sent concurrently and XRootD ranges as vector reads.
+RemoteSourcePool gives all opened remote files the same source options:
+
+- connections_per_host - size of HTTP connection pool per host
+- parallel_requests - number of range requests (or vector reads) in flight per read
+- coalescing - nearby basket ranges are merged to one range, ranges are grouped to vector requests
+  (uproot CoalesceConfig)
+- timeout - seconds to wait for a request
+
+fsspec keeps one filesystem instance per protocol and options. Since the options are the same objects
+for all files, every uproot.open gets the same instance with its open HTTP session or XRootD
+connection, instead of a fresh handle per file.
+
+    pool = RemoteSourcePool(parallel_requests=32, timeout=30)
+    file = pool.open("root://dtn-eic.jlab.org//work/eic2/file.root")
+"""
+
+import logging
+import threading
+
+from pyrobird.remote_cache import is_remote_path, open_root_file
+
+logger = logging.getLogger(__name__)
+
+HTTP_PREFIXES = ('http://', 'https://')
+XROOTD_PREFIXES = ('root://',)
+
+
+class _HttpClientFactory:
+    """
+    Creates aiohttp session for fsspec HTTPFileSystem (its get_client argument).
+    repr depends only on the settings, so fsspec reuses the filesystem instance for the same settings
+    """
+
+    def __init__(self, connections_per_host, timeout):
+        self.connections_per_host = connections_per_host
+        self.timeout = timeout
+
+    async def __call__(self, **kwargs):
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit_per_host=self.connections_per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        kwargs.pop("loop", None)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, **kwargs)
+
+    def __repr__(self):
+        return f"_HttpClientFactory(connections_per_host={self.connections_per_host}, timeout={self.timeout})"
+
+
+class RemoteSourcePool:
+    """
+    Source options of remote files, shared by all files opened through the pool.
+
+    Parameters
+    ----------
+    connections_per_host : int
+        Maximum open HTTP connections per host. 0 means unlimited.
+        XRootD multiplexes requests over one connection per host
+    parallel_requests : int
+        Maximum range requests in flight for one read (fsspec batch_size)
+    coalesce : bool
+        Merge nearby ranges and group ranges to vector requests. If False, each basket is a separate request
+    coalesce_gap : int
+        Ranges closer than this number of bytes are read as one range
+    max_request_ranges : int
+        Maximum number of ranges in one vector request
+    max_request_bytes : int
+        Maximum bytes in one vector request
+    timeout : float
+        Seconds to wait for a request. 0 or None waits forever
+    block_cache : RemoteBlockCache, optional
+        Disk cache that remote files are read through
+    """
+
+    def __init__(self, connections_per_host=16, parallel_requests=32, coalesce=True, coalesce_gap=32 * 1024,
+                 max_request_ranges=1024, max_request_bytes=10 * 1024 * 1024, timeout=60.0, block_cache=None):
+        from uproot.source.coalesce import CoalesceConfig
+
+        self.connections_per_host = connections_per_host
+        self.parallel_requests = max(1, parallel_requests)
+        self.coalesce = coalesce
+        self.timeout = timeout or None
+        self.block_cache = block_cache
+        if coalesce:
+            self.coalesce_config = CoalesceConfig(max_range_gap=coalesce_gap, max_request_ranges=max_request_ranges,
+                                                  max_request_bytes=max_request_bytes)
+        else:
+            self.coalesce_config = CoalesceConfig(max_range_gap=0, max_request_ranges=1,
+                                                  max_request_bytes=max_request_bytes, min_first_request_bytes=0)
+        self._http_client = _HttpClientFactory(connections_per_host, self.timeout)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def uproot_options(self, path):
+        """Returns uproot.open options for the file. Local files get no options"""
+        if path.startswith(HTTP_PREFIXES):
+            return {
+                "coalesce_config": self.coalesce_config,
+                "batch_size": self.parallel_requests,
+                "get_client": self._http_client,
+            }
+        if path.startswith(XROOTD_PREFIXES):
+            options = {
+                "coalesce_config": self.coalesce_config,
+                "batch_size": self.parallel_requests,
+            }
+            if self.timeout:
+                options["timeout"] = int(self.timeout)
+            return options
+        return {}
+
+    def open(self, path, **options):
+        """
+        Opens ROOT file with uproot. Remote files get the pool source options and are read through
+        the block cache if the pool has one. options are passed to uproot.open
+        """
+        if is_remote_path(path):
+            with self._lock:
+                self.opened += 1
+            options = dict(self.uproot_options(path), **options)
+        return open_root_file(path, block_cache=self.block_cache, **options)
+
+    def stats(self):
+        """Returns dictionary with pool settings and counters"""
+        with self._lock:
+            result = {
+                "connections_per_host": self.connections_per_host,
+                "parallel_requests": self.parallel_requests,
+                "coalesce": self.coalesce,
+                "timeout": self.timeout,
+                "opened": self.opened,
+            }
+        if self.block_cache is not None:
+            result["block_cache"] = self.block_cache.stats()
+        return result
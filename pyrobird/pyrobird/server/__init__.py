@@ -2,17 +2,38 @@
 # This file is part of Firebird Event Display and is licensed under the LGPLv3.
 # See the LICENSE file in the project root for full license information.
 import datetime
+import hashlib
+import json
 import os
 import logging
+import math
+import threading
 import time
+import uuid
 from urllib.parse import unquote
 
 import werkzeug.exceptions
-from flask import render_template, send_from_directory, Flask, send_file, abort, Config, jsonify, request
+from flask import render_template, Flask, send_file, abort, Config, jsonify, request, stream_with_context, \
+    after_this_request, g
 import flask
-import json5
 from werkzeug.routing import BaseConverter, ValidationError
-from pyrobird.edm4eic import parse_entry_numbers
+from pyrobird.edm4eic import (parse_entry_numbers, CONVERTER_VERSION, DEX_VERSION, OPTION_CALO_MIN_ENERGY,
+                              OPTION_CALO_MAX_HITS, OPTION_LOD, OPTION_LOD_VOXEL_SIZE, OPTION_LOD_MAX_HITS)
+from pyrobird.dex_lod import LOD_METHODS, LOD_VOXEL
+from pyrobird.dex_columnar import DEX_FORMATS, FORMAT_ROWS, DEX_COLUMNAR_VERSION
+from pyrobird.dex_binary import DEX_BINARY_MIME_TYPE
+from pyrobird.server.file_cache import OpenFileCache, is_remote_path, file_identity
+from pyrobird.server.result_cache import EventResultCache, DiskResultStore, make_event_key
+from pyrobird.server.conversion import (ConvertPool, ConvertPoolBusy, ConvertError, convert_file_entries,
+                                        DEX_BINARY_FORMAT)
+from pyrobird.server.prefetch import Prefetcher
+from pyrobird.server.single_flight import SingleFlight
+from pyrobird.server.static_assets import StaticAssets, INDEX_FILE, IMMUTABLE_MAX_AGE
+from pyrobird.server.asset_config import AssetConfig, with_timestamp
+from pyrobird.server.metrics import MetricsRegistry, stats_families, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from pyrobird.remote_cache import RemoteBlockCache
+from pyrobird.remote_source import RemoteSourcePool
+from pyrobird.timing import StageTimings, timed
 from flask_compress import Compress
 
 
@@ -43,9 +64,270 @@ CFG_CORS_IS_ALLOWED = "PYROBIRD_CORS_IS_ALLOWED"
 CFG_SHUTDOWN_IS_ALLOWED = "PYROBIRD_SHUTDOWN_IS_ALLOWED"
 CFG_API_BASE_URL = "PYROBIRD_API_BASE_URL"
 CFG_FIREBIRD_CONFIG_PATH = "PYROBIRD_FIREBIRD_CONFIG_PATH"
+CFG_FILE_CACHE_SIZE = "PYROBIRD_FILE_CACHE_SIZE"
+CFG_FILE_CACHE_IDLE_TIMEOUT = "PYROBIRD_FILE_CACHE_IDLE_TIMEOUT"
+CFG_RESULT_CACHE_SIZE_MB = "PYROBIRD_RESULT_CACHE_SIZE_MB"
+CFG_RESULT_CACHE_DIR = "PYROBIRD_RESULT_CACHE_DIR"
+CFG_RESULT_CACHE_DIR_SIZE_MB = "PYROBIRD_RESULT_CACHE_DIR_SIZE_MB"
+CFG_SERVE_WORKERS = "PYROBIRD_SERVE_WORKERS"
+CFG_CONVERT_WORKERS = "PYROBIRD_CONVERT_WORKERS"
+CFG_CONVERT_QUEUE_DEPTH = "PYROBIRD_CONVERT_QUEUE_DEPTH"
+CFG_PREFETCH_DEPTH = "PYROBIRD_PREFETCH_DEPTH"
+CFG_PREFETCH_BUDGET_MB = "PYROBIRD_PREFETCH_BUDGET_MB"
+CFG_REMOTE_CACHE_DIR = "PYROBIRD_REMOTE_CACHE_DIR"
+CFG_REMOTE_CACHE_SIZE_MB = "PYROBIRD_REMOTE_CACHE_SIZE_MB"
+CFG_REMOTE_CACHE_BLOCK_KB = "PYROBIRD_REMOTE_CACHE_BLOCK_KB"
+CFG_REMOTE_CONNECTIONS_PER_HOST = "PYROBIRD_REMOTE_CONNECTIONS_PER_HOST"
+CFG_REMOTE_PARALLEL_REQUESTS = "PYROBIRD_REMOTE_PARALLEL_REQUESTS"
+CFG_REMOTE_COALESCE = "PYROBIRD_REMOTE_COALESCE"
+CFG_REMOTE_COALESCE_GAP_KB = "PYROBIRD_REMOTE_COALESCE_GAP_KB"
+CFG_REMOTE_TIMEOUT = "PYROBIRD_REMOTE_TIMEOUT"
+CFG_STATIC_COMPRESS_ON_REQUEST = "PYROBIRD_STATIC_COMPRESS_ON_REQUEST"
+CFG_SERVER_TIMING = "PYROBIRD_SERVER_TIMING"
+CFG_METRICS = "PYROBIRD_METRICS"
+CFG_CALO_MIN_ENERGY = "PYROBIRD_CALO_MIN_ENERGY"
+CFG_CALO_MAX_HITS = "PYROBIRD_CALO_MAX_HITS"
+CFG_LOD = "PYROBIRD_LOD"
+CFG_LOD_VOXEL_SIZE = "PYROBIRD_LOD_VOXEL_SIZE"
+CFG_LOD_MAX_HITS = "PYROBIRD_LOD_MAX_HITS"
 
 # Get
 flask_app.config[CFG_CORS_IS_ALLOWED] = str(os.environ.get(CFG_CORS_IS_ALLOWED, '')).lower() in ('1', 'true')
+flask_app.config[CFG_FILE_CACHE_SIZE] = int(os.environ.get(CFG_FILE_CACHE_SIZE, 8))
+flask_app.config[CFG_FILE_CACHE_IDLE_TIMEOUT] = float(os.environ.get(CFG_FILE_CACHE_IDLE_TIMEOUT, 300))
+flask_app.config[CFG_RESULT_CACHE_SIZE_MB] = float(os.environ.get(CFG_RESULT_CACHE_SIZE_MB, 256))
+flask_app.config[CFG_RESULT_CACHE_DIR] = os.environ.get(CFG_RESULT_CACHE_DIR, '')
+flask_app.config[CFG_RESULT_CACHE_DIR_SIZE_MB] = float(os.environ.get(CFG_RESULT_CACHE_DIR_SIZE_MB, 4096))
+flask_app.config[CFG_SERVE_WORKERS] = int(os.environ.get(CFG_SERVE_WORKERS, 1))
+flask_app.config[CFG_CONVERT_WORKERS] = int(os.environ.get(CFG_CONVERT_WORKERS, 0))
+flask_app.config[CFG_CONVERT_QUEUE_DEPTH] = int(os.environ.get(CFG_CONVERT_QUEUE_DEPTH, 4))
+flask_app.config[CFG_PREFETCH_DEPTH] = int(os.environ.get(CFG_PREFETCH_DEPTH, 0))
+flask_app.config[CFG_PREFETCH_BUDGET_MB] = float(os.environ.get(CFG_PREFETCH_BUDGET_MB, 64))
+flask_app.config[CFG_REMOTE_CACHE_DIR] = os.environ.get(CFG_REMOTE_CACHE_DIR, '')
+flask_app.config[CFG_REMOTE_CACHE_SIZE_MB] = float(os.environ.get(CFG_REMOTE_CACHE_SIZE_MB, 10240))
+flask_app.config[CFG_REMOTE_CACHE_BLOCK_KB] = int(os.environ.get(CFG_REMOTE_CACHE_BLOCK_KB, 1024))
+flask_app.config[CFG_REMOTE_CONNECTIONS_PER_HOST] = int(os.environ.get(CFG_REMOTE_CONNECTIONS_PER_HOST, 16))
+flask_app.config[CFG_REMOTE_PARALLEL_REQUESTS] = int(os.environ.get(CFG_REMOTE_PARALLEL_REQUESTS, 32))
+flask_app.config[CFG_REMOTE_COALESCE] = str(os.environ.get(CFG_REMOTE_COALESCE, 'true')).lower() in ('1', 'true')
+flask_app.config[CFG_REMOTE_COALESCE_GAP_KB] = int(os.environ.get(CFG_REMOTE_COALESCE_GAP_KB, 32))
+flask_app.config[CFG_REMOTE_TIMEOUT] = float(os.environ.get(CFG_REMOTE_TIMEOUT, 60))
+flask_app.config[CFG_STATIC_COMPRESS_ON_REQUEST] = str(os.environ.get(CFG_STATIC_COMPRESS_ON_REQUEST, 'true')).lower() in ('1', 'true')
+flask_app.config[CFG_SERVER_TIMING] = str(os.environ.get(CFG_SERVER_TIMING, 'true')).lower() in ('1', 'true')
+flask_app.config[CFG_METRICS] = str(os.environ.get(CFG_METRICS, '')).lower() in ('1', 'true')
+flask_app.config[CFG_CALO_MIN_ENERGY] = float(os.environ.get(CFG_CALO_MIN_ENERGY, 0))
+flask_app.config[CFG_CALO_MAX_HITS] = int(os.environ.get(CFG_CALO_MAX_HITS, 0))
+flask_app.config[CFG_LOD] = os.environ.get(CFG_LOD, '')
+flask_app.config[CFG_LOD_VOXEL_SIZE] = float(os.environ.get(CFG_LOD_VOXEL_SIZE, 10))
+flask_app.config[CFG_LOD_MAX_HITS] = int(os.environ.get(CFG_LOD_MAX_HITS, 20000))
+
+# Streaming modes of the convert endpoint
+STREAM_NDJSON = "ndjson"
+STREAM_JSON = "json"
+STREAM_MODES = (STREAM_NDJSON, STREAM_JSON)
+NDJSON_MIME_TYPE = "application/x-ndjson"
+
+# Disk cache of remote files blocks. Created on the first use from the app config
+_remote_block_cache = None
+
+
+def remote_block_cache_options():
+    """Returns RemoteBlockCache arguments from the app config or None if the cache is disabled"""
+    cache_dir = flask_app.config.get(CFG_REMOTE_CACHE_DIR)
+    if not cache_dir:
+        return None
+    return {
+        "path": cache_dir,
+        "max_bytes": int(flask_app.config.get(CFG_REMOTE_CACHE_SIZE_MB, 10240) * 1024 * 1024),
+        "block_size": int(flask_app.config.get(CFG_REMOTE_CACHE_BLOCK_KB, 1024) * 1024),
+    }
+
+
+def get_remote_block_cache():
+    """Returns the disk cache of remote files blocks or None if it is disabled"""
+    global _remote_block_cache
+    if _remote_block_cache is None:
+        options = remote_block_cache_options()
+        if options is not None:
+            _remote_block_cache = RemoteBlockCache(**options)
+    return _remote_block_cache
+
+
+def reset_remote_block_cache():
+    """Forgets the remote blocks cache. Stored blocks are kept on disk"""
+    global _remote_block_cache, _remote_source_pool
+    _remote_block_cache = None
+    # The pool reads through the block cache
+    _remote_source_pool = None
+
+
+# Source options of remote files shared by all requests. Created on the first use from the app config
+_remote_source_pool = None
+
+
+def remote_source_options():
+    """Returns RemoteSourcePool arguments (without block cache) from the app config"""
+    return {
+        "connections_per_host": flask_app.config.get(CFG_REMOTE_CONNECTIONS_PER_HOST, 16),
+        "parallel_requests": flask_app.config.get(CFG_REMOTE_PARALLEL_REQUESTS, 32),
+        "coalesce": flask_app.config.get(CFG_REMOTE_COALESCE, True),
+        "coalesce_gap": int(flask_app.config.get(CFG_REMOTE_COALESCE_GAP_KB, 32) * 1024),
+        "timeout": flask_app.config.get(CFG_REMOTE_TIMEOUT, 60),
+    }
+
+
+def get_remote_source_pool():
+    """Returns the remote sources pool that opens files for convert requests"""
+    global _remote_source_pool
+    if _remote_source_pool is None:
+        _remote_source_pool = RemoteSourcePool(block_cache=get_remote_block_cache(), **remote_source_options())
+    return _remote_source_pool
+
+
+def reset_remote_source_pool():
+    """The pool is recreated with the current config on the next use"""
+    global _remote_source_pool
+    _remote_source_pool = None
+
+
+# Open files cache. Created on the first use from the app config
+_file_cache = None
+
+
+def get_file_cache():
+    """Returns the cache of open uproot files, creating it according to the app config"""
+    global _file_cache
+    if _file_cache is None:
+        _file_cache = OpenFileCache(
+            max_size=flask_app.config.get(CFG_FILE_CACHE_SIZE, 8),
+            idle_timeout=flask_app.config.get(CFG_FILE_CACHE_IDLE_TIMEOUT, 300),
+            opener=get_remote_source_pool().open)
+    return _file_cache
+
+
+def reset_file_cache():
+    """Closes all cached files. The cache is recreated with the current config on the next use"""
+    global _file_cache
+    if _file_cache is not None:
+        _file_cache.clear()
+    _file_cache = None
+
+
+# Converted events cache. Created on the first use from the app config
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Returns the cache of converted events, creating it according to the app config"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            disk_store = None
+            cache_dir = flask_app.config.get(CFG_RESULT_CACHE_DIR)
+            if cache_dir:
+                disk_size_mb = flask_app.config.get(CFG_RESULT_CACHE_DIR_SIZE_MB, 4096)
+                disk_store = DiskResultStore(cache_dir, max_bytes=int(disk_size_mb * 1024 * 1024),
+                                             workers=flask_app.config.get(CFG_SERVE_WORKERS, 1))
+            size_mb = flask_app.config.get(CFG_RESULT_CACHE_SIZE_MB, 256)
+            _result_cache = EventResultCache(max_bytes=int(size_mb * 1024 * 1024), disk_store=disk_store)
+        return _result_cache
+
+
+def reset_result_cache():
+    """Drops converted events from memory. The cache is recreated with the current config on the next use"""
+    global _result_cache
+    # Prefetcher stores events to the current cache
+    reset_prefetcher()
+    with _result_cache_lock:
+        if _result_cache is not None:
+            _result_cache.clear()
+        _result_cache = None
+
+
+# Pool of conversion processes. Created on the first use from the app config, None if conversion is in-thread
+_convert_pool = None
+_convert_pool_lock = threading.Lock()
+
+
+def get_convert_pool():
+    """Returns the pool of conversion processes or None if events are converted on request threads"""
+    global _convert_pool
+    workers = flask_app.config.get(CFG_CONVERT_WORKERS, 0)
+    if not workers:
+        return None
+    with _convert_pool_lock:
+        if _convert_pool is None:
+            _convert_pool = ConvertPool(
+                workers,
+                max_queue_depth=flask_app.config.get(CFG_CONVERT_QUEUE_DEPTH, 4),
+                file_cache_size=flask_app.config.get(CFG_FILE_CACHE_SIZE, 8),
+                file_cache_idle_timeout=flask_app.config.get(CFG_FILE_CACHE_IDLE_TIMEOUT, 300),
+                block_cache_options=remote_block_cache_options(),
+                source_options=remote_source_options())
+        return _convert_pool
+
+
+def reset_convert_pool():
+    """Stops conversion processes. The pool is recreated with the current config on the next use"""
+    global _convert_pool
+    with _convert_pool_lock:
+        if _convert_pool is not None:
+            _convert_pool.shutdown(wait=False)
+        _convert_pool = None
+
+
+# Background prefetch of neighbouring events. Created on the first use, None if disabled
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """Returns the prefetcher of neighbouring events or None if prefetch is disabled"""
+    global _prefetcher
+    depth = flask_app.config.get(CFG_PREFETCH_DEPTH, 0)
+    if not depth:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            budget_mb = flask_app.config.get(CFG_PREFETCH_BUDGET_MB, 64)
+            _prefetcher = Prefetcher(_prefetch_file_entries, get_result_cache(), depth=depth,
+                                     max_bytes=int(budget_mb * 1024 * 1024), single_flight=_single_flight,
+                                     is_busy=_is_convert_pool_busy)
+        return _prefetcher
+
+
+def reset_prefetcher():
+    """Cancels prefetch. The prefetcher is recreated with the current config on the next use"""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is not None:
+            _prefetcher.shutdown(wait=False)
+        _prefetcher = None
+
+
+# Query argument and cookie that identify the client of prefetch
+PREFETCH_CLIENT_ARG = "client"
+PREFETCH_CLIENT_COOKIE = "pyrobird_client"
+
+
+def _prefetch_client_id(filename):
+    """
+    Returns the key of the client prefetch state for the file.
+
+    Clients behind a reverse proxy have the same address, so the client is identified by
+    the 'client' query argument or by the cookie that is set on its first convert response.
+    Clients without cookies (e.g. scripts) should pass the argument, otherwise each request is a new client.
+    """
+    client = request.args.get(PREFETCH_CLIENT_ARG) or request.cookies.get(PREFETCH_CLIENT_COOKIE)
+    if not client:
+        client = uuid.uuid4().hex
+
+        @after_this_request
+        def set_client_cookie(response):
+            response.set_cookie(PREFETCH_CLIENT_COOKIE, client, httponly=True, samesite="Lax")
+            return response
+
+    return f"{client}|{filename}"
 
 
 class ExcludeAPIConverter(BaseConverter):
@@ -170,6 +452,88 @@ def download_file(filename=None):
         abort(404)  # Return 404 if the file does not exist
 
 
+def _resolve_input_file(filename):
+    """
+    Checks that the file can be opened and returns its full path.
+
+    Remote files (starting with http://, https://, root://) are returned as is.
+    Relative local paths are combined with PYROBIRD_DOWNLOAD_PATH.
+    Aborts the request with 403 if user can't access the file and 404 if it doesn't exist.
+    """
+
+    # Check if filename is a remote URL or root://
+    is_remote = is_remote_path(filename)
+
+    # If not remote, treat it as local file
+    if not is_remote:
+        # If it is relative, combine it with DOWNLOAD_PATH
+        if not os.path.isabs(filename):
+            download_path = flask.current_app.config.get(CFG_DOWNLOAD_PATH)
+            if not download_path:
+                download_path = os.getcwd()
+
+            # Normalize the path
+            download_path = os.path.abspath(download_path)
+
+            # Combine the file path
+            filename = os.path.join(download_path, filename)
+
+        # All checks and flags that user can access the file
+        if not _can_user_download_file(filename):
+            abort(403)  # Forbidden
+
+        # Check if the file exists and is a file
+        if not (os.path.exists(filename) and os.path.isfile(filename)):
+            logger.warning(f"Cannot open file. File does not exist")
+            abort(404)  # Not Found
+
+    return filename
+
+
+@flask_app.route('/api/v1/collections/<string:file_type>', methods=['GET'])
+@flask_app.route('/api/v1/collections/<string:file_type>/<path:filename>', methods=['GET'])
+@compress.compressed()
+def list_collections(filename=None, file_type="edm4eic"):
+    """
+    Returns podio collections of the file 'events' tree: their types, data members and relations.
+
+    The tree is scanned once per file, next requests take the collections map from the cache.
+
+    Parameters
+    ----------
+    filename - Name or URL of the file to open
+    file_type - String identifying file type: "edm4hep" or "edm4eic" or else...
+    """
+    from pyrobird.podio import get_events_schema
+
+    if not filename:
+        filename = request.args.get('filename')
+        if not filename:
+            filename = request.args.get('f')
+            if not filename:
+                abort(400, description="Filename not provided.")
+
+    filename = _resolve_input_file(unquote(filename))
+
+    try:
+        file_lease = get_file_cache().acquire(filename)
+    except Exception as e:
+        logger.error(f"Error opening file {filename}: {e}")
+        abort(500, description="Error opening file.")
+
+    with file_lease:
+        if 'events' not in file_lease.file:
+            logger.error(f"'events' tree not found in file {filename}")
+            abort(500, description="'events' tree not found in file.")
+
+        tree = file_lease.tree('events')
+        result = get_events_schema(tree).to_dict()
+        result["source"] = filename
+        result["entries"] = tree.num_entries
+
+    return jsonify(result)
+
+
 @flask_app.route('/api/v1/convert/<string:file_type>/<string:entries>', methods=['GET'])
 @flask_app.route('/api/v1/convert/<string:file_type>/<string:entries>/<path:filename>', methods=['GET'])
 @compress.compressed()
@@ -185,11 +549,13 @@ def open_edm4eic_file(filename=None, file_type="edm4eic", entries="0"):
     filename - Name or URL of the file to open
     file_type - String identifying file type: "edm4hep" or "edm4eic" or else...
     entries - List of entries, May be one entry, range or comma separated list
+
+    Stage durations are sent in Server-Timing header. With timings=1 argument each collection is measured
+    too and all timings are added to origin["timings"].
     """
 
     start_time = time.perf_counter()
-    import uproot
-    from pyrobird.edm4eic import edm4eic_to_dex_dict
+    timings = StageTimings(per_collection=request.args.get('timings', '').lower() in ('1', 'true'))
 
     # Decode the filename
     # Retrieve the filename from query parameters
@@ -209,110 +575,412 @@ def open_edm4eic_file(filename=None, file_type="edm4eic", entries="0"):
         # Return an error response if the event_numbers string is invalid
         return str(e), 400
 
-    # Check if filename is a remote URL or root://
-    is_remote = any(filename.startswith(prefix) for prefix in ['http://', 'https://', 'root://'])
+    filename = _resolve_input_file(filename)
 
-    # If not remote, treat it as local file
-    if not is_remote:
-        # If it is relative, combine it with DOWNLOAD_PATH
-        if not os.path.isabs(filename):
-            download_path = flask.current_app.config.get(CFG_DOWNLOAD_PATH)
-            if not download_path:
-                download_path = os.getcwd()
+    # Requested collections (default collections if not given)
+    collections = _parse_collections(request.args.get('collections', ''))
 
-            # Normalize the path
-            download_path = os.path.abspath(download_path)
+    # Calorimeter hits energy threshold, top-N cap and LOD (server defaults if not given)
+    try:
+        options = _convert_options()
+    except ValueError as e:
+        return {"error": str(e)}, 400
 
-            # Combine the file path
-            filename = os.path.join(download_path, filename)
+    # Group encoding: DEX 0.04 rows or DEX 0.05 columnar
+    dex_format = request.args.get('format', FORMAT_ROWS)
+    if dex_format not in DEX_FORMATS:
+        return {"error": f"Unknown format '{dex_format}'. Supported formats: {', '.join(DEX_FORMATS)}"}, 400
 
-        # All checks and flags that user can access the file
-        if not _can_user_download_file(filename):
-            abort(403)  # Forbidden
+    # Events may be streamed one by one as NDJSON lines or incrementally written JSON document
+    stream_mode = request.args.get('stream', '')
+    if not stream_mode and request.accept_mimetypes.best == NDJSON_MIME_TYPE:
+        stream_mode = STREAM_NDJSON
+    if stream_mode and stream_mode not in STREAM_MODES:
+        return {"error": f"Unknown stream mode '{stream_mode}'. Supported modes: {', '.join(STREAM_MODES)}"}, 400
 
-        # Check if the file exists and is a file
-        if not (os.path.exists(filename) and os.path.isfile(filename)):
-            logger.warning(f"Cannot open file. File does not exist")
-            abort(404)  # Not Found
+    # Binary DEX container if the client prefers it to JSON (always has columnar groups)
+    is_binary = not stream_mode and _accepts_dex_binary()
+    if is_binary:
+        dex_format = DEX_BINARY_FORMAT
 
     # At this point, filename is either a permitted local file or a remote file
     try:
-        # Open the file with uproot
-        file = uproot.open(filename)
-    except Exception as e:
+        identity = file_identity(filename)
+    except OSError as e:
         logger.error(f"Error opening file {filename}: {e}")
         abort(500, description="Error opening file.")
+    timings.add("resolve", (time.perf_counter() - start_time) * 1000)
+
+    # Take already converted events from the cache
+    result_cache = get_result_cache()
+    event_keys = {entry: make_event_key(identity, entry, collections, CONVERTER_VERSION, dex_format, options)
+                  for entry in entries_index_list}
+    fragments = {}
+    with timings.stage("cache"):
+        for entry, key in event_keys.items():
+            data = result_cache.get(key)
+            if data is not None:
+                fragments[entry] = data
+    cache_hits = len(fragments)
+    coalesced = 0
+
+    if len(fragments) < len(event_keys):
+        # Extract the event data of entries that are not cached.
+        # Streamed events are converted while the response is sent, here the file is only checked
+        missing_entries = sorted(set(entries_index_list) - fragments.keys())
+        try:
+            if stream_mode:
+                total_num_entries, converted = _convert_file_entries(filename, [], collections, dex_format, timings,
+                                                                     options)
+            else:
+                total_num_entries, converted, coalesced = _convert_entries_single_flight(
+                    filename, missing_entries, event_keys, collections, dex_format, timings, options)
+        except ConvertPoolBusy as e:
+            logger.warning(f"Conversion workers are busy, rejecting entries='{entries}' of {filename}")
+            return {"error": "Server is busy converting other events, retry later."}, 503, {"Retry-After": str(e.retry_after)}
+        except ConvertError as e:
+            if e.status >= 500:
+                abort(e.status, description=e.message)
+            return {"error": e.message}, e.status
+
+        # Do we have valid entries?
+        existing_index_list = []
+        for entry_index in entries_index_list:
+            if entry_index > total_num_entries - 1:
+                err_msg = f"For entries='{entries}' entry index={entry_index} is outside of tree num_entries={total_num_entries}"
+                logger.warning(err_msg)
+                #return {"error": err_msg}, 400
+            else:
+                existing_index_list.append(entry_index)
 
-    # Check if 'events' tree exists in the file
-    if 'events' not in file:
-        logger.error(f"'events' tree not found in file {filename}")
-        abort(500, description="'events' tree not found in file.")
-
-    tree = file['events']
-    total_num_entries = tree.num_entries
-
-    # Do we have valid entries?
-    existing_index_list = []
-    for entry_index in entries_index_list:
-        if entry_index > total_num_entries - 1:
-            err_msg = f"For entries='{entries}' entry index={entry_index} is outside of tree num_entries={total_num_entries}"
-            logger.warning(err_msg)
-            #return {"error": err_msg}, 400
-        else:
-            existing_index_list.append(entry_index)
-
-    # Do we have entries AT ALL?
-    if not existing_index_list:
-        err_msg = f"For entries='{entries}' there are no entries to process!"
-        logger.error(err_msg)
-        return {"error": err_msg}, 400
-
-    entries_index_list = existing_index_list
+        # Do we have entries AT ALL?
+        if not existing_index_list:
+            err_msg = f"For entries='{entries}' there are no entries to process!"
+            logger.error(err_msg)
+            return {"error": err_msg}, 400
 
-    try:
-        # Extract the event data
-        event = edm4eic_to_dex_dict(tree, entries_index_list)
-    except Exception as e:
-        # Log detailed error server-side, return generic message to client
-        logger.error(f"Error processing events {entries} from file {filename}: {e}")
-        return {"error": "Error processing events from file."}, 400
+        entries_index_list = existing_index_list
+        fragments.update(converted)
 
     # This function conversion time to milliseconds
     elapsed_time_ms = (time.perf_counter() - start_time) * 1000
 
     # Set origin info
-    event["origin"] = {
+    origin = {
         "source": filename,
         "latency": elapsed_time_ms,
+        "cache_hits": cache_hits,
+        "coalesced": coalesced,
         "by": "Pyrobird Flask server"
     }
+    if timings.per_collection:
+        origin["timings"] = timings.to_dict()
+
+    server_metrics = get_metrics()
+    if server_metrics is not None:
+        server_metrics.convert_events.inc(("cache",), cache_hits)
+        server_metrics.convert_events.inc(("coalesced",), coalesced)
+        server_metrics.convert_events.inc(("converted",), len(entries_index_list) - cache_hits - coalesced)
+
+    if flask_app.config.get(CFG_SERVER_TIMING):
+        _add_server_timing(timings, start_time, filename, entries)
+
+    # Convert the next events in background, while the user looks at these
+    prefetcher = get_prefetcher()
+    if prefetcher is not None:
+        prefetcher.on_request(_prefetch_client_id(filename), filename, entries_index_list,
+                              lambda entry: make_event_key(identity, entry, collections, CONVERTER_VERSION, dex_format,
+                                                           options),
+                              collections, dex_format, options)
+
+    version = DEX_VERSION if dex_format == FORMAT_ROWS else DEX_COLUMNAR_VERSION
+    if stream_mode:
+        events_stream = _stream_events(stream_mode, filename, origin, version, entries_index_list,
+                                       fragments, event_keys, collections, dex_format, options)
+        mimetype = NDJSON_MIME_TYPE if stream_mode == STREAM_NDJSON else "application/json"
+        response = flask_app.response_class(stream_with_context(events_stream), mimetype=mimetype)
+        response.vary.add("Accept")
+        response.cache_control.no_cache = True
+        # Ask proxies (e.g. nginx) to pass the events as soon as they are ready
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    # Return the JSON data assembled from per event fragments
+    event_fragments = [fragments[entry] for entry in entries_index_list]
+    with timings.stage("response"):
+        if is_binary:
+            body = _dex_binary_bytes(origin, event_fragments, version)
+            response = flask_app.response_class(body, mimetype=DEX_BINARY_MIME_TYPE)
+        else:
+            body = _dex_json_bytes(origin, event_fragments, version)
+            response = flask_app.response_class(body, mimetype="application/json")
+    response.vary.add("Accept")
 
-    # Return the JSON data
-    return jsonify(event)
+    # The same events of the same file content are always converted the same way,
+    # so browsers can revalidate the response by the event keys
+    etag_source = ",".join(event_keys[entry] for entry in entries_index_list)
+    response.set_etag(hashlib.sha256(etag_source.encode("utf-8")).hexdigest(), weak=True)
+    if identity[0] == "file":
+        response.last_modified = datetime.datetime.fromtimestamp(identity[2] / 1e9, tz=datetime.timezone.utc)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
-@flask_app.route('/assets/config.jsonc', methods=['GET'])
-def asset_config():
-    """Returns asset configuration file.
+def _add_server_timing(timings, start_time, filename, entries):
+    """
+    Adds Server-Timing header with the stages to the response of this request.
+    Registered after flask-compress compressor of the view, so the time till then is "compress" stage
+    """
+    view_end_time = time.perf_counter()
 
-    It reads out existing file adding server info
+    @after_this_request
+    def add_server_timing_header(response):
+        end_time = time.perf_counter()
+        timings.add("compress", (end_time - view_end_time) * 1000)
+        timings.add("total", (end_time - start_time) * 1000)
+        response.headers["Server-Timing"] = timings.server_timing()
+        if flask_app.config.get(CFG_CORS_IS_ALLOWED):
+            response.headers["Timing-Allow-Origin"] = "*"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Timings of entries='{entries}' of {filename}: {json.dumps(timings.to_dict())}")
+        return response
+
+
+def _parse_collections(collections_str):
+    """Parses comma separated list of collections. Returns None if no collections are given"""
+    collections = [x.strip() for x in collections_str.split(',') if x.strip()]
+    return collections if collections else None
+
+
+def _convert_options():
     """
-    config_path = flask_app.config.get(CFG_FIREBIRD_CONFIG_PATH)
-    if not config_path:
-        config_path = 'assets/config.jsonc'
-    config_dict = {}
+    Returns conversion options from the request arguments and the app config or None if all are default.
+    Raises ValueError for invalid values
+    """
+    try:
+        min_energy = float(request.args.get(OPTION_CALO_MIN_ENERGY, flask_app.config.get(CFG_CALO_MIN_ENERGY) or 0))
+        max_hits = int(request.args.get(OPTION_CALO_MAX_HITS, flask_app.config.get(CFG_CALO_MAX_HITS) or 0))
+    except ValueError:
+        raise ValueError(f"{OPTION_CALO_MIN_ENERGY} must be a number and {OPTION_CALO_MAX_HITS} an integer")
+    if not math.isfinite(min_energy) or max_hits < 0:
+        raise ValueError(f"{OPTION_CALO_MIN_ENERGY} must be finite and {OPTION_CALO_MAX_HITS} not negative")
+
+    options = {}
+    if min_energy:
+        options[OPTION_CALO_MIN_ENERGY] = min_energy
+    if max_hits:
+        options[OPTION_CALO_MAX_HITS] = max_hits
+    options.update(_lod_options())
+    return options or None
+
+
+def _lod_options():
+    """Returns LOD options from the request arguments and the app config. Only the used parameter is returned"""
+    lod = request.args.get(OPTION_LOD, flask_app.config.get(CFG_LOD) or '').strip().lower()
+    if not lod or lod == 'none':
+        return {}
+    if lod not in LOD_METHODS:
+        raise ValueError(f"{OPTION_LOD} must be one of: {', '.join(LOD_METHODS)}")
+
+    if lod == LOD_VOXEL:
+        try:
+            voxel_size = float(request.args.get(OPTION_LOD_VOXEL_SIZE, flask_app.config.get(CFG_LOD_VOXEL_SIZE)))
+        except (TypeError, ValueError):
+            raise ValueError(f"{OPTION_LOD_VOXEL_SIZE} must be a number")
+        if not math.isfinite(voxel_size) or voxel_size <= 0:
+            raise ValueError(f"{OPTION_LOD_VOXEL_SIZE} must be positive")
+        return {OPTION_LOD: lod, OPTION_LOD_VOXEL_SIZE: voxel_size}
+
+    try:
+        max_hits = int(request.args.get(OPTION_LOD_MAX_HITS, flask_app.config.get(CFG_LOD_MAX_HITS)))
+    except (TypeError, ValueError):
+        raise ValueError(f"{OPTION_LOD_MAX_HITS} must be an integer")
+    if max_hits < 0:
+        raise ValueError(f"{OPTION_LOD_MAX_HITS} must not be negative")
+    return {OPTION_LOD: lod, OPTION_LOD_MAX_HITS: max_hits}
+
+
+def _accepts_dex_binary():
+    """True if the request Accept header prefers binary DEX container to JSON"""
+    best_match = request.accept_mimetypes.best_match(["application/json", DEX_BINARY_MIME_TYPE])
+    return best_match == DEX_BINARY_MIME_TYPE
+
+
+def _dex_json_bytes(origin, event_fragments, version=DEX_VERSION):
+    """Assembles DEX JSON document from the origin info and serialized events"""
+    header = json.dumps({
+        "type": "firebird-dex-json",
+        "version": version,
+        "origin": origin,
+    }, separators=(",", ":"))
+
+    # header is '{...}', events are appended before the closing bracket
+    return header[:-1].encode("utf-8") + b',"events":[' + b",".join(event_fragments) + b"]}"
+
+
+def _convert_file_entries(filename, entries, collections, dex_format, timings=None, options=None, background=False):
+    """
+    Converts entries in the conversion pool or on this thread (see conversion.convert_file_entries).
+    Stages are added to timings (StageTimings) if it is given. options are conversion options.
+    background (prefetch) conversions don't take queue slots of requests in the pool
+
+    Returns
+    -------
+    tuple
+        (number of entries in the tree, dict of entry index => serialized DEX event)
+    """
+    server_metrics = get_metrics() if entries else None
+    start_time = time.perf_counter()
+    convert_pool = get_convert_pool()
+    if convert_pool is not None:
+        result = convert_pool.convert(filename, entries, collections, dex_format, timings=timings, options=options,
+                                      background=background)
+    else:
+        result = convert_file_entries(get_file_cache(), filename, entries, collections, dex_format, timings, options)
+    if server_metrics is not None:
+        server_metrics.convert_duration.observe(time.perf_counter() - start_time)
+    return result
+
+
+def _prefetch_file_entries(filename, entries, collections, dex_format, options=None):
+    """Converts prefetched entries in background"""
+    return _convert_file_entries(filename, entries, collections, dex_format, options=options, background=True)
+
+
+def _is_convert_pool_busy(filename):
+    """True if the conversion pool worker of the file has tasks. Prefetch waits for requests then"""
+    convert_pool = get_convert_pool()
+    return convert_pool is not None and not convert_pool.is_idle(filename)
+
+
+# Conversions in flight, shared by concurrent requests of the same events
+_single_flight = SingleFlight()
+
 
-    os_config_path = os.path.join(flask_app.static_folder, 'assets', 'config.jsonc')
-    logger.debug(f"Flask static folder: {flask_app.static_folder}")
-    logger.debug(f"os_config_path: {os_config_path}")
+def get_single_flight():
+    """Returns the registry of conversions in flight"""
+    return _single_flight
 
+
+def _convert_entries_single_flight(filename, entries, event_keys, collections, dex_format, timings=None, options=None):
+    """
+    Converts entries and puts them to the result cache. If a concurrent request converts
+    the same events (the same event keys), waits for it and takes its result instead.
+    Conversion stages and "wait" for the concurrent requests are added to timings if it is given
+
+    Returns
+    -------
+    tuple
+        (number of entries in the tree, dict of entry index => serialized DEX event,
+         number of events taken from concurrent requests)
+
+    Raises
+    ------
+    ConvertError, ConvertPoolBusy
+        If conversion of this or of the concurrent request fails
+    """
+    result_cache = get_result_cache()
+    key_entries = {event_keys[entry]: entry for entry in entries}
+    own, waiting = _single_flight.claim(key_entries)
+    num_entries = 0
+    converted = {}
     try:
-        # Open the config file and load its content using jsonc
-        with open(os_config_path, 'r') as file:
-            config_dict = json5.load(file)
-    except Exception as ex:
-        logger.error(f"error opening {config_path}: {ex}")
+        if own:
+            own_entries = sorted(key_entries[key] for key in own)
+            num_entries, converted = _convert_file_entries(filename, own_entries, collections, dex_format, timings,
+                                                           options)
+            for key in list(own):
+                data = converted.get(key_entries[key])
+                if data is not None:
+                    result_cache.put(key, data)
+                _single_flight.resolve(own, key, (num_entries, data))
+    except BaseException as e:
+        # Requests waiting for these events fail the same way
+        _single_flight.fail(own, e)
+        raise
+
+    with timed(timings if waiting else None, "wait"):
+        for key, future in waiting.items():
+            num_entries, data = future.result()
+            if data is not None:
+                converted[key_entries[key]] = data
+    return num_entries, converted, len(waiting)
+
+
+def _stream_chunks(entries, max_chunk_size=16):
+    """
+    Splits entries to chunks converted at once. The first chunk has one entry to send it fast,
+    next chunks grow up to max_chunk_size to read consecutive entries together
+    """
+    chunk_size = 1
+    position = 0
+    while position < len(entries):
+        yield entries[position:position + chunk_size]
+        position += chunk_size
+        chunk_size = min(chunk_size * 2, max_chunk_size)
+
 
+def _stream_events(stream_mode, filename, origin, version, entries, fragments, event_keys, collections, dex_format,
+                   options=None):
+    """
+    Yields the streamed DEX document. Events that are not in fragments are converted chunk by chunk.
+
+    In NDJSON mode the first line is the document header without events, then each line is an event.
+    In JSON mode the document is the same as not streamed one, written piece by piece.
+    If conversion fails in the middle, the error is written as the last line (NDJSON)
+    or as "error" field after events (JSON).
+    """
+    is_ndjson = stream_mode == STREAM_NDJSON
+    header = json.dumps({"type": "firebird-dex-json", "version": version, "origin": origin},
+                        separators=(",", ":")).encode("utf-8")
+    try:
+        yield header + b"\n" if is_ndjson else header[:-1] + b',"events":['
+
+        is_first = True
+        for chunk in _stream_chunks(entries):
+            chunk_fragments = {entry: fragments[entry] for entry in chunk if entry in fragments}
+            missing_entries = sorted(set(chunk) - chunk_fragments.keys())
+            if missing_entries:
+                _, converted, _ = _convert_entries_single_flight(filename, missing_entries, event_keys,
+                                                                 collections, dex_format, options=options)
+                chunk_fragments.update(converted)
+
+            for entry in chunk:
+                if is_ndjson:
+                    yield chunk_fragments[entry] + b"\n"
+                else:
+                    yield chunk_fragments[entry] if is_first else b"," + chunk_fragments[entry]
+                is_first = False
+
+        if not is_ndjson:
+            yield b"]}"
+    except Exception as e:
+        # Headers are sent already, so the error goes to the body
+        logger.error(f"Error streaming events from file {filename}: {e}")
+        error = "Error processing events from file."
+        if is_ndjson:
+            yield json.dumps({"error": error}).encode("utf-8") + b"\n"
+        else:
+            yield b'],"error":' + json.dumps(error).encode("utf-8") + b"}"
+
+
+def _dex_binary_bytes(origin, event_containers, version=DEX_COLUMNAR_VERSION):
+    """Assembles binary DEX container from the origin info and binary containers of events"""
+    from pyrobird.dex_binary import assemble_dex_binary
+    header = {
+        "type": "firebird-dex-json",
+        "version": version,
+        "origin": origin,
+    }
+    return assemble_dex_binary(header, event_containers)
+
+
+@flask_app.route('/assets/config.jsonc', methods=['GET'])
+def asset_config():
+    """Returns asset configuration file.
+
+    It reads out existing file adding server info. The file is parsed only when it changes
+    """
     host = 'localhost'
     port = 80
 
@@ -330,21 +998,50 @@ def asset_config():
       servedByPyrobird: boolean;
       apiAvailable: boolean;
     """
+    try:
+        int(port)
+    except ValueError:
+        return {"error": f"Invalid port in Host header: '{port}'"}, 400
+
+    dumps = flask_app.json.dumps
+    text = get_asset_config().response_text(host, port, request.scheme, flask_app.config.get(CFG_API_BASE_URL), dumps)
+    text = with_timestamp(text, datetime.datetime.now().isoformat(), dumps)
+    return flask_app.response_class(text + "\n", mimetype="application/json")
+
+
+# Parsed frontend config. Created on the first use from the app config
+_asset_config = None
+_asset_config_lock = threading.Lock()
+
+
+def asset_config_path():
+    """
+    Returns path of the frontend config file: PYROBIRD_FIREBIRD_CONFIG_PATH if set or assets/config.jsonc of static files.
+    Relative config path is taken from the working directory if such file exists, from the static folder otherwise
+    """
+    config_path = flask_app.config.get(CFG_FIREBIRD_CONFIG_PATH)
+    if not config_path:
+        return os.path.join(flask_app.static_folder, 'assets', 'config.jsonc')
+    if os.path.isabs(config_path) or os.path.isfile(config_path):
+        return os.path.abspath(config_path)
+    return os.path.join(flask_app.static_folder, config_path)
+
+
+def get_asset_config():
+    """Returns parsed frontend config for the current config path"""
+    global _asset_config
+    path = asset_config_path()
+    with _asset_config_lock:
+        if _asset_config is None or _asset_config.path != path:
+            logger.debug(f"Frontend config path: {path}")
+            _asset_config = AssetConfig(path)
+        return _asset_config
 
-    # Modify the fields in the dictionary as needed
-    config_dict['serverPort'] = int(port)
-    config_dict['serverHost'] = host
-    config_dict['servedByPyrobird'] = True
-    config_dict['apiAvailable'] = True
-    config_dict['timestamp'] = datetime.datetime.now().isoformat();
-    config_dict['userConfigs'] = {
-        "experiment.haha": 5
-    }
-    config_api_url = flask_app.config.get(CFG_API_BASE_URL)
-    config_dict['apiBaseUrl'] = config_api_url if config_api_url else f"{request.scheme}://{host}:{port}"
 
-    # Convert the updated dictionary to JSON
-    return jsonify(config_dict)
+def reset_asset_config():
+    """Forgets parsed frontend config"""
+    global _asset_config
+    _asset_config = None
 
 
 @flask_app.route('/')
@@ -354,29 +1051,74 @@ def index():
 
 @flask_app.route('/<notapipath:path>')
 def static_file(path):
-    """Serves flask static directory files"""
+    """Serves frontend files. Compressed siblings are sent if the client accepts them"""
+    static_assets = get_static_assets()
+    asset = static_assets.resolve(path)
+    if asset is not None:
+        try:
+            return _send_static_asset(asset, path)
+        except werkzeug.exceptions.NotFound:
+            # Files were replaced (e.g. the frontend was rebuilt), resolve the path again
+            static_assets.clear()
+            asset = static_assets.resolve(path)
+            if asset is not None:
+                return _send_static_asset(asset, path)
+
+    # What a bad situation
+    logger.error("'index.html' is not found!")
+
+    # Maybe it is developer problem?
+    if flask_app.debug:
+        logger.warning("You run in debug mode. If you are a developer, did you run ng_build_copy.py?")
+        return abort(404, "404 ERROR. index.html is not found. It might suggest frontend hasn't been built")
+    else:
+        return abort(404)
 
-    try:
-        return send_from_directory(static_dir, path)
-    except werkzeug.exceptions.NotFound as ex:
 
-        if path != "index.html":
+# Resolved frontend files. Created on the first use from the app config
+_static_assets = None
+_static_assets_lock = threading.Lock()
 
-            logger.debug("File is not found, assuming it is SPA and serving index.html")
-            return static_file("index.html")
-        else:
-            # What a bad situation
-            logger.error("'index.html' is not found!")
-
-            # Maybe it is developer problem?
-            from flask import abort
-            if flask_app.debug:
-                logger.warning("You run in debug mode. If you are a developer, did you run ng_build_copy.py?")
-                return abort(404, "404 ERROR. index.html is not found. It might suggest frontend hasn't been built")
-            else:
-                return abort(404)
+
+def get_static_assets():
+    """Returns the resolver of frontend files"""
+    global _static_assets
+    with _static_assets_lock:
+        if _static_assets is None:
+            _static_assets = StaticAssets(static_dir,
+                                          compress_on_request=flask_app.config.get(CFG_STATIC_COMPRESS_ON_REQUEST, True))
+        return _static_assets
 
 
+def reset_static_assets():
+    """Forgets resolved frontend files"""
+    global _static_assets
+    with _static_assets_lock:
+        _static_assets = None
+
+
+def _send_static_asset(asset, path):
+    """Sends the file or its compressed sibling with caching headers"""
+    file_path, encoding = asset.select(request.accept_encodings)
+    if asset.is_fallback:
+        logger.debug(f"File '{path}' is not found, assuming it is SPA route and serving index.html")
+    try:
+        response = send_file(file_path, mimetype=asset.mimetype, conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE if asset.is_hashed else None)
+    except FileNotFoundError:
+        raise werkzeug.exceptions.NotFound()
+
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if asset.siblings:
+        response.vary.add("Accept-Encoding")
+    if asset.is_hashed:
+        # The name changes when the content changes
+        response.cache_control.immutable = True
+    elif asset.is_fallback or path == INDEX_FILE:
+        # index.html refers to the current bundle files
+        response.cache_control.no_cache = True
+    return response
 
 
 @flask_app.route('/shutdown', methods=['GET', 'POST'])
@@ -403,6 +1145,108 @@ def shutdown():
     return 'Server shutting down...'
 
 
+# Metrics of the server. Created on the first request if PYROBIRD_METRICS is set
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class ServerMetrics:
+    """Metrics updated by the request hooks and the convert endpoint"""
+
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.requests = self.registry.counter(
+            "pyrobird_http_requests_total", "HTTP requests by endpoint, method and status",
+            ("endpoint", "method", "status"))
+        self.request_duration = self.registry.histogram(
+            "pyrobird_http_request_duration_seconds",
+            "Time till the response is ready (streamed bodies are sent after that) by endpoint", ("endpoint",))
+        self.response_bytes = self.registry.counter(
+            "pyrobird_http_response_bytes_total", "Bytes of responses with known length by endpoint", ("endpoint",))
+        self.convert_events = self.registry.counter(
+            "pyrobird_convert_events_total",
+            "Events sent by the convert endpoint by source: cache, converted or coalesced (from concurrent requests)",
+            ("source",))
+        self.convert_duration = self.registry.histogram(
+            "pyrobird_convert_duration_seconds", "Time to convert a batch of entries (including prefetch)")
+        self.registry.add_collector(_collect_server_stats)
+
+
+def _collect_server_stats():
+    """Metric families of caches and pools that exist (they are not created by scraping)"""
+    families = []
+    if _file_cache is not None:
+        families += stats_families("pyrobird_file_cache", _file_cache.stats(), ("hits", "misses", "evictions"),
+                                   "Open files cache")
+    if _result_cache is not None:
+        families += stats_families("pyrobird_result_cache", _result_cache.stats(), ("hits", "disk_hits", "misses"),
+                                   "Converted events cache")
+    if _remote_block_cache is not None:
+        families += stats_families("pyrobird_remote_cache", _remote_block_cache.stats(),
+                                   ("hits", "misses", "bytes_from_cache", "bytes_fetched"), "Remote files blocks cache")
+    if _convert_pool is not None:
+        families += stats_families("pyrobird_convert_pool", _convert_pool.stats(), ("submitted", "rejected"),
+                                   "Conversion worker processes")
+    if _prefetcher is not None:
+        families += stats_families("pyrobird_prefetch", _prefetcher.stats(),
+                                   ("prefetched", "used", "cancelled", "dropped", "busy"), "Prefetch of next events")
+    if _static_assets is not None:
+        families += stats_families("pyrobird_static", _static_assets.stats(), ("hits", "misses"),
+                                   "Resolved frontend files")
+    families += stats_families("pyrobird_single_flight", _single_flight.stats(), ("leaders", "shared"),
+                               "Conversions shared by concurrent requests")
+    return families
+
+
+def get_metrics():
+    """Returns ServerMetrics or None if metrics are disabled"""
+    global _metrics
+    if not flask_app.config.get(CFG_METRICS):
+        return None
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = ServerMetrics()
+        return _metrics
+
+
+def reset_metrics():
+    """Drops collected metrics"""
+    global _metrics
+    _metrics = None
+
+
+@flask_app.before_request
+def _metrics_before_request():
+    if flask_app.config.get(CFG_METRICS):
+        g.metrics_start_time = time.perf_counter()
+
+
+@flask_app.after_request
+def _metrics_after_request(response):
+    start_time = g.get("metrics_start_time")
+    if start_time is None:
+        return response
+    metrics = get_metrics()
+    if metrics is not None:
+        endpoint = request.endpoint or "not_found"
+        metrics.requests.inc((endpoint, request.method, str(response.status_code)))
+        metrics.request_duration.observe(time.perf_counter() - start_time, (endpoint,))
+        if response.content_length is not None and request.method != "HEAD":
+            metrics.response_bytes.inc((endpoint,), response.content_length)
+    return response
+
+
+@flask_app.route('/api/v1/metrics', methods=['GET'])
+def metrics():
+    """Returns server metrics in Prometheus text format. 404 if PYROBIRD_METRICS is not set"""
+    server_metrics = get_metrics()
+    if server_metrics is None:
+        abort(404)
+    response = flask_app.response_class(server_metrics.registry.render(), content_type=METRICS_CONTENT_TYPE)
+    response.cache_control.no_cache = True
+    return response
+
+
 def configure_flask_app(config=None):
     """Returns"""
     if config:
@@ -411,6 +1255,16 @@ def configure_flask_app(config=None):
         else:
             flask_app.config.from_object(config)
 
+    # Caches and the conversion pool are recreated with the new settings
+    reset_file_cache()
+    reset_remote_block_cache()
+    reset_remote_source_pool()
+    reset_static_assets()
+    reset_asset_config()
+    reset_metrics()
+    reset_result_cache()
+    reset_convert_pool()
+
     if flask_app.config:
         cfg_cors_allowed = flask_app.config.get(CFG_CORS_IS_ALLOWED)
         if cfg_cors_allowed:
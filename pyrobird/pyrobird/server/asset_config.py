@@ -0,0 +1,117 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Frontend config.jsonc served with the server fields.
+
+The frontend loads assets/config.jsonc on each page load. json5 parser is pure python and slow,
+so the file is parsed once and parsed again only when its modification time or size changes.
+Server fields (host, port, apiBaseUrl) are overlaid on a shallow copy of the parsed config.
+The JSON text is remembered per host, port, scheme and API URL. Only the timestamp is added per request.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import json5
+
+logger = logging.getLogger(__name__)
+
+
+class AssetConfig:
+    """
+    Parsed config.jsonc with remembered responses.
+
+    Parameters
+    ----------
+    path : str
+        Path of the config file. A missing or broken file gives empty config (the error is logged)
+    max_responses : int
+        Number of remembered response texts (different hosts or API URLs)
+    """
+
+    def __init__(self, path, max_responses=64):
+        self.path = path
+        self.max_responses = max_responses
+        self._lock = threading.Lock()
+        self._signature = None
+        self._base = {}
+        self._responses = OrderedDict()     # (host, port, scheme, api url) => JSON text
+        self.loads = 0
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def base(self):
+        """Returns parsed config. The file is parsed again if it has changed. Don't modify the result"""
+        signature = self._file_signature()
+        with self._lock:
+            if self.loads and signature == self._signature:
+                return self._base
+
+            base = {}
+            if signature is None:
+                logger.error(f"error opening {self.path}: file not found")
+            else:
+                try:
+                    with open(self.path, 'r') as file:
+                        base = json5.load(file)
+                except Exception as ex:
+                    logger.error(f"error opening {self.path}: {ex}")
+            self._base = base if isinstance(base, dict) else {}
+            self._signature = signature
+            self._responses.clear()
+            self.loads += 1
+            return self._base
+
+    def response_text(self, host, port, scheme, api_base_url, dumps):
+        """
+        Returns JSON text of the config with the server fields, without the timestamp.
+
+        Parameters
+        ----------
+        host, port, scheme
+            Of the request
+        api_base_url : str
+            Configured API base URL. If empty, the request address is used
+        dumps : callable
+            JSON serializer, e.g. flask_app.json.dumps
+        """
+        base = self.base()
+        key = (host, port, scheme, api_base_url)
+        with self._lock:
+            text = self._responses.get(key)
+            if text is not None:
+                self._responses.move_to_end(key)
+                return text
+
+        config_dict = dict(base)
+        config_dict.pop('timestamp', None)
+        config_dict['serverPort'] = int(port)
+        config_dict['serverHost'] = host
+        config_dict['servedByPyrobird'] = True
+        config_dict['apiAvailable'] = True
+        config_dict['userConfigs'] = {
+            "experiment.haha": 5
+        }
+        config_dict['apiBaseUrl'] = api_base_url if api_base_url else f"{scheme}://{host}:{port}"
+        text = dumps(config_dict)
+
+        with self._lock:
+            # Don't keep the text made from the config that was reloaded meanwhile
+            if base is self._base:
+                self._responses[key] = text
+                while len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+        return text
+
+
+def with_timestamp(text, timestamp, dumps):
+    """Adds "timestamp" field to the beginning of JSON object text (text is not empty object)"""
+    return '{"timestamp": ' + dumps(timestamp) + ', ' + text.lstrip()[1:]
@@ -0,0 +1,347 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Conversion of events tree entries for the convert endpoint.
+
+Entries are converted on the request thread by default. Conversion is CPU bound and holds the GIL,
+so concurrent requests may be converted by a pool of worker processes instead (ConvertPool).
+Each worker is a separate single process executor with its own open files cache.
+Requests for the same file go to the same worker, so the file stays open and its schema scanned there.
+"""
+
+import logging
+import multiprocessing
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from pyrobird.dex_columnar import FORMAT_ROWS
+from pyrobird.timing import StageTimings, timed
+
+logger = logging.getLogger(__name__)
+
+# Format name of binary DEX container events in the result cache keys
+DEX_BINARY_FORMAT = "binary"
+
+
+class ConvertError(Exception):
+    """
+    Conversion failed.
+
+    Parameters
+    ----------
+    message : str
+        Message that can be shown to the client (details are logged where the error happens)
+    status : int
+        HTTP status to respond with
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message, status)
+        self.message = message
+        self.status = status
+
+    def __str__(self):
+        return self.message
+
+
+class ConvertPoolBusy(Exception):
+    """All pool workers have full queues"""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+def serialize_event(event, dex_format=FORMAT_ROWS):
+    """Serializes DEX event dictionary to compact JSON bytes or binary container. Hits may be kept as NumPy arrays"""
+    if dex_format == DEX_BINARY_FORMAT:
+        from pyrobird.dex_binary import write_dex_binary
+        return write_dex_binary(event)
+    from pyrobird.dex_arrays import dex_to_json
+    return dex_to_json(event, separators=(",", ":")).encode("utf-8")
+
+
+def convert_events(tree, entries, collections=None, dex_format=FORMAT_ROWS, timings=None, options=None):
+    """
+    Converts entries of the events tree. Stages are measured if timings (StageTimings) is given.
+    options are conversion options of edm4eic_entries_to_dicts
+
+    Returns
+    -------
+    dict
+        entry index => serialized DEX event
+    """
+    from pyrobird.edm4eic import edm4eic_entries_to_dicts
+
+    # Binary container encodes the groups itself
+    groups_format = FORMAT_ROWS if dex_format == DEX_BINARY_FORMAT else dex_format
+    events = edm4eic_entries_to_dicts(tree, entries, collections=collections, as_arrays=True, dex_format=groups_format,
+                                      timings=timings, options=options)
+    with timed(timings, "serialize"):
+        return {entry: serialize_event(event, dex_format) for entry, event in zip(entries, events)}
+
+
+def convert_file_entries(file_cache, filename, entries, collections=None, dex_format=FORMAT_ROWS, timings=None,
+                         options=None):
+    """
+    Opens the file through the file cache and converts entries that exist in its events tree.
+
+    Parameters
+    ----------
+    file_cache : OpenFileCache
+        Cache of open files
+    filename : str
+        Local path or URL
+    entries : list of int
+        Entries to convert. Entries outside the tree are skipped. Empty list only checks the file
+    timings : pyrobird.timing.StageTimings, optional
+        Gets durations of "open" and conversion stages
+    options : dict, optional
+        Conversion options (see pyrobird.edm4eic.edm4eic_entries_to_dicts)
+
+    Returns
+    -------
+    tuple
+        (number of entries in the tree, dict of entry index => serialized DEX event)
+
+    Raises
+    ------
+    ConvertError
+        If the file can't be opened (status 500), has no events tree (500) or conversion fails (400)
+    """
+    open_start = time.perf_counter()
+    try:
+        # Take the open file from the cache or open it with uproot
+        file_lease = file_cache.acquire(filename)
+    except Exception as e:
+        logger.error(f"Error opening file {filename}: {e}")
+        raise ConvertError("Error opening file.", 500)
+
+    with file_lease:
+        # Check if 'events' tree exists in the file
+        if 'events' not in file_lease.file:
+            logger.error(f"'events' tree not found in file {filename}")
+            raise ConvertError("'events' tree not found in file.", 500)
+
+        tree = file_lease.tree('events')
+        num_entries = tree.num_entries
+        if timings is not None:
+            timings.add("open", (time.perf_counter() - open_start) * 1000)
+        existing_entries = [entry for entry in entries if entry < num_entries]
+        if not existing_entries:
+            return num_entries, {}
+
+        try:
+            return num_entries, convert_events(tree, existing_entries, collections, dex_format, timings, options)
+        except Exception as e:
+            # Log detailed error server-side, return generic message to client
+            logger.error(f"Error processing events {existing_entries} from file {filename}: {e}")
+            raise ConvertError("Error processing events from file.", 400)
+
+
+# Open files cache of a worker process
+_worker_file_cache = None
+
+
+def _init_worker(file_cache_size, file_cache_idle_timeout, block_cache_options=None, source_options=None):
+    global _worker_file_cache
+    from pyrobird.server.file_cache import OpenFileCache
+    from pyrobird.remote_cache import RemoteBlockCache
+    from pyrobird.remote_source import RemoteSourcePool
+
+    # Workers share the blocks directory with the server process
+    block_cache = RemoteBlockCache(**block_cache_options) if block_cache_options else None
+    source_pool = RemoteSourcePool(block_cache=block_cache, **(source_options or {}))
+    _worker_file_cache = OpenFileCache(max_size=file_cache_size, idle_timeout=file_cache_idle_timeout,
+                                       opener=source_pool.open)
+
+
+def _worker_convert(filename, entries, collections, dex_format, timings_mode=None, options=None):
+    """
+    Runs in a worker process. If timings_mode is given ("stages" or "collections"),
+    returns measured timings dictionary as the third element of the result
+    """
+    _worker_file_cache.evict_idle()
+    if timings_mode is None:
+        return convert_file_entries(_worker_file_cache, filename, entries, collections, dex_format, options=options)
+    timings = StageTimings(per_collection=timings_mode == "collections")
+    num_entries, converted = convert_file_entries(_worker_file_cache, filename, entries, collections, dex_format,
+                                                  timings, options)
+    return num_entries, converted, timings.to_dict()
+
+
+class ConvertPool:
+    """
+    Pool of worker processes that convert events.
+
+    Each worker is a single process executor. A file is always sent to the same worker
+    (selected by the file name hash), so the worker keeps it open. If that worker queue is full,
+    the least loaded worker takes the task. If all queues are full, ConvertPoolBusy is raised.
+
+    Background tasks (prefetch) don't take queue slots of requests: they are sent only to an idle
+    worker of the file (see is_idle), so a request waits behind at most one background task.
+
+    Parameters
+    ----------
+    workers : int
+        Number of worker processes
+    max_queue_depth : int
+        Maximum number of tasks queued or running per worker
+    file_cache_size : int
+        Size of open files cache of each worker
+    file_cache_idle_timeout : float
+        Idle timeout of open files cache of each worker, seconds
+    retry_after : int
+        Seconds to suggest the client to wait when the pool is busy
+    block_cache_options : dict, optional
+        Arguments of RemoteBlockCache that workers read remote files through
+    source_options : dict, optional
+        Arguments of RemoteSourcePool that workers open remote files with
+    """
+
+    def __init__(self, workers, max_queue_depth=4, file_cache_size=8, file_cache_idle_timeout=300.0, retry_after=2,
+                 block_cache_options=None, source_options=None):
+        if workers < 1:
+            raise ValueError(f"ConvertPool needs at least one worker, got {workers}")
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.retry_after = retry_after
+        self._initargs = (file_cache_size, file_cache_idle_timeout, block_cache_options, source_options)
+        # Spawned workers don't inherit locks held by other server threads at fork time
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._executors = [self._new_executor() for _ in range(workers)]
+        self._depths = [0] * workers
+        self._background = [0] * workers
+        self.submitted = 0
+        self.rejected = 0
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=1, mp_context=self._mp_context,
+                                   initializer=_init_worker, initargs=self._initargs)
+
+    @property
+    def workers(self):
+        return len(self._executors)
+
+    def _preferred_worker(self, filename):
+        return zlib.crc32(filename.encode("utf-8")) % len(self._executors)
+
+    def _select_worker(self, filename):
+        """Returns worker index for the file or None if all workers are busy. Lock must be held"""
+        preferred = self._preferred_worker(filename)
+        if self._depths[preferred] < self.max_queue_depth:
+            return preferred
+        least_loaded = min(range(len(self._executors)), key=lambda index: self._depths[index])
+        if self._depths[least_loaded] < self.max_queue_depth:
+            return least_loaded
+        return None
+
+    def _task_done(self, index, background=False):
+        with self._lock:
+            if background:
+                self._background[index] -= 1
+            else:
+                self._depths[index] -= 1
+
+    def is_idle(self, filename):
+        """True if the worker of the file has no tasks queued or running"""
+        with self._lock:
+            index = self._preferred_worker(filename)
+            return not self._depths[index] and not self._background[index]
+
+    def submit(self, filename, entries, collections=None, dex_format=FORMAT_ROWS, timings_mode=None, options=None,
+               background=False):
+        """
+        Submits conversion of file entries (see convert_file_entries).
+        Background tasks go to the worker of the file and are not counted in its queue depth
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future of (number of entries in the tree, dict of entry index => serialized DEX event).
+            If timings_mode is "stages" or "collections", the third element is StageTimings.to_dict() result
+
+        Raises
+        ------
+        ConvertPoolBusy
+            If all worker queues are full
+        """
+        with self._lock:
+            if background:
+                index = self._preferred_worker(filename)
+                self._background[index] += 1
+            else:
+                index = self._select_worker(filename)
+                if index is None:
+                    self.rejected += 1
+                    raise ConvertPoolBusy(self.retry_after)
+                self._depths[index] += 1
+            self.submitted += 1
+            executor = self._executors[index]
+
+        try:
+            future = executor.submit(_worker_convert, filename, entries, collections, dex_format, timings_mode,
+                                     options)
+        except BrokenProcessPool:
+            # The worker died (e.g. was killed by OOM killer). Replace it and try once more
+            logger.warning(f"Convert worker {index} is broken, restarting it")
+            with self._lock:
+                if self._executors[index] is executor:
+                    self._executors[index] = self._new_executor()
+                executor = self._executors[index]
+            try:
+                future = executor.submit(_worker_convert, filename, entries, collections, dex_format, timings_mode,
+                                         options)
+            except Exception:
+                self._task_done(index, background)
+                raise
+        except Exception:
+            self._task_done(index, background)
+            raise
+
+        future.add_done_callback(lambda _: self._task_done(index, background))
+        return future
+
+    def convert(self, filename, entries, collections=None, dex_format=FORMAT_ROWS, timeout=None, timings=None,
+                options=None, background=False):
+        """
+        Converts file entries in a worker process and waits for the result (see submit).
+        Stages measured in the worker are added to timings (StageTimings) if it is given
+        """
+        timings_mode = None
+        if timings is not None:
+            timings_mode = "collections" if timings.per_collection else "stages"
+        future = self.submit(filename, entries, collections, dex_format, timings_mode, options, background)
+        try:
+            result = future.result(timeout=timeout)
+        except BrokenProcessPool:
+            logger.error(f"Convert worker crashed while converting {entries} of {filename}")
+            raise ConvertError("Error processing events from file.", 500)
+        if timings is None:
+            return result
+        num_entries, converted, worker_timings = result
+        timings.update(worker_timings)
+        return num_entries, converted
+
+    def stats(self):
+        """Returns dictionary with pool counters"""
+        with self._lock:
+            return {
+                "workers": len(self._executors),
+                "max_queue_depth": self.max_queue_depth,
+                "queued": sum(self._depths),
+                "background": sum(self._background),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        """Stops worker processes"""
+        with self._lock:
+            executors = list(self._executors)
+        for executor in executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
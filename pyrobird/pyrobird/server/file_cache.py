@@ -0,0 +1,293 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+LRU cache of open uproot files and their trees.
+
+Opening a ROOT file reads the header, the streamers and the TTree metadata.
+For files served over xrootd or http it costs many round trips. The server
+keeps recently used files open, so stepping through events of one file
+only costs reading the baskets of the requested entries.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import fsspec.core
+
+from pyrobird.remote_cache import REMOTE_PREFIXES, file_validator, is_remote_path  # noqa: F401 (re-exported)
+
+logger = logging.getLogger(__name__)
+
+
+def remote_file_validator(url):
+    """Returns validator of a remote file (see pyrobird.remote_cache.file_validator) or None if it is unknown"""
+    try:
+        fs, fs_path = fsspec.core.url_to_fs(url)
+        return file_validator(fs.info(fs_path))
+    except Exception as ex:
+        logger.debug(f"Can't get info of {url}: {ex}")
+        return None
+
+
+def file_identity(path):
+    """
+    Returns the key that identifies the file content.
+
+    Local files are identified by real path, modification time and size,
+    so the file is reopened if it is overwritten. Remote files are identified by URL,
+    size and ETag or modification time if the protocol provides them.
+
+    Parameters
+    ----------
+    path : str
+        Local file path or URL
+
+    Returns
+    -------
+    tuple
+        Hashable file identity
+    """
+    if is_remote_path(path):
+        return ("url", path, remote_file_validator(path))
+
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return ("file", real_path, stat.st_mtime_ns, stat.st_size)
+
+
+class CachedFile:
+    """
+    Open uproot file with its already accessed trees.
+
+    Parameters
+    ----------
+    path : str
+        Local file path or URL as given by user
+    identity : tuple
+        File identity (see file_identity)
+    file : uproot.ReadOnlyDirectory
+        Open file
+    """
+
+    def __init__(self, path, identity, file):
+        self.path = path
+        self.identity = identity
+        self.file = file
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.is_evicted = False
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def tree(self, name="events"):
+        """Returns TTree object by name. Tree metadata is read only on the first call"""
+        with self._lock:
+            if name not in self._trees:
+                self._trees[name] = self.file[name]
+            return self._trees[name]
+
+    def close(self):
+        """Closes the file and drops its trees"""
+        self._trees.clear()
+        try:
+            self.file.close()
+        except Exception as ex:
+            logger.warning(f"Error closing file {self.path}: {ex}")
+
+
+class FileLease:
+    """
+    Use of the cached file by one request.
+
+    The file is not closed while it is leased, even if it is evicted from the cache.
+    Use as context manager or call release() when done.
+    """
+
+    def __init__(self, cache, cached_file):
+        self._cache = cache
+        self._cached_file = cached_file
+        self._is_released = False
+
+    @property
+    def file(self):
+        """Open uproot file"""
+        return self._cached_file.file
+
+    @property
+    def identity(self):
+        """Identity of the file content (see file_identity)"""
+        return self._cached_file.identity
+
+    def tree(self, name="events"):
+        """Returns TTree object by name"""
+        return self._cached_file.tree(name)
+
+    def release(self):
+        """Returns the file to the cache"""
+        if not self._is_released:
+            self._is_released = True
+            self._cache._release(self._cached_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class OpenFileCache:
+    """
+    Bounded LRU cache of open uproot files with idle timeout eviction.
+
+    Evicted files are closed explicitly. If an evicted file is still used
+    by a request, it is closed when the request releases it.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of open files kept. 0 disables caching: files are closed after each use
+    idle_timeout : float
+        Files not used for this number of seconds are closed. 0 or None disables idle eviction
+    opener : callable, optional
+        Function that opens a file by path. uproot.open by default
+    """
+
+    def __init__(self, max_size=8, idle_timeout=300.0, opener=None):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._opener = opener
+        self._files = OrderedDict()     # identity => CachedFile
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _open(self, path):
+        if self._opener is not None:
+            return self._opener(path)
+        import uproot
+        return uproot.open(path)
+
+    def acquire(self, path):
+        """
+        Returns the lease of the open file, opening it if it is not in the cache.
+
+        Parameters
+        ----------
+        path : str
+            Local file path or URL
+
+        Returns
+        -------
+        FileLease
+            Lease of the open file. It must be released after use
+        """
+        identity = file_identity(path)
+        now = time.monotonic()
+        to_close = []
+
+        with self._lock:
+            to_close.extend(self._pop_idle(now))
+            cached_file = self._files.get(identity)
+            if cached_file is not None:
+                self._files.move_to_end(identity)
+                cached_file.users += 1
+                cached_file.last_used = now
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        self._close_all(to_close)
+        if cached_file is not None:
+            return FileLease(self, cached_file)
+
+        # Open outside the lock, as it might take long for remote files
+        new_file = CachedFile(path, identity, self._open(path))
+
+        to_close = []
+        with self._lock:
+            cached_file = self._files.get(identity)
+            if cached_file is None:
+                # Older versions of the same local file are outdated
+                for other in list(self._files.values()):
+                    if other.path == path:
+                        to_close.extend(self._pop(other.identity))
+                cached_file = new_file
+                self._files[identity] = cached_file
+            else:
+                # Other request opened the same file meanwhile
+                to_close.append(new_file)
+            cached_file.users += 1
+            cached_file.last_used = time.monotonic()
+            to_close.extend(self._pop_over_size())
+
+        self._close_all(to_close)
+        return FileLease(self, cached_file)
+
+    def _release(self, cached_file):
+        with self._lock:
+            cached_file.users -= 1
+            cached_file.last_used = time.monotonic()
+            can_close = cached_file.is_evicted and cached_file.users == 0
+        if can_close:
+            self._close_all([cached_file])
+
+    def _pop(self, identity):
+        """Removes file from the cache. Returns list with the file if it can be closed now. Lock must be held"""
+        cached_file = self._files.pop(identity, None)
+        if cached_file is None:
+            return []
+        cached_file.is_evicted = True
+        self.evictions += 1
+        return [cached_file] if cached_file.users == 0 else []
+
+    def _pop_idle(self, now):
+        if not self.idle_timeout:
+            return []
+        to_close = []
+        for identity, cached_file in list(self._files.items()):
+            if cached_file.users == 0 and now - cached_file.last_used > self.idle_timeout:
+                to_close.extend(self._pop(identity))
+        return to_close
+
+    def _pop_over_size(self):
+        to_close = []
+        while len(self._files) > max(self.max_size, 0):
+            identity = next(iter(self._files))
+            to_close.extend(self._pop(identity))
+        return to_close
+
+    @staticmethod
+    def _close_all(cached_files):
+        for cached_file in cached_files:
+            logger.debug(f"Closing cached file {cached_file.path}")
+            cached_file.close()
+
+    def evict_idle(self):
+        """Closes files that have not been used longer than idle_timeout"""
+        with self._lock:
+            to_close = self._pop_idle(time.monotonic())
+        self._close_all(to_close)
+
+    def clear(self):
+        """Closes all files that are not used at the moment and removes all files from the cache"""
+        with self._lock:
+            to_close = []
+            for identity in list(self._files.keys()):
+                to_close.extend(self._pop(identity))
+        self._close_all(to_close)
+
+    def stats(self):
+        """Returns dictionary with cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._files),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
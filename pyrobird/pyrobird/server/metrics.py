@@ -0,0 +1,207 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Server metrics in Prometheus text exposition format.
+
+Counters and histograms are updated by the request hooks. Values that caches and pools already count
+(open files, cache hits, queued conversions) are taken from their stats() when metrics are scraped,
+so there is nothing to update on the request path for them.
+
+    registry = MetricsRegistry()
+    requests = registry.counter("pyrobird_http_requests_total", "Requests", ("endpoint", "status"))
+    requests.inc(("download_file", "200"))
+    registry.render()
+"""
+
+import math
+import threading
+
+# Exposition format version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request and conversion durations, seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Counter:
+    """
+    Monotonic counter with labels.
+
+    Parameters
+    ----------
+    name : str
+        Metric name, e.g. pyrobird_http_requests_total
+    help_text : str
+        Description shown in # HELP line
+    labelnames : tuple of str
+        Names of labels. Values are given as a tuple in the same order
+    """
+
+    metric_type = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        """Returns list of (name suffix, labels as list of (name, value), value)"""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [("", list(zip(self.labelnames, labels)), value) for labels, value in values]
+
+
+class Histogram:
+    """
+    Histogram of observed values with labels.
+
+    Parameters
+    ----------
+    name, help_text, labelnames
+        See Counter
+    buckets : tuple of float
+        Upper bounds of the buckets, increasing. +Inf bucket is added
+    """
+
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels => [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def count(self, labels=()):
+        with self._lock:
+            data = self._values.get(labels)
+            return data[-1] if data else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(data)) for labels, data in self._values.items())
+        result = []
+        for labels, data in values:
+            label_pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, data[:-2]):
+                cumulative += bucket_count
+                result.append(("_bucket", label_pairs + [("le", _format_value(float(bound)))], cumulative))
+            # Observations above the last bound are only in +Inf bucket
+            result.append(("_bucket", label_pairs + [("le", "+Inf")], data[-1]))
+            result.append(("_sum", label_pairs, data[-2]))
+            result.append(("_count", label_pairs, data[-1]))
+        return result
+
+
+def stats_families(prefix, stats, counter_keys=(), help_text=""):
+    """
+    Converts stats() dictionary of a cache or pool to metric families.
+
+    Numeric values become gauges named prefix_key. Keys in counter_keys become counters prefix_key_total.
+    Other values (paths, nested dictionaries) are skipped.
+
+    Returns
+    -------
+    list of tuple
+        (name, type, help text, [(labels, value)])
+    """
+    families = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        key_help = f"{help_text}: {key}" if help_text else ""
+        if key in counter_keys:
+            families.append((f"{prefix}_{key}_total", "counter", key_help, [([], value)]))
+        else:
+            families.append((f"{prefix}_{key}", "gauge", key_help, [([], value)]))
+    return families
+
+
+class MetricsRegistry:
+    """Registered metrics and collectors rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Adds callable that returns metric families at scrape time (see stats_families)"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        """Returns metrics in the text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.help_text)}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            for name, metric_type, help_text, samples in collector():
+                if help_text:
+                    lines.append(f"# HELP {name} {_escape(help_text)}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
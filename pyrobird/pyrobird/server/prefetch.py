@@ -0,0 +1,275 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Background prefetch of neighbouring events.
+
+Users usually click "next event" or "previous event". After a convert request the following
+entries in the detected direction are converted in the background and put to the result cache,
+so the next request is a cache hit.
+
+Each client has a generation counter. A new request of the client increments it, and prefetch
+started for the older request stops before converting the next entry.
+The total work is limited: one background thread, bounded queue of prefetch plans and
+the budget of bytes that were prefetched but not requested yet. Only the events of the last
+request plan that are still in the result cache count against the budget.
+"""
+
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+FORWARD = 1
+BACKWARD = -1
+
+
+def detect_direction(positions):
+    """
+    Returns FORWARD or BACKWARD by the last requested entries of a client.
+    The direction of the most of the steps wins, forward if unknown
+    """
+    steps = [current - previous for previous, current in zip(positions, list(positions)[1:]) if current != previous]
+    backward_steps = sum(1 for step in steps if step < 0)
+    return BACKWARD if backward_steps * 2 > len(steps) else FORWARD
+
+
+def plan_entries(entries, direction, depth):
+    """Returns entries to prefetch after requested entries in the direction"""
+    if direction == FORWARD:
+        start = max(entries) + 1
+        return list(range(start, start + depth))
+    start = min(entries) - 1
+    return list(range(start, max(start - depth, -1), -1))
+
+
+class _ClientState:
+    def __init__(self, history_size):
+        self.generation = 0
+        self.file = None
+        self.positions = deque(maxlen=history_size)
+        self.outstanding = {}      # prefetched key => size, not yet requested
+
+
+class Prefetcher:
+    """
+    Plans and runs background prefetch of events.
+
+    Parameters
+    ----------
+    convert : callable
+        function(filename, entries, collections, dex_format, options=None) => (num_entries, {entry: data}).
+        May raise, errors are logged and prefetch of this plan stops
+    result_cache : EventResultCache
+        Where prefetched events are stored
+    depth : int
+        Number of entries to prefetch after each request. 0 disables prefetch
+    history_size : int
+        Number of last requests per client used to detect the direction
+    max_queued : int
+        Maximum number of prefetch plans waiting for the background thread. New plans are dropped after
+    max_bytes : int
+        Budget of bytes that were prefetched, but not requested yet. Prefetch pauses when it is exhausted
+    max_clients : int
+        Number of clients to remember
+    single_flight : SingleFlight, optional
+        Registry of conversions in flight. Prefetch skips events that requests convert
+        and requests wait for events being prefetched instead of converting them again
+    is_busy : callable, optional
+        function(filename) => True if the converter has request work for the file.
+        Prefetch of the plan stops then, so it doesn't delay requests
+    """
+
+    def __init__(self, convert, result_cache, depth=2, history_size=4, max_queued=16,
+                 max_bytes=64 * 1024 * 1024, max_clients=256, single_flight=None, is_busy=None):
+        self.convert = convert
+        self.result_cache = result_cache
+        self.depth = depth
+        self.history_size = history_size
+        self.max_queued = max_queued
+        self.max_bytes = max_bytes
+        self.max_clients = max_clients
+        self.single_flight = single_flight
+        self.is_busy = is_busy
+        self._clients = OrderedDict()      # client id => _ClientState
+        self._outstanding_bytes = 0
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyrobird-prefetch")
+        self.prefetched = 0
+        self.used = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.busy = 0
+
+    def _client(self, client_id):
+        """Returns client state. Lock must be held"""
+        state = self._clients.get(client_id)
+        if state is None:
+            state = self._clients[client_id] = _ClientState(self.history_size)
+            while len(self._clients) > self.max_clients:
+                _, forgotten = self._clients.popitem(last=False)
+                self._outstanding_bytes -= sum(forgotten.outstanding.values())
+                forgotten.generation += 1
+        self._clients.move_to_end(client_id)
+        return state
+
+    def on_request(self, client_id, filename, entries, make_key, collections=None, dex_format="rows", options=None):
+        """
+        Registers the convert request and schedules prefetch of the next entries.
+
+        Parameters
+        ----------
+        client_id : str
+            Identifies the client (e.g. session cookie and file name)
+        filename : str
+            Converted file
+        entries : list of int
+            Requested entries
+        make_key : callable
+            function(entry) => result cache key of the entry with the same file, collections and format
+        collections, dex_format, options
+            As in the request
+
+        Returns
+        -------
+        list of int
+            Entries scheduled for prefetch
+        """
+        if not self.depth or not entries:
+            return []
+
+        with self._lock:
+            state = self._client(client_id)
+
+            # Prefetched events that are requested now
+            for entry in entries:
+                size = state.outstanding.pop(make_key(entry), None)
+                if size is not None:
+                    self._outstanding_bytes -= size
+                    self.used += 1
+
+            # Any new request cancels the previous prefetch of this client.
+            # Events prefetched for it and not requested now (the client jumped elsewhere,
+            # changed collections or options) stay in the result cache, but no longer count against the budget
+            state.generation += 1
+            self._outstanding_bytes -= sum(state.outstanding.values())
+            state.outstanding.clear()
+            if state.file != filename:
+                state.file = filename
+                state.positions.clear()
+
+            direction = FORWARD
+            state.positions.append(max(entries))
+            if len(state.positions) > 1:
+                direction = detect_direction(state.positions)
+
+            plan = [entry for entry in plan_entries(entries, direction, self.depth) if entry not in entries]
+            if not plan:
+                return []
+            if self._queued >= self.max_queued:
+                self.dropped += 1
+                return []
+            self._queued += 1
+            generation = state.generation
+
+        self._executor.submit(self._run, client_id, generation, filename, plan, make_key, collections, dex_format,
+                              options)
+        return plan
+
+    def _is_current(self, client_id, generation):
+        state = self._clients.get(client_id)
+        return state is not None and state.generation == generation
+
+    def _release_evicted(self):
+        """Releases the budget of prefetched events that the result cache evicted. Lock must be held"""
+        for state in self._clients.values():
+            evicted = [key for key in state.outstanding if key not in self.result_cache]
+            for key in evicted:
+                self._outstanding_bytes -= state.outstanding.pop(key)
+
+    def _run(self, client_id, generation, filename, plan, make_key, collections, dex_format, options=None):
+        try:
+            for entry in plan:
+                key = make_key(entry)
+                with self._lock:
+                    if not self._is_current(client_id, generation):
+                        self.cancelled += 1
+                        return
+                    if self._outstanding_bytes >= self.max_bytes:
+                        self._release_evicted()
+                    if self._outstanding_bytes >= self.max_bytes:
+                        return
+                if key in self.result_cache:
+                    continue
+                if self.is_busy is not None and self.is_busy(filename):
+                    with self._lock:
+                        self.busy += 1
+                    return
+
+                own = {}
+                if self.single_flight is not None:
+                    own, waiting = self.single_flight.claim([key])
+                    if waiting:
+                        # A request converts this event right now
+                        continue
+                data = self._convert(filename, entry, key, collections, dex_format, own, options)
+                if data is None:
+                    # Out of the tree, further entries in this direction don't exist either
+                    return
+                with self._lock:
+                    self.prefetched += 1
+                    state = self._clients.get(client_id)
+                    if state is not None and state.generation == generation and key not in state.outstanding:
+                        state.outstanding[key] = len(data)
+                        self._outstanding_bytes += len(data)
+        except Exception as e:
+            logger.debug(f"Prefetch of entries {plan} of {filename} stopped: {e}")
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def _convert(self, filename, entry, key, collections, dex_format, own, options=None):
+        """
+        Converts the entry and puts it to the result cache. Returns serialized event or None.
+        own are keys claimed in single_flight, requests waiting for them get the result
+        """
+        try:
+            num_entries, converted = self.convert(filename, [entry], collections, dex_format, options)
+            data = converted.get(entry)
+            if data is not None:
+                self.result_cache.put(key, data)
+            if own:
+                self.single_flight.resolve(own, key, (num_entries, data))
+            return data
+        except BaseException as e:
+            if own:
+                self.single_flight.fail(own, e)
+            raise
+
+    def stats(self):
+        """Returns dictionary with prefetch counters"""
+        with self._lock:
+            return {
+                "depth": self.depth,
+                "queued": self._queued,
+                "outstanding_bytes": self._outstanding_bytes,
+                "prefetched": self.prefetched,
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "dropped": self.dropped,
+                "busy": self.busy,
+            }
+
+    def wait(self):
+        """Waits until all scheduled prefetch is done. Used in tests"""
+        self._executor.submit(lambda: None).result()
+
+    def shutdown(self, wait=False):
+        """Stops the background thread. Not started prefetch is cancelled"""
+        with self._lock:
+            for state in self._clients.values():
+                state.generation += 1
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,187 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Multi-worker serve modes.
+
+The flask development server runs in one process, so one slow conversion holds the GIL for all users.
+`pyrobird serve --workers N --engine gunicorn|uvicorn` runs N server processes:
+
+gunicorn
+    Threaded workers (gthread). uproot, awkward, numpy and the converters are imported and the app
+    is configured in the master process before forking, so the workers share these pages.
+uvicorn
+    uvicorn workers with the WSGI interface. uvicorn starts workers with spawn, so each worker
+    imports the modules itself. The app config is passed in PYROBIRD_SERVE_CONFIG environment variable.
+
+Converted events are shared by the workers through the on-disk result store.
+If PYROBIRD_RESULT_CACHE_DIR is not set, the user cache directory ~/.cache/pyrobird/results is used.
+"""
+
+import importlib
+import json
+import logging
+import os
+import time
+
+from pyrobird.server import configure_flask_app, CFG_RESULT_CACHE_DIR, CFG_SERVE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+ENGINE_FLASK = "flask"
+ENGINE_GUNICORN = "gunicorn"
+ENGINE_UVICORN = "uvicorn"
+ENGINES = (ENGINE_FLASK, ENGINE_GUNICORN, ENGINE_UVICORN)
+
+# Environment variable with JSON of the app config for spawned workers
+SERVE_CONFIG_ENV = "PYROBIRD_SERVE_CONFIG"
+
+# Heavy modules imported before forking workers
+PRELOAD_MODULES = ("numpy", "awkward", "uproot", "pyrobird.edm4eic", "pyrobird.dex_columnar",
+                   "pyrobird.server.conversion")
+
+
+def preload_modules(modules=PRELOAD_MODULES):
+    """Imports the modules, so forked workers share them. Returns the import time in seconds"""
+    start = time.perf_counter()
+    for module in modules:
+        importlib.import_module(module)
+    elapsed = time.perf_counter() - start
+    logger.debug(f"Preloaded {', '.join(modules)} in {elapsed:.2f}s")
+    return elapsed
+
+
+def shared_result_cache_dir():
+    """
+    Returns default directory of converted events shared by the workers of this user:
+    $XDG_CACHE_HOME/pyrobird/results or ~/.cache/pyrobird/results.
+
+    The directory is created accessible only by the user. Other users could plant events in it,
+    so RuntimeError is raised if it belongs to another user.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(cache_home, "pyrobird", "results")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+    stat = os.stat(path)
+    if hasattr(os, "getuid") and stat.st_uid != os.getuid():
+        raise RuntimeError(f"Result cache directory {path} belongs to another user. "
+                           f"Set the directory with --cache-dir")
+    if stat.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return path
+
+
+def workers_config(config, workers):
+    """
+    Returns a copy of the app config for several workers.
+    The workers can't share memory cache, so the on-disk result store is enabled if it is not set
+    """
+    config = dict(config or {})
+    if workers <= 1:
+        return config
+    config[CFG_SERVE_WORKERS] = workers
+    if not config.get(CFG_RESULT_CACHE_DIR):
+        config[CFG_RESULT_CACHE_DIR] = shared_result_cache_dir()
+        logger.info(f"Converted events are shared by the workers through {config[CFG_RESULT_CACHE_DIR]}")
+    return config
+
+
+def config_from_environ():
+    """Returns the app config passed to spawned workers or empty dict"""
+    text = os.environ.get(SERVE_CONFIG_ENV)
+    return json.loads(text) if text else {}
+
+
+def gunicorn_application(config, host, port, workers, threads=8, timeout=300):
+    """
+    Returns gunicorn application that serves the preloaded and configured flask app.
+
+    Parameters
+    ----------
+    config : dict
+        App config
+    host, port
+        Address to listen to. Empty host means 127.0.0.1
+    workers : int
+        Number of worker processes
+    threads : int
+        Request threads of each worker
+    timeout : int
+        Seconds a worker may be silent before it is restarted (long conversions)
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as ex:
+        raise RuntimeError("gunicorn engine requires gunicorn: pip install gunicorn") from ex
+
+    options = {
+        "bind": f"{host or '127.0.0.1'}:{port}",
+        "workers": workers,
+        "worker_class": "gthread",
+        "threads": threads,
+        "timeout": timeout,
+        "preload_app": True,
+    }
+
+    class PyrobirdApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Called once in the master process as preload_app is set
+            preload_modules()
+            return configure_flask_app(config)
+
+    return PyrobirdApplication()
+
+
+def run_gunicorn(config, host, port, workers, threads=8, timeout=300):
+    gunicorn_application(config, host, port, workers, threads, timeout).run()
+
+
+def run_uvicorn(config, host, port, workers):
+    try:
+        import uvicorn
+    except ImportError as ex:
+        raise RuntimeError("uvicorn engine requires uvicorn: pip install uvicorn") from ex
+
+    os.environ[SERVE_CONFIG_ENV] = json.dumps(config)
+    uvicorn.run("pyrobird.server.wsgi:application", host=host or "127.0.0.1", port=int(port),
+                workers=workers, interface="wsgi")
+
+
+def run(config=None, host=None, port=5454, workers=1, engine=ENGINE_FLASK, threads=8, debug=False):
+    """
+    Runs the server with the engine.
+
+    Parameters
+    ----------
+    config : dict
+        App config
+    workers : int
+        Number of server processes. The flask engine supports only 1
+    engine : str
+        One of ENGINES
+    threads : int
+        Request threads of each gunicorn worker
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}'. Supported: {', '.join(ENGINES)}")
+    if workers < 1:
+        raise ValueError(f"Number of workers should be at least 1, got {workers}")
+    if engine == ENGINE_FLASK:
+        if workers > 1:
+            raise ValueError("flask development server runs one worker. Use --engine gunicorn or uvicorn")
+        from pyrobird.server import run as run_flask
+        run_flask(config=config, host=host, port=port, debug=debug)
+        return
+
+    config = workers_config(config, workers)
+    logger.info(f"Starting {workers} {engine} worker(s) on {host or '127.0.0.1'}:{port}")
+    if engine == ENGINE_GUNICORN:
+        run_gunicorn(config, host, port, workers, threads)
+    else:
+        run_uvicorn(config, host, port, workers)
+
@@ -0,0 +1,263 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Cache of converted events.
+
+Each event is stored as serialized DEX JSON fragment under the content addressed key
+made of file identity, entry index, converted collections, converter version and format.
+The cache has two tiers: in-memory LRU limited by total bytes and optional on-disk store.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_event_key(file_identity, entry, collections, converter_version, dex_format="rows", options=None):
+    """
+    Builds the content addressed key of a converted event.
+
+    Parameters
+    ----------
+    file_identity : tuple
+        Identity of the file content (see pyrobird.server.file_cache.file_identity)
+    entry : int
+        Entry index in the events tree
+    collections : list of str or None
+        Converted collections. None means default collections
+    converter_version : str
+        Version of the converter that produced the data
+    dex_format : str
+        Group encoding of the converted event (see pyrobird.dex_columnar.DEX_FORMATS)
+    options : dict, optional
+        Conversion options. Keys of events converted without options don't change
+
+    Returns
+    -------
+    str
+        Hex digest that identifies the converted event
+    """
+    key_data = {
+        "file": list(file_identity),
+        "entry": entry,
+        "collections": sorted(collections) if collections else None,
+        "converter": converter_version,
+        "format": dex_format,
+    }
+    if options:
+        key_data["options"] = options
+    key_text = json.dumps(key_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(key_text.encode("utf-8")).hexdigest()
+
+
+class DiskResultStore:
+    """
+    On-disk store of converted events. Files are named by the key.
+
+    The store can be shared by several server processes. When the total size goes over
+    max_bytes, the least recently used files are removed.
+
+    The size limit is approximate: each process only knows the files it has written since
+    it scanned the directory. The directory is scanned again when a process has written
+    max_bytes / workers, so the store of all processes may exceed max_bytes about twice at most.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the files in. Created if it doesn't exist
+    max_bytes : int
+        Maximum total size of stored files. 0 means unlimited
+    workers : int
+        Number of processes that share the directory
+    """
+
+    def __init__(self, path, max_bytes=0, workers=1):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = self._scan_total_bytes()
+        # Bytes written by this process since the last scan
+        self._unscanned_bytes = 0
+
+    def _file_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def _scan_files(self):
+        """Returns list of (mtime, size, path) of stored files"""
+        result = []
+        for dir_path, _, file_names in os.walk(self.path):
+            for file_name in file_names:
+                if not file_name.endswith(".json"):
+                    continue
+                file_path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                result.append((stat.st_mtime, stat.st_size, file_path))
+        return result
+
+    def _scan_total_bytes(self):
+        return sum(size for _, size, _ in self._scan_files())
+
+    def get(self, key):
+        """Returns stored data or None"""
+        file_path = self._file_path(key)
+        try:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Stores data atomically, so concurrent readers never see partial files"""
+        file_path = self._file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # The same key may be written again (e.g. by another worker), its old file is replaced
+            try:
+                replaced_bytes = os.stat(file_path).st_size
+            except FileNotFoundError:
+                replaced_bytes = 0
+            os.replace(tmp_path, file_path)
+        except OSError as ex:
+            logger.warning(f"Can't store converted event in {self.path}: {ex}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._total_bytes += len(data) - replaced_bytes
+            self._unscanned_bytes += len(data) - replaced_bytes
+            # Other processes write to the directory too
+            if self.max_bytes and (self._total_bytes > self.max_bytes or
+                                   self._unscanned_bytes > self.max_bytes / self.workers):
+                self._cleanup()
+
+    def _cleanup(self):
+        """Scans the directory and removes the least recently used files if the store is over max_bytes"""
+        files = sorted(self._scan_files())
+        total_bytes = sum(size for _, size, _ in files)
+        self._unscanned_bytes = 0
+        if total_bytes <= self.max_bytes:
+            self._total_bytes = total_bytes
+            return
+
+        # Remove files until the store is at 90% of max_bytes
+        target_bytes = int(self.max_bytes * 0.9)
+        for _, size, file_path in files:
+            if total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(file_path)
+                total_bytes -= size
+            except OSError:
+                pass
+        self._total_bytes = total_bytes
+
+
+class EventResultCache:
+    """
+    Two tier cache of serialized converted events.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Memory budget of in-memory tier in bytes. 0 disables in-memory tier
+    disk_store : DiskResultStore, optional
+        On-disk tier
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_store=None):
+        self.max_bytes = max_bytes
+        self.disk_store = disk_store
+        self._items = OrderedDict()     # key => bytes
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns serialized event by key or None if it is not cached"""
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.disk_store is not None:
+            data = self.disk_store.get(key)
+            if data is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put_memory(key, data)
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """Stores serialized event"""
+        with self._lock:
+            self._put_memory(key, data)
+        if self.disk_store is not None:
+            self.disk_store.put(key, data)
+
+    def _put_memory(self, key, data):
+        """Puts data to in-memory tier. Lock must be held"""
+        if len(data) > self.max_bytes:
+            return
+        old_data = self._items.pop(key, None)
+        if old_data is not None:
+            self._total_bytes -= len(old_data)
+        self._items[key] = data
+        self._total_bytes += len(data)
+        while self._total_bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._total_bytes -= len(evicted)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def clear(self):
+        """Clears in-memory tier"""
+        with self._lock:
+            self._items.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Returns dictionary with cache counters"""
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
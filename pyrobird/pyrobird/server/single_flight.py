@@ -0,0 +1,101 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Single flight coalescing of identical concurrent work.
+
+When a page is loaded, the frontend (or several users of a tutorial session) may request
+the same event of the same file at the same moment. The first request claims the event key
+and converts it, other requests wait on the future of that key and share the serialized bytes.
+
+Keys are claimed in groups: a request for several entries converts all entries nobody else
+converts in one call, then waits for the rest. A request never waits while holding unresolved keys,
+so requests with overlapping entries don't block each other.
+
+Futures are thread based: it works with threads of one process (threaded dev server,
+threaded gunicorn workers). Processes don't share in-flight work.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    Registry of in-flight work by key.
+
+        own, waiting = single_flight.claim(keys)
+        try:
+            results = compute(list(own))
+            for key in list(own): single_flight.resolve(own, key, results[key])
+        except Exception as ex:
+            single_flight.fail(own, ex)
+            raise
+        shared = {key: future.result() for key, future in waiting.items()}
+    """
+
+    def __init__(self):
+        self._futures = {}      # key => Future of the leader
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def claim(self, keys):
+        """
+        Claims keys that are not in flight.
+
+        Returns
+        -------
+        tuple
+            (own, waiting) - dict of key => Future of keys the caller must resolve or fail,
+            dict of key => Future of keys that other callers are computing
+        """
+        own = {}
+        waiting = {}
+        with self._lock:
+            for key in keys:
+                future = self._futures.get(key)
+                if future is None:
+                    future = self._futures[key] = Future()
+                    own[key] = future
+                elif key not in own and key not in waiting:
+                    waiting[key] = future
+            if own:
+                self.leaders += 1
+            self.shared += len(waiting)
+        return own, waiting
+
+    def _release(self, key, future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def resolve(self, own, key, result):
+        """
+        Sets the result of the claimed key and removes it from own.
+        Waiting callers get the result, next callers claim the key again
+        """
+        future = own.pop(key)
+        self._release(key, future)
+        future.set_result(result)
+
+    def fail(self, own, exception):
+        """Passes the exception to callers waiting for keys in own (claimed but not resolved)"""
+        for key, future in list(own.items()):
+            self._release(key, future)
+            future.set_exception(exception)
+        own.clear()
+
+    def in_flight(self):
+        """Number of keys being computed"""
+        with self._lock:
+            return len(self._futures)
+
+    def stats(self):
+        """Returns dictionary with counters"""
+        with self._lock:
+            return {
+                "in_flight": len(self._futures),
+                "leaders": self.leaders,
+                "shared": self.shared,
+            }
@@ -0,0 +1,261 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Serving of the frontend bundle with precompressed files.
+
+Text assets get .br and .gz siblings: main-5RJ6TLTO.js => main-5RJ6TLTO.js.br, main-5RJ6TLTO.js.gz.
+Siblings are made at build time (python -m pyrobird.server.static_assets <static dir>)
+or on the first request of the file. The best sibling for the request Accept-Encoding is sent
+with Content-Encoding, so multi megabyte bundles are not compressed on each request.
+
+Fingerprinted files (the name has the content hash) never change, they are sent with
+"Cache-Control: immutable" and one year max-age. index.html is revalidated on each load.
+
+Frontend routes (e.g. /event-display) are not files, index.html is sent for them (SPA fallback).
+Path resolution (file, siblings or fallback) is remembered, so next requests don't touch the disk.
+"""
+
+import gzip
+import logging
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+# Extensions of files worth compressing
+COMPRESSIBLE_EXTENSIONS = ('.js', '.mjs', '.css', '.html', '.json', '.jsonc', '.svg', '.txt', '.map', '.wasm',
+                           '.xml', '.gltf', '.glb', '.ttf', '.otf', '.ico')
+
+# Content encoding => sibling file suffix, in the order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Files smaller than this are sent as is
+MIN_COMPRESS_SIZE = 1024
+
+# Angular (esbuild) names: main-5RJ6TLTO.js; webpack names: main.3f2a9c8e1b7d4a6c5e0f.js
+_HASHED_NAME_RE = re.compile(r"[-.](?=[A-Z0-9]*[0-9])(?=[A-Z0-9]*[A-Z])[A-Z0-9]{8,}\.\w+$|[-.][a-f0-9]{16,}\.\w+$")
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+INDEX_FILE = "index.html"
+
+
+def is_hashed_name(path):
+    """True if the file name has the content hash, so the file never changes"""
+    return bool(_HASHED_NAME_RE.search(os.path.basename(path)))
+
+
+def is_compressible(path):
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def _compress(data, encoding, brotli_quality):
+    if encoding == "br":
+        import brotli
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write_atomic(file_path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _is_fresh(sibling_path, stat):
+    """True if the sibling exists and is not older than the original file"""
+    try:
+        return os.stat(sibling_path).st_mtime_ns >= stat.st_mtime_ns
+    except OSError:
+        return False
+
+
+def precompress_file(file_path, encodings=("br", "gzip"), brotli_quality=11, min_size=MIN_COMPRESS_SIZE):
+    """
+    Writes compressed siblings of the file if they are missing or older than the file.
+    Siblings that are not smaller than the file are not written.
+
+    Returns
+    -------
+    list of str
+        Paths of written siblings
+    """
+    stat = os.stat(file_path)
+    if stat.st_size < min_size or not is_compressible(file_path):
+        return []
+
+    written = []
+    data = None
+    for encoding, suffix in ENCODINGS:
+        if encoding not in encodings or _is_fresh(file_path + suffix, stat):
+            continue
+        if data is None:
+            with open(file_path, "rb") as f:
+                data = f.read()
+        compressed = _compress(data, encoding, brotli_quality)
+        if len(compressed) >= len(data):
+            continue
+        _write_atomic(file_path + suffix, compressed)
+        written.append(file_path + suffix)
+    return written
+
+
+def precompress_directory(path, encodings=("br", "gzip"), brotli_quality=11, min_size=MIN_COMPRESS_SIZE):
+    """Writes compressed siblings of all compressible files in the directory. Returns paths of written siblings"""
+    written = []
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            written.extend(precompress_file(os.path.join(dir_path, file_name), encodings, brotli_quality, min_size))
+    return written
+
+
+class StaticAsset:
+    """
+    Resolved static file.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file
+    mimetype : str
+        Type of the original file content
+    siblings : dict
+        Content encoding => path of the compressed sibling
+    is_hashed : bool
+        The file name is fingerprinted
+    is_fallback : bool
+        The file is index.html sent instead of a not existing path
+    """
+
+    def __init__(self, path, mimetype, siblings, is_hashed, is_fallback=False):
+        self.path = path
+        self.mimetype = mimetype
+        self.siblings = siblings
+        self.is_hashed = is_hashed
+        self.is_fallback = is_fallback
+
+    def select(self, accept_encodings):
+        """
+        Returns (file path, content encoding or None) best for the request.
+
+        Parameters
+        ----------
+        accept_encodings : werkzeug.datastructures.Accept
+            request.accept_encodings
+        """
+        for encoding, _ in ENCODINGS:
+            if encoding in self.siblings and accept_encodings.quality(encoding) > 0:
+                return self.siblings[encoding], encoding
+        return self.path, None
+
+
+class StaticAssets:
+    """
+    Resolves request paths to static files and their compressed siblings.
+
+    Parameters
+    ----------
+    static_dir : str
+        Directory of the frontend bundle
+    compress_on_request : bool
+        Make missing siblings when the file is resolved the first time.
+        If the directory is read only, files are sent as they are
+    brotli_quality : int
+        Quality of brotli siblings made on request
+    max_entries : int
+        Number of remembered resolved paths
+    """
+
+    def __init__(self, static_dir, compress_on_request=True, brotli_quality=9, max_entries=4096):
+        self.static_dir = static_dir
+        self.compress_on_request = compress_on_request
+        self.brotli_quality = brotli_quality
+        self.max_entries = max_entries
+        self._resolved = OrderedDict()      # request path => StaticAsset or None
+        self._lock = threading.Lock()
+        self._compress_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _make_asset(self, file_path, is_fallback=False):
+        if self.compress_on_request:
+            # One file at a time: concurrent first requests of a bundle don't compress it twice
+            with self._compress_lock:
+                try:
+                    precompress_file(file_path, brotli_quality=self.brotli_quality)
+                except OSError as ex:
+                    logger.debug(f"Can't write compressed siblings of {file_path}: {ex}")
+
+        stat = os.stat(file_path)
+        siblings = {encoding: file_path + suffix for encoding, suffix in ENCODINGS
+                    if _is_fresh(file_path + suffix, stat)}
+        mimetype = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return StaticAsset(file_path, mimetype, siblings, is_hashed_name(file_path), is_fallback)
+
+    def _resolve_file(self, path):
+        """Returns StaticAsset of the existing file or None"""
+        file_path = safe_join(self.static_dir, path)
+        if file_path is None or not os.path.isfile(file_path):
+            return None
+        return self._make_asset(file_path)
+
+    def resolve(self, path):
+        """
+        Returns StaticAsset for the request path: the file, or index.html if there is no such file.
+        Returns None if index.html doesn't exist either
+        """
+        with self._lock:
+            if path in self._resolved:
+                self._resolved.move_to_end(path)
+                self.hits += 1
+                return self._resolved[path]
+            self.misses += 1
+
+        asset = self._resolve_file(path)
+        if asset is None and path != INDEX_FILE:
+            index = self.resolve(INDEX_FILE)
+            if index is not None:
+                asset = StaticAsset(index.path, index.mimetype, index.siblings, False, is_fallback=True)
+
+        with self._lock:
+            self._resolved[path] = asset
+            while len(self._resolved) > self.max_entries:
+                self._resolved.popitem(last=False)
+        return asset
+
+    def forget(self, path):
+        """Drops remembered resolution of the path (e.g. its file was removed)"""
+        with self._lock:
+            self._resolved.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._resolved.clear()
+
+    def stats(self):
+        """Returns dictionary with resolution counters"""
+        with self._lock:
+            return {"entries": len(self._resolved), "hits": self.hits, "misses": self.misses}
+
+
+if __name__ == "__main__":
+    # Build step: python -m pyrobird.server.static_assets pyrobird/server/static
+    for directory in sys.argv[1:]:
+        for sibling in precompress_directory(directory):
+            print(sibling)
@@ -0,0 +1,17 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+WSGI entry point of workers: pyrobird.server.wsgi:application
+
+The app is configured from PYROBIRD_SERVE_CONFIG environment variable (JSON of the app config),
+which `pyrobird serve --engine uvicorn` sets for its workers. It may be used with other servers too:
+
+    PYROBIRD_SERVE_CONFIG='{"PYROBIRD_DOWNLOAD_PATH": "/data"}' gunicorn pyrobird.server.wsgi:application
+"""
+
+from pyrobird.server import configure_flask_app
+from pyrobird.server.production import config_from_environ, preload_modules
+
+preload_modules()
+application = configure_flask_app(config_from_environ())
@@ -0,0 +1,91 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Durations of conversion stages.
+
+Functions that take optional ``timings`` argument add their stages to it:
+
+    timings = StageTimings(per_collection=True)
+    events = edm4eic_entries_to_dicts(tree, [0, 1], timings=timings)
+    timings.to_dict()   # {"stages": {"schema": 0.1, "read": 12.5, ...}, "collections": {"TOFBarrelRecHit": 3.2, ...}}
+
+The server sends the stages in Server-Timing header.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StageTimings:
+    """
+    Durations of processing stages and collections, milliseconds. A repeated stage is summed up.
+
+    Parameters
+    ----------
+    per_collection : bool
+        Measure each collection separately. Collections are then read one by one
+        instead of in a single pass, which is a bit slower
+    """
+
+    def __init__(self, per_collection=False):
+        self.per_collection = per_collection
+        self.stages = {}
+        self.collections = {}
+
+    def add(self, name, duration_ms):
+        """Adds duration to the stage"""
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def add_collection(self, name, duration_ms):
+        """Adds duration to the collection"""
+        self.collections[name] = self.collections.get(name, 0.0) + duration_ms
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that measures the stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    @contextmanager
+    def collection(self, name):
+        """Context manager that measures the collection (if per_collection is set)"""
+        if not self.per_collection:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_collection(name, (time.perf_counter() - start) * 1000)
+
+    def update(self, timings_dict):
+        """Adds durations from to_dict() result (e.g. measured in a worker process)"""
+        for name, duration_ms in timings_dict.get("stages", {}).items():
+            self.add(name, duration_ms)
+        for name, duration_ms in timings_dict.get("collections", {}).items():
+            self.add_collection(name, duration_ms)
+
+    def to_dict(self):
+        """Returns {"stages": {name: ms}, "collections": {name: ms}}. Collections are only if per_collection is set"""
+        result = {"stages": {name: round(duration_ms, 3) for name, duration_ms in self.stages.items()}}
+        if self.per_collection:
+            result["collections"] = {name: round(duration_ms, 3) for name, duration_ms in self.collections.items()}
+        return result
+
+    def server_timing(self):
+        """Returns Server-Timing header value: 'open;dur=1.20, read;dur=12.51'"""
+        return ", ".join(f"{name};dur={duration_ms:.2f}" for name, duration_ms in self.stages.items())
+
+
+def timed(timings, name):
+    """Returns timings.stage(name) or no-op context manager if timings is None"""
+    return timings.stage(name) if timings is not None else nullcontext()
+
+
+def timed_collection(timings, name):
+    """Returns timings.collection(name) or no-op context manager if timings is None"""
+    return timings.collection(name) if timings is not None else nullcontext()
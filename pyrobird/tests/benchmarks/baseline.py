@@ -0,0 +1,73 @@
+"""
+Recorded benchmark baseline.
+
+baseline.json keeps only summary statistics of each benchmark (seconds), not the raw
+pytest-benchmark output with machine info and per-round samples:
+
+    pytest tests/benchmarks -m benchmark --benchmark-json=benchmark.json
+
+    # Compare a run with the baseline
+    python tests/benchmarks/baseline.py compare benchmark.json
+
+    # Refresh the baseline after changes of the converters
+    python tests/benchmarks/baseline.py update benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Statistics kept per benchmark
+SUMMARY_STATS = ("min", "median", "ops", "rounds")
+
+
+def summarize(report):
+    """Returns baseline dictionary from pytest-benchmark JSON report"""
+    machine_info = report.get("machine_info", {})
+    return {
+        "datetime": report.get("datetime"),
+        "python": machine_info.get("python_version", platform.python_version()),
+        "cpu": machine_info.get("cpu", {}).get("brand_raw", ""),
+        "entries": int(os.environ.get("PYROBIRD_BENCHMARK_ENTRIES", 50)),
+        "benchmarks": {benchmark["name"]: {stat: benchmark["stats"][stat] for stat in SUMMARY_STATS}
+                       for benchmark in report["benchmarks"]},
+    }
+
+
+def compare(baseline, report):
+    """Returns lines with median time of each benchmark in the report relative to the baseline"""
+    lines = [f"{'benchmark':<45} {'baseline':>10} {'current':>10} {'ratio':>7}"]
+    current = summarize(report)["benchmarks"]
+    for name, stats in current.items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            lines.append(f"{name:<45} {'-':>10} {stats['median'] * 1000:>8.1f}ms {'new':>7}")
+            continue
+        ratio = stats["median"] / base["median"]
+        lines.append(f"{name:<45} {base['median'] * 1000:>8.1f}ms {stats['median'] * 1000:>8.1f}ms {ratio:>6.2f}x")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare or update the benchmark baseline")
+    parser.add_argument("command", choices=("compare", "update"))
+    parser.add_argument("report", help="pytest-benchmark JSON report (--benchmark-json)")
+    args = parser.parse_args()
+
+    with open(args.report) as f:
+        report = json.load(f)
+    if args.command == "update":
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(summarize(report), f, indent=2)
+            f.write("\n")
+        return
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    print("\n".join(compare(baseline, report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from synthetic_edm4eic import write_synthetic_events
+from tests.podio_flat import use_flat_layout
+
+# Size of the synthetic file. Default hit counts are close to a DIS event of craterlake reconstruction
+BENCHMARK_ENTRIES = int(os.environ.get("PYROBIRD_BENCHMARK_ENTRIES", 50))
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    class _SingleRun:
+        """Stands for pytest-benchmark fixture when the plugin is not installed: runs the function once"""
+
+        def __call__(self, function, *args, **kwargs):
+            return function(*args, **kwargs)
+
+        def pedantic(self, target, args=(), kwargs=None, setup=None, rounds=1, iterations=1, warmup_rounds=0):
+            if setup is not None:
+                # setup may return (args, kwargs) for the target
+                arguments = setup()
+                if arguments is not None:
+                    args, kwargs = arguments
+            return target(*args, **(kwargs or {}))
+
+    @pytest.fixture
+    def benchmark():
+        return _SingleRun()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def flat_layout():
+    """The synthetic file has flat layout, its schema is scanned by the test scanner"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        use_flat_layout(monkeypatch)
+        yield
+
+
+@pytest.fixture(scope="session")
+def synthetic_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp("benchmarks") / "synthetic.edm4eic.root"
+    return write_synthetic_events(str(path), n_entries=BENCHMARK_ENTRIES)
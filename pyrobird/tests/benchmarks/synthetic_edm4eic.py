@@ -0,0 +1,178 @@
+# This file is part of Firebird Event Display and is licensed under the LGPLv3.
+# See the LICENSE file in the project root for full license information.
+
+"""
+Synthetic EDM4eic files for benchmarks.
+
+Writes podio-style 'events' tree with uproot: TrackerHitData collections with configurable number of hits,
+CentralTrackSegments with _CentralTrackSegments_points and CentralCKFTrackParameters.
+uproot can't write split branches, so the tree has flat layout (see tests.podio_flat):
+each podio member branch is a jagged branch with the collection size counter. Members are read
+the same way as split member branches, but baskets and their headers differ, so absolute numbers
+are not those of real EDM4eic files. Use the benchmarks to compare changes of the converters.
+
+    write_synthetic_events("synthetic.edm4eic.root", n_entries=100, hit_counts={"SiBarrelTrackerRecHits": 2000})
+"""
+
+import awkward as ak
+import numpy as np
+import uproot
+
+from tests.podio_flat import flat_layout_title
+
+# Mean number of hits per entry of each TrackerHitData collection
+DEFAULT_HIT_COUNTS = {
+    "SiBarrelTrackerRecHits": 400,
+    "SiEndcapTrackerRecHits": 300,
+    "MPGDBarrelRecHits": 200,
+    "TOFBarrelRecHits": 150,
+    "TOFEndcapRecHits": 100,
+    "B0TrackerRecHits": 50,
+}
+
+SEGMENTS = "CentralTrackSegments"
+POINTS = "_CentralTrackSegments_points"
+PARAMETERS = "CentralCKFTrackParameters"
+
+TRACK_POINT_FIELDS = ["position.x", "position.y", "position.z", "positionError.xx", "positionError.yy",
+                      "positionError.zz", "time", "timeError", "pathlength"]
+TRACK_PARAMETERS_FIELDS = ["loc.a", "loc.b", "theta", "phi", "qOverP", "time"]
+
+# Entries generated and written at once
+_BATCH_SIZE = 100
+
+
+def _jagged(flat, counts):
+    return ak.unflatten(np.asarray(flat), counts)
+
+
+def _tracker_hits(rng, name, counts):
+    """Hits on cylinders around the beam line, 20..800 mm"""
+    total = int(counts.sum())
+    radius = rng.uniform(20, 800, total)
+    phi = rng.uniform(-np.pi, np.pi, total)
+    values = {
+        "cellID": rng.integers(0, 2 ** 60, total, dtype=np.uint64),
+        "position.x": radius * np.cos(phi),
+        "position.y": radius * np.sin(phi),
+        "position.z": rng.uniform(-1500, 1500, total),
+        "positionError.xx": rng.uniform(0.01, 1, total),
+        "positionError.yy": rng.uniform(0.01, 1, total),
+        "positionError.zz": rng.uniform(0.01, 5, total),
+        "time": rng.uniform(0, 20, total),
+        "timeError": rng.uniform(0.01, 1, total),
+        "edep": rng.exponential(1e-4, total),
+        "edepError": rng.uniform(0, 1e-5, total),
+    }
+    return {f"{name}/{name}.{field}": _jagged(array if field == "cellID" else array.astype(np.float32), counts)
+            for field, array in values.items()}
+
+
+def _tracks(rng, n_tracks, points_per_track):
+    """Straight tracks from the vertex. Points are 50 mm apart and 0.2 ns apart"""
+    n_entries = len(n_tracks)
+    total_tracks = int(n_tracks.sum())
+    theta = rng.uniform(0.1, np.pi - 0.1, total_tracks)
+    phi = rng.uniform(-np.pi, np.pi, total_tracks)
+
+    # points_begin/points_end index points of the entry
+    track_begins = np.zeros(total_tracks, dtype=np.uint32)
+    entry_offsets = np.concatenate([[0], np.cumsum(n_tracks)])
+    for entry in range(n_entries):
+        start, stop = entry_offsets[entry], entry_offsets[entry + 1]
+        track_begins[start:stop] = np.arange(stop - start, dtype=np.uint32) * points_per_track
+
+    steps = np.tile(np.arange(1, points_per_track + 1), total_tracks)
+    point_theta = np.repeat(theta, points_per_track)
+    point_phi = np.repeat(phi, points_per_track)
+    path = steps * 50.0
+    total_points = len(steps)
+    points = {
+        "position.x": path * np.sin(point_theta) * np.cos(point_phi),
+        "position.y": path * np.sin(point_theta) * np.sin(point_phi),
+        "position.z": path * np.cos(point_theta),
+        "positionError.xx": rng.uniform(0.01, 1, total_points),
+        "positionError.yy": rng.uniform(0.01, 1, total_points),
+        "positionError.zz": rng.uniform(0.01, 1, total_points),
+        "time": steps * 0.2,
+        "timeError": rng.uniform(0.01, 0.1, total_points),
+        "pathlength": path,
+    }
+    parameters = {
+        "loc.a": rng.normal(0, 0.1, total_tracks),
+        "loc.b": rng.normal(0, 0.1, total_tracks),
+        "theta": theta,
+        "phi": phi,
+        "qOverP": rng.choice([-1, 1], total_tracks) / rng.uniform(0.5, 20, total_tracks),
+        "time": rng.normal(0, 0.1, total_tracks),
+    }
+
+    branches = {
+        f"{SEGMENTS}/{SEGMENTS}.points_begin": _jagged(track_begins, n_tracks),
+        f"{SEGMENTS}/{SEGMENTS}.points_end": _jagged(track_begins + points_per_track, n_tracks),
+    }
+    point_counts = n_tracks * points_per_track
+    for field, array in points.items():
+        branches[f"{POINTS}/{POINTS}.{field}"] = _jagged(array.astype(np.float32), point_counts)
+    for field, array in parameters.items():
+        branches[f"{PARAMETERS}/{PARAMETERS}.{field}"] = _jagged(array.astype(np.float32), n_tracks)
+    return branches
+
+
+def synthetic_batch(rng, n_entries, hit_counts, tracks_per_entry, points_per_track):
+    """Returns branch name => jagged array of n_entries. Numbers of hits and tracks are Poisson distributed"""
+    branches = {}
+    for name, mean_count in hit_counts.items():
+        branches.update(_tracker_hits(rng, name, rng.poisson(mean_count, n_entries)))
+    if tracks_per_entry:
+        branches.update(_tracks(rng, rng.poisson(tracks_per_entry, n_entries), points_per_track))
+    return branches
+
+
+def write_synthetic_events(path, n_entries=10, hit_counts=None, tracks_per_entry=20, points_per_track=10, seed=1):
+    """
+    Writes synthetic EDM4eic 'events' tree.
+
+    Parameters
+    ----------
+    path : str
+        Output ROOT file
+    n_entries : int
+        Number of entries
+    hit_counts : dict, optional
+        TrackerHitData collection name => mean number of hits per entry. DEFAULT_HIT_COUNTS if not given
+    tracks_per_entry : int
+        Mean number of CentralTrackSegments per entry. 0 - no track collections
+    points_per_track : int
+        Number of track points of each segment
+    seed : int
+        Random seed. The same arguments give the same file content
+
+    Returns
+    -------
+    str
+        path
+    """
+    if hit_counts is None:
+        hit_counts = DEFAULT_HIT_COUNTS
+    rng = np.random.default_rng(seed)
+
+    branch_types = {name: "vector<edm4eic::TrackerHitData>" for name in hit_counts}
+    if tracks_per_entry:
+        branch_types[SEGMENTS] = "vector<edm4eic::TrackSegmentData>"
+        branch_types[POINTS] = "vector<edm4eic::TrackPoint>"
+        branch_types[PARAMETERS] = "vector<edm4eic::TrackParametersData>"
+
+    with uproot.recreate(path) as file:
+        tree = None
+        for batch_start in range(0, n_entries, _BATCH_SIZE):
+            batch_size = min(_BATCH_SIZE, n_entries - batch_start)
+            batch = synthetic_batch(rng, batch_size, hit_counts, tracks_per_entry, points_per_track)
+            if tree is None:
+                # Branches of a collection share one counter, like podio collections share one size
+                tree = file.mktree("events",
+                                   {name: f"var * {array.layout.content.dtype}" for name, array in batch.items()},
+                                   counter_name=lambda name: "n" + name.split("/")[0],
+                                   title=flat_layout_title(branch_types))
+            tree.extend(batch)
+    return path
@@ -0,0 +1,126 @@
+"""
+Benchmarks of the conversion pipeline on a synthetic EDM4eic file
+and on the podio file of the unit tests (split branches, relations between collections).
+
+    pytest tests/benchmarks -m benchmark --benchmark-json=benchmark.json
+    python tests/benchmarks/baseline.py compare benchmark.json
+
+Benchmarks are deselected unless '-m benchmark' is given.
+Without pytest-benchmark each case runs once as a smoke test.
+"""
+
+import copy
+import os
+
+import pytest
+import uproot
+
+import pyrobird.server
+from pyrobird.cli.merge import merge_dex_files
+from pyrobird.cli.smooth import apply_smoothing
+from pyrobird.dex_columnar import FORMAT_COLUMNAR
+from pyrobird.edm4eic import edm4eic_to_dex_dict
+from pyrobird.server import flask_app
+
+pytestmark = pytest.mark.benchmark
+
+# Two events of craterlake reconstruction written by podio
+PODIO_TEST_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "unit_tests", "data",
+                               "reco_2024-09_craterlake_2evt.edm4eic.root")
+
+# All kinds of converted collections
+ALL_COLLECTIONS = ["tracker_hits", "tracks", "calorimeter_hits", "clusters", "mc_particles"]
+
+
+@pytest.fixture(scope="module")
+def tree(synthetic_file):
+    with uproot.open(synthetic_file) as file:
+        yield file["events"]
+
+
+@pytest.fixture(scope="module")
+def entries(tree):
+    return list(range(tree.num_entries))
+
+
+@pytest.fixture(scope="module")
+def podio_tree():
+    with uproot.open(PODIO_TEST_FILE) as file:
+        yield file["events"]
+
+
+@pytest.fixture
+def client(synthetic_file):
+    flask_app.config['TESTING'] = True
+    flask_app.config['PYROBIRD_DOWNLOAD_PATH'] = os.path.dirname(synthetic_file)
+    flask_app.config['PYROBIRD_DOWNLOAD_IS_DISABLED'] = False
+    flask_app.config['PYROBIRD_DOWNLOAD_IS_UNRESTRICTED'] = False
+    pyrobird.server.reset_result_cache()
+    yield flask_app.test_client()
+    pyrobird.server.reset_result_cache()
+
+
+def test_edm4eic_to_dex_dict(benchmark, tree, entries):
+    dex = benchmark(edm4eic_to_dex_dict, tree, entries)
+    assert len(dex["events"]) == len(entries)
+
+
+def test_edm4eic_to_dex_dict_columnar(benchmark, tree, entries):
+    dex = benchmark(edm4eic_to_dex_dict, tree, entries, dex_format=FORMAT_COLUMNAR)
+    assert len(dex["events"]) == len(entries)
+
+
+def test_edm4eic_to_dex_dict_single_entry(benchmark, tree):
+    dex = benchmark(edm4eic_to_dex_dict, tree, [0])
+    assert len(dex["events"]) == 1
+
+
+def test_podio_file_to_dex_dict(benchmark, podio_tree):
+    entries = list(range(podio_tree.num_entries))
+    dex = benchmark(edm4eic_to_dex_dict, podio_tree, entries, collections=ALL_COLLECTIONS)
+    assert len(dex["events"]) == len(entries)
+    assert dex["events"][0]["groups"]
+
+
+def test_podio_file_to_dex_dict_columnar(benchmark, podio_tree):
+    entries = list(range(podio_tree.num_entries))
+    dex = benchmark(edm4eic_to_dex_dict, podio_tree, entries, collections=ALL_COLLECTIONS, dex_format=FORMAT_COLUMNAR)
+    assert len(dex["events"]) == len(entries)
+
+
+def test_server_convert(benchmark, client, synthetic_file, entries):
+    url = f"/api/v1/convert/edm4eic/0-{len(entries) - 1}?f={os.path.basename(synthetic_file)}"
+
+    # Converted events are dropped before each round, the opened file is kept
+    response = benchmark.pedantic(client.get, args=(url,), setup=pyrobird.server.reset_result_cache, rounds=5)
+    assert response.status_code == 200
+    assert len(response.get_json()["events"]) == len(entries)
+
+
+def test_server_convert_cached(benchmark, client, synthetic_file, entries):
+    url = f"/api/v1/convert/edm4eic/0-{len(entries) - 1}?f={os.path.basename(synthetic_file)}"
+    client.get(url)
+
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+
+def test_merge_dex_files(benchmark, tree, entries):
+    hits = edm4eic_to_dex_dict(tree, entries, collections=["tracker_hits"])
+    tracks = edm4eic_to_dex_dict(tree, entries, collections=["tracks"])
+
+    merged = benchmark(merge_dex_files, [("hits.json", hits), ("tracks.json", tracks)])
+    assert len(merged["events"]) == len(entries)
+    assert len(merged["events"][0]["groups"]) == len(hits["events"][0]["groups"]) + 1
+
+
+def test_apply_smoothing(benchmark, tree, entries):
+    dex = edm4eic_to_dex_dict(tree, entries, collections=["tracks"])
+
+    # apply_smoothing modifies the data, each round gets a fresh copy
+    def setup():
+        return (copy.deepcopy(dex), 0.05), {}
+
+    smoothed = benchmark.pedantic(apply_smoothing, setup=setup, rounds=5)
+    trajectory = smoothed["events"][0]["groups"][0]["trajectories"][0]
+    assert len(trajectory["points"]) > len(dex["events"][0]["groups"][0]["trajectories"][0]["points"])
@@ -0,0 +1,9 @@
+import pytest
+
+from tests.podio_flat import use_flat_layout
+
+
+@pytest.fixture
+def flat_layout(monkeypatch):
+    """Trees written by uproot with tests.podio_flat.flat_layout_title are scanned as podio trees"""
+    use_flat_layout(monkeypatch)
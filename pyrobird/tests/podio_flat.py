@@ -0,0 +1,61 @@
+"""
+podio layout of trees written by uproot in tests and benchmarks.
+
+uproot can't write split branches, so such trees keep podio branch names as flat jagged branches
+and give the collection types in the tree title:
+    title: 'podio-flat {"TOFEndcapRecHits": "vector<edm4eic::TrackerHitData>", ...}'
+    'TOFEndcapRecHits/TOFEndcapRecHits.position.x': 'float[]',
+use_flat_layout makes pyrobird.podio scan them as if the branches were split.
+"""
+
+import json
+from collections import OrderedDict
+
+import pyrobird.podio
+
+# Title prefix of trees with flat layout
+FLAT_LAYOUT_TITLE_PREFIX = "podio-flat "
+
+
+def flat_layout_title(branch_types):
+    """
+    Returns the title of a flat layout tree.
+
+    Parameters
+    ----------
+    branch_types : dict
+        Top level branch name => class name, e.g. 'TOFEndcapRecHits' => 'vector<edm4eic::TrackerHitData>'
+    """
+    return FLAT_LAYOUT_TITLE_PREFIX + json.dumps(branch_types)
+
+
+def flat_branch_infos(tree):
+    """
+    Returns (name, class name, sub branch names) of podio branches of a flat layout tree
+    or None if the tree has usual podio layout
+    """
+    title = getattr(tree, "title", None) or ""
+    if not title.startswith(FLAT_LAYOUT_TITLE_PREFIX):
+        return None
+    branch_types = json.loads(title[len(FLAT_LAYOUT_TITLE_PREFIX):])
+
+    # 'Coll/Coll.position.x' => 'Coll': ['Coll.position.x', ...]
+    sub_names_by_branch = OrderedDict()
+    for branch in tree.branches:
+        top_name, _, sub_name = branch.name.partition("/")
+        # Branches without '/' are jagged array counters
+        if sub_name:
+            sub_names_by_branch.setdefault(top_name, []).append(sub_name)
+    return [(name, branch_types.get(name, ""), sub_names) for name, sub_names in sub_names_by_branch.items()]
+
+
+def use_flat_layout(monkeypatch):
+    """Patches the podio schema scanner to understand flat layout trees (monkeypatch is pytest.MonkeyPatch)"""
+    split_branch_infos = pyrobird.podio._branch_infos
+
+    def branch_infos(tree):
+        infos = flat_branch_infos(tree)
+        return split_branch_infos(tree) if infos is None else infos
+
+    monkeypatch.setattr(pyrobird.podio, "_branch_infos", branch_infos)
+    pyrobird.podio.clear_schema_cache()
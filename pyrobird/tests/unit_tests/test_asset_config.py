@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from pyrobird.server import flask_app, CFG_FIREBIRD_CONFIG_PATH, CFG_API_BASE_URL, get_asset_config, \
+    reset_asset_config, asset_config_path
+from pyrobird.server.asset_config import AssetConfig, with_timestamp
+
+CONFIG_TEXT = """
+// Firebird config
+{
+  "colors": ["red", "green"],   // trailing comma is fine in jsonc
+  "timestamp": "old",
+}
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    path = tmp_path / "config.jsonc"
+    path.write_text(CONFIG_TEXT)
+    return path
+
+
+@pytest.fixture
+def client(config_file):
+    flask_app.config['TESTING'] = True
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = str(config_file)
+    flask_app.config[CFG_API_BASE_URL] = ""
+    reset_asset_config()
+    yield flask_app.test_client()
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = ""
+    reset_asset_config()
+
+
+def test_parse_once_and_reload(config_file):
+    config = AssetConfig(str(config_file))
+    assert config.base()["colors"] == ["red", "green"]
+    config.base()
+    first = config.response_text("localhost", "5454", "http", "", json.dumps)
+    assert config.response_text("localhost", "5454", "http", "", json.dumps) is first
+    assert config.loads == 1
+
+    config_file.write_text('{"colors": ["blue"]}')
+    stat = os.stat(config_file)
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert json.loads(config.response_text("localhost", "5454", "http", "", json.dumps))["colors"] == ["blue"]
+    assert config.loads == 2
+
+
+def test_response_fields(config_file):
+    config = AssetConfig(str(config_file))
+    result = json.loads(config.response_text("example.org", "8080", "https", "", json.dumps))
+    assert "timestamp" not in result
+    assert result["serverPort"] == 8080
+    assert result["serverHost"] == "example.org"
+    assert result["apiBaseUrl"] == "https://example.org:8080"
+    assert "serverHost" not in config.base()
+
+    api_result = json.loads(config.response_text("example.org", "8080", "https", "https://api.org", json.dumps))
+    assert api_result["apiBaseUrl"] == "https://api.org"
+
+    result = json.loads(with_timestamp(json.dumps(result), "2024-10-01T00:00:00", json.dumps))
+    assert result["timestamp"] == "2024-10-01T00:00:00"
+    assert result["serverPort"] == 8080
+
+
+def test_missing_file(tmp_path):
+    config = AssetConfig(str(tmp_path / "missing.jsonc"))
+    result = json.loads(config.response_text("localhost", "80", "http", "", json.dumps))
+    assert result["servedByPyrobird"]
+    config.base()
+    assert config.loads == 1
+
+
+def test_config_path(config_file, tmp_path, monkeypatch):
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = ""
+    assert asset_config_path() == os.path.join(flask_app.static_folder, "assets", "config.jsonc")
+
+    monkeypatch.chdir(tmp_path)
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = "config.jsonc"
+    assert asset_config_path() == str(config_file)
+
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = "assets/other.jsonc"
+    assert asset_config_path() == os.path.join(flask_app.static_folder, "assets", "other.jsonc")
+    flask_app.config[CFG_FIREBIRD_CONFIG_PATH] = ""
+
+
+def test_route_uses_config_path(client):
+    response = client.get("/assets/config.jsonc", headers={"Host": "example.org:5454"})
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result["colors"] == ["red", "green"]
+    assert result["serverPort"] == 5454
+    assert result["apiBaseUrl"] == "http://example.org:5454"
+    assert result["timestamp"] != "old"
+
+    client.get("/assets/config.jsonc", headers={"Host": "example.org:5454"})
+    assert get_asset_config().loads == 1
@@ -34,3 +34,52 @@ def test_get_default_host():
     # Case 2: Not running in container
     with patch('pyrobird.cli.serve.is_running_in_container', return_value=False):
         assert get_default_host() is None
+
+
+def test_lazy_subcommands_short_help():
+    """Short help shown by `pyrobird --help` matches the commands"""
+    import importlib
+    from pyrobird.cli import LAZY_SUBCOMMANDS
+
+    for name, (module_name, attr_name, short_help) in LAZY_SUBCOMMANDS.items():
+        command = getattr(importlib.import_module(module_name), attr_name)
+        assert command.help.strip().startswith(short_help.rstrip('.')), name
+
+
+def test_cli_imports_only_invoked_command(tmp_path):
+    """`pyrobird --help` and light commands don't import the server, uproot or numpy"""
+    import json
+    import subprocess
+    import sys
+
+    for name in ("a.json", "b.json"):
+        dex = {"type": "firebird-dex-json", "version": "0.04",
+               "events": [{"id": 0, "groups": [{"name": name, "type": "BoxHit", "hits": []}]}]}
+        (tmp_path / name).write_text(json.dumps(dex))
+
+    for args in (['merge', '--help'],
+                 ['merge', str(tmp_path / "a.json"), str(tmp_path / "b.json"), '-o', str(tmp_path / "merged.json")]):
+        code = ("import sys\n"
+                "from pyrobird.cli import cli_app\n"
+                f"cli_app({args!r}, standalone_mode=False)\n"
+                "print(','.join(m for m in ('flask', 'uproot', 'awkward', 'numpy', 'pyrobird.server', "
+                "'pyrobird.cli.merge') if m in sys.modules))\n")
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        assert result.stdout.strip().splitlines()[-1] == "pyrobird.cli.merge", args
+    assert len(json.loads((tmp_path / "merged.json").read_text())["events"][0]["groups"]) == 2
+
+
+def test_cli_startup_time():
+    """Time budget of `pyrobird --help`. It was over 1s when all commands were imported"""
+    import subprocess
+    import sys
+    import time
+
+    budget = 0.6
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "pyrobird.cli", "--help"], capture_output=True, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert best < budget, f"pyrobird --help took {best:.2f}s, budget is {budget}s"
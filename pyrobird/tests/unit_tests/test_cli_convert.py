@@ -124,3 +124,28 @@ def test_guess_output_name(input_entry, expected_output, output_extension):
 def test_guess_output_name_none_input():
     with pytest.raises(TypeError):
         guess_output_name(None)
+
+
+def test_convert_columnar_format(runner):
+    from pyrobird.dex_columnar import decode_dex
+    rows_result = runner.invoke(convert, [TEST_ROOT_FILE, '--output', '-'])
+    result = runner.invoke(convert, [TEST_ROOT_FILE, '--output', '-', '--format', 'columnar-base64'])
+
+    assert result.exit_code == 0, result.output
+    data = json.loads(result.output)
+    assert data["version"] == "0.05"
+    assert data["events"][0]["groups"][0]["columns"]["x"]["dtype"] == "float32"
+    assert len(decode_dex(data)["events"][0]["groups"]) == len(json.loads(rows_result.output)["events"][0]["groups"])
+
+
+def test_convert_binary_output(runner, tmp_path):
+    from pyrobird.dex_utils import load_dex_file
+    json_file = str(tmp_path / 'test.firebird.json')
+    bin_file = str(tmp_path / 'test.firebird.bin')
+    assert runner.invoke(convert, [TEST_ROOT_FILE, '-o', json_file, '-e', '0-1']).exit_code == 0
+    result = runner.invoke(convert, [TEST_ROOT_FILE, '-o', bin_file, '-e', '0-1'])
+    assert result.exit_code == 0, result.output
+
+    with open(bin_file, 'rb') as f:
+        assert f.read(8) == b"FBDEXBIN"
+    assert load_dex_file(bin_file)["events"] == load_dex_file(json_file)["events"]
@@ -505,4 +505,31 @@ def test_merge_event_groups():
     # Verify that group1 from file2 overwrote the one from file1
     for group in merged_event["groups"]:
         if group["name"] == "group1":
-            assert group["data"] == [10, 11, 12]  # From event2, not event1
\ No newline at end of file
+            assert group["data"] == [10, 11, 12]  # From event2, not event1
+
+def test_merge_columnar_files(tmp_path):
+    """Columnar (DEX 0.05) inputs are decoded, and the output format is chosen by --format."""
+    from pyrobird.dex_columnar import encode_dex
+
+    def make_dex(group_name, x):
+        hit = {"pos": [x, 2.0, 3.0], "dim": [0.5, 0.5, 0.5], "t": [1.0, 0.0], "ed": [0.25, 0.0]}
+        return {"type": "firebird-dex-json", "version": "0.04", "origin": {},
+                "events": [{"id": 0, "groups": [{"name": group_name, "type": "BoxHit", "hits": [hit]}]}]}
+
+    file1 = tmp_path / "file1.firebird.json"
+    file2 = tmp_path / "file2.firebird.json"
+    file1.write_text(json.dumps(encode_dex(make_dex("VertexHits", 1.0), "columnar")))
+    file2.write_text(json.dumps(make_dex("EndcapHits", 5.0)))
+
+    runner = CliRunner()
+    result = runner.invoke(merge, [str(file1), str(file2)])
+    assert result.exit_code == 0, result.output
+    merged = json.loads(result.output)
+    assert merged["version"] == "0.04"
+    assert merged["events"][0]["groups"][0]["hits"][0]["pos"] == [1.0, 2.0, 3.0]
+
+    result = runner.invoke(merge, ["--format", "columnar", str(file1), str(file2)])
+    assert result.exit_code == 0, result.output
+    merged = json.loads(result.output)
+    assert merged["version"] == "0.05"
+    assert [group["columns"]["x"] for group in merged["events"][0]["groups"]] == [[1.0], [5.0]]
@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from pyrobird.server.conversion import (ConvertPool, ConvertPoolBusy, ConvertError, convert_file_entries,
+                                        DEX_BINARY_FORMAT)
+from pyrobird.server.file_cache import OpenFileCache
+from pyrobird.timing import StageTimings
+
+# Path to the test ROOT file
+TEST_ROOT_FILE = os.path.join(os.path.dirname(__file__), 'data', 'reco_2024-09_craterlake_2evt.edm4eic.root')
+
+
+def test_convert_file_entries_skips_missing_entries():
+    cache = OpenFileCache()
+    num_entries, converted = convert_file_entries(cache, TEST_ROOT_FILE, [1, 5])
+    assert num_entries == 2
+    assert list(converted.keys()) == [1]
+    assert json.loads(converted[1])["id"] == 1
+
+    # Empty entries only check the file
+    assert convert_file_entries(cache, TEST_ROOT_FILE, []) == (2, {})
+
+    _, converted = convert_file_entries(cache, TEST_ROOT_FILE, [0], dex_format=DEX_BINARY_FORMAT)
+    assert converted[0].startswith(b"FBDEXBIN")
+    cache.clear()
+
+
+def test_convert_file_entries_errors(tmp_path):
+    invalid_file = tmp_path / "invalid.root"
+    invalid_file.write_text("This is not a ROOT file")
+    with pytest.raises(ConvertError) as error:
+        convert_file_entries(OpenFileCache(), str(invalid_file), [0])
+    assert error.value.status == 500
+
+
+def test_pool_converts_in_worker():
+    pool = ConvertPool(2, max_queue_depth=2)
+    try:
+        num_entries, converted = pool.convert(TEST_ROOT_FILE, [0, 1])
+        _, expected = convert_file_entries(OpenFileCache(), TEST_ROOT_FILE, [0, 1])
+        assert num_entries == 2
+        assert converted == expected
+
+        # Stages measured in the worker are passed back
+        timings = StageTimings()
+        assert pool.convert(TEST_ROOT_FILE, [0], timings=timings)[1] == {0: expected[0]}
+        assert {"open", "read", "serialize"} <= timings.stages.keys()
+
+        # Errors are passed from the worker
+        with pytest.raises(ConvertError) as error:
+            pool.convert("/nonexistent/file.root", [0])
+        assert error.value.status == 500
+        assert pool.stats()["queued"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_pool_rejects_when_queues_are_full():
+    pool = ConvertPool(1, max_queue_depth=1, retry_after=3)
+    try:
+        # The worker process is still starting, so the first task stays in the queue
+        future = pool.submit(TEST_ROOT_FILE, [0])
+        with pytest.raises(ConvertPoolBusy) as busy:
+            pool.submit(TEST_ROOT_FILE, [1])
+        assert busy.value.retry_after == 3
+        assert pool.stats()["rejected"] == 1
+
+        future.result()
+        # Queue is free again
+        assert pool.convert(TEST_ROOT_FILE, [1])[1].keys() == {1}
+    finally:
+        pool.shutdown()
+
+
+def test_pool_background_tasks_leave_queue_to_requests():
+    pool = ConvertPool(1, max_queue_depth=1)
+    try:
+        assert pool.is_idle(TEST_ROOT_FILE)
+        background = pool.submit(TEST_ROOT_FILE, [1], background=True)
+        assert not pool.is_idle(TEST_ROOT_FILE)
+
+        # Background task doesn't take the queue slot of a request
+        assert pool.submit(TEST_ROOT_FILE, [0]).result()[1].keys() == {0}
+        assert background.result()[1].keys() == {1}
+        assert pool.stats()["rejected"] == 0
+        assert pool.is_idle(TEST_ROOT_FILE)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,98 @@
+import json
+
+import numpy as np
+import pytest
+
+from pyrobird.dex_arrays import BoxHitArrays, BOX_HIT_COLUMNS, dex_to_json, materialize_group
+
+
+def make_hits(count=5, dtype=np.float32):
+    rng = np.random.default_rng(42)
+    return BoxHitArrays({name: rng.random(count).astype(dtype) for name in BOX_HIT_COLUMNS})
+
+
+def test_to_list_row_form():
+    hits = make_hits(3)
+    rows = hits.to_list()
+
+    assert len(rows) == 3
+    assert rows[1]["pos"] == [hits["x"][1].item(), hits["y"][1].item(), hits["z"][1].item()]
+    assert rows[1]["dim"] == [hits["dx"][1].item(), hits["dy"][1].item(), hits["dz"][1].item()]
+    assert rows[1]["t"] == [hits["t"][1].item(), hits["dt"][1].item()]
+    assert rows[1]["ed"] == [hits["ed"][1].item(), hits["ded"][1].item()]
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_to_json_same_as_json_dumps(separators):
+    hits = make_hits(7)
+    assert hits.to_json(separators) == json.dumps(hits.to_list(), separators=separators)
+
+
+def test_empty_hits():
+    hits = BoxHitArrays.from_list([])
+    assert len(hits) == 0
+    assert hits.to_list() == []
+    assert hits.to_json() == "[]"
+
+
+def test_from_list_round_trip():
+    hits = make_hits(4, dtype=np.float64)
+    assert BoxHitArrays.from_list(hits.to_list()) == hits
+
+
+def test_take_and_nbytes():
+    hits = make_hits(10)
+    assert hits.nbytes == 10 * 4 * len(BOX_HIT_COLUMNS)
+
+    selected = hits.take(hits["ed"] > 0.5)
+    assert len(selected) == int(np.sum(hits["ed"] > 0.5))
+    assert np.all(selected["ed"] > 0.5)
+
+
+def test_invalid_columns():
+    with pytest.raises(ValueError):
+        BoxHitArrays({"x": np.zeros(3)})
+
+    columns = {name: np.zeros(3) for name in BOX_HIT_COLUMNS}
+    columns["ed"] = np.zeros(4)
+    with pytest.raises(ValueError):
+        BoxHitArrays(columns)
+
+
+def test_dex_to_json_document():
+    hits = make_hits(3)
+    document = {
+        "type": "firebird-dex-json",
+        "version": "0.04",
+        "origin": {"file": "test.root"},
+        "events": [
+            {"id": 0, "groups": [
+                {"name": "Hits", "type": "BoxHit", "origin": {}, "hits": hits},
+                {"name": "Tracks", "type": "PointTrajectory", "trajectories": []},
+            ]},
+        ]
+    }
+
+    text = dex_to_json(document)
+
+    # Arrays are not replaced in the source document
+    assert document["events"][0]["groups"][0]["hits"] is hits
+
+    expected = json.loads(json.dumps(document, default=lambda obj: obj.to_list()))
+    assert json.loads(text) == expected
+    assert text == json.dumps(expected)
+
+
+def test_dex_to_json_event_and_group():
+    hits = make_hits(2)
+    group = {"name": "Hits", "type": "BoxHit", "hits": hits}
+
+    assert json.loads(dex_to_json(group))["hits"] == hits.to_list()
+    assert json.loads(dex_to_json({"id": 1, "groups": [group]}))["groups"][0]["hits"] == hits.to_list()
+    assert json.loads(dex_to_json([{"id": 1, "groups": [group]}]))[0]["groups"][0]["hits"] == hits.to_list()
+
+
+def test_materialize_group():
+    hits = make_hits(2)
+    group = materialize_group({"name": "Hits", "type": "BoxHit", "hits": hits})
+    assert group["hits"] == hits.to_list()
@@ -0,0 +1,73 @@
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+import uproot
+
+from pyrobird.dex_arrays import BoxHitArrays, BOX_HIT_COLUMNS
+from pyrobird.dex_binary import write_dex_binary, read_dex_binary, assemble_dex_binary, is_dex_binary
+from pyrobird.edm4eic import edm4eic_to_dex_dict
+
+# Path to the test ROOT file
+TEST_ROOT_FILE = os.path.join(os.path.dirname(__file__), 'data', 'reco_2024-09_craterlake_2evt.edm4eic.root')
+
+
+def make_event(event_id, count=3, as_arrays=False):
+    rng = np.random.default_rng(event_id)
+    hits = BoxHitArrays({name: rng.random(count).astype(np.float32) for name in BOX_HIT_COLUMNS})
+    return {
+        "id": event_id,
+        "groups": [
+            {"name": "Hits", "type": "BoxHit", "origin": {"type": "edm4eic::TrackerHitData"}, "hits": hits if as_arrays else hits.to_list()},
+            {"name": "Tracks", "type": "PointTrajectory", "origin": [], "paramColumns": ["pdg"],
+             "pointColumns": ["x", "t"],
+             "trajectories": [{"points": [[0.1, 1.0 / 3.0]], "params": [1000020040.0]},
+                              {"points": [], "params": []}]},
+            {"name": "Other", "type": "Unknown", "data": {"a": [1, 2]}},
+        ],
+    }
+
+
+def test_round_trip_is_lossless():
+    dex = {"type": "firebird-dex-json", "version": "0.04", "origin": {"file": "a.root"},
+           "events": [make_event(0), make_event(1)]}
+    data = write_dex_binary(dex)
+
+    assert is_dex_binary(data)
+    assert json.dumps(read_dex_binary(data)) == json.dumps(dex)
+
+
+def test_payloads_are_aligned_typed_arrays():
+    data = write_dex_binary(make_event(0, count=5, as_arrays=True))
+    magic, version, header_size = struct.unpack_from("<8sII", data)
+    assert (magic, version) == (b"FBDEXBIN", 1)
+    assert header_size % 8 == 0
+
+    header = read_dex_binary(data, as_rows=False)
+    x = header["groups"][0]["columns"]["x"]
+    assert x.dtype == np.float32 and len(x) == 5
+    # float64 python values are kept as float64
+    assert header["groups"][1]["points"]["t"].dtype == np.float64
+
+
+def test_edm4eic_round_trip():
+    tree = uproot.open(TEST_ROOT_FILE)["events"]
+    rows = edm4eic_to_dex_dict(tree, [0, 1], {"file": "test"})
+    data = write_dex_binary(edm4eic_to_dex_dict(tree, [0, 1], {"file": "test"}, as_arrays=True))
+    assert json.dumps(read_dex_binary(data), sort_keys=True) == json.dumps(rows, sort_keys=True)
+
+
+def test_assemble_events():
+    events = [make_event(0), make_event(1, count=4)]
+    data = assemble_dex_binary({"type": "firebird-dex-json", "version": "0.05", "origin": {}},
+                               [write_dex_binary(event) for event in events])
+    assert read_dex_binary(data)["events"] == events
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError):
+        read_dex_binary(b'{"events": []}')
+    with pytest.raises(ValueError):
+        read_dex_binary(write_dex_binary(make_event(0))[:-8])
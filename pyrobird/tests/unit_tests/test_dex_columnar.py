@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+
+from pyrobird.dex_arrays import BoxHitArrays, BOX_HIT_COLUMNS
+from pyrobird.dex_columnar import (encode_dex, decode_dex, encode_group, decode_group, pack_column, unpack_column,
+                                   FORMAT_ROWS, FORMAT_COLUMNAR, FORMAT_COLUMNAR_BASE64)
+
+
+def make_box_hit_group(count=4):
+    rng = np.random.default_rng(1)
+    # float32 values survive packing to float32 buffers
+    hits = BoxHitArrays({name: rng.random(count).astype(np.float32) for name in BOX_HIT_COLUMNS})
+    return {"name": "VertexHits", "type": "BoxHit", "origin": {"type": "edm4eic::TrackerHitData"},
+            "hits": hits.to_list()}
+
+
+def make_trajectory_group():
+    return {
+        "name": "Tracks",
+        "type": "PointTrajectory",
+        "origin": ["edm4eic::TrackPoint"],
+        "paramColumns": ["theta", "pdg"],
+        "pointColumns": ["x", "y", "z", "t"],
+        "trajectories": [
+            {"points": [[1.0, 2.0, 3.0, 0.5], [1.5, 2.5, 3.5, 0.75]], "params": [0.25, 1000020040.0]},
+            {"points": [], "params": [0.5, 11.0]},
+            {"points": [[-1.0, -2.0, -3.0, 1.25]], "params": []},
+        ],
+    }
+
+
+def make_dex():
+    return {
+        "type": "firebird-dex-json",
+        "version": "0.04",
+        "origin": {"file": "test.root"},
+        "events": [{"id": 0, "groups": [make_box_hit_group(), make_trajectory_group(),
+                                        {"name": "Other", "type": "Unknown", "data": [1, 2]}]}],
+    }
+
+
+@pytest.mark.parametrize("dex_format", [FORMAT_COLUMNAR, FORMAT_COLUMNAR_BASE64])
+def test_round_trip(dex_format):
+    dex = make_dex()
+    encoded = encode_dex(dex, dex_format)
+    assert encoded["version"] == "0.05"
+
+    # Goes through JSON text as it would be in a file
+    encoded = json.loads(json.dumps(encoded))
+    box_hits, trajectories, other = encoded["events"][0]["groups"]
+    assert box_hits["encoding"] == "columnar"
+    assert box_hits["count"] == 4
+    assert "hits" not in box_hits
+    assert unpack_column(trajectories["offsets"]).tolist() == [0, 2, 2, 3]
+    assert trajectories["hasParams"] == [1, 1, 0]
+    assert other == dex["events"][0]["groups"][2]
+
+    decoded = decode_dex(encoded)
+    assert decoded["version"] == "0.04"
+    assert decoded["events"] == dex["events"]
+
+
+def test_rows_format_is_unchanged():
+    dex = make_dex()
+    assert encode_dex(dex, FORMAT_ROWS) is dex
+    assert decode_dex(dex) is dex
+    with pytest.raises(ValueError):
+        encode_dex(dex, "xml")
+
+
+def test_columnar_plain_lists():
+    group = encode_group(make_trajectory_group(), FORMAT_COLUMNAR)
+    assert group["points"]["x"] == [1.0, 1.5, -1.0]
+    assert group["params"]["pdg"] == [1000020040.0, 11.0]
+
+
+def test_box_hit_arrays_are_encoded():
+    group = make_box_hit_group(3)
+    group_with_arrays = dict(group, hits=BoxHitArrays.from_list(group["hits"]))
+    assert encode_group(group_with_arrays) == encode_group(group)
+    assert decode_group(encode_group(group)) == group
+
+
+def test_not_matching_points_are_left_as_rows():
+    group = make_trajectory_group()
+    group["trajectories"][0]["points"][0] = [1.0, 2.0]
+    assert encode_group(group, FORMAT_COLUMNAR) is group
+
+
+def test_packed_column_little_endian():
+    column = pack_column([1.0, -2.0], "float32")
+    assert column == {"dtype": "float32", "base64": "AACAPwAAAMA="}
+    assert unpack_column(column).tolist() == [1.0, -2.0]
+    with pytest.raises(ValueError):
+        unpack_column({"dtype": "float16", "base64": ""})
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from pyrobird.dex_arrays import BoxHitArrays, BOX_HIT_COLUMNS
+from pyrobird.dex_lod import apply_lod, sample_hits, stratified_budgets, voxel_aggregate, LOD_SAMPLE, LOD_VOXEL
+
+
+def make_hits(count, seed=42):
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.random(count) for name in BOX_HIT_COLUMNS}
+    for axis in ("x", "y", "z"):
+        columns[axis] = rng.uniform(-100, 100, count)
+    return BoxHitArrays(columns)
+
+
+def make_group(name, hits, **extra):
+    return dict({"name": name, "type": "BoxHit", "origin": {"type": "edm4eic::TrackerHitData", "name": name},
+                 "hits": hits}, **extra)
+
+
+def test_voxel_aggregate():
+    hits = BoxHitArrays.from_list([
+        {"pos": [1, 1, 1], "dim": [1, 1, 1], "t": [5, 1], "ed": [1, 3]},
+        {"pos": [25, 1, 1], "dim": [1, 1, 1], "t": [2, 1], "ed": [2, 0]},
+        {"pos": [3, 1, 1], "dim": [1, 1, 1], "t": [1, 1], "ed": [3, 4]},
+    ])
+    voxels = voxel_aggregate(hits, 10)
+
+    # Voxels are in the order of their first hit
+    assert voxels.to_list() == [
+        {"pos": [2.5, 1.0, 1.0], "dim": [10.0, 10.0, 10.0], "t": [1.0, 4.0], "ed": [4.0, 5.0]},
+        {"pos": [25.0, 1.0, 1.0], "dim": [10.0, 10.0, 10.0], "t": [2.0, 0.0], "ed": [2.0, 0.0]},
+    ]
+
+
+def test_voxel_aggregate_keeps_energy():
+    hits = make_hits(1000)
+    voxels = voxel_aggregate(hits, 50)
+    assert 0 < len(voxels) < len(hits)
+    assert np.isclose(np.sum(voxels["ed"]), np.sum(hits["ed"]))
+    assert np.all(np.abs(voxels["x"]) <= 100)
+
+    with pytest.raises(ValueError):
+        voxel_aggregate(hits, 0)
+
+
+def test_stratified_budgets():
+    assert stratified_budgets([10, 500, 1000], 310) == [10, 150, 150]
+    assert stratified_budgets([10, 20], 100) == [10, 20]
+    assert stratified_budgets([100, 100, 100], 100) == [33, 33, 34]
+    assert stratified_budgets([], 100) == []
+
+
+def test_sample_hits_is_reproducible():
+    hits = make_hits(100)
+    selected = sample_hits(hits, 10, seed=7)
+    assert len(selected) == 10
+    assert np.all(np.diff(selected) > 0)
+    assert np.array_equal(selected, sample_hits(hits, 10, seed=7))
+    assert np.array_equal(sample_hits(hits, 200), np.arange(100))
+
+
+def test_apply_lod_sample():
+    small = make_hits(5).to_list()
+    groups = [make_group("Small", small), make_group("Large", make_hits(1000))]
+    apply_lod(groups, LOD_SAMPLE, max_hits=105)
+
+    assert len(groups[0]["hits"]) == 5
+    assert "lod" not in groups[0]["origin"]
+    assert groups[0]["hits"].to_list() == small
+    assert len(groups[1]["hits"]) == 100
+    assert groups[1]["origin"]["lod"] == {"method": "sample", "maxHits": 105, "totalHits": 1000, "keptHits": 100}
+
+
+def test_apply_lod_removes_links():
+    particles = {"name": "MCParticles", "type": "PointTrajectory", "trajectories": []}
+    hits = make_group("Hits", make_hits(100), links={"particles": {"collection": "MCParticles", "indexes": []}})
+    clusters = make_group("Clusters", make_hits(3, seed=1), links={
+        "hits": {"collection": "Hits", "offsets": [0, 0, 0, 0], "indexes": []},
+        "particles": {"collection": "MCParticles", "indexes": [-1, -1, -1]},
+    })
+    groups = apply_lod([particles, hits, clusters], LOD_SAMPLE, max_hits=13)
+
+    # Clusters keep their hits and the links to particles, the links to the sampled hits are removed
+    assert len(hits["hits"]) == 10
+    assert hits["origin"]["lod"]["keptHits"] == 10
+    assert "links" not in hits
+    assert len(clusters["hits"]) == 3
+    assert list(clusters["links"]) == ["particles"]
+    assert groups[0] is particles
+
+
+@pytest.mark.parametrize("method, parameters", [
+    ("unknown", {}),
+    (LOD_VOXEL, {}),
+    (LOD_VOXEL, {"voxel_size": -1}),
+    (LOD_SAMPLE, {"max_hits": None}),
+])
+def test_apply_lod_invalid(method, parameters):
+    with pytest.raises(ValueError):
+        apply_lod([], method, **parameters)
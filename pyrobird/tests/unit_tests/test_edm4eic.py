@@ -12,6 +12,7 @@ from pyrobird.edm4eic import tracker_hits_to_box_hits
 
 import pytest
 from pyrobird.edm4eic import parse_entry_numbers
+from tests.podio_flat import flat_layout_title
 
 
 # Path to the test ROOT file
@@ -158,6 +159,273 @@ def test_tracker_hits_to_box_hits():
             # Perform the same checks as before
 
 
+def test_edm4eic_to_dex_dict_batch_matches_single_entries():
+    from pyrobird.edm4eic import edm4eic_to_dex_dict
+
+    file = uproot.open(TEST_ROOT_FILE)
+    tree = file['events']
+
+    # Entries are read in one pass, but the result must be the same as entry by entry conversion
+    dex = edm4eic_to_dex_dict(tree, [1, 0, 1])
+    assert [event["id"] for event in dex["events"]] == [1, 0, 1]
+    for event in dex["events"]:
+        assert event == edm4eic_entry_to_dict(tree, entry_index=event["id"])
+
+
+def test_edm4eic_to_dex_dict_as_arrays():
+    from pyrobird.edm4eic import edm4eic_to_dex_dict
+    from pyrobird.dex_arrays import BoxHitArrays, dex_to_json
+
+    file = uproot.open(TEST_ROOT_FILE)
+    tree = file['events']
+
+    rows_dex = edm4eic_to_dex_dict(tree, [0, 1])
+    arrays_dex = edm4eic_to_dex_dict(tree, [0, 1], as_arrays=True)
+
+    box_groups = [group for event in arrays_dex["events"] for group in event["groups"] if group["type"] == "BoxHit"]
+    assert box_groups
+    assert all(isinstance(group["hits"], BoxHitArrays) for group in box_groups)
+
+    # Arrays are written to exactly the same JSON
+    assert dex_to_json(arrays_dex) == json.dumps(rows_dex)
+
+
+def test_entry_range_arrays_split_by_entries():
+    from pyrobird.edm4eic import EntryRangeArrays
+
+    file = uproot.open(TEST_ROOT_FILE)
+    tree = file['events']
+    branch = 'B0TrackerRecHits/B0TrackerRecHits.edep'
+
+    arrays = EntryRangeArrays(tree, [branch], 0, 2)
+    expected = tree[branch].array(entry_start=0, entry_stop=2)
+
+    assert branch in arrays
+    assert arrays.get(branch, 0).tolist() == expected[0].tolist()
+    assert arrays.get(branch, 1).tolist() == expected[1].tolist()
+    assert arrays.get(branch, 0, 2).tolist() == ak.flatten(expected).tolist()
+
+    with pytest.raises(IndexError):
+        arrays.get(branch, 2)
+
+
+def test_edm4eic_entries_per_collection_timings():
+    from pyrobird.edm4eic import edm4eic_entries_to_dicts
+    from pyrobird.timing import StageTimings
+
+    file = uproot.open(TEST_ROOT_FILE)
+    tree = file['events']
+
+    # Collections read one by one give the same events
+    timings = StageTimings(per_collection=True)
+    events = edm4eic_entries_to_dicts(tree, [0, 1], timings=timings)
+    assert events == edm4eic_entries_to_dicts(tree, [0, 1])
+    assert {"schema", "read", "assemble"} <= timings.stages.keys()
+    assert "B0TrackerRecHits" in timings.collections
+    assert "CentralTrackSegments" in timings.collections
+
+
+def _loop_track_segments(tree, branch_name, entry):
+    """Reference implementation: point by point loop the vectorized converter replaced"""
+    def values(branch):
+        return ak.flatten(tree[branch].array(entry_start=entry, entry_stop=entry + 1)).to_list()
+
+    points = f"_{branch_name}_points"
+    begins = values(f"{branch_name}/{branch_name}.points_begin")
+    ends = values(f"{branch_name}/{branch_name}.points_end")
+    p = {field: values(f"{points}/{points}.{field}") for field in
+         ("position.x", "position.y", "position.z", "time", "timeError",
+          "positionError.xx", "positionError.yy", "positionError.zz")}
+    params = [values(f"CentralCKFTrackParameters/CentralCKFTrackParameters.{field}")
+              for field in ("theta", "phi", "qOverP", "loc.a", "loc.b", "time")]
+
+    trajectories = []
+    for seg_index in range(len(begins)):
+        segment_points = []
+        for i in range(begins[seg_index], ends[seg_index]):
+            dx = 2.0 * np.sqrt(p["positionError.xx"][i]) if p["positionError.xx"][i] > 0 else 0.0
+            dy = 2.0 * np.sqrt(p["positionError.yy"][i]) if p["positionError.yy"][i] > 0 else 0.0
+            dz = 2.0 * np.sqrt(p["positionError.zz"][i]) if p["positionError.zz"][i] > 0 else 0.0
+            segment_points.append([p["position.x"][i], p["position.y"][i], p["position.z"][i], p["time"][i],
+                                   dx, dy, dz, p["timeError"][i]])
+        segment_params = [column[seg_index] for column in params] if seg_index < len(params[0]) else []
+        trajectories.append({"points": segment_points, "params": segment_params})
+    return trajectories
+
+
+def _write_flat_tracks(path):
+    """Two entries of CentralTrackSegments with zero, negative and NaN variances and a missing parameter"""
+    points = "_CentralTrackSegments_points"
+    params = "CentralCKFTrackParameters"
+    branches = {
+        "CentralTrackSegments/CentralTrackSegments.points_begin": ak.Array([[0, 2, 3], [0]]),
+        "CentralTrackSegments/CentralTrackSegments.points_end": ak.Array([[2, 3, 3], [2]]),
+    }
+    point_values = {
+        "position.x": [[1.5, 2.5, 3.5], [4.5, 5.5]],
+        "position.y": [[0.1, 0.2, 0.3], [0.4, 0.5]],
+        "position.z": [[10.0, 20.0, 30.0], [40.0, 50.0]],
+        "time": [[0.1, 0.3, 0.7], [1.1, 1.3]],
+        "timeError": [[0.01, 0.02, 0.03], [0.04, 0.05]],
+        "positionError.xx": [[0.25, 0.0, -1.0], [float("nan"), 4.0]],
+        "positionError.yy": [[1.0, 2.0, 3.0], [0.0, 0.5]],
+        "positionError.zz": [[0.3, 0.0, 0.1], [0.2, 0.0]],
+    }
+    for field, value in point_values.items():
+        branches[f"{points}/{points}.{field}"] = ak.Array(value)
+    for field, value in {"theta": [[0.5, 1.0], [1.5]], "phi": [[0.1, 0.2], [0.3]], "qOverP": [[1.0, -1.0], [0.5]],
+                         "loc.a": [[0.0, 0.1], [0.2]], "loc.b": [[0.3, 0.4], [0.5]], "time": [[1.0, 2.0], [3.0]]}.items():
+        branches[f"{params}/{params}.{field}"] = ak.Array(value)
+
+    branch_types = {
+        "CentralTrackSegments": "vector<edm4eic::TrackSegmentData>",
+        points: "vector<edm4eic::TrackPoint>",
+        params: "vector<edm4eic::TrackParametersData>",
+    }
+    with uproot.recreate(path) as file:
+        file.mktree("events", {name: f"var * {'uint32' if 'points_' in name else 'float32'}" for name in branches},
+                    counter_name=lambda name: "n" + name.split("/")[0], title=flat_layout_title(branch_types))
+        file["events"].extend(branches)
+    return path
+
+
+def test_track_segments_match_point_loop(tmp_path, flat_layout, capsys, caplog):
+    from pyrobird.edm4eic import track_segments_to_line_trajectories
+
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+    for entry in range(tree.num_entries):
+        group = track_segments_to_line_trajectories(tree, "CentralTrackSegments", entry)
+        assert group["trajectories"]
+        assert group["trajectories"] == _loop_track_segments(tree, "CentralTrackSegments", entry)
+
+    flat_tree = uproot.open(_write_flat_tracks(str(tmp_path / "tracks.root")))['events']
+    first = track_segments_to_line_trajectories(flat_tree, "CentralTrackSegments", 0)["trajectories"]
+    assert first == _loop_track_segments(flat_tree, "CentralTrackSegments", 0)
+    assert [len(trajectory["points"]) for trajectory in first] == [2, 1, 0]
+    assert first[2]["params"] == []
+    assert first[1]["points"][0][4] == 0.0
+
+    # Missing parameters are logged, stdout stays clean for 'convert -o -'
+    assert "len(CentralCKFParameters) != len(CentralTrackSegments)" in caplog.text
+    assert capsys.readouterr().out == ""
+
+    # NaN variance gives zero width
+    second = track_segments_to_line_trajectories(flat_tree, "CentralTrackSegments", 1)["trajectories"]
+    assert second[0]["points"][0][4] == 0.0
+    assert second[0]["points"][1][4] == 4.0
+
+
+def test_track_segments_entry_range():
+    from pyrobird.edm4eic import track_segments_to_line_trajectories
+
+    # Point indexes of every entry start from 0
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+    both = track_segments_to_line_trajectories(tree, "CentralTrackSegments", 0, 2)["trajectories"]
+    points = [trajectory["points"] for trajectory in both]
+    assert points == [trajectory["points"] for entry in (0, 1)
+                      for trajectory in _loop_track_segments(tree, "CentralTrackSegments", entry)]
+
+
+def test_track_segments_read_with_hits():
+    from pyrobird.edm4eic import (EntryRangeArrays, edm4eic_entries_to_dicts, track_segments_branches,
+                                  track_segments_to_line_trajectories)
+
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+    branches = track_segments_branches(tree, "CentralTrackSegments")
+    assert "CentralTrackSegments/CentralTrackSegments.points_begin" in branches
+    assert "CentralCKFTrackParameters/CentralCKFTrackParameters.qOverP" in branches
+
+    # Offsets split the range by entries
+    arrays = EntryRangeArrays(tree, branches, 0, 2)
+    offsets = arrays.offsets("CentralTrackSegments/CentralTrackSegments.points_begin", 0, 2)
+    assert offsets.tolist() == [0, 3, 4]
+    assert arrays.offsets("CentralTrackSegments/CentralTrackSegments.points_begin", 1).tolist() == [0, 1]
+
+    # Groups from the range read are the same as from entry by entry reads
+    for entry in (0, 1):
+        expected = track_segments_to_line_trajectories(tree, "CentralTrackSegments", entry)
+        assert track_segments_to_line_trajectories(tree, "CentralTrackSegments", entry, arrays=arrays) == expected
+
+    # Repeated entry gets its own group objects
+    events = edm4eic_entries_to_dicts(tree, [0, 1, 0], collections=["tracks"])
+    assert events[0]["groups"] == events[2]["groups"]
+    assert events[0]["groups"][0] is not events[2]["groups"][0]
+    assert events[0]["groups"][0]["trajectories"][0]["points"] is not events[2]["groups"][0]["trajectories"][0]["points"]
+
+
+def test_select_by_energy():
+    from pyrobird.edm4eic import select_by_energy
+
+    energy = np.array([0.5, 0.1, 2.0, 0.3, 1.0, np.nan])
+    assert select_by_energy(energy) is None
+    assert select_by_energy(energy, min_energy=0.3).tolist() == [0, 2, 3, 4]
+    assert select_by_energy(energy, min_energy=0.3, max_hits=2).tolist() == [2, 4]
+    assert select_by_energy(energy[:5], max_hits=3).tolist() == [0, 2, 4]
+    assert select_by_energy(energy[:5], max_hits=10) is None
+
+
+def test_calorimeter_hits_to_box_hits():
+    from pyrobird.edm4eic import calorimeter_hits_to_box_hits, edm4eic_to_dex_dict
+
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+    branch = "B0ECalRecHits"
+    energy = tree[f"{branch}/{branch}.energy"].array(entry_start=0, entry_stop=1)[0].to_numpy()
+
+    group = calorimeter_hits_to_box_hits(tree, branch, 0)
+    assert group["type"] == "BoxHit"
+    assert group["origin"] == {"type": "edm4eic::CalorimeterHitData", "name": branch}
+    assert len(group["hits"]) == len(energy)
+    hit = group["hits"][0]
+    assert hit["ed"][0] == float(energy[0])
+    assert hit["dim"] == [float(tree[f"{branch}/{branch}.dimension.{axis}"].array(entry_stop=1)[0][0]) for axis in "xyz"]
+
+    # Threshold and top-N are applied before hits are made, the order of hits is kept
+    group = calorimeter_hits_to_box_hits(tree, branch, 0, min_energy=0.01, max_hits=5)
+    expected = sorted(np.argsort(-np.where(energy >= 0.01, energy, -np.inf))[:5])
+    assert [hit["ed"][0] for hit in group["hits"]] == [float(energy[i]) for i in expected]
+    assert group["origin"]["selection"] == {"minEnergy": 0.01, "maxHits": 5, "totalHits": len(energy)}
+
+    # Calorimeter collections are only converted if requested
+    dex = edm4eic_to_dex_dict(tree, [0, 1], collections=["calorimeter_hits"],
+                              options={"calo_min_energy": 0.01, "calo_max_hits": 5})
+    groups = dex["events"][0]["groups"]
+    assert branch in [group["name"] for group in groups]
+    assert all(len(group["hits"]) <= 5 for group in groups)
+    assert all(group["origin"]["type"] == "edm4eic::CalorimeterHitData" for group in groups)
+    assert "B0ECalRecHits" not in [group["name"] for group in edm4eic_to_dex_dict(tree, 0)["events"][0]["groups"]]
+
+
+def test_sim_calorimeter_hits(tmp_path, flat_layout):
+    from pyrobird.edm4eic import edm4eic_to_dex_dict
+
+    path = str(tmp_path / "sim.root")
+    branches = {f"EcalBarrelHits/EcalBarrelHits.{field}": ak.Array(value) for field, value in {
+        "position.x": [[1.0, 2.0, 3.0]], "position.y": [[0.0, 0.0, 0.0]], "position.z": [[5.0, 6.0, 7.0]],
+        "energy": [[0.2, 0.01, 0.5]]}.items()}
+    with uproot.recreate(path) as file:
+        file.mktree("events", {name: "var * float32" for name in branches}, counter_name=lambda name: "nEcalBarrelHits",
+                    title=flat_layout_title({"EcalBarrelHits": "vector<edm4hep::SimCalorimeterHitData>"}))
+        file["events"].extend(branches)
+
+    tree = uproot.open(path)["events"]
+    dex = edm4eic_to_dex_dict(tree, 0, collections=["calorimeter_hits"], options={"calo_min_energy": 0.1})
+    group = dex["events"][0]["groups"][0]
+    assert group["origin"]["type"] == "edm4hep::SimCalorimeterHitData"
+    assert [hit["pos"][0] for hit in group["hits"]] == [1.0, 3.0]
+    assert group["hits"][0]["dim"] == [0.0, 0.0, 0.0]
+
+
+@pytest.mark.parametrize("input_value, expected", [
+    ([0], [(0, 1)]),
+    ([0, 1, 2], [(0, 3)]),
+    ([5, 0, 1, 2, 1], [(0, 3), (5, 6)]),
+    ([], []),
+])
+def test_split_entry_ranges(input_value, expected):
+    from pyrobird.edm4eic import split_entry_ranges
+    assert split_entry_ranges(input_value) == expected
+
+
 @pytest.mark.parametrize("input_value, expected", [
     ('3', [3]),
     ('1-5', [1, 2, 3, 4, 5]),
@@ -179,3 +447,71 @@ def test_parse_entry_numbers_valid_inputs(input_value, expected):
 def test_parse_entry_numbers_invalid_inputs(input_value):
     with pytest.raises(ValueError):
         parse_entry_numbers(input_value)
+
+
+def test_mc_particles_to_trajectories():
+    from pyrobird.edm4eic import mc_particles_to_trajectories, MC_PARTICLE_PARAM_COLUMNS, SPEED_OF_LIGHT
+
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+    group = mc_particles_to_trajectories(tree, "MCParticles", 1)
+    pdg = tree["MCParticles/MCParticles.PDG"].array(entry_start=1, entry_stop=2)[0].tolist()
+    parents_begin = tree["MCParticles/MCParticles.parents_begin"].array(entry_start=1, entry_stop=2)[0].tolist()
+    parents_end = tree["MCParticles/MCParticles.parents_end"].array(entry_start=1, entry_stop=2)[0].tolist()
+    parents = tree["_MCParticles_parents/_MCParticles_parents.index"].array(entry_start=1, entry_stop=2)[0].tolist()
+
+    assert group["type"] == "PointTrajectory"
+    assert group["paramColumns"] == MC_PARTICLE_PARAM_COLUMNS
+    assert len(group["trajectories"]) == len(pdg)
+    parent_column = MC_PARTICLE_PARAM_COLUMNS.index("parent")
+    for i, trajectory in enumerate(group["trajectories"]):
+        assert trajectory["params"][0] == pdg[i]
+        expected_parent = parents[parents_begin[i]] if parents_end[i] > parents_begin[i] else -1
+        assert trajectory["params"][parent_column] == expected_parent
+
+    # Endpoint time is from the particle velocity
+    start, stop = group["trajectories"][2]["points"]
+    _, _, px, py, pz, mass = group["trajectories"][2]["params"][:6]
+    p = np.sqrt(px * px + py * py + pz * pz)
+    length = np.linalg.norm(np.array(stop[:3]) - np.array(start[:3]))
+    assert stop[3] == pytest.approx(start[3] + length * np.sqrt(p * p + mass * mass) / (p * SPEED_OF_LIGHT))
+
+
+def test_relation_links():
+    from pyrobird.edm4eic import edm4eic_to_dex_dict
+
+    tree = uproot.open(TEST_ROOT_FILE)['events']
+
+    # Without mc_particles and calorimeter_hits there are no links
+    dex = edm4eic_to_dex_dict(tree, [0, 1], collections=["tracker_hits", "clusters"])
+    assert all("links" not in group for group in dex["events"][0]["groups"])
+
+    collections = ["tracker_hits", "calorimeter_hits", "clusters", "mc_particles"]
+    dex = edm4eic_to_dex_dict(tree, [0, 1], collections=collections)
+    groups = {group["name"]: group for group in dex["events"][1]["groups"]}
+
+    hits = groups["TOFEndcapRecHits"]
+    assert hits["links"]["particles"]["collection"] == "MCParticles"
+    assert len(hits["links"]["particles"]["indexes"]) == len(hits["hits"])
+    assert all(0 <= index < len(groups["MCParticles"]["trajectories"])
+               for index in hits["links"]["particles"]["indexes"])
+
+    clusters = groups["EcalEndcapPClusters"]
+    sim_ids = tree["EcalEndcapPClusterAssociations/EcalEndcapPClusterAssociations.simID"].array()[1].tolist()
+    assert clusters["origin"] == {"type": "edm4eic::ClusterData", "name": "EcalEndcapPClusters"}
+    assert clusters["links"]["particles"]["indexes"] == sim_ids
+    cluster_hits = clusters["links"]["hits"]
+    assert cluster_hits["collection"] == "EcalEndcapPRecHits"
+    assert len(cluster_hits["offsets"]) == len(clusters["hits"]) + 1
+    assert cluster_hits["offsets"][-1] == len(cluster_hits["indexes"])
+
+    # Calorimeter hit selection is applied to the cluster hit links
+    selected = edm4eic_to_dex_dict(tree, [1], collections=collections, options={"calo_max_hits": 5})
+    selected_groups = {group["name"]: group for group in selected["events"][0]["groups"]}
+    selected_links = selected_groups["EcalEndcapPClusters"]["links"]["hits"]
+    assert selected_links["offsets"] == cluster_hits["offsets"]
+    selected_hits = selected_groups["EcalEndcapPRecHits"]["hits"]
+    all_hits = groups["EcalEndcapPRecHits"]["hits"]
+    for original, index in zip(cluster_hits["indexes"], selected_links["indexes"]):
+        if index >= 0:
+            assert selected_hits[index] == all_hits[original]
+    assert 0 < sum(index >= 0 for index in selected_links["indexes"]) <= 5
@@ -0,0 +1,167 @@
+import os
+import time
+
+import pytest
+
+from pyrobird.server.file_cache import OpenFileCache, file_identity, is_remote_path
+
+
+class FakeFile:
+    """Stands for uproot file in the tests"""
+
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def __contains__(self, item):
+        return item == "events"
+
+    def __getitem__(self, item):
+        return f"tree:{item}"
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def local_files(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"file{i}.root"
+        path.write_text(f"data {i}")
+        paths.append(str(path))
+    return paths
+
+
+def test_is_remote_path():
+    assert is_remote_path("root://dtn-eic.jlab.org//work/eic2/file.root")
+    assert is_remote_path("https://example.com/file.root")
+    assert not is_remote_path("/tmp/file.root")
+    assert not is_remote_path("file.root")
+
+
+def test_file_identity_changes_with_content(local_files):
+    path = local_files[0]
+    identity = file_identity(path)
+    assert identity[1] == os.path.realpath(path)
+
+    with open(path, "w") as f:
+        f.write("new longer content")
+    assert file_identity(path) != identity
+
+
+
+class FakeRemoteFs:
+    """fsspec filesystem with given file info"""
+
+    def __init__(self, info):
+        self.info_result = info
+
+    def info(self, path):
+        if self.info_result is None:
+            raise FileNotFoundError(path)
+        return self.info_result
+
+
+def test_remote_file_identity_changes_with_validator(monkeypatch):
+    from pyrobird.server.result_cache import make_event_key
+
+    url = "https://example.com/file.root"
+    fs = FakeRemoteFs({"size": 100, "ETag": "abc"})
+    monkeypatch.setattr("fsspec.core.url_to_fs", lambda path: (fs, path))
+    identity = file_identity(url)
+    assert identity == ("url", url, "size=100;ETag=abc")
+    key = make_event_key(identity, 0, None, "v")
+
+    # Replaced file has other ETag or size
+    fs.info_result = {"size": 100, "ETag": "def"}
+    assert file_identity(url) != identity
+    assert make_event_key(file_identity(url), 0, None, "v") != key
+    fs.info_result = {"size": 101, "ETag": "abc"}
+    assert make_event_key(file_identity(url), 0, None, "v") != key
+
+    # Identity without validator if the info can't be read
+    fs.info_result = None
+    assert file_identity(url) == ("url", url, None)
+
+
+def test_cache_hits_and_misses(local_files):
+    cache = OpenFileCache(max_size=2, opener=FakeFile)
+
+    with cache.acquire(local_files[0]) as lease:
+        first_file = lease.file
+        assert lease.tree("events") == "tree:events"
+
+    with cache.acquire(local_files[0]) as lease:
+        assert lease.file is first_file
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+
+def test_cache_evicts_least_recently_used(local_files):
+    cache = OpenFileCache(max_size=2, opener=FakeFile)
+
+    leases = [cache.acquire(path) for path in local_files[:2]]
+    for lease in leases:
+        lease.release()
+    first_file = leases[0].file
+
+    # Use the first file, so the second becomes the least recently used
+    cache.acquire(local_files[0]).release()
+    cache.acquire(local_files[2]).release()
+
+    assert not first_file.closed
+    assert leases[1].file.closed
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size"] == 2
+
+
+def test_leased_file_is_closed_on_release(local_files):
+    cache = OpenFileCache(max_size=1, opener=FakeFile)
+
+    lease = cache.acquire(local_files[0])
+    cache.acquire(local_files[1]).release()
+
+    # Evicted but still in use
+    assert not lease.file.closed
+    lease.release()
+    assert lease.file.closed
+
+
+def test_idle_files_are_closed(local_files):
+    cache = OpenFileCache(max_size=4, idle_timeout=0.01, opener=FakeFile)
+
+    lease = cache.acquire(local_files[0])
+    lease.release()
+    time.sleep(0.05)
+    cache.evict_idle()
+
+    assert lease.file.closed
+    assert cache.stats()["size"] == 0
+
+
+def test_zero_size_disables_cache(local_files):
+    cache = OpenFileCache(max_size=0, opener=FakeFile)
+
+    with cache.acquire(local_files[0]) as lease:
+        assert not lease.file.closed
+    assert lease.file.closed
+    assert cache.stats()["size"] == 0
+
+
+def test_modified_file_is_reopened(local_files):
+    cache = OpenFileCache(max_size=4, opener=FakeFile)
+
+    with cache.acquire(local_files[0]) as lease:
+        old_file = lease.file
+
+    with open(local_files[0], "w") as f:
+        f.write("overwritten with other data")
+
+    with cache.acquire(local_files[0]) as lease:
+        assert lease.file is not old_file
+    assert old_file.closed
+    assert cache.stats()["size"] == 1
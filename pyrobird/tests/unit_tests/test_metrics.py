@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import pyrobird.server
+from pyrobird.server import flask_app, CFG_METRICS, CFG_DOWNLOAD_PATH
+from pyrobird.server.metrics import MetricsRegistry, stats_families, CONTENT_TYPE
+
+TEST_ROOT_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+TEST_FILE_NAME = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+
+@pytest.fixture
+def client():
+    flask_app.config['TESTING'] = True
+    flask_app.config[CFG_DOWNLOAD_PATH] = os.path.abspath(TEST_ROOT_DATA_DIR)
+    flask_app.config[CFG_METRICS] = True
+    pyrobird.server.reset_metrics()
+    yield flask_app.test_client()
+    flask_app.config[CFG_METRICS] = False
+    pyrobird.server.reset_metrics()
+
+
+def test_counter_and_histogram_render():
+    registry = MetricsRegistry()
+    requests = registry.counter("test_requests_total", "Requests", ("endpoint", "status"))
+    duration = registry.histogram("test_duration_seconds", "Duration", buckets=(0.1, 1.0))
+    requests.inc(("download_file", "200"))
+    requests.inc(("download_file", "200"), 2)
+    duration.observe(0.05)
+    duration.observe(0.5)
+    duration.observe(5)
+    registry.add_collector(lambda: stats_families("test_cache", {"size": 3, "hits": 7, "path": "/tmp"}, ("hits",)))
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{endpoint="download_file",status="200"} 3' in lines
+    assert 'test_duration_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_duration_seconds_bucket{le="1"} 2' in lines
+    assert 'test_duration_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_duration_seconds_sum 5.55" in lines
+    assert "test_duration_seconds_count 3" in lines
+    assert "test_cache_size 3" in lines
+    assert "# TYPE test_cache_hits_total counter" in lines
+    assert not any(line.startswith("test_cache_path") for line in lines)
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("test_total", "Test", ("name",)).inc(('a "quoted"\nname',))
+    assert 'test_total{name="a \\"quoted\\"\\nname"} 1' in registry.render()
+
+
+def test_metrics_disabled():
+    flask_app.config[CFG_METRICS] = False
+    pyrobird.server.reset_metrics()
+    client = flask_app.test_client()
+    assert client.get("/api/v1/metrics").status_code == 404
+    assert pyrobird.server.get_metrics() is None
+
+
+def test_metrics_endpoint(client):
+    pyrobird.server.reset_result_cache()
+    assert client.get(f"/api/v1/convert/edm4eic/0/{TEST_FILE_NAME}?collections=tracker_hits").status_code == 200
+    assert client.get(f"/api/v1/convert/edm4eic/0/{TEST_FILE_NAME}?collections=tracker_hits").status_code == 200
+    download = client.get(f"/api/v1/download/{TEST_FILE_NAME}")
+    download_size = len(download.get_data())
+
+    response = client.get("/api/v1/metrics")
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE
+    lines = response.get_data(as_text=True).splitlines()
+    assert 'pyrobird_http_requests_total{endpoint="open_edm4eic_file",method="GET",status="200"} 2' in lines
+    assert 'pyrobird_http_request_duration_seconds_count{endpoint="open_edm4eic_file"} 2' in lines
+    assert f'pyrobird_http_response_bytes_total{{endpoint="download_file"}} {download_size}' in lines
+    assert 'pyrobird_convert_events_total{source="converted"} 1' in lines
+    assert 'pyrobird_convert_events_total{source="cache"} 1' in lines
+    assert "pyrobird_convert_duration_seconds_count 1" in lines
+    assert "pyrobird_result_cache_hits_total 1" in lines
+    assert any(line.startswith("pyrobird_file_cache_size ") for line in lines)
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+import uproot
+
+from pyrobird.podio import get_events_schema, scan_events_tree, clear_schema_cache
+from pyrobird.podio import collection_id_hash, get_collection_id_table
+from tests.podio_flat import flat_layout_title
+
+# Path to the test ROOT file
+TEST_ROOT_FILE = os.path.join(os.path.dirname(__file__), 'data', 'reco_2024-09_craterlake_2evt.edm4eic.root')
+
+
+@pytest.fixture(scope="module")
+def tree():
+    file = uproot.open(TEST_ROOT_FILE)
+    return file['events']
+
+
+def test_collections_of_type_matches_typenames(tree):
+    schema = scan_events_tree(tree)
+    expected = tree.typenames(recursive=False, full_paths=True, filter_typename="vector<edm4eic::TrackerHitData>")
+
+    names = [collection.name for collection in schema.collections_of_type("edm4eic::TrackerHitData")]
+    assert names == list(expected.keys())
+
+    # vector<...> form is also accepted
+    names = [collection.name for collection in schema.collections_of_type("vector<edm4eic::TrackerHitData>")]
+    assert names == list(expected.keys())
+
+
+def test_collection_members(tree):
+    schema = scan_events_tree(tree)
+
+    hits = schema["TOFEndcapRecHits"]
+    assert hits.type_name == "edm4eic::TrackerHitData"
+    assert hits.field_branch("position.x") == "TOFEndcapRecHits/TOFEndcapRecHits.position.x"
+    assert hits.relations["rawHit"] == "_TOFEndcapRecHits_rawHit"
+    assert hits.object_id_branches("rawHit") == (
+        "_TOFEndcapRecHits_rawHit/_TOFEndcapRecHits_rawHit.index",
+        "_TOFEndcapRecHits_rawHit/_TOFEndcapRecHits_rawHit.collectionID",
+    )
+    assert not hits.is_subset
+
+    segments = schema["CentralTrackSegments"]
+    assert segments.vector_members["points"] == ("_CentralTrackSegments_points", "edm4eic::TrackPoint")
+    assert (segments.vector_member_branch("points", "position.x") ==
+            "_CentralTrackSegments_points/_CentralTrackSegments_points.position.x")
+    assert "track" in segments.relations
+
+    # Every branch path in the schema exists in the tree
+    for collection in schema:
+        for branch in collection.fields.values():
+            assert branch in tree
+
+
+def test_subset_collections(tree):
+    schema = scan_events_tree(tree)
+    subset = schema["CentralTrackingRecHits"]
+    assert subset.is_subset
+    assert subset.type_name is None
+    assert subset.subset_branch == "CentralTrackingRecHits_objIdx"
+
+
+def test_schema_is_cached(tree):
+    clear_schema_cache()
+    schema = get_events_schema(tree)
+    assert get_events_schema(tree) is schema
+
+    # The same file opened again shares the schema
+    other_tree = uproot.open(TEST_ROOT_FILE)['events']
+    assert get_events_schema(other_tree) is schema
+
+    # Fingerprint is the same for every scan of the same layout
+    clear_schema_cache()
+    assert scan_events_tree(tree).fingerprint == schema.fingerprint
+
+
+def test_flat_layout(tmp_path, flat_layout):
+    import awkward as ak
+
+    path = str(tmp_path / "flat.root")
+    branches = {
+        "B0TrackerRecHits/B0TrackerRecHits.position.x": ak.Array([[1.0, 2.0], [3.0]]),
+        "B0TrackerRecHits/B0TrackerRecHits.time": ak.Array([[0.5, 0.6], [0.7]]),
+        "_B0TrackerRecHits_rawHit/_B0TrackerRecHits_rawHit.index": ak.Array([[0, 1], [0]]),
+    }
+    branch_types = {"B0TrackerRecHits": "vector<edm4eic::TrackerHitData>",
+                    "_B0TrackerRecHits_rawHit": "vector<podio::ObjectID>"}
+    with uproot.recreate(path) as file:
+        file.mktree("events", {name: "var * float64" for name in branches},
+                    counter_name=lambda name: "n" + name.split("/")[0], title=flat_layout_title(branch_types))
+        file["events"].extend(branches)
+
+    flat_tree = uproot.open(path)["events"]
+    schema = scan_events_tree(flat_tree)
+    hits = schema["B0TrackerRecHits"]
+    assert [collection.name for collection in schema.collections_of_type("edm4eic::TrackerHitData")] == ["B0TrackerRecHits"]
+    assert hits.field_branch("time") == "B0TrackerRecHits/B0TrackerRecHits.time"
+    assert hits.relations["rawHit"] == "_B0TrackerRecHits_rawHit"
+    assert flat_tree[hits.field_branch("position.x")].array().tolist() == [[1.0, 2.0], [3.0]]
+
+
+def test_collection_id_table(tree):
+    # podio::detail::hash32 is MurmurHash3_x86_32 with seed 0
+    assert collection_id_hash("") == 0
+    assert collection_id_hash("abc") == 0xB3DD93FA
+
+    clear_schema_cache()
+    table = get_collection_id_table(tree)
+    assert get_collection_id_table(tree) is table
+    assert table.name(collection_id_hash("MCParticles")) == "MCParticles"
+    assert table.collection_id("MCParticles") == collection_id_hash("MCParticles")
+    assert table.name(12345) is None
+
+    # The file has no metadata tree, IDs of ObjectID branches are resolved by the names
+    ids = tree["_B0ECalRecHits_rawHit/_B0ECalRecHits_rawHit.collectionID"].array(library="np")
+    assert {table.name(collection_id) for collection_id in np.concatenate(ids)} == {"B0ECalRawHits"}
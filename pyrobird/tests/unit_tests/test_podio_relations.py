@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pytest
+import uproot
+
+from pyrobird.edm4eic import EntryRangeArrays
+from pyrobird.podio import CollectionIdTable, collection_id_hash
+from pyrobird.podio_relations import NO_LINK, ObjectRefs, RelationResolver, lookup
+from tests.podio_flat import flat_layout_title
+
+# Path to the test ROOT file
+TEST_ROOT_FILE = os.path.join(os.path.dirname(__file__), 'data', 'reco_2024-09_craterlake_2evt.edm4eic.root')
+
+TRACKER_ASSOCIATION = "edm4eic::MCRecoTrackerHitAssociationData"
+CLUSTER_ASSOCIATION = "edm4eic::MCRecoClusterParticleAssociationData"
+
+
+@pytest.fixture(scope="module")
+def tree():
+    file = uproot.open(TEST_ROOT_FILE)
+    return file['events']
+
+
+def _values(tree, branch, entry):
+    return tree[branch].array(entry_start=entry, entry_stop=entry + 1, library="np")[0].tolist()
+
+
+def test_lookup():
+    keys = np.array([5, 3, 5, -1])
+    assert lookup(keys, np.array([5, 3, 4, -1])).tolist() == [0, 1, NO_LINK, NO_LINK]
+    assert lookup(np.array([], dtype=np.int64), np.array([1])).tolist() == [NO_LINK]
+
+
+def test_object_refs_from_object_ids():
+    table = CollectionIdTable({10: "A", 20: "B"})
+    indexes = np.array([0, 1, 2, -2])
+    collection_ids = np.array([10, 20, 10, 99], dtype=np.uint32)
+    refs = ObjectRefs.from_object_ids(indexes, collection_ids, np.array([0, 2, 4]), table, entry_start=5)
+
+    assert refs.collections == ["A", "B"]
+    assert refs.codes.tolist() == [0, 1, 0, NO_LINK]
+    assert refs.entry_indexes("A").tolist() == [0, NO_LINK, 2, NO_LINK]
+    assert refs.entry_indexes("B", 5).tolist() == [NO_LINK, 1]
+    assert refs.entry_indexes("A", 6).tolist() == [2, NO_LINK]
+
+
+def _loop_hit_particles(tree, rec_name, associations, sim_name, entry):
+    """MCParticle of each hit found with Python loops over the ObjectID values"""
+    raw_indexes = _values(tree, f"_{rec_name}_rawHit/_{rec_name}_rawHit.index", entry)
+    assoc_raw = _values(tree, f"_{associations}_rawHit/_{associations}_rawHit.index", entry)
+    assoc_sim = _values(tree, f"_{associations}_simHit/_{associations}_simHit.index", entry)
+    particles = _values(tree, f"_{sim_name}_MCParticle/_{sim_name}_MCParticle.index", entry)
+
+    result = []
+    for raw in raw_indexes:
+        row = assoc_raw.index(raw) if raw in assoc_raw else None
+        result.append(particles[assoc_sim[row]] if row is not None else NO_LINK)
+    return result
+
+
+@pytest.mark.parametrize("rec_name, associations, sim_name", [
+    ("SiEndcapTrackerRecHits", "SiEndcapTrackerRawHitAssociations", "TrackerEndcapHits"),
+    ("B0TrackerRecHits", "B0TrackerRawHitAssociations", "B0TrackerHits"),
+    ("TOFEndcapRecHits", "TOFEndcapRawHitAssociations", "TOFEndcapHits"),
+])
+def test_tracker_hit_particles_match_loop(tree, rec_name, associations, sim_name):
+    resolver = RelationResolver(tree, EntryRangeArrays(tree, [], 0, 2))
+    raw_hits = resolver.refs(rec_name, "rawHit")
+    sim_hits = resolver.associated(raw_hits, TRACKER_ASSOCIATION, "rawHit", "simHit")
+    assert sim_hits.collections == [sim_name]
+    particles = resolver.follow(sim_hits, "MCParticle")
+
+    assert particles.collections == ["MCParticles"]
+    for entry in range(2):
+        expected = _loop_hit_particles(tree, rec_name, associations, sim_name, entry)
+        assert particles.entry_indexes("MCParticles", entry).tolist() == expected
+
+
+def test_cluster_relations(tree):
+    name = "EcalEndcapPClusters"
+    resolver = RelationResolver(tree, EntryRangeArrays(tree, [], 0, 2))
+
+    # Associations also have the index of the MCParticle as simID
+    clusters = resolver.objects(name, "energy")
+    particles = resolver.associated(clusters, CLUSTER_ASSOCIATION, "rec", "sim")
+    for entry in range(2):
+        sim_ids = _values(tree, "EcalEndcapPClusterAssociations/EcalEndcapPClusterAssociations.simID", entry)
+        assert particles.entry_indexes("MCParticles", entry).tolist() == sim_ids
+
+    # Hits of a cluster are hits_begin..hits_end of the entry
+    object_offsets, hits = resolver.multi_refs(name, "hits")
+    assert hits.collections == ["EcalEndcapPRecHits"]
+    first_cluster = 0
+    for entry in range(2):
+        begins = _values(tree, f"{name}/{name}.hits_begin", entry)
+        ends = _values(tree, f"{name}/{name}.hits_end", entry)
+        hit_indexes = _values(tree, f"_{name}_hits/_{name}_hits.index", entry)
+        expected = [index for begin, end in zip(begins, ends) for index in hit_indexes[begin:end]]
+        assert hits.entry_indexes("EcalEndcapPRecHits", entry).tolist() == expected
+
+        counts = np.diff(object_offsets[first_cluster:first_cluster + len(begins) + 1]).tolist()
+        assert counts == [end - begin for begin, end in zip(begins, ends)]
+        first_cluster += len(begins)
+
+
+def test_multi_refs_out_of_entry(tmp_path, flat_layout):
+    import awkward as ak
+
+    # Cluster 1 of entry 0 ends past the 3 refs of the entry, cluster 0 of entry 1 begins before them
+    branches = {
+        "Clusters/Clusters.energy": (ak.Array([[1.0, 2.0], [3.0]]), "float32"),
+        "Clusters/Clusters.hits_begin": (ak.Array([[0, 1], [-1]]), "int32"),
+        "Clusters/Clusters.hits_end": (ak.Array([[2, 5], [1]]), "int32"),
+        "_Clusters_hits/_Clusters_hits.index": (ak.Array([[0, 1, 2], [0, 1]]), "int32"),
+        "_Clusters_hits/_Clusters_hits.collectionID": (ak.Array([[collection_id_hash("Hits")] * 3,
+                                                                 [collection_id_hash("Hits")] * 2]), "uint32"),
+        "Hits/Hits.energy": (ak.Array([[0.1, 0.2, 0.3], [0.4, 0.5]]), "float32"),
+    }
+    branch_types = {"Clusters": "vector<edm4eic::ClusterData>", "_Clusters_hits": "vector<podio::ObjectID>",
+                    "Hits": "vector<edm4eic::CalorimeterHitData>"}
+    path = str(tmp_path / "clusters.root")
+    with uproot.recreate(path) as file:
+        file.mktree("events", {name: f"var * {dtype}" for name, (_, dtype) in branches.items()},
+                    counter_name=lambda name: "n" + name.split("/")[0], title=flat_layout_title(branch_types))
+        file["events"].extend({name: values for name, (values, _) in branches.items()})
+
+    flat_tree = uproot.open(path)["events"]
+    resolver = RelationResolver(flat_tree, EntryRangeArrays(flat_tree, [], 0, 2))
+    object_offsets, hits = resolver.multi_refs("Clusters", "hits")
+    assert object_offsets.tolist() == [0, 2, 6, 8]
+    assert hits.entry_indexes("Hits", 0).tolist() == [0, 1, 1, 2, NO_LINK, NO_LINK]
+    assert hits.entry_indexes("Hits", 1).tolist() == [NO_LINK, 0]
+
+
+def test_resolved_by_entry_range(tree):
+    """Links of an entry are the same whether it is resolved alone or in a range"""
+    whole = RelationResolver(tree, EntryRangeArrays(tree, [], 0, 2))
+    single = RelationResolver(tree, EntryRangeArrays(tree, [], 1, 2))
+
+    whole_parents = whole.multi_refs("MCParticles", "parents")[1]
+    single_parents = single.multi_refs("MCParticles", "parents")[1]
+    assert (whole_parents.entry_indexes("MCParticles", 1).tolist() ==
+            single_parents.entry_indexes("MCParticles", 1).tolist())
+
+    # Relations that the collections don't have give no links
+    missing = whole.follow(whole.refs("TOFEndcapRecHits", "rawHit"), "MCParticle")
+    assert missing.collections == []
+    assert (missing.keys == NO_LINK).all()
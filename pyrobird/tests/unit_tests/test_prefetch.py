@@ -0,0 +1,179 @@
+import threading
+
+from pyrobird.server.prefetch import Prefetcher, detect_direction, plan_entries, FORWARD, BACKWARD
+from pyrobird.server.result_cache import EventResultCache
+from pyrobird.server.single_flight import SingleFlight
+
+
+def make_key(entry):
+    return f"key-{entry}"
+
+
+class FakeConverter:
+    """Converts entries 0..num_entries-1 to b'event-N'. May block until released"""
+
+    def __init__(self, num_entries=100, block=False):
+        self.num_entries = num_entries
+        self.calls = []
+        self.release = threading.Event()
+        if not block:
+            self.release.set()
+
+    def __call__(self, filename, entries, collections, dex_format, options=None):
+        self.release.wait(5)
+        self.calls.append(entries)
+        return self.num_entries, {entry: f"event-{entry}".encode() for entry in entries if entry < self.num_entries}
+
+
+def test_detect_direction():
+    assert detect_direction([5]) == FORWARD
+    assert detect_direction([5, 6, 7]) == FORWARD
+    assert detect_direction([7, 6, 5]) == BACKWARD
+    assert detect_direction([7, 6, 10, 9]) == BACKWARD
+    assert plan_entries([5], FORWARD, 3) == [6, 7, 8]
+    assert plan_entries([5, 6], BACKWARD, 3) == [4, 3, 2]
+    assert plan_entries([1], BACKWARD, 3) == [0]
+
+
+def test_prefetch_next_entries():
+    cache = EventResultCache()
+    converter = FakeConverter(num_entries=4)
+    prefetcher = Prefetcher(converter, cache, depth=2)
+
+    assert prefetcher.on_request("client", "file.root", [1], make_key) == [2, 3]
+    prefetcher.wait()
+    assert cache.get("key-2") == b"event-2"
+    assert cache.get("key-3") == b"event-3"
+
+    # Entries after the end of the tree are not converted twice
+    prefetcher.on_request("client", "file.root", [3], make_key)
+    prefetcher.wait()
+    assert converter.calls == [[2], [3], [4]]
+
+    stats = prefetcher.stats()
+    assert stats["prefetched"] == 2
+    assert stats["used"] == 1
+    prefetcher.shutdown()
+
+
+def test_prefetch_backward():
+    cache = EventResultCache()
+    prefetcher = Prefetcher(FakeConverter(), cache, depth=1)
+    prefetcher.on_request("client", "file.root", [10], make_key)
+    prefetcher.on_request("client", "file.root", [9], make_key)
+    prefetcher.wait()
+    assert "key-8" in cache
+    prefetcher.shutdown()
+
+
+def test_new_request_cancels_prefetch():
+    cache = EventResultCache()
+    converter = FakeConverter(block=True)
+    prefetcher = Prefetcher(converter, cache, depth=3)
+
+    prefetcher.on_request("client", "file.root", [0], make_key)
+    # Client jumps elsewhere while entry 1 is being converted
+    prefetcher.on_request("client", "file.root", [50], make_key)
+    converter.release.set()
+    prefetcher.wait()
+
+    # Entries 2, 3 of the first plan are skipped
+    assert converter.calls == [[1], [51], [52], [53]]
+    assert prefetcher.stats()["cancelled"] == 1
+    prefetcher.shutdown()
+
+
+def test_prefetch_budget():
+    cache = EventResultCache()
+    converter = FakeConverter()
+    prefetcher = Prefetcher(converter, cache, depth=5, max_bytes=10)
+    prefetcher.on_request("client", "file.root", [0], make_key)
+    prefetcher.wait()
+
+    # Each event is 7 bytes, prefetch stops after the budget is exhausted
+    assert converter.calls == [[1], [2]]
+    prefetcher.shutdown()
+
+
+def test_prefetch_budget_released_on_jump():
+    cache = EventResultCache()
+    prefetcher = Prefetcher(FakeConverter(), cache, depth=2)
+    prefetcher.on_request("client", "file.root", [0], make_key)
+    prefetcher.wait()
+    assert prefetcher.stats()["outstanding_bytes"] == 14
+
+    # The client jumps to another entry of the same file, events 1, 2 are not used
+    prefetcher.on_request("client", "file.root", [50], make_key)
+    prefetcher.wait()
+    assert prefetcher.stats()["outstanding_bytes"] == 16
+
+    # The client changes collections, so the keys of the same entries differ
+    prefetcher.on_request("client", "file.root", [51], lambda entry: f"tracks-key-{entry}")
+    assert prefetcher.stats()["outstanding_bytes"] == 0
+    prefetcher.wait()
+    prefetcher.on_request("client", "file.root", [51], make_key)
+    assert prefetcher.stats()["outstanding_bytes"] == 0
+    assert prefetcher.stats()["used"] == 0
+    prefetcher.shutdown()
+
+
+def test_prefetch_budget_released_on_eviction():
+    cache = EventResultCache()
+    converter = FakeConverter()
+    prefetcher = Prefetcher(converter, cache, depth=2, max_bytes=14)
+    prefetcher.on_request("client", "file.root", [0], make_key)
+    prefetcher.wait()
+
+    # Another client exhausts the budget, then the result cache drops its events
+    prefetcher.on_request("other", "file.root", [10], make_key)
+    prefetcher.wait()
+    assert converter.calls == [[1], [2]]
+    cache.clear()
+    prefetcher.on_request("other", "file.root", [20], make_key)
+    prefetcher.wait()
+    assert converter.calls == [[1], [2], [21], [22]]
+    assert prefetcher.stats()["outstanding_bytes"] == 16
+    prefetcher.shutdown()
+
+
+def test_prefetch_waits_for_busy_converter():
+    cache = EventResultCache()
+    converter = FakeConverter()
+    busy = threading.Event()
+    busy.set()
+    prefetcher = Prefetcher(converter, cache, depth=2, is_busy=lambda filename: busy.is_set())
+    prefetcher.on_request("client", "file.root", [0], make_key)
+    prefetcher.wait()
+    assert converter.calls == []
+    assert prefetcher.stats()["busy"] == 1
+
+    busy.clear()
+    prefetcher.on_request("client", "file.root", [1], make_key)
+    prefetcher.wait()
+    assert converter.calls == [[2], [3]]
+    prefetcher.shutdown()
+
+
+def test_prefetch_single_flight():
+    cache = EventResultCache()
+    single_flight = SingleFlight()
+    converter = FakeConverter(block=True)
+    prefetcher = Prefetcher(converter, cache, depth=2, single_flight=single_flight)
+    prefetcher.on_request("client", "file.root", [1], make_key)
+
+    # A request for the event being prefetched waits for it instead of converting
+    while not single_flight.in_flight():
+        pass
+    own, waiting = single_flight.claim(["key-2"])
+    assert not own
+    converter.release.set()
+    assert waiting["key-2"].result(timeout=5) == (100, b"event-2")
+
+    # Prefetch skips events that a request converts
+    own, _ = single_flight.claim(["key-5"])
+    prefetcher.on_request("client", "file.root", [4], make_key)
+    prefetcher.wait()
+    assert [5] not in converter.calls
+    assert "key-6" in cache
+    single_flight.resolve(own, "key-5", (100, b"event-5"))
+    prefetcher.shutdown()
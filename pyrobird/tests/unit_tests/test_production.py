@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+from pyrobird.cli.serve import serve
+from pyrobird.server import flask_app, CFG_RESULT_CACHE_DIR, CFG_DOWNLOAD_PATH, CFG_SERVE_WORKERS
+from pyrobird.server.production import (workers_config, config_from_environ, preload_modules, gunicorn_application,
+                                        run, shared_result_cache_dir, SERVE_CONFIG_ENV, ENGINE_FLASK)
+
+
+def test_workers_share_result_store(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert workers_config({}, 1) == {}
+
+    config = workers_config({CFG_DOWNLOAD_PATH: "/data"}, 4)
+    assert config[CFG_RESULT_CACHE_DIR] == str(tmp_path / "pyrobird" / "results")
+    assert config[CFG_DOWNLOAD_PATH] == "/data"
+    assert config[CFG_SERVE_WORKERS] == 4
+
+    config = workers_config({CFG_RESULT_CACHE_DIR: "/scratch/events"}, 4)
+    assert config[CFG_RESULT_CACHE_DIR] == "/scratch/events"
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX file owners")
+def test_shared_result_cache_dir_is_private(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    path = tmp_path / "pyrobird" / "results"
+    path.mkdir(parents=True, mode=0o777)
+    os.chmod(path, 0o777)
+
+    # Own directory is made private
+    assert shared_result_cache_dir() == str(path)
+    assert os.stat(path).st_mode & 0o777 == 0o700
+
+    # Directory of another user is refused
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+    with pytest.raises(RuntimeError):
+        shared_result_cache_dir()
+
+
+def test_config_from_environ(monkeypatch):
+    monkeypatch.delenv(SERVE_CONFIG_ENV, raising=False)
+    assert config_from_environ() == {}
+    monkeypatch.setenv(SERVE_CONFIG_ENV, json.dumps({CFG_DOWNLOAD_PATH: "/data", "PYROBIRD_CONVERT_WORKERS": 2}))
+    assert config_from_environ() == {CFG_DOWNLOAD_PATH: "/data", "PYROBIRD_CONVERT_WORKERS": 2}
+
+
+def test_preload_modules():
+    preload_modules()
+    assert "uproot" in sys.modules
+    assert "pyrobird.edm4eic" in sys.modules
+
+
+def test_gunicorn_application():
+    pytest.importorskip("gunicorn")
+    application = gunicorn_application({}, "", 5454, workers=3, threads=4)
+    assert application.cfg.workers == 3
+    assert application.cfg.threads == 4
+    assert application.cfg.preload_app
+    assert application.cfg.bind == ["127.0.0.1:5454"]
+    assert application.load() is flask_app
+
+
+def test_flask_engine_runs_one_worker():
+    with pytest.raises(ValueError):
+        run(workers=2, engine=ENGINE_FLASK)
+    with pytest.raises(ValueError):
+        run(workers=2, engine="tornado")
+
+    result = CliRunner().invoke(serve, ["--workers", "2"])
+    assert result.exit_code != 0
+    assert "--engine" in result.output
@@ -0,0 +1,125 @@
+import os
+import queue
+
+import numpy as np
+import pytest
+import uproot
+
+from pyrobird.remote_cache import RemoteBlockCache, CachingSource, open_root_file, file_validator, is_remote_path
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "reco_2024-09_craterlake_2evt.edm4eic.root")
+
+BRANCH = "TOFBarrelRecHit/TOFBarrelRecHit.position.x"
+
+
+def test_is_remote_path():
+    assert is_remote_path("root://dtn-eic.jlab.org//work/file.root")
+    assert is_remote_path("https://example.com/file.root")
+    assert not is_remote_path("/tmp/file.root")
+
+
+def test_file_validator():
+    assert file_validator({"size": 10}) == "size=10"
+    assert file_validator({"size": 10, "ETag": "abc"}) == "size=10;ETag=abc"
+    assert file_validator({"name": "file"}) is None
+
+
+def test_block_put_get(tmp_path):
+    cache = RemoteBlockCache(str(tmp_path), block_size=4)
+    key = cache.file_key("root://host//file.root", "size=10")
+    assert cache.file_key("root://host//file.root", "size=11") != key
+
+    assert cache.get_block(key, 0, 4) is None
+    cache.put_block(key, 0, b"abcd")
+    assert cache.get_block(key, 0, 4) == b"abcd"
+
+    # Block of unexpected size is not used
+    assert cache.get_block(key, 0, 3) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["bytes_from_cache"] == 4
+    assert stats["bytes_fetched"] == 4
+    assert stats["bytes"] == 4
+
+    # Blocks stored by another process are found
+    assert RemoteBlockCache(str(tmp_path), block_size=4).get_block(key, 0, 4) == b"abcd"
+
+
+def test_lru_eviction(tmp_path):
+    cache = RemoteBlockCache(str(tmp_path), max_bytes=1000, block_size=400)
+    key = cache.file_key("root://host//file.root", "size=1200")
+    cache.put_block(key, 0, b"a" * 400)
+    cache.put_block(key, 1, b"b" * 400)
+    old_time = os.path.getmtime(cache._block_path(key, 0)) - 100
+    os.utime(cache._block_path(key, 0), (old_time, old_time))
+    os.utime(cache._block_path(key, 1), (old_time + 10, old_time + 10))
+
+    # Block 1 becomes recently used
+    assert cache.get_block(key, 1, 400) is not None
+    cache.put_block(key, 2, b"c" * 400)
+
+    assert cache.get_block(key, 0, 400) is None
+    assert cache.get_block(key, 1, 400) is not None
+    assert cache.get_block(key, 2, 400) is not None
+    assert cache.stats()["bytes"] == 800
+
+
+def test_caching_source_ranges(tmp_path):
+    cache = RemoteBlockCache(str(tmp_path), block_size=1000)
+    with open(DATA_FILE, "rb") as f:
+        content = f.read()
+
+    source = CachingSource(DATA_FILE, block_cache=cache)
+    assert source.num_bytes == len(content)
+
+    # Ranges inside a block, over block borders and up to the end of file
+    ranges = [(0, 10), (990, 2010), (5, 7), (len(content) - 100, len(content))]
+    notifications = queue.Queue()
+    chunks = source.chunks(ranges, notifications)
+    assert notifications.qsize() == len(ranges)
+    for (start, stop), chunk in zip(ranges, chunks):
+        assert bytes(chunk.raw_data) == content[start:stop]
+
+    # Only blocks covering the ranges are fetched
+    blocks = {index for start, stop in ranges for index in range(start // 1000, (stop - 1) // 1000 + 1)}
+    assert cache.stats()["bytes_fetched"] == sum(len(content[index * 1000:(index + 1) * 1000]) for index in blocks)
+
+    chunk = source.chunk(1500, 1600)
+    assert bytes(chunk.raw_data) == content[1500:1600]
+    assert cache.stats()["hits"] == 1
+
+
+def test_read_through_cache(tmp_path):
+    cache = RemoteBlockCache(str(tmp_path), block_size=64 * 1024)
+    expected = uproot.open(DATA_FILE)["events"][BRANCH].array(library="np")
+
+    with uproot.open(DATA_FILE, handler=CachingSource, block_cache=cache) as file:
+        first = file["events"][BRANCH].array(library="np")
+    fetched = cache.stats()["bytes_fetched"]
+    assert fetched > 0
+
+    # The second open reads everything from the disk
+    with uproot.open(DATA_FILE, handler=CachingSource, block_cache=cache) as file:
+        second = file["events"][BRANCH].array(library="np")
+    stats = cache.stats()
+    assert stats["bytes_fetched"] == fetched
+    assert stats["hits"] > 0
+
+    for expected_entry, first_entry, second_entry in zip(expected, first, second):
+        np.testing.assert_array_equal(first_entry, expected_entry)
+        np.testing.assert_array_equal(second_entry, expected_entry)
+
+
+def test_open_root_file_local_path(tmp_path):
+    cache = RemoteBlockCache(str(tmp_path))
+    with open_root_file(DATA_FILE, block_cache=cache) as file:
+        assert not isinstance(file.file.source, CachingSource)
+        assert "events" in file
+    assert cache.stats()["bytes_fetched"] == 0
+
+
+def test_block_size_must_be_positive(tmp_path):
+    with pytest.raises(ValueError):
+        RemoteBlockCache(str(tmp_path), block_size=0)
@@ -0,0 +1,73 @@
+import os
+
+import uproot
+from fsspec.utils import tokenize
+
+import pyrobird.remote_source
+from pyrobird.remote_cache import RemoteBlockCache, CachingSource
+from pyrobird.remote_source import RemoteSourcePool
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "reco_2024-09_craterlake_2evt.edm4eic.root")
+
+
+def test_uproot_options():
+    pool = RemoteSourcePool(connections_per_host=4, parallel_requests=8, coalesce_gap=1024, timeout=30)
+
+    http_options = pool.uproot_options("https://example.com/file.root")
+    assert http_options["batch_size"] == 8
+    assert http_options["coalesce_config"].max_range_gap == 1024
+    assert http_options["get_client"].connections_per_host == 4
+
+    xrootd_options = pool.uproot_options("root://dtn-eic.jlab.org//work/file.root")
+    assert xrootd_options["batch_size"] == 8
+    assert xrootd_options["timeout"] == 30
+    assert "get_client" not in xrootd_options
+
+    assert pool.uproot_options("/tmp/file.root") == {}
+
+
+def test_options_are_reused():
+    # fsspec reuses a filesystem instance (and its connections) when options have the same token
+    first = RemoteSourcePool(timeout=30).uproot_options("https://example.com/a.root")
+    second = RemoteSourcePool(timeout=30).uproot_options("https://example.com/b.root")
+    other = RemoteSourcePool(timeout=10).uproot_options("https://example.com/a.root")
+    assert tokenize(**first) == tokenize(**second)
+    assert tokenize(**first) != tokenize(**other)
+
+
+def test_no_coalesce():
+    config = RemoteSourcePool(coalesce=False).coalesce_config
+    assert config.max_request_ranges == 1
+    assert config.max_range_gap == 0
+
+
+def test_open_remote_file_options(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pyrobird.remote_source, "open_root_file",
+                        lambda path, block_cache=None, **options: calls.append((path, block_cache, options)))
+
+    pool = RemoteSourcePool(parallel_requests=4)
+    pool.open("root://dtn-eic.jlab.org//work/file.root")
+    pool.open("/tmp/file.root")
+
+    assert calls[0][2]["batch_size"] == 4
+    assert calls[1][2] == {}
+    assert pool.stats()["opened"] == 1
+
+
+def test_open_local_file():
+    pool = RemoteSourcePool()
+    with pool.open(DATA_FILE) as file:
+        assert file["events"].num_entries == 2
+    assert pool.stats()["opened"] == 0
+
+
+def test_coalesce_config_reaches_source(tmp_path):
+    pool = RemoteSourcePool(coalesce_gap=4096, block_cache=RemoteBlockCache(str(tmp_path)))
+    with uproot.open(DATA_FILE, handler=CachingSource, block_cache=pool.block_cache,
+                     coalesce_config=pool.coalesce_config) as file:
+        assert file.file.source._inner._coalesce_config is pool.coalesce_config
+        # Source options don't go to the filesystem that gets the file info, so blocks are cached
+        assert file.file.source._file_key is not None
+        assert file["events"].num_entries == 2
+    assert "block_cache" in pool.stats()
@@ -0,0 +1,95 @@
+import os
+
+from pyrobird.server.result_cache import EventResultCache, DiskResultStore, make_event_key
+
+
+def test_make_event_key_depends_on_all_parts():
+    identity = ("file", "/data/file.root", 100, 2000)
+    key = make_event_key(identity, 0, None, "1.0/dex-0.04")
+
+    assert key == make_event_key(identity, 0, None, "1.0/dex-0.04")
+    assert key != make_event_key(identity, 1, None, "1.0/dex-0.04")
+    assert key != make_event_key(identity, 0, ["tracks"], "1.0/dex-0.04")
+    assert key != make_event_key(identity, 0, None, "1.1/dex-0.04")
+    assert key != make_event_key(("file", "/data/file.root", 101, 2000), 0, None, "1.0/dex-0.04")
+
+    # Order of collections doesn't matter
+    assert (make_event_key(identity, 0, ["tracks", "tracker_hits"], "v") ==
+            make_event_key(identity, 0, ["tracker_hits", "tracks"], "v"))
+
+
+def test_memory_cache_byte_budget():
+    cache = EventResultCache(max_bytes=10)
+
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"
+
+    # "b" is the least recently used and is evicted
+    cache.put("c", b"123")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    assert cache.get("c") == b"123"
+
+    # Too large items are not stored
+    cache.put("d", b"12345678901")
+    assert cache.get("d") is None
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 10
+    assert stats["hits"] == 3
+    assert stats["misses"] == 2
+
+
+def test_disk_tier(tmp_path):
+    store = DiskResultStore(str(tmp_path / "cache"))
+    cache = EventResultCache(max_bytes=100, disk_store=store)
+    cache.put("ab12", b'{"id":0}')
+
+    # New cache with the same store (e.g. other process) finds the data on disk
+    other_cache = EventResultCache(max_bytes=100, disk_store=DiskResultStore(str(tmp_path / "cache")))
+    assert other_cache.get("ab12") == b'{"id":0}'
+    assert other_cache.stats()["disk_hits"] == 1
+
+    # Now it is in memory
+    assert other_cache.get("ab12") == b'{"id":0}'
+    assert other_cache.stats()["hits"] == 1
+
+
+def test_disk_store_size_limit(tmp_path):
+    store = DiskResultStore(str(tmp_path), max_bytes=25)
+    for i in range(5):
+        store.put(f"key{i}", b"0123456789")
+        # Make the modification times distinct
+        file_path = os.path.join(str(tmp_path), "ke", f"key{i}.json")
+        os.utime(file_path, (i, i))
+
+    total = sum(os.path.getsize(os.path.join(dir_path, name))
+                for dir_path, _, names in os.walk(str(tmp_path)) for name in names)
+    assert total <= 25
+    assert store.get("key0") is None
+
+
+def test_disk_store_shared_by_workers(tmp_path):
+    # Each process only counts its own files, but scans the directory after writing its share of max_bytes
+    stores = [DiskResultStore(str(tmp_path), max_bytes=40, workers=2) for _ in range(2)]
+    for i in range(8):
+        stores[i % 2].put(f"key{i}", b"0123456789")
+        os.utime(os.path.join(str(tmp_path), "ke", f"key{i}.json"), (i, i))
+
+    total = sum(os.path.getsize(os.path.join(dir_path, name))
+                for dir_path, _, names in os.walk(str(tmp_path)) for name in names)
+    assert total <= 40
+    assert stores[0].get("key6") == stores[0].get("key7") == b"0123456789"
+
+
+def test_disk_store_rewrite_same_key(tmp_path):
+    store = DiskResultStore(str(tmp_path), max_bytes=25)
+    for _ in range(5):
+        store.put("key0", b"0123456789")
+    store.put("key1", b"0123456789")
+
+    # Rewritten key is counted once, nothing is evicted
+    assert store.get("key0") == b"0123456789"
+    assert store.get("key1") == b"0123456789"
+    assert store._total_bytes == 20
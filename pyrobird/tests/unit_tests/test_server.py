@@ -114,3 +114,408 @@ def test_open_edm4eic_file_invalid_file(client):
     except PermissionError as ex:
         print(f"Can't delete {invalid_file_path} probably is locked or no rights: {ex}. "
               f"Continue as is, consider this message as warning")
+
+
+def test_open_edm4eic_file_reuses_open_file(client):
+    from pyrobird.server import get_file_cache, reset_file_cache, reset_result_cache
+
+    reset_file_cache()
+    reset_result_cache()
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    for event_number in (0, 1):
+        response = client.get(f'/api/v1/convert/edm4eic/{event_number}?f={filename}')
+        assert response.status_code == 200
+
+    stats = get_file_cache().stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    reset_file_cache()
+
+
+def test_open_edm4eic_file_result_cache(client):
+    from pyrobird.server import get_result_cache, reset_result_cache
+
+    reset_result_cache()
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}')
+    assert response.status_code == 200
+    first = response.get_json()
+    assert first["origin"]["cache_hits"] == 0
+
+    # Event 0 is taken from the cache, event 1 is converted
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["origin"]["cache_hits"] == 1
+    assert [event["id"] for event in data["events"]] == [0, 1]
+    assert data["events"][0] == first["events"][0]
+    assert data["type"] == "firebird-dex-json"
+
+    stats = get_result_cache().stats()
+    assert stats["items"] == 2
+    reset_result_cache()
+
+
+def test_open_edm4eic_file_etag_revalidation(client):
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    response = client.get(f'/api/v1/convert/edm4eic/1?f={filename}')
+    assert response.status_code == 200
+    etag = response.headers.get("ETag")
+    assert etag
+    assert response.headers.get("Last-Modified")
+
+    response = client.get(f'/api/v1/convert/edm4eic/1?f={filename}', headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # Other entries have different ETag
+    response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}', headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_list_collections(client):
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    response = client.get(f'/api/v1/collections/edm4eic?f={filename}')
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["entries"] == 2
+    assert data["fingerprint"]
+    tof_hits = data["collections"]["TOFEndcapRecHits"]
+    assert tof_hits["type"] == "edm4eic::TrackerHitData"
+    assert "position.x" in tof_hits["fields"]
+    assert "rawHit" in tof_hits["relations"]
+    assert data["collections"]["CentralTrackSegments"]["vectorMembers"] == {"points": "edm4eic::TrackPoint"}
+
+
+def test_list_collections_not_allowed(client):
+    from urllib.parse import quote
+    response = client.get(f'/api/v1/collections/edm4eic?f={quote("/etc/passwd", safe="")}')
+    assert response.status_code == 403
+
+
+def test_open_edm4eic_file_columnar_format(client):
+    from pyrobird.dex_columnar import decode_dex
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    rows = client.get(f'/api/v1/convert/edm4eic/0?f={filename}').get_json()
+    response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}&format=columnar')
+    assert response.status_code == 200
+    columnar = response.get_json()
+    assert columnar["version"] == "0.05"
+    assert all(group["encoding"] == "columnar" for group in columnar["events"][0]["groups"])
+    assert decode_dex(columnar)["events"] == rows["events"]
+
+    response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}&format=xml')
+    assert response.status_code == 400
+
+
+def test_open_edm4eic_file_binary_accept(client):
+    from pyrobird.dex_binary import read_dex_binary, DEX_BINARY_MIME_TYPE
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    rows = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}').get_json()
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}',
+                          headers={"Accept": f"{DEX_BINARY_MIME_TYPE}, application/json;q=0.5"})
+    assert response.status_code == 200
+    assert response.mimetype == DEX_BINARY_MIME_TYPE
+    assert "Accept" in response.headers.get("Vary")
+
+    data = read_dex_binary(response.data)
+    assert data["events"] == rows["events"]
+    assert data["origin"]["source"] == rows["origin"]["source"]
+
+
+def test_open_edm4eic_file_stream_ndjson(client):
+    from pyrobird.server import reset_result_cache, get_file_cache
+    reset_result_cache()
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+
+    expected = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}').get_json()
+    reset_result_cache()
+
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}&stream=ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+
+    lines = response.get_data().decode("utf-8").splitlines()
+    header = json.loads(lines[0])
+    assert header["type"] == "firebird-dex-json"
+    assert "events" not in header
+    assert [json.loads(line) for line in lines[1:]] == expected["events"]
+
+    # Accept header selects NDJSON as well
+    response = client.get(f'/api/v1/convert/edm4eic/1?f={filename}', headers={"Accept": "application/x-ndjson"})
+    assert len(response.get_data().decode("utf-8").splitlines()) == 2
+
+    # All leases are released when the stream is done
+    assert all(cached.users == 0 for cached in get_file_cache()._files.values())
+
+
+def test_open_edm4eic_file_stream_json(client):
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    expected = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}').get_json()
+
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}&stream=json')
+    assert response.status_code == 200
+    data = json.loads(response.get_data())
+    assert data["events"] == expected["events"]
+
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}&stream=xml')
+    assert response.status_code == 400
+
+
+def test_open_edm4eic_file_convert_pool(client):
+    from pyrobird.server import reset_result_cache, reset_convert_pool, get_convert_pool
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    reset_result_cache()
+    expected = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}').get_json()
+    reset_result_cache()
+
+    flask_app.config['PYROBIRD_CONVERT_WORKERS'] = 1
+    try:
+        response = client.get(f'/api/v1/convert/edm4eic/0-1?f={filename}')
+        assert response.status_code == 200
+        assert response.get_json()["events"] == expected["events"]
+        assert get_convert_pool().stats()["submitted"] == 1
+
+        # Worker errors keep their statuses
+        assert client.get(f'/api/v1/convert/edm4eic/100?f={filename}').status_code == 400
+    finally:
+        flask_app.config['PYROBIRD_CONVERT_WORKERS'] = 0
+        reset_convert_pool()
+        reset_result_cache()
+
+
+def test_open_edm4eic_file_convert_pool_busy(client, monkeypatch):
+    import pyrobird.server
+    from pyrobird.server.conversion import ConvertPoolBusy
+
+    class BusyPool:
+        def convert(self, *args, **kwargs):
+            raise ConvertPoolBusy(7)
+
+    pyrobird.server.reset_result_cache()
+    monkeypatch.setattr(pyrobird.server, "get_convert_pool", lambda: BusyPool())
+    response = client.get('/api/v1/convert/edm4eic/0?f=reco_2024-09_craterlake_2evt.edm4eic.root')
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+
+
+def test_open_edm4eic_file_prefetch(client):
+    from pyrobird.server import reset_result_cache, get_prefetcher
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    reset_result_cache()
+
+    flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 1
+    try:
+        response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}')
+        assert response.status_code == 200
+        get_prefetcher().wait()
+
+        # Entry 1 was converted in background
+        response = client.get(f'/api/v1/convert/edm4eic/1?f={filename}')
+        assert response.get_json()["origin"]["cache_hits"] == 1
+        assert get_prefetcher().stats()["used"] == 1
+    finally:
+        flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 0
+        reset_result_cache()
+
+
+def test_open_edm4eic_file_prefetch_clients(client):
+    from pyrobird.server import reset_result_cache, reset_prefetcher, get_prefetcher, PREFETCH_CLIENT_COOKIE
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    reset_result_cache()
+
+    flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 1
+    try:
+        # The first response sets the client cookie, the next requests are tracked by it
+        response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}')
+        cookie = client.get_cookie(PREFETCH_CLIENT_COOKIE)
+        assert cookie is not None
+        response = client.get(f'/api/v1/convert/edm4eic/1?f={filename}')
+        assert PREFETCH_CLIENT_COOKIE not in response.headers.get("Set-Cookie", "")
+
+        # Clients behind one proxy are told apart by the explicit argument
+        client.get(f'/api/v1/convert/edm4eic/0?f={filename}&client=tab1')
+        client.get(f'/api/v1/convert/edm4eic/0?f={filename}&client=tab2')
+        get_prefetcher().wait()
+        client_ids = list(get_prefetcher()._clients)
+        assert [client_id.split("|")[0] for client_id in client_ids] == [cookie.value, "tab1", "tab2"]
+        assert all(client_id.endswith(filename) for client_id in client_ids)
+    finally:
+        flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 0
+        reset_prefetcher()
+        reset_result_cache()
+
+
+def test_open_edm4eic_file_prefetch_convert_pool(client):
+    from pyrobird.server import reset_result_cache, reset_convert_pool, reset_prefetcher, get_prefetcher
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    reset_result_cache()
+
+    # One worker with one queue slot: prefetch must not take it from requests
+    flask_app.config['PYROBIRD_CONVERT_WORKERS'] = 1
+    flask_app.config['PYROBIRD_CONVERT_QUEUE_DEPTH'] = 1
+    flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 1
+    try:
+        # Each request starts prefetch of entry 1, the next request needs the worker right after it
+        for collections in ['tracker_hits', 'tracks', 'calorimeter_hits', 'clusters', 'tracker_hits,tracks']:
+            url = f'/api/v1/convert/edm4eic/0?f={filename}&collections={collections}'
+            assert client.get(url).status_code == 200
+        get_prefetcher().wait()
+    finally:
+        flask_app.config['PYROBIRD_CONVERT_WORKERS'] = 0
+        flask_app.config['PYROBIRD_CONVERT_QUEUE_DEPTH'] = 4
+        flask_app.config['PYROBIRD_PREFETCH_DEPTH'] = 0
+        reset_prefetcher()
+        reset_convert_pool()
+        reset_result_cache()
+
+
+def test_remote_block_cache_config(client, tmp_path):
+    from pyrobird.server import reset_file_cache, reset_remote_block_cache, get_remote_block_cache, get_file_cache
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    assert get_remote_block_cache() is None
+
+    flask_app.config['PYROBIRD_REMOTE_CACHE_DIR'] = str(tmp_path)
+    flask_app.config['PYROBIRD_REMOTE_CACHE_BLOCK_KB'] = 64
+    reset_file_cache()
+    reset_remote_block_cache()
+    try:
+        block_cache = get_remote_block_cache()
+        assert block_cache.block_size == 64 * 1024
+        assert get_file_cache()._opener is not None
+
+        # Local files are opened directly
+        response = client.get(f'/api/v1/convert/edm4eic/0?f={filename}')
+        assert response.status_code == 200
+        assert block_cache.stats()["bytes_fetched"] == 0
+    finally:
+        flask_app.config['PYROBIRD_REMOTE_CACHE_DIR'] = ''
+        reset_file_cache()
+        reset_remote_block_cache()
+
+
+def test_open_edm4eic_file_single_flight(client, monkeypatch):
+    import threading
+    import pyrobird.server
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    convert_file_entries = pyrobird.server._convert_file_entries
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_convert(*args, **kwargs):
+        calls.append(args[1])
+        started.set()
+        release.wait(10)
+        return convert_file_entries(*args, **kwargs)
+
+    pyrobird.server.reset_result_cache()
+    monkeypatch.setattr(pyrobird.server, "_convert_file_entries", slow_convert)
+    responses = []
+
+    def request():
+        responses.append(flask_app.test_client().get(f'/api/v1/convert/edm4eic/0?f={filename}'))
+
+    first = threading.Thread(target=request)
+    first.start()
+    assert started.wait(10)
+    shared_before = pyrobird.server.get_single_flight().stats()["shared"]
+    second = threading.Thread(target=request)
+    second.start()
+    while pyrobird.server.get_single_flight().stats()["shared"] == shared_before:
+        pass
+    release.set()
+    first.join(10)
+    second.join(10)
+
+    # The event was converted once, the second request took the result of the first one
+    assert calls == [[0]]
+    assert [response.status_code for response in responses] == [200, 200]
+    assert sorted(response.get_json()["origin"]["coalesced"] for response in responses) == [0, 1]
+    assert responses[0].get_json()["events"] == responses[1].get_json()["events"]
+    pyrobird.server.reset_result_cache()
+
+
+def test_open_edm4eic_file_server_timing(client):
+    import pyrobird.server
+    pyrobird.server.reset_result_cache()
+    response = client.get(f'/api/v1/convert/edm4eic/0-1?f={TEST_ROOT_FILE}&collections=tracker_hits&timings=1')
+    assert response.status_code == 200
+    stages = [item.split(';')[0] for item in response.headers['Server-Timing'].split(', ')]
+    assert stages[0] == "resolve"
+    assert stages[-1] == "total"
+    assert "compress" in stages
+
+    timings = response.get_json()["origin"]["timings"]
+    assert "read" in timings["stages"]
+    assert "B0TrackerRecHits" in timings["collections"]
+
+    # Without timings argument, origin has no timings
+    response = client.get(f'/api/v1/convert/edm4eic/0?f={TEST_ROOT_FILE}&collections=tracker_hits')
+    assert "timings" not in response.get_json()["origin"]
+    assert "Server-Timing" in response.headers
+
+
+def test_open_edm4eic_file_calorimeter_options(client):
+    from pyrobird.server import reset_result_cache, CFG_CALO_MAX_HITS
+
+    reset_result_cache()
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    url = f'/api/v1/convert/edm4eic/0?f={filename}&collections=calorimeter_hits'
+
+    all_hits = client.get(url).get_json()["events"][0]["groups"]
+    capped = client.get(url + '&calo_max_hits=3').get_json()
+    assert capped["origin"]["cache_hits"] == 0
+    groups = capped["events"][0]["groups"]
+    assert all(len(group["hits"]) <= 3 for group in groups)
+    assert sum(len(group["hits"]) for group in groups) < sum(len(group["hits"]) for group in all_hits)
+
+    # Server default applies when the request doesn't give the option
+    flask_app.config[CFG_CALO_MAX_HITS] = 3
+    try:
+        data = client.get(url).get_json()
+        assert data["origin"]["cache_hits"] == 1
+        assert data["events"][0]["groups"] == groups
+    finally:
+        flask_app.config[CFG_CALO_MAX_HITS] = 0
+
+    assert client.get(url + '&calo_min_energy=abc').status_code == 400
+    assert client.get(url + '&calo_max_hits=-1').status_code == 400
+    reset_result_cache()
+
+
+def test_open_edm4eic_file_lod(client):
+    from pyrobird.server import reset_result_cache, CFG_LOD
+
+    reset_result_cache()
+    filename = 'reco_2024-09_craterlake_2evt.edm4eic.root'
+    url = f'/api/v1/convert/edm4eic/0?f={filename}&collections=tracker_hits,calorimeter_hits'
+
+    all_groups = client.get(url).get_json()["events"][0]["groups"]
+    sampled = client.get(url + '&lod=sample&lod_max_hits=50').get_json()
+    assert sampled["origin"]["cache_hits"] == 0
+    groups = sampled["events"][0]["groups"]
+    assert sum(len(group["hits"]) for group in groups) == 50
+    assert any("lod" in group["origin"] for group in groups)
+
+    voxels = client.get(url + '&lod=voxel&lod_voxel_size=100').get_json()["events"][0]["groups"]
+    assert sum(len(group["hits"]) for group in voxels) < sum(len(group["hits"]) for group in all_groups)
+
+    # Server default applies when the request doesn't give the option, lod=none disables it
+    flask_app.config[CFG_LOD] = 'sample'
+    try:
+        assert client.get(url + '&lod_max_hits=50').get_json()["events"][0]["groups"] == groups
+        assert client.get(url + '&lod=none').get_json()["events"][0]["groups"] == all_groups
+    finally:
+        flask_app.config[CFG_LOD] = ''
+
+    assert client.get(url + '&lod=fancy').status_code == 400
+    assert client.get(url + '&lod=voxel&lod_voxel_size=0').status_code == 400
+    assert client.get(url + '&lod=sample&lod_max_hits=x').status_code == 400
+    reset_result_cache()
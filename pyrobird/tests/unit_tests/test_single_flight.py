@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from pyrobird.server.single_flight import SingleFlight
+
+
+def test_claim_and_resolve():
+    single_flight = SingleFlight()
+    own, waiting = single_flight.claim(["a", "b"])
+    assert sorted(own) == ["a", "b"]
+    assert waiting == {}
+
+    # Concurrent caller waits for "b" and claims "c"
+    other_own, other_waiting = single_flight.claim(["b", "c"])
+    assert list(other_own) == ["c"]
+    assert list(other_waiting) == ["b"]
+
+    single_flight.resolve(own, "b", 42)
+    assert other_waiting["b"].result(timeout=1) == 42
+    assert list(own) == ["a"]
+
+    # Resolved key may be claimed again
+    next_own, _ = single_flight.claim(["b"])
+    assert list(next_own) == ["b"]
+    assert single_flight.stats() == {"in_flight": 3, "leaders": 3, "shared": 1}
+
+
+def test_fail_passes_exception():
+    single_flight = SingleFlight()
+    own, _ = single_flight.claim(["a"])
+    _, waiting = single_flight.claim(["a"])
+
+    single_flight.fail(own, ValueError("broken"))
+    with pytest.raises(ValueError):
+        waiting["a"].result(timeout=1)
+    assert single_flight.in_flight() == 0
+
+
+def test_concurrent_callers_share_result():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    computed = []
+    results = []
+
+    def compute():
+        own, waiting = single_flight.claim(["key"])
+        if own:
+            started.set()
+            release.wait(5)
+            computed.append(1)
+            single_flight.resolve(own, "key", b"event")
+            results.append(b"event")
+        else:
+            results.append(waiting["key"].result(timeout=5))
+
+    leader = threading.Thread(target=compute)
+    leader.start()
+    assert started.wait(5)
+    followers = [threading.Thread(target=compute) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while single_flight.stats()["shared"] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert computed == [1]
+    assert results == [b"event"] * 4
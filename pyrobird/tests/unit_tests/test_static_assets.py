@@ -0,0 +1,129 @@
+import gzip
+import os
+
+import brotli
+import pytest
+from werkzeug.datastructures import Accept
+
+import pyrobird.server
+from pyrobird.server import flask_app
+from pyrobird.server.static_assets import (StaticAssets, is_hashed_name, precompress_file, precompress_directory,
+                                           IMMUTABLE_MAX_AGE)
+
+BUNDLE = b"console.log('firebird');\n" * 200
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "index.html").write_bytes(b"<html>" + b"<script src='main-5RJ6TLTO.js'></script>" * 100 + b"</html>")
+    (tmp_path / "main-5RJ6TLTO.js").write_bytes(BUNDLE)
+    (tmp_path / "small.js").write_bytes(b"1")
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "config.jsonc").write_bytes(b'{"a": 1}\n' * 200)
+    return tmp_path
+
+
+@pytest.fixture
+def client(static_dir, monkeypatch):
+    monkeypatch.setattr(pyrobird.server, "static_dir", str(static_dir))
+    pyrobird.server.reset_static_assets()
+    flask_app.config['TESTING'] = True
+    yield flask_app.test_client()
+    pyrobird.server.reset_static_assets()
+
+
+def test_is_hashed_name():
+    assert is_hashed_name("main-5RJ6TLTO.js")
+    assert is_hashed_name("media/chunk-ABCD2345.css")
+    assert is_hashed_name("main.3f2a9c8e1b7d4a6c5e0f.js")
+    assert not is_hashed_name("index.html")
+    assert not is_hashed_name("config-defaults.json")
+    assert not is_hashed_name("run-20240101.json")
+
+
+def test_precompress_file(static_dir):
+    bundle = str(static_dir / "main-5RJ6TLTO.js")
+    written = precompress_file(bundle)
+    assert sorted(written) == [bundle + ".br", bundle + ".gz"]
+    assert brotli.decompress((static_dir / "main-5RJ6TLTO.js.br").read_bytes()) == BUNDLE
+    assert gzip.decompress((static_dir / "main-5RJ6TLTO.js.gz").read_bytes()) == BUNDLE
+
+    # Fresh siblings are kept, small files are not compressed
+    assert precompress_file(bundle) == []
+    assert precompress_file(str(static_dir / "small.js")) == []
+
+    # Changed file gets new siblings
+    stat = os.stat(bundle)
+    os.utime(bundle, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert len(precompress_file(bundle)) == 2
+
+
+def test_precompress_directory(static_dir):
+    written = precompress_directory(str(static_dir))
+    assert str(static_dir / "assets" / "config.jsonc.gz") in written
+    assert len(written) == 6
+
+
+def test_resolve_and_select(static_dir):
+    assets = StaticAssets(str(static_dir))
+    asset = assets.resolve("main-5RJ6TLTO.js")
+    assert asset.is_hashed
+    assert asset.mimetype == "text/javascript"
+    assert asset.select(Accept([("gzip", 1), ("br", 1)])) == (asset.path + ".br", "br")
+    assert asset.select(Accept([("gzip", 1)])) == (asset.path + ".gz", "gzip")
+    assert asset.select(Accept([("br", 0), ("gzip", 1)])) == (asset.path + ".gz", "gzip")
+    assert asset.select(Accept([])) == (asset.path, None)
+
+    # Not existing paths are SPA routes, the decision is remembered
+    route = assets.resolve("event-display")
+    assert route.is_fallback
+    assert route.path.endswith("index.html")
+    assert assets.resolve("event-display") is route
+    assert assets.stats()["hits"] == 1
+    assert assets.resolve("../etc/passwd").is_fallback
+
+
+def test_read_only_directory(static_dir):
+    assets = StaticAssets(str(static_dir), compress_on_request=False)
+    assert assets.resolve("main-5RJ6TLTO.js").siblings == {}
+
+
+def test_serve_compressed_bundle(client):
+    response = client.get("/main-5RJ6TLTO.js", headers={"Accept-Encoding": "gzip, br"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "br"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.cache_control.immutable
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert brotli.decompress(response.get_data()) == BUNDLE
+
+    response = client.get("/main-5RJ6TLTO.js", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data() == BUNDLE
+
+
+def test_serve_spa_fallback(client):
+    response = client.get("/event-display", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.cache_control.no_cache
+    assert gzip.decompress(response.get_data()).startswith(b"<html>")
+
+    response = client.get("/")
+    assert response.cache_control.no_cache
+    assert not response.cache_control.immutable
+
+
+def test_serve_after_rebuild(client, static_dir):
+    assert client.get("/small.js").get_data() == b"1"
+    os.remove(static_dir / "small.js")
+    response = client.get("/small.js")
+    assert response.status_code == 200
+    assert response.mimetype == "text/html"
+
+
+def test_no_index(client, static_dir):
+    for file_name in os.listdir(static_dir):
+        if file_name.startswith("index.html"):
+            os.remove(static_dir / file_name)
+    assert client.get("/event-display").status_code == 404
@@ -0,0 +1,35 @@
+import time
+
+from pyrobird.timing import StageTimings, timed, timed_collection
+
+
+def test_stages_are_summed():
+    timings = StageTimings()
+    with timings.stage("read"):
+        time.sleep(0.01)
+    timings.add("read", 5.0)
+    timings.add("serialize", 1.234567)
+    assert timings.stages["read"] >= 15.0
+    assert list(timings.stages) == ["read", "serialize"]
+    assert timings.to_dict() == {"stages": {"read": round(timings.stages["read"], 3), "serialize": 1.235}}
+    assert timings.server_timing().endswith("serialize;dur=1.23")
+    assert timings.server_timing().startswith("read;dur=")
+
+
+def test_collections_and_update():
+    timings = StageTimings()
+    with timed_collection(timings, "B0TrackerRecHits"):
+        pass
+    assert timings.collections == {}
+
+    timings = StageTimings(per_collection=True)
+    with timed_collection(timings, "B0TrackerRecHits"):
+        pass
+    timings.update({"stages": {"open": 2.0}, "collections": {"B0TrackerRecHits": 1.0}})
+    assert timings.stages == {"open": 2.0}
+    assert timings.collections["B0TrackerRecHits"] >= 1.0
+
+
+def test_timed_without_timings():
+    with timed(None, "read"), timed_collection(None, "hits"):
+        pass